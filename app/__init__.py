@@ -11,6 +11,15 @@
 # After registering the Blueprint, the application initializes custom integrations by calling the `initialize_integrations`
 # function, passing the application instance as an argument. This step dynamically loads and activates specified integrations,
 # enhancing the application's functionality based on predefined configurations.
+# Integration modules and the database backend are only imported when used (see integration_manager.py and
+# integrations/database/__init__.py), which keeps the startup of a worker short. The database backend is also built on
+# its first call (see integrations/database/lazy.py), a Neo4j backend does not connect at boot.
+
+# The app encodes and decodes JSON with `FastJSONProvider` (orjson when installed, see json_provider.py).
+# Logging (levels, request correlation ids, truncated and sampled payloads, queued output) is set up by
+# `configure_logging`, see logs.py.
+# Unless METRICS=false, requests and database calls are timed for the /metrics route, see metrics.py.
+# With PROFILE_TOKEN set, single requests can be profiled on demand, see profiling.py.
 
 # Optionally, a list of setup callbacks can be provided to perform additional setup tasks with the application context.
 # This allows for flexible customization of the application setup process, enabling the execution of additional configuration
@@ -20,7 +29,14 @@
 
 from flask import Flask
 from app.integrations.integration_manager import initialize_integrations
-from app.integrations.database import CurrentDBIntegration
+from app.integrations.database import database_class
+from app.integrations.database.cache import CachedDatabase, cache_enabled, cache_settings
+from app.integrations.database.instrumented import InstrumentedDatabase
+from app.integrations.database.lazy import LazyDatabase
+from app.json_provider import FastJSONProvider
+from app.logs import configure_logging
+from app.metrics import METRICS_ENABLED, instrument_app
+from app.profiling import install_profiling
 from app.models import set_database_integration
 from dotenv import load_dotenv
 import os
@@ -32,15 +48,28 @@ def create_app(setup_callbacks=None):
   app = Flask(__name__,
               template_folder="./templates",
               static_folder="../static")
+  app.json = FastJSONProvider(app)
+  configure_logging(app)
+  if METRICS_ENABLED:
+    instrument_app(app)
+  install_profiling(app)
 
   from .views import main
 
   app.register_blueprint(main)
 
+  from .commands import graph_cli
+
+  app.cli.add_command(graph_cli)
+
   # Initialize integrations
   initialize_integrations(app)
 
-  db_integration_instance = CurrentDBIntegration()
+  db_integration_instance = LazyDatabase(lambda: database_class()())
+  if cache_enabled():
+    db_integration_instance = CachedDatabase(db_integration_instance, **cache_settings())
+  if METRICS_ENABLED:
+    db_integration_instance = InstrumentedDatabase(db_integration_instance)
   set_database_integration(db_integration_instance)
 
   # If setup_callbacks is None, initialize as empty list
@@ -0,0 +1,341 @@
+# Graph analytics on a compressed sparse row (CSR) snapshot of the graph.
+#
+# `CSRGraph.from_dump(nodes, edges)` turns the `dump_graph()` output of any backend into:
+# - `ids`, the entity ids, a node is referred to by its position in this list,
+# - `adjacency`, a scipy.sparse CSR matrix where adjacency[i, j] counts the relationships from node i to node j
+#   (relationships whose endpoints are not entities are dropped),
+# - `undirected`, adjacency + its transpose, used where the direction of a relationship does not matter.
+# Every algorithm then works on the whole arrays, with sparse matrix products instead of Python loops over nodes:
+# - pagerank: power iteration on the out-degree normalised adjacency, dangling nodes spread their rank uniformly,
+# - components: weakly (or strongly) connected components, numbered by decreasing size,
+# - degree: in, out and total degree from the row and column sums,
+# - betweenness: Brandes' dependency accumulation from `samples` random sources, all BFS run together as one
+#   sparse matrix times dense block product per level, scaled to estimate the exact value (exact when samples >= n),
+# - communities: synchronous label propagation on the undirected graph, numbered by decreasing size.
+#
+# `GraphAnalytics` builds the snapshot and caches the results of every algorithm and parameter set until the graph
+# version (bumped by every write in app.models) changes. `analytics` is the instance of the app, behind the
+# /analytics endpoints; its methods return plain dicts keyed by entity id, `report` the top entities of a result.
+
+import threading
+import time
+import numpy as np
+from scipy import sparse
+from scipy.sparse import csgraph
+
+ALGORITHMS = ("pagerank", "components", "degree", "betweenness", "communities")
+DEFAULT_BETWEENNESS_SAMPLES = 64
+# Number of BFS sources run together in one sparse x dense product of the betweenness approximation
+BETWEENNESS_BLOCK = 32
+
+
+class CSRGraph:
+    def __init__(self, ids, names, types, adjacency):
+        self.ids = ids
+        self.names = names
+        self.types = types
+        self.adjacency = adjacency
+        self.undirected = (adjacency + adjacency.T).tocsr()
+
+    @classmethod
+    def from_dump(cls, nodes, edges):
+        ids = []
+        names = []
+        types = []
+        for entity_id, entity_type, data in nodes:
+            ids.append(entity_id)
+            names.append((data or {}).get("name"))
+            types.append(entity_type)
+        index = {entity_id: position for position, entity_id in enumerate(ids)}
+
+        sources = []
+        targets = []
+        for from_id, to_id, _ in edges:
+            source = index.get(from_id)
+            target = index.get(to_id)
+            if source is not None and target is not None:
+                sources.append(source)
+                targets.append(target)
+        n = len(ids)
+        adjacency = sparse.csr_matrix(
+            (np.ones(len(sources), dtype=np.float64), (np.array(sources, dtype=np.int64), np.array(targets, dtype=np.int64))),
+            shape=(n, n),
+        )
+        adjacency.sum_duplicates()
+        return cls(ids, names, types, adjacency)
+
+    @property
+    def node_count(self):
+        return len(self.ids)
+
+    @property
+    def edge_count(self):
+        return int(self.adjacency.sum())
+
+
+def pagerank(graph, damping=0.85, tolerance=1e-6, max_iterations=100):
+    n = graph.node_count
+    if n == 0:
+        return np.zeros(0)
+    out_degree = np.asarray(graph.adjacency.sum(axis=1)).ravel()
+    dangling = out_degree == 0
+    inverse = np.divide(1.0, out_degree, out=np.zeros(n), where=~dangling)
+    # transition[j, i] is the probability to go from i to j
+    transition = (sparse.diags(inverse) @ graph.adjacency).T.tocsr()
+    rank = np.full(n, 1.0 / n)
+    for _ in range(max_iterations):
+        spread = (damping * rank[dangling].sum() + 1 - damping) / n
+        updated = damping * (transition @ rank) + spread
+        error = np.abs(updated - rank).sum()
+        rank = updated
+        if error < n * tolerance:
+            break
+    return rank / rank.sum()
+
+
+def _by_size(labels):
+    # Renumbers labels so that 0 is the largest group, ties broken by the smallest original label
+    _, inverse, counts = np.unique(labels, return_inverse=True, return_counts=True)
+    order = np.argsort(-counts, kind="stable")
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+    return rank[inverse]
+
+
+def components(graph, connection="weak"):
+    if graph.node_count == 0:
+        return np.zeros(0, dtype=np.int64)
+    _, labels = csgraph.connected_components(graph.adjacency, directed=True, connection=connection)
+    return _by_size(labels)
+
+
+def degree(graph):
+    out_degree = np.asarray(graph.adjacency.sum(axis=1)).ravel()
+    in_degree = np.asarray(graph.adjacency.sum(axis=0)).ravel()
+    return in_degree, out_degree
+
+
+def betweenness(graph, samples=DEFAULT_BETWEENNESS_SAMPLES, seed=0):
+    n = graph.node_count
+    scores = np.zeros(n)
+    if n == 0:
+        return scores
+    # Multi-edges do not add shortest paths
+    structure = graph.undirected.copy()
+    structure.data[:] = 1.0
+    structure.setdiag(0)
+    structure.eliminate_zeros()
+
+    if samples >= n:
+        sources = np.arange(n)
+    else:
+        sources = np.random.default_rng(seed).choice(n, size=samples, replace=False)
+
+    for start in range(0, len(sources), BETWEENNESS_BLOCK):
+        block = sources[start:start + BETWEENNESS_BLOCK]
+        columns = np.arange(len(block))
+        distance = np.full((n, len(block)), -1, dtype=np.int64)
+        sigma = np.zeros((n, len(block)))
+        distance[block, columns] = 0
+        sigma[block, columns] = 1.0
+
+        # Forward: counts of shortest paths, one BFS level of every source per product
+        frontier = sigma.copy()
+        level = 0
+        while frontier.any():
+            reached = structure @ frontier
+            new = (reached > 0) & (distance < 0)
+            level += 1
+            distance[new] = level
+            sigma[new] = reached[new]
+            frontier = np.where(new, sigma, 0.0)
+
+        # Backward: dependencies of every node on its successors, deepest level first
+        delta = np.zeros_like(sigma)
+        for current in range(level, 1, -1):
+            on_level = distance == current
+            coefficient = np.where(on_level, (1.0 + delta) / np.where(on_level, sigma, 1.0), 0.0)
+            contribution = structure @ coefficient
+            previous = distance == current - 1
+            delta[previous] += sigma[previous] * contribution[previous]
+        delta[block, columns] = 0.0
+        scores += delta.sum(axis=1)
+
+    # Every path is counted from both ends on the undirected graph
+    return scores * (n / len(sources)) / 2.0
+
+
+def communities(graph, max_iterations=20):
+    n = graph.node_count
+    labels = np.arange(n)
+    if n == 0:
+        return labels
+    structure = graph.undirected.tocoo()
+    # Every node also votes once for its own label, which damps the oscillations of synchronous updates
+    rows = np.concatenate([structure.row, np.arange(n)]).astype(np.int64)
+    columns = np.concatenate([structure.col, np.arange(n)])
+    weights = np.concatenate([structure.data, np.ones(n)])
+    for _ in range(max_iterations):
+        # Total vote of every (node, label) pair, sorted by node then label
+        keys = rows * n + labels[columns]
+        order = np.argsort(keys, kind="stable")
+        keys = keys[order]
+        starts = np.flatnonzero(np.concatenate([[True], keys[1:] != keys[:-1]]))
+        votes = np.add.reduceat(weights[order], starts)
+        nodes, candidates = np.divmod(keys[starts], n)
+        # The most voted label of every node, ties go to the smallest label
+        node_starts = np.flatnonzero(np.concatenate([[True], nodes[1:] != nodes[:-1]]))
+        best = np.maximum.reduceat(votes, node_starts)
+        winners = votes == np.repeat(best, np.diff(np.append(node_starts, len(nodes))))
+        first = np.unique(nodes[winners], return_index=True)[1]
+        updated = candidates[winners][first]
+        if np.array_equal(updated, labels):
+            break
+        labels = updated
+    return _by_size(labels)
+
+
+FUNCTIONS = {
+    "pagerank": pagerank,
+    "components": components,
+    "degree": degree,
+    "betweenness": betweenness,
+    "communities": communities,
+}
+DEFAULT_PARAMS = {
+    "pagerank": {"damping": 0.85, "tolerance": 1e-6, "max_iterations": 100},
+    "components": {"connection": "weak"},
+    "degree": {},
+    "betweenness": {"samples": DEFAULT_BETWEENNESS_SAMPLES, "seed": 0},
+    "communities": {"max_iterations": 20},
+}
+
+
+class GraphAnalytics:
+    def __init__(self, load_graph=None, version=None):
+        # Defaults to the database integration of the app and the graph version of app.models
+        self.load_graph = load_graph
+        self.version = version
+        self.lock = threading.Lock()
+        self.graph = None
+        self.graph_version = None
+        self.results = {}
+        self.timings = {}
+
+    def _load(self):
+        if self.load_graph is not None:
+            return self.load_graph()
+        from app import models
+        if models.current_db_integration is None:
+            raise ValueError("Database integration is not set.")
+        return models.current_db_integration.dump_graph()
+
+    def _current_version(self):
+        if self.version is not None:
+            return self.version()
+        from app.models import get_graph_version
+        return get_graph_version()
+
+    def snapshot(self):
+        with self.lock:
+            return self._snapshot()
+
+    def _snapshot(self):
+        version = self._current_version()
+        if self.graph is None or version != self.graph_version:
+            started = time.perf_counter()
+            nodes, edges = self._load()
+            self.graph = CSRGraph.from_dump(nodes, edges)
+            self.graph_version = version
+            self.results = {}
+            self.timings = {"snapshot": time.perf_counter() - started}
+        return self.graph
+
+    def run(self, algorithm, **params):
+        # Returns the snapshot and the raw result arrays, computed once per graph version and parameter set
+        if algorithm not in FUNCTIONS:
+            raise ValueError(f"Unknown algorithm '{algorithm}', expected one of {', '.join(ALGORITHMS)}")
+        unknown = set(params) - set(DEFAULT_PARAMS[algorithm])
+        if unknown:
+            raise ValueError(f"Unknown parameters for {algorithm}: {', '.join(sorted(unknown))}")
+        params = {**DEFAULT_PARAMS[algorithm], **params}
+        key = (algorithm, *sorted(params.items()))
+        with self.lock:
+            graph = self._snapshot()
+            if key not in self.results:
+                started = time.perf_counter()
+                self.results[key] = FUNCTIONS[algorithm](graph, **params)
+                self.timings[algorithm] = time.perf_counter() - started
+            return graph, self.results[key]
+
+    def _by_id(self, graph, values):
+        return {entity_id: value.item() for entity_id, value in zip(graph.ids, values, strict=True)}
+
+    def pagerank(self, **params):
+        return self._by_id(*self.run("pagerank", **params))
+
+    def components(self, **params):
+        return self._by_id(*self.run("components", **params))
+
+    def degree(self):
+        graph, (in_degree, out_degree) = self.run("degree")
+        return {
+            entity_id: {"in": int(incoming), "out": int(outgoing), "total": int(incoming + outgoing)}
+            for entity_id, incoming, outgoing in zip(graph.ids, in_degree, out_degree, strict=True)
+        }
+
+    def betweenness(self, **params):
+        return self._by_id(*self.run("betweenness", **params))
+
+    def communities(self, **params):
+        return self._by_id(*self.run("communities", **params))
+
+    def _entity(self, graph, position, **values):
+        return {"id": graph.ids[position], "name": graph.names[position], "type": graph.types[position], **values}
+
+    def _groups(self, graph, labels, limit, members):
+        counts = np.bincount(labels) if len(labels) else np.zeros(0, dtype=np.int64)
+        order = np.argsort(labels, kind="stable")
+        bounds = np.concatenate([[0], np.cumsum(counts)])
+        groups = []
+        for label in range(min(limit, len(counts))):
+            positions = order[bounds[label]:bounds[label + 1]][:members]
+            groups.append({
+                "id": label,
+                "size": int(counts[label]),
+                "members": [self._entity(graph, position) for position in positions],
+            })
+        return {"count": int(len(counts)), "groups": groups}
+
+    def report(self, algorithm, limit=20, members=10, **params):
+        # The top `limit` entities, or the `limit` largest groups with their first `members`, as served over HTTP
+        graph, result = self.run(algorithm, **params)
+        if algorithm == "degree":
+            in_degree, out_degree = result
+            total = in_degree + out_degree
+            summary = {"top": [
+                self._entity(graph, position, **{"in": int(in_degree[position]), "out": int(out_degree[position]),
+                                                 "total": int(total[position])})
+                for position in np.argsort(-total, kind="stable")[:limit]
+            ]}
+        elif algorithm in ("components", "communities"):
+            summary = self._groups(graph, result, limit, members)
+        else:
+            summary = {"top": [
+                self._entity(graph, position, score=float(result[position]))
+                for position in np.argsort(-result, kind="stable")[:limit]
+            ]}
+        return {"algorithm": algorithm, "params": {**DEFAULT_PARAMS[algorithm], **params}, **self.stats(), **summary}
+
+    def stats(self):
+        with self.lock:
+            graph = self.graph
+            return {
+                "graph_version": self.graph_version,
+                "nodes": graph.node_count if graph is not None else None,
+                "edges": graph.edge_count if graph is not None else None,
+                "seconds": {name: round(seconds, 6) for name, seconds in self.timings.items()},
+            }
+
+
+analytics = GraphAnalytics()
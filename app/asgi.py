@@ -0,0 +1,160 @@
+# ASGI adapter of the Flask app, served by the asgi.py entry point next to main.py.
+#
+# POST /trigger-integration/<integration_name> of integrations with an async variant (registered with
+# `register_async`: natural_input, add_multiple_conditional, the conditional additions, ai_search) is served on the
+# event loop. The request goes through the usual Flask request context, hooks and error handling (request id, metrics,
+# profiling, compression) but the integration is awaited, a request waiting for the model only holds a coroutine, and
+# it is admitted by the async limiter of the integration (429/503 with Retry-After when saturated).
+#
+# Every other request, including integrations without an async variant, runs the WSGI app in a pool of
+# ASGI_WSGI_THREADS threads, as it would under a threaded WSGI server. Request and response bodies are buffered, the
+# routes of this app answer with complete JSON documents.
+
+import asyncio
+import io
+import os
+import re
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from flask import jsonify, request
+from .integrations.integration_manager import AdmissionRejected
+
+ASGI_WSGI_THREADS = int(os.getenv("ASGI_WSGI_THREADS", "32"))
+TRIGGER_PATH = re.compile(r"/trigger-integration/([^/]+)")
+
+
+def build_environ(scope, body):
+    server_name, server_port = scope.get("server") or ("localhost", 80)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode("utf-8").decode("latin-1"),
+        "PATH_INFO": scope["path"].encode("utf-8").decode("latin-1"),
+        "QUERY_STRING": scope.get("query_string", b"").decode("latin-1"),
+        "SERVER_NAME": server_name,
+        "SERVER_PORT": str(server_port),
+        "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+        "CONTENT_LENGTH": str(len(body)),
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False,
+    }
+    if scope.get("client"):
+        environ["REMOTE_ADDR"] = scope["client"][0]
+    for name, value in scope.get("headers", []):
+        name = name.decode("latin-1").upper().replace("-", "_")
+        value = value.decode("latin-1")
+        key = name if name in ("CONTENT_TYPE", "CONTENT_LENGTH") else f"HTTP_{name}"
+        environ[key] = f"{environ[key]},{value}" if key in environ and key != "CONTENT_LENGTH" else value
+    return environ
+
+
+async def read_body(receive):
+    chunks = []
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            break
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body"):
+            break
+    return b"".join(chunks)
+
+
+async def send_response(send, status, headers, body):
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(name.lower().encode("latin-1"), value.encode("latin-1")) for name, value in headers],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+class AsgiApp:
+    def __init__(self, flask_app, wsgi_threads=ASGI_WSGI_THREADS):
+        self.flask_app = flask_app
+        self.executor = ThreadPoolExecutor(wsgi_threads, thread_name_prefix="asgi-wsgi")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            return await self.lifespan(receive, send)
+        if scope["type"] != "http":
+            raise ValueError(f"Unsupported ASGI scope type '{scope['type']}'")
+
+        body = await read_body(receive)
+        environ = build_environ(scope, body)
+        match = TRIGGER_PATH.fullmatch(scope["path"])
+        if match and scope["method"] == "POST":
+            integration_name = match.group(1)
+            integration_function = self.flask_app.integration_manager.get_async_integration_function(integration_name)
+            if integration_function is not None:
+                return await self.trigger(environ, integration_name, integration_function, send)
+        await self.wsgi(environ, send)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                self.executor.shutdown(wait=False)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def wsgi(self, environ, send):
+        loop = asyncio.get_running_loop()
+        status, headers, body = await loop.run_in_executor(self.executor, self.call_wsgi, environ)
+        await send_response(send, status, headers, body)
+
+    def call_wsgi(self, environ):
+        started = {}
+        chunks = []
+
+        def start_response(status, headers, exc_info=None):
+            # Nothing is sent before the app returns, so an error response (exc_info) replaces the started one
+            if exc_info is None and started:
+                raise AssertionError("start_response called twice without exc_info")
+            started["status"] = int(status.split(" ", 1)[0])
+            started["headers"] = headers
+            return chunks.append
+
+        result = self.flask_app(environ, start_response)
+        try:
+            chunks.extend(result)
+        finally:
+            if hasattr(result, "close"):
+                result.close()
+        return started["status"], started["headers"], b"".join(chunks)
+
+    async def trigger(self, environ, integration_name, integration_function, send):
+        # What Flask's full_dispatch_request does, with the view awaited on the event loop
+        app = self.flask_app
+        with app.request_context(environ):
+            try:
+                response = app.preprocess_request()
+                if response is None:
+                    response = await self.run_integration(integration_name, integration_function)
+                response = app.finalize_request(response)
+            except Exception as e:
+                try:
+                    response = app.finalize_request(app.handle_user_exception(e))
+                except Exception as error:
+                    response = app.handle_exception(error)
+            body = response.get_data()
+            await send_response(send, response.status_code, response.headers.to_wsgi_list(), body)
+
+    async def run_integration(self, integration_name, integration_function):
+        data = request.json
+        limiter = self.flask_app.integration_manager.get_async_limiter(integration_name)
+        if limiter is None:
+            return await integration_function(self.flask_app, data)
+        try:
+            async with limiter.admit():
+                return await integration_function(self.flask_app, data)
+        except AdmissionRejected as e:
+            response = jsonify(error=str(e), retry_after=e.retry_after)
+            response.headers["Retry-After"] = str(e.retry_after)
+            return response, e.status_code
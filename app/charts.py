@@ -0,0 +1,283 @@
+# Statistics charts of the graph, rendered off the request path.
+#
+# Charts:
+# - degree_distribution: number of entities per total degree (in + out), from the degree of the analytics snapshot,
+#   on log-log axes unless `scale=linear`,
+# - entity_types: number of entities of the `limit` most common types, the others summed up as "other",
+# - ingest_rate: documents (bars) and extracted entities (line) ingested per `bucket` seconds over the last `window`
+#   buckets, from the document registry.
+# Each chart is drawn as PNG or SVG with matplotlib's object API (a `Figure` with no pyplot state, nothing needs a
+# display) by a single background worker thread. matplotlib is imported by the first render, not at startup.
+#
+# `ChartService.get` never draws in the calling thread. Rendered bytes are cached per chart, format and parameters
+# along with the graph version (bumped by every write in app.models) they were drawn at, at most CHART_CACHE_ENTRIES
+# of them. A request for a chart of the current version gets the cached bytes; otherwise a render is scheduled (once
+# per chart and version, however many requests ask) and the request gets the bytes of the last version drawn, marked
+# stale, or nothing yet when the chart was never drawn. `wait` lets a caller wait that many seconds for the render.
+# The window of the ingest rate also slides with the clock: its version is the graph version and the index of the
+# current bucket, so a chart drawn in an earlier bucket is stale even when nothing was written since.
+# Integer parameters are capped by MAX_PARAMS, each distinct value being a render and a cache entry of its own.
+
+import contextlib
+import io
+import logging
+import os
+import threading
+import time
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+logger = logging.getLogger(__name__)
+
+FORMATS = {"png": "image/png", "svg": "image/svg+xml"}
+DEFAULT_PARAMS = {
+    "degree_distribution": {"scale": "log"},
+    "entity_types": {"limit": 12},
+    "ingest_rate": {"bucket": 3600, "window": 48},
+}
+# Upper bounds of the integer parameters: the window is one bar per bucket, a week is the longest bucket
+MAX_PARAMS = {"limit": 50, "bucket": 7 * 24 * 3600, "window": 500}
+CHART_CACHE_ENTRIES = int(os.getenv("CHART_CACHE_ENTRIES", "64"))
+CHART_WIDTH = float(os.getenv("CHART_WIDTH", "6.4"))
+CHART_HEIGHT = float(os.getenv("CHART_HEIGHT", "4"))
+CHART_DPI = int(os.getenv("CHART_DPI", "100"))
+
+
+def degree_distribution_data(analytics):
+    # [(degree, number of entities)] sorted by degree
+    _, (in_degree, out_degree) = analytics.run("degree")
+    counts = Counter(int(total) for total in in_degree + out_degree)
+    return sorted(counts.items())
+
+
+def entity_type_data(analytics, limit):
+    graph = analytics.snapshot()
+    counts = Counter(entity_type or "unknown" for entity_type in graph.types).most_common()
+    top = counts[:limit]
+    other = sum(count for _, count in counts[limit:])
+    return top + [("other", other)] if other else top
+
+
+def ingest_rate_data(registry, bucket, window, now=None):
+    # [(bucket start, documents, entities)] of the last `window` buckets, empty buckets included
+    with registry.lock:
+        records = [record for record in registry.documents.values() if record.get("status") == "ingested"]
+    now = time.time() if now is None else now
+    last = int(now // bucket)
+    first = last - window + 1
+    documents = Counter()
+    entities = Counter()
+    for record in records:
+        index = int(record["ingested_at"] // bucket)
+        if first <= index <= last:
+            documents[index] += 1
+            entities[index] += len(record.get("entities") or ())
+    return [(index * bucket, documents[index], entities[index]) for index in range(first, last + 1)]
+
+
+def _no_data(axes):
+    axes.text(0.5, 0.5, "No data yet", ha="center", va="center", transform=axes.transAxes, color="gray")
+    axes.set_xticks([])
+    axes.set_yticks([])
+
+
+def draw_degree_distribution(figure, points, scale):
+    axes = figure.subplots()
+    axes.set_title("Degree distribution")
+    if not points:
+        return _no_data(axes)
+    degrees, counts = zip(*points, strict=True)
+    if scale == "log":
+        # Isolated entities have no place on a log axis
+        points = [(degree, count) for degree, count in points if degree > 0] or points
+        degrees, counts = zip(*points, strict=True)
+        axes.set_xscale("log" if degrees[0] > 0 else "symlog")
+        axes.set_yscale("log")
+    axes.plot(degrees, counts, marker="o", linestyle="none", color="#61bffc")
+    axes.set_xlabel("Degree (in + out)")
+    axes.set_ylabel("Entities")
+
+
+def draw_entity_types(figure, counts):
+    axes = figure.subplots()
+    axes.set_title("Entity types")
+    if not counts:
+        return _no_data(axes)
+    names, values = zip(*reversed(counts), strict=True)
+    axes.barh(names, values, color="#80D8FF")
+    axes.set_xlabel("Entities")
+
+
+def draw_ingest_rate(figure, buckets, bucket):
+    from matplotlib.dates import AutoDateLocator, ConciseDateFormatter
+
+    axes = figure.subplots()
+    axes.set_title(f"Ingest rate per {bucket} s")
+    if not any(documents for _, documents, _ in buckets):
+        return _no_data(axes)
+    starts = [datetime.fromtimestamp(start) for start, _, _ in buckets]
+    width = timedelta(seconds=bucket * 0.8)
+    axes.bar(starts, [documents for _, documents, _ in buckets], width=width, align="edge", color="#CCFF90")
+    axes.set_ylabel("Documents")
+    entities_axes = axes.twinx()
+    entities_axes.plot([start + width / 2 for start in starts], [entities for _, _, entities in buckets],
+                       color="#FF8A80", marker=".")
+    entities_axes.set_ylabel("Entities")
+    locator = AutoDateLocator()
+    axes.xaxis.set_major_locator(locator)
+    axes.xaxis.set_major_formatter(ConciseDateFormatter(locator))
+
+
+class ChartService:
+    def __init__(self, analytics=None, registry=None, version=None, max_entries=CHART_CACHE_ENTRIES, clock=time.time):
+        # Default to the analytics snapshot, document registry and graph version of the app
+        self.analytics = analytics
+        self.clock = clock
+        self.registry = registry
+        self.version = version
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        # (chart, format, params) -> (version, bytes), least recently used first
+        self.rendered = OrderedDict()
+        # (chart, format, params) -> (version, future) of the scheduled render
+        self.pending = {}
+        # (chart, format, params) -> (version, message) of the last failed render
+        self.errors = {}
+        self.renders = 0
+        self.timings = {}
+        self.executor = ThreadPoolExecutor(1, thread_name_prefix="charts")
+
+    def _current_version(self):
+        if self.version is not None:
+            return self.version()
+        from app.models import get_graph_version
+        return get_graph_version()
+
+    def _analytics(self):
+        if self.analytics is not None:
+            return self.analytics
+        from app.analytics import analytics
+        return analytics
+
+    def _registry(self):
+        if self.registry is not None:
+            return self.registry
+        from app.documents import document_registry
+        return document_registry
+
+    def params(self, chart, **params):
+        # Parameters of a chart with their defaults, converted to the type of the default
+        if chart not in DEFAULT_PARAMS:
+            raise KeyError(chart)
+        unknown = set(params) - set(DEFAULT_PARAMS[chart])
+        if unknown:
+            raise ValueError(f"Unknown parameters for {chart}: {', '.join(sorted(unknown))}")
+        params = {**DEFAULT_PARAMS[chart],
+                  **{key: type(DEFAULT_PARAMS[chart][key])(value) for key, value in params.items()}}
+        if params.get("scale", "log") not in ("log", "linear"):
+            raise ValueError("scale must be log or linear")
+        if any(isinstance(value, int) and value < 1 for value in params.values()):
+            raise ValueError(f"Parameters of {chart} must be positive")
+        for key, value in params.items():
+            if key in MAX_PARAMS and value > MAX_PARAMS[key]:
+                raise ValueError(f"{key} must be at most {MAX_PARAMS[key]}")
+        return params
+
+    def _version(self, chart, params):
+        # Version the chart is current for, (graph version, bucket index) for the ingest rate
+        version = self._current_version()
+        if chart == "ingest_rate":
+            return version, int(self.clock() // params["bucket"])
+        return version
+
+    def get(self, chart, fmt="png", wait=0, **params):
+        # Returns (bytes or None, graph version of the bytes, whether they are of the current version)
+        if fmt not in FORMATS:
+            raise ValueError(f"Unknown format '{fmt}', expected one of {', '.join(FORMATS)}")
+        params = self.params(chart, **params)
+        key = (chart, fmt, *sorted(params.items()))
+        version = self._version(chart, params)
+        with self.lock:
+            entry = self.rendered.get(key)
+            if entry is not None and entry[0] == version:
+                self.rendered.move_to_end(key)
+                return entry[1], version, True
+            error = self.errors.get(key)
+            if error is not None and error[0] == version:
+                raise RuntimeError(error[1])
+            scheduled = self.pending.get(key)
+            if scheduled is None or scheduled[0] != version:
+                future = self.executor.submit(self._render, key, chart, fmt, params, version)
+                scheduled = self.pending[key] = (version, future)
+
+        if wait > 0:
+            # Timed out, or failed and reported below
+            with contextlib.suppress(Exception):
+                scheduled[1].result(timeout=wait)
+        with self.lock:
+            entry = self.rendered.get(key)
+            error = self.errors.get(key)
+        if entry is None:
+            if error is not None and error[0] == version:
+                raise RuntimeError(error[1])
+            return None, None, False
+        return entry[1], entry[0], entry[0] == version
+
+    def _render(self, key, chart, fmt, params, version):
+        try:
+            started = time.perf_counter()
+            data = self._render_bytes(chart, fmt, params)
+            elapsed = time.perf_counter() - started
+        except Exception as e:
+            logger.exception("Rendering chart %s failed", chart)
+            with self.lock:
+                self.errors[key] = (version, f"Rendering chart {chart} failed: {e}")
+                self._done(key, version)
+            raise
+        with self.lock:
+            current = self.rendered.get(key)
+            if current is None or current[0] <= version:
+                self.rendered[key] = (version, data)
+                self.rendered.move_to_end(key)
+                while len(self.rendered) > self.max_entries:
+                    self.rendered.popitem(last=False)
+            self.errors.pop(key, None)
+            self.renders += 1
+            self.timings[chart] = elapsed
+            self._done(key, version)
+        return data
+
+    def _done(self, key, version):
+        scheduled = self.pending.get(key)
+        if scheduled is not None and scheduled[0] == version:
+            del self.pending[key]
+
+    def _render_bytes(self, chart, fmt, params):
+        from matplotlib.figure import Figure
+
+        figure = Figure(figsize=(CHART_WIDTH, CHART_HEIGHT), dpi=CHART_DPI, layout="constrained")
+        if chart == "degree_distribution":
+            draw_degree_distribution(figure, degree_distribution_data(self._analytics()), params["scale"])
+        elif chart == "entity_types":
+            draw_entity_types(figure, entity_type_data(self._analytics(), params["limit"]))
+        else:
+            buckets = ingest_rate_data(self._registry(), params["bucket"], params["window"], now=self.clock())
+            draw_ingest_rate(figure, buckets, params["bucket"])
+        buffer = io.BytesIO()
+        figure.savefig(buffer, format=fmt)
+        return buffer.getvalue()
+
+    def stats(self):
+        with self.lock:
+            return {
+                "charts": {chart: dict(params) for chart, params in DEFAULT_PARAMS.items()},
+                "formats": list(FORMATS),
+                "cached": len(self.rendered),
+                "pending": len(self.pending),
+                "renders": self.renders,
+                "seconds": {chart: round(seconds, 6) for chart, seconds in self.timings.items()},
+            }
+
+
+charts = ChartService()
@@ -0,0 +1,325 @@
+# Level-of-detail view of the graph: a hierarchy of communities served as weighted super-nodes.
+#
+# Level 0 groups the entities into the communities of the analytics snapshot (label propagation, see analytics.py).
+# Every next level merges the clusters of the level below on their graph, where two clusters are joined by the number
+# of relationships between their entities: rounds of heavy-edge matching (`coarsen` of layout.py) on the weights
+# divided by the sizes of both clusters, until CLUSTER_BRANCHING times fewer clusters are left, so that expanding a
+# cluster shows a handful of children of similar sizes. Clusters without any relationship to another one (e.g. lone
+# entities) are grouped by their most common entity type. Levels are added until at most CLUSTER_TOP_SIZE clusters are
+# left or a level no longer merges clusters.
+#
+# `GraphClusters` keeps the hierarchy of the snapshot until the graph version changes, then updates it:
+# - entities still in the graph stay in their clusters, deleted ones leave them (emptied clusters are not served),
+# - new entities join the level 0 cluster most of their already clustered neighbours are in, in two passes so that
+#   chains of new entities follow, the others start a cluster of their own at every level,
+# - once the entities added or removed since the last full build exceed CLUSTER_REBUILD_FRACTION of the graph, the
+#   hierarchy is built again from the communities (cluster ids then change, `build` is incremented).
+# Cluster ids are "<level>-<index>". Edge weights between clusters are recomputed for every version from the sparse
+# membership matrices, N_a^T U N_b for the undirected adjacency U and the entity-to-cluster matrices N of levels a, b.
+#
+# `overview(level)` returns the `limit` largest clusters of a level (the top one by default) with the edges between
+# them. `expand(cluster_id)` returns the clusters one level below it, or its entities for a level 0 cluster, with the
+# edges among them and their `external` edges to the other clusters of the expanded cluster's level.
+
+import os
+import threading
+import time
+from collections import Counter
+import numpy as np
+from scipy import sparse
+from .layout import coarsen
+
+CLUSTER_TOP_SIZE = int(os.getenv("CLUSTER_TOP_SIZE", "50"))
+# Clusters of a level are merged until there are about this many times fewer at the next level
+CLUSTER_BRANCHING = int(os.getenv("CLUSTER_BRANCHING", "8"))
+CLUSTER_REBUILD_FRACTION = float(os.getenv("CLUSTER_REBUILD_FRACTION", "0.25"))
+CLUSTER_MAX_LEVELS = 8
+DEFAULT_LIMIT = 100
+DEFAULT_MAX_EDGES = 500
+
+
+def _membership(labels, size):
+    # Sparse (len(labels), size) matrix with a 1 in the column of every label
+    return sparse.csr_matrix((np.ones(len(labels)), (np.arange(len(labels)), labels)), shape=(len(labels), size))
+
+
+def _dominant(nodes, size, codes):
+    # Most common code among the nodes of every cluster
+    base = int(codes.max()) + 1 if len(codes) else 1
+    keys, counts = np.unique(nodes * base + codes, return_counts=True)
+    clusters, values = np.divmod(keys, base)
+    order = np.lexsort((-counts, clusters))
+    first = order[np.flatnonzero(np.concatenate([[True], clusters[order][1:] != clusters[order][:-1]]))]
+    dominant = np.zeros(size, dtype=np.int64)
+    dominant[clusters[first]] = values[first]
+    return dominant
+
+
+def _chunks(indices, groups):
+    # Key of every index: its group, then chunks of CLUSTER_BRANCHING indices within the group
+    order = np.argsort(groups[indices], kind="stable")
+    indices = indices[order]
+    sorted_groups = groups[indices]
+    starts = np.flatnonzero(np.concatenate([[True], sorted_groups[1:] != sorted_groups[:-1]]))
+    rank = np.arange(len(indices)) - np.repeat(starts, np.diff(np.append(starts, len(indices))))
+    return indices, sorted_groups * (len(indices) + 1) + rank // CLUSTER_BRANCHING
+
+
+def merge_level(weights, sizes, dominant, rng):
+    # Parent of every cluster of a level. Connected clusters are paired along the edges of highest weight relative
+    # to the sizes of both ends (strongly linked small clusters first, which keeps the clusters balanced), round after
+    # round, until CLUSTER_BRANCHING times fewer clusters are left. Clusters with no relationship to another one are
+    # grouped by entity type, CLUSTER_BRANCHING at a time.
+    count = weights.shape[0]
+    parent = np.arange(count)
+    outside = np.asarray(weights.sum(axis=1)).ravel() - weights.diagonal()
+    isolated = np.flatnonzero(outside == 0)
+    # Isolated clusters keep a parent of their own through the rounds, they do not count towards the target
+    target = (count - len(isolated)) / CLUSTER_BRANCHING + len(isolated)
+    current = weights
+    while current.shape[0] > target:
+        scored = sparse.triu(current, k=1).tocoo()
+        scored.data = scored.data / (sizes[scored.row] * sizes[scored.col])
+        step = coarsen(scored.tocsr(), rng, weighted=True)
+        if step.max() + 1 == current.shape[0]:
+            break
+        parent = step[parent]
+        membership = _membership(step, int(step.max()) + 1)
+        current = (membership.T @ current @ membership).tocsr()
+        sizes = np.bincount(step, weights=sizes)
+
+    if len(isolated):
+        isolated, keys = _chunks(isolated, dominant)
+        parent[isolated] = parent.max() + 1 + np.unique(keys, return_inverse=True)[1].ravel()
+    return np.unique(parent, return_inverse=True)[1].ravel()
+
+
+def build_levels(adjacency, labels, type_codes, seed=0):
+    # Parents of the clusters of every level above level 0, given the level 0 labels and entity type codes of the nodes
+    rng = np.random.default_rng(seed)
+    parents = []
+    nodes = labels
+    size = int(labels.max()) + 1 if len(labels) else 0
+    while size > CLUSTER_TOP_SIZE and len(parents) < CLUSTER_MAX_LEVELS:
+        membership = _membership(nodes, size)
+        weights = (membership.T @ adjacency @ membership).tocsr()
+        sizes = np.bincount(nodes, minlength=size).astype(np.float64)
+        parent = merge_level(weights, np.maximum(sizes, 1), _dominant(nodes, size, type_codes), rng)
+        if parent.max() + 1 > 0.9 * size:
+            break
+        parents.append(parent)
+        nodes = parent[nodes]
+        size = int(parent.max()) + 1
+    return parents
+
+
+class ClusterHierarchy:
+    def __init__(self, graph, labels, parents, build):
+        self.graph = graph
+        # Level 0 cluster of every node, parent of every cluster of the levels above
+        self.labels = labels
+        self.parents = parents
+        self.build = build
+        self.levels = len(parents) + 1
+        self.node_clusters = [labels]
+        for parent in parents:
+            self.node_clusters.append(parent[self.node_clusters[-1]])
+        self.sizes = [len(parents[level]) if level < len(parents) else self._top_size()
+                      for level in range(self.levels)]
+        self.memberships = [_membership(clusters, size) for clusters, size in zip(self.node_clusters, self.sizes, strict=True)]
+        self.degree = np.asarray(graph.adjacency.sum(axis=0)).ravel() + np.asarray(graph.adjacency.sum(axis=1)).ravel()
+
+    def _top_size(self):
+        top = self.parents[-1] if self.parents else self.labels
+        return int(top.max()) + 1 if len(top) else 0
+
+    def weights(self, level, other_level):
+        return (self.memberships[level].T @ self.graph.undirected @ self.memberships[other_level]).tocsr()
+
+    def members(self, level, cluster):
+        return np.flatnonzero(self.node_clusters[level] == cluster)
+
+    def cluster(self, level, cluster, members):
+        types = Counter(self.graph.types[position] for position in members)
+        representative = members[np.argmax(self.degree[members])]
+        entry = {
+            "id": f"{level}-{cluster}",
+            "level": level,
+            "size": int(len(members)),
+            "label": self.graph.names[representative],
+            "representative": self.graph.ids[representative],
+            "types": dict(types.most_common(3)),
+        }
+        if level > 0:
+            entry["children"] = int(len(np.unique(self.node_clusters[level - 1][members])))
+        return entry
+
+    def clusters(self, level, indices, limit):
+        # The `limit` largest non-empty clusters among `indices`
+        sizes = np.bincount(self.node_clusters[level], minlength=self.sizes[level])
+        indices = indices[sizes[indices] > 0]
+        order = indices[np.argsort(-sizes[indices], kind="stable")]
+        shown = order[:limit]
+        hidden = {"clusters": int(len(order) - len(shown)), "entities": int(sizes[order[limit:]].sum())}
+        return shown, hidden
+
+
+def _edges(weights, rows, columns, row_ids, column_ids, max_edges, symmetric):
+    # Heaviest edges of the weights between rows and columns, each pair once when both sides are the same set
+    block = weights[rows][:, columns].tocoo()
+    keep = block.row < block.col if symmetric else np.ones(len(block.row), dtype=bool)
+    order = np.argsort(-block.data[keep], kind="stable")[:max_edges]
+    row, col, data = block.row[keep][order], block.col[keep][order], block.data[keep][order]
+    return [{"from": row_ids[r], "to": column_ids[c], "weight": int(w)} for r, c, w in zip(row, col, data, strict=True)]
+
+
+class GraphClusters:
+    def __init__(self, analytics=None):
+        # Defaults to the analytics snapshot of the app
+        self.analytics = analytics
+        self.lock = threading.Lock()
+        self.hierarchy = None
+        self.changed = 0
+        self.builds = 0
+        self.updates = 0
+        self.timings = {}
+
+    def _analytics(self):
+        if self.analytics is not None:
+            return self.analytics
+        from app.analytics import analytics
+        return analytics
+
+    def _build(self):
+        graph, labels = self._analytics().run("communities")
+        self.changed = 0
+        self.builds += 1
+        type_codes = np.unique(np.array([str(entity_type) for entity_type in graph.types]), return_inverse=True)[1]
+        parents = build_levels(graph.undirected, labels, type_codes.ravel())
+        return ClusterHierarchy(graph, labels, parents, self.builds)
+
+    def _update(self, graph):
+        previous = self.hierarchy
+        old = {entity_id: position for position, entity_id in enumerate(previous.graph.ids)}
+        positions = np.array([old.get(entity_id, -1) for entity_id in graph.ids], dtype=np.int64)
+        known = positions >= 0
+        added = int((~known).sum())
+        removed = previous.graph.node_count - int(known.sum())
+        if self.changed + added + removed > CLUSTER_REBUILD_FRACTION * max(graph.node_count, 1):
+            return self._build()
+
+        labels = np.full(graph.node_count, -1, dtype=np.int64)
+        labels[known] = previous.labels[positions[known]]
+        size = previous.sizes[0]
+        for _ in range(2):
+            placed = labels >= 0
+            if placed.all() or not placed.any():
+                break
+            rows = np.flatnonzero(placed)
+            clustered = sparse.csr_matrix((np.ones(len(rows)), (rows, labels[rows])), shape=(len(labels), size))
+            votes = (graph.undirected @ clustered).tocsr()
+            counts = np.asarray(votes.sum(axis=1)).ravel()
+            fill = ~placed & (counts > 0)
+            labels[fill] = np.asarray(votes[fill].argmax(axis=1)).ravel()
+        # Entities with no clustered neighbour start clusters of their own, at every level
+        lonely = np.flatnonzero(labels < 0)
+        labels[lonely] = size + np.arange(len(lonely))
+        parents = []
+        for level, parent in enumerate(previous.parents):
+            top = previous.sizes[level + 1]
+            parents.append(np.concatenate([parent, top + np.arange(len(lonely))]))
+        self.changed += added + removed
+        self.updates += 1
+        return ClusterHierarchy(graph, labels, parents, previous.build)
+
+    def current(self):
+        with self.lock:
+            graph = self._analytics().snapshot()
+            if self.hierarchy is None or self.hierarchy.graph is not graph:
+                started = time.perf_counter()
+                self.hierarchy = self._build() if self.hierarchy is None else self._update(graph)
+                self.timings["clusters"] = time.perf_counter() - started
+            return self.hierarchy
+
+    def _check(self, limit, max_edges):
+        if limit < 0 or max_edges < 0:
+            raise ValueError("limit and max_edges must not be negative")
+
+    def _header(self, hierarchy):
+        return {"build": hierarchy.build, "levels": hierarchy.levels, "entities": hierarchy.graph.node_count}
+
+    def overview(self, level=None, limit=DEFAULT_LIMIT, max_edges=DEFAULT_MAX_EDGES):
+        self._check(limit, max_edges)
+        hierarchy = self.current()
+        level = hierarchy.levels - 1 if level is None else level
+        if not 0 <= level < hierarchy.levels:
+            raise ValueError(f"level must be between 0 and {hierarchy.levels - 1}")
+        shown, hidden = hierarchy.clusters(level, np.arange(hierarchy.sizes[level]), limit)
+        ids = [f"{level}-{cluster}" for cluster in shown]
+        weights = hierarchy.weights(level, level)
+        return {
+            **self._header(hierarchy),
+            "level": level,
+            "clusters": [hierarchy.cluster(level, cluster, hierarchy.members(level, cluster)) for cluster in shown],
+            "edges": _edges(weights, shown, shown, ids, ids, max_edges, True),
+            "hidden": hidden,
+        }
+
+    def expand(self, cluster_id, limit=DEFAULT_LIMIT, max_edges=DEFAULT_MAX_EDGES):
+        self._check(limit, max_edges)
+        hierarchy = self.current()
+        try:
+            level, cluster = (int(part) for part in cluster_id.split("-"))
+        except ValueError:
+            raise KeyError(cluster_id) from None
+        if not (0 <= level < hierarchy.levels and 0 <= cluster < hierarchy.sizes[level]):
+            raise KeyError(cluster_id)
+        members = hierarchy.members(level, cluster)
+        if not len(members):
+            raise KeyError(cluster_id)
+
+        level_clusters = np.arange(hierarchy.sizes[level])
+        outside = level_clusters[level_clusters != cluster]
+        outside_ids = [f"{level}-{other}" for other in outside]
+        result = {**self._header(hierarchy), "cluster": hierarchy.cluster(level, cluster, members)}
+        if level == 0:
+            graph = hierarchy.graph
+            order = members[np.argsort(-hierarchy.degree[members], kind="stable")]
+            shown = order[:limit]
+            ids = [graph.ids[position] for position in shown]
+            result["entities"] = [
+                {"id": graph.ids[position], "name": graph.names[position], "type": graph.types[position],
+                 "degree": int(hierarchy.degree[position])}
+                for position in shown
+            ]
+            result["relationships"] = _edges(graph.adjacency, shown, shown, ids, ids, max_edges, False)
+            node_weights = (graph.undirected @ hierarchy.memberships[0]).tocsr()
+            result["external"] = _edges(node_weights, shown, outside, ids, outside_ids, max_edges, False)
+            result["hidden"] = {"entities": int(len(order) - len(shown))}
+            return result
+
+        children = np.unique(hierarchy.node_clusters[level - 1][members])
+        shown, hidden = hierarchy.clusters(level - 1, children, limit)
+        ids = [f"{level - 1}-{child}" for child in shown]
+        result["clusters"] = [
+            hierarchy.cluster(level - 1, child, hierarchy.members(level - 1, child)) for child in shown
+        ]
+        result["edges"] = _edges(hierarchy.weights(level - 1, level - 1), shown, shown, ids, ids, max_edges, True)
+        result["external"] = _edges(hierarchy.weights(level - 1, level), shown, outside, ids, outside_ids, max_edges,
+                                    False)
+        result["hidden"] = hidden
+        return result
+
+    def stats(self):
+        with self.lock:
+            hierarchy = self.hierarchy
+            return {
+                "build": hierarchy.build if hierarchy is not None else None,
+                "levels": hierarchy.sizes if hierarchy is not None else None,
+                "builds": self.builds,
+                "updates": self.updates,
+                "seconds": {name: round(seconds, 6) for name, seconds in self.timings.items()},
+            }
+
+
+graph_clusters = GraphClusters()
@@ -0,0 +1,29 @@
+# Command line tools registered on the Flask CLI, e.g. `flask graph export backup.kgs`.
+#
+# `graph export` writes the current graph to a binary snapshot and `graph import` loads a snapshot into the
+# configured database integration. Both go through the model functions, so they work with any backend selected
+# by DATABASE_TYPE, which makes them usable for backups, warm starts and migrating a graph between backends.
+
+import click
+from flask.cli import AppGroup
+from .integrations.database.snapshot import CODECS
+from .models import export_snapshot, import_snapshot
+
+graph_cli = AppGroup("graph", help="Export and import binary graph snapshots.")
+
+
+@graph_cli.command("export")
+@click.argument("path", type=click.Path(dir_okay=False, writable=True))
+@click.option("--compression", type=click.Choice(list(CODECS)), default="zlib", show_default=True)
+def export_graph_command(path, compression):
+    with open(path, "wb") as fp:
+        size = export_snapshot(fp, compression)
+    click.echo(f"Wrote {size} bytes to {path}")
+
+
+@graph_cli.command("import")
+@click.argument("path", type=click.Path(exists=True, dir_okay=False))
+def import_graph_command(path):
+    with open(path, "rb") as fp:
+        counts = import_snapshot(fp)
+    click.echo(f"Imported {counts['entities']} entities and {counts['relationships']} relationships from {path}")
@@ -0,0 +1,100 @@
+# Content addressed registry of ingested documents.
+#
+# Every text pushed through `natural_input` is normalised (unicode NFKC, collapsed whitespace) and hashed into a
+# document id. Before running the expensive extraction, the integration claims the document id in the registry:
+# a document that was already ingested, or is being ingested by another request, is short-circuited.
+#
+# Once a document is ingested, the registry records the entities and relationships it produced, and the entities and
+# relationships themselves carry the ids of the documents they came from in their `source_documents` property. This
+# makes it possible to re-ingest or remove the data coming from a given source later on.
+#
+# The registry lives in memory. Set DOCUMENT_REGISTRY_PATH to a file to keep it across restarts; records are
+# appended to it as JSON lines.
+
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import unicodedata
+from .models import get_entity, update_entity
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_document(text):
+    text = unicodedata.normalize("NFKC", str(text))
+    return _WHITESPACE.sub(" ", text).strip()
+
+
+def document_id_for(text):
+    digest = hashlib.sha256(normalize_document(text).encode("utf-8")).hexdigest()
+    return f"doc_{digest}"
+
+
+class DocumentRegistry:
+    def __init__(self, path=None):
+        self.path = path
+        self.documents = {}
+        self.lock = threading.Lock()
+        if path and os.path.exists(path):
+            with open(path, encoding="utf-8") as fp:
+                for line in fp:
+                    if line.strip():
+                        record = json.loads(line)
+                        self.documents[record["document_id"]] = record
+
+    def get(self, document_id):
+        with self.lock:
+            return self.documents.get(document_id)
+
+    def claim(self, document_id, source=None):
+        # Returns None when the caller should ingest the document, or the existing record otherwise
+        with self.lock:
+            record = self.documents.get(document_id)
+            if record is not None:
+                return record
+            self.documents[document_id] = {
+                "document_id": document_id,
+                "status": "processing",
+                "source": source,
+                "claimed_at": time.time(),
+            }
+            return None
+
+    def release(self, document_id):
+        # Drops a claim after a failed ingestion so the document can be submitted again
+        with self.lock:
+            record = self.documents.get(document_id)
+            if record is not None and record["status"] == "processing":
+                del self.documents[document_id]
+
+    def complete(self, document_id, entity_ids, relationships):
+        with self.lock:
+            record = self.documents.setdefault(document_id, {"document_id": document_id, "source": None})
+            record.update({
+                "status": "ingested",
+                "ingested_at": time.time(),
+                "entities": list(entity_ids),
+                "relationships": list(relationships),
+            })
+            if self.path:
+                with open(self.path, "a", encoding="utf-8") as fp:
+                    fp.write(json.dumps(record, default=str) + "\n")
+            return record
+
+
+def add_entity_provenance(entity_id, document_id):
+    # Adds a document id to the `source_documents` of an entity that already existed in the graph
+    entity = get_entity(entity_id)
+    if not entity:
+        return False
+    sources = list(entity.get("source_documents") or [])
+    if document_id in sources:
+        return True
+    sources.append(document_id)
+    return bool(update_entity(entity_id, {"source_documents": sources}))
+
+
+document_registry = DocumentRegistry(os.getenv("DOCUMENT_REGISTRY_PATH"))
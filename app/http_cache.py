@@ -0,0 +1,181 @@
+# Conditional requests and compression for the JSON routes of the blueprint.
+#
+# Graph versioned routes (`@versioned`), whose response only depends on the URL and the graph:
+# - get a weak ETag made of the graph version (bumped by every write in app.models) and a token of this process, so
+#   a client holding an ETag from before a restart never gets a wrong 304,
+# - answer 304 Not Modified, without running the view, when If-None-Match holds the current ETag,
+# - keep their encoded bodies (identity, gzip, br) per URL for the current graph version, so repeated reads of an
+#   unchanged graph neither rebuild the JSON nor compress it again. Entries of older versions are dropped as soon as
+#   the version changes, at most RESPONSE_CACHE_ENTRIES are kept.
+# Writes made to the database outside of this process (e.g. another app on the same Neo4j server) do not bump the
+# version, their changes show up with the next local write.
+#
+# Every other response of the blueprint goes through `compress_response`: text and JSON bodies of at least
+# COMPRESS_MIN_SIZE bytes are compressed with the best encoding the client accepts, brotli when the `brotli` package
+# is installed, otherwise gzip.
+
+import gzip
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from functools import wraps
+from flask import Response, make_response, request
+from .models import get_graph_version
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESS_MIN_SIZE = int(os.getenv("COMPRESS_MIN_SIZE", "1024"))
+GZIP_LEVEL = int(os.getenv("COMPRESS_GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("COMPRESS_BROTLI_QUALITY", "5"))
+RESPONSE_CACHE_ENTRIES = int(os.getenv("RESPONSE_CACHE_ENTRIES", "256"))
+COMPRESSIBLE_MIMETYPES = ("application/json", "text/html", "text/plain", "text/css", "application/javascript")
+# Changes on every start, graph versions start over with the process
+INSTANCE_TOKEN = uuid.uuid4().hex[:12]
+
+
+def supported_encodings():
+    return ("br", "gzip") if brotli is not None else ("gzip",)
+
+
+def negotiate_encoding(accept_encoding):
+    # The supported encoding with the highest q-value, brotli first on ties, or None for identity
+    qualities = {}
+    for part in (accept_encoding or "").split(","):
+        coding, _, params = part.strip().partition(";")
+        coding = coding.strip().lower()
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        if coding:
+            qualities[coding] = quality
+    best = None
+    for encoding in supported_encodings():
+        quality = qualities.get(encoding, qualities.get("*", 0.0))
+        if quality > 0 and (best is None or quality > best[0]):
+            best = (quality, encoding)
+    return best[1] if best else None
+
+
+def encode(data, encoding):
+    if encoding == "br":
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    if encoding == "gzip":
+        return gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)
+    return data
+
+
+def graph_etag(version):
+    # A version can be a tuple, e.g. the graph version and a time bucket
+    if isinstance(version, tuple):
+        version = "-".join(str(part) for part in version)
+    return f"{INSTANCE_TOKEN}-{version}"
+
+
+class ResponseCache:
+    def __init__(self, max_entries=RESPONSE_CACHE_ENTRIES):
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.version = None
+        # (url, accepted encoding) -> (body, mimetype, content encoding)
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, version, url, encoding):
+        with self.lock:
+            if version != self.version:
+                self.version = version
+                self.entries.clear()
+            entry = self.entries.get((url, encoding))
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end((url, encoding))
+            self.hits += 1
+            return entry
+
+    def put(self, version, url, encoding, entry):
+        with self.lock:
+            if version != self.version:
+                return
+            self.entries[(url, encoding)] = entry
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def stats(self):
+        with self.lock:
+            return {"version": self.version, "entries": len(self.entries), "hits": self.hits, "misses": self.misses}
+
+
+response_cache = ResponseCache()
+
+
+def _not_modified(etag):
+    response = Response(status=304)
+    response.set_etag(etag, weak=True)
+    response.headers["Cache-Control"] = "no-cache"
+    response.vary.add("Accept-Encoding")
+    return response
+
+
+def versioned(view):
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        version = get_graph_version()
+        etag = graph_etag(version)
+        if request.if_none_match.contains_weak(etag):
+            return _not_modified(etag)
+
+        url = request.full_path
+        encoding = negotiate_encoding(request.headers.get("Accept-Encoding"))
+        cached = response_cache.get(version, url, encoding)
+        if cached is None:
+            identity = response_cache.get(version, url, None) if encoding is not None else None
+            if identity is None:
+                response = make_response(view(*args, **kwargs))
+                # Errors are not cached, they go through compress_response like any other response
+                if response.status_code != 200:
+                    return response
+                identity = (response.get_data(), response.mimetype, None)
+                response_cache.put(version, url, None, identity)
+            body, mimetype, _ = identity
+            # Small bodies are sent as they are whatever the client accepts
+            content_encoding = encoding if len(body) >= COMPRESS_MIN_SIZE else None
+            cached = (encode(body, content_encoding), mimetype, content_encoding)
+            response_cache.put(version, url, encoding, cached)
+
+        body, mimetype, content_encoding = cached
+        response = Response(body, status=200, mimetype=mimetype)
+        if content_encoding is not None:
+            response.headers["Content-Encoding"] = content_encoding
+        response.set_etag(etag, weak=True)
+        response.headers["Cache-Control"] = "no-cache"
+        response.vary.add("Accept-Encoding")
+        return response
+
+    return wrapper
+
+
+def compress_response(response):
+    # after_request hook of the blueprint
+    if (response.direct_passthrough or response.status_code < 200 or response.status_code in (204, 304)
+            or "Content-Encoding" in response.headers or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+        return response
+    response.vary.add("Accept-Encoding")
+    data = response.get_data()
+    if len(data) < COMPRESS_MIN_SIZE:
+        return response
+    encoding = negotiate_encoding(request.headers.get("Accept-Encoding"))
+    if encoding is None:
+        return response
+    response.set_data(encode(data, encoding))
+    response.headers["Content-Encoding"] = encoding
+    return response
@@ -1,8 +1,8 @@
 # This Flask application integration, `add_multiple_conditional`, dynamically adds multiple entities and relationships
 # to a knowledge graph, leveraging other integrations `conditional_entity_addition` and `conditional_relationship_addition`.
 
-# It starts by attempting to load these integrations using `get_integration_function`, to conditionally add entities
-# and their relationships. The data processed includes entities (`nodes`) and relationships, with entities addressed first.
+# It calls these integrations through `call_integration`, which hands their results back as dicts, to conditionally add
+# entities and their relationships. The data processed includes entities (`nodes`) and relationships, with entities addressed first.
 
 # Entities are added through `conditional_entity_add_function`, with a payload prepared for each entity containing its type
 # and data. The response updates a mapping of temporary IDs to actual system-assigned IDs, essential for linking entities
@@ -12,9 +12,15 @@
 # for each relationship. This payload is then passed to `conditional_relationship_add_function`, which decides on the
 # relationship's addition based on internal logic.
 
-# The function prints outcomes (e.g., entity added, relationship exists) and handles errors gracefully, returning a JSON
+# The function logs outcomes (e.g., entity added, relationship exists) at debug level and handles errors gracefully, returning a JSON
 # response with the operation's status and details on created or matched entities and relationships.
 
+# When the database backend supports batch writes (`upsert_graph`), all entities are resolved first and the new
+# entities, the provenance updates and the relationships are written in a single transaction by `write_graph_batched`.
+
+# `add_multiple_conditional_async`, used on the event loop of the ASGI entry point, awaits the async variants of the
+# conditional additions. With batch writes, the model is asked about all the entities of the graph at once.
+
 # A `register` function ensures `add_multiple_conditional` is available within the application's integration manager,
 # enabling its invocation as part of the application's integrations ecosystem.
 
@@ -22,23 +28,121 @@
 # enhanced knowledge graph management.
 
 # app/integrations/add_multiple_nodes_and_relationships.py
-from flask import jsonify
-from app.integrations.integration_manager import get_integration_function
+import asyncio
+import logging
+from app.integrations.integration_manager import call_integration, call_integration_async
+from app.integrations.conditional_entity_addition import find_matching_entity, find_matching_entity_async
+from app.integrations.conditional_relationship_addition import find_matching_relationship
+from app.documents import add_entity_provenance
+from app.logs import truncated
+from app.models import get_entity, supports_batch_writes, upsert_graph
+
+logger = logging.getLogger(__name__)
+
+
+def write_graph_batched(graph, resolutions, document_id=None, known_entities=None):
+    # Writes an extracted graph with a single `upsert_graph` call.
+    # `resolutions` maps the temporary id of every node to the id of the existing entity it matches, or None.
+    # `known_entities` maps lowercased names to ids of entities created by earlier calls, it is updated in place.
+    # Returns the temporary id -> entity id mapping and the relationships that were processed.
+    known_entities = known_entities if known_entities is not None else {}
+    sources = [document_id] if document_id else []
+    matched = {}
+    refs = {}
+    new_entities = {}
+    new_names = {}
+    # Whether each matched id is in the graph, looked up once per id
+    exists = {}
+
+    for node in graph.get("nodes", []):
+        temp_id = node.get("id")
+        name = node.get("name")
+        if not name:
+            continue
+        key = name.strip().lower()
+        match_id = resolutions.get(temp_id) or known_entities.get(key)
+        if match_id and match_id not in exists:
+            exists[match_id] = get_entity(match_id) is not None
+        # A match the graph does not know about is treated as a new entity, as in the one-by-one path
+        if match_id and exists[match_id]:
+            matched[temp_id] = match_id
+        elif key in new_names:
+            # The same name twice in one extraction is one entity
+            refs[temp_id] = new_names[key]
+        else:
+            new_names[key] = temp_id
+            refs[temp_id] = temp_id
+            new_entities[temp_id] = dict(node, source_documents=sources) if document_id else dict(node)
+
+    # Every match is sent as an update, so an entity deleted in the meantime is not used for relationships
+    entity_updates = [{"id": entity_id, "source_documents": sources} for entity_id in set(matched.values())]
+
+    relationship_rows = []
+    existing_relationships = []
+    for relationship in graph.get("relationships", []):
+        row = {
+            "relationship": relationship.get("relationship", "associated"),
+            "snippet": relationship.get("snippet", ""),
+            "source_documents": sources
+        }
+        for end in ("from", "to"):
+            temp_id = relationship.get(f"{end}_id")
+            if temp_id in matched:
+                row[f"{end}_id"] = matched[temp_id]
+            elif temp_id in refs:
+                row[f"{end}_ref"] = refs[temp_id]
+        if not all(f"{end}_id" in row or f"{end}_ref" in row for end in ("from", "to")):
+            logger.warning("Missing entity for relationship: %s", truncated(relationship))
+            continue
+
+        # Only relationships between two existing entities can already be in the graph
+        if "from_id" in row and "to_id" in row and find_matching_relationship(row) is not None:
+            existing_relationships.append(row)
+            continue
+        relationship_rows.append(row)
+
+    result = upsert_graph(new_entities, relationship_rows, entity_updates)
+    updated = set(result["updated"])
+    new_ids = result["entity_ids"]
+
+    created_entities = {temp_id: entity_id for temp_id, entity_id in matched.items() if entity_id in updated}
+    created_entities.update({temp_id: new_ids[ref] for temp_id, ref in refs.items()})
+    known_entities.update({key: new_ids[ref] for key, ref in new_names.items()})
+
+    processed_relationships = []
+    for row in relationship_rows + existing_relationships:
+        from_id = new_ids[row["from_ref"]] if "from_ref" in row else row["from_id"]
+        to_id = new_ids[row["to_ref"]] if "to_ref" in row else row["to_id"]
+        if ("from_id" in row and from_id not in updated) or ("to_id" in row and to_id not in updated):
+            continue
+        processed_relationships.append({"from_id": from_id, "to_id": to_id, "relationship": row["relationship"]})
+
+    return created_entities, processed_relationships
+
 
 def add_multiple_conditional(app, data):
     with app.app_context():
         try:
-            print(f"\n\nData received: {data}\n\n")
-            print("ADD MULTIPLE NODES AND RELATIONSHIP INTEGRATION STARTED")
+            logger.debug("Data received: %s", truncated(data))
             created_entities = {}
             entity_names = {}
+            processed_relationships = []
+            # Id of the source document, set when called from natural_input, recorded on everything it produces
+            document_id = data.get("document_id")
 
-            # Retrieve the callable functions for the conditional additions
-            conditional_entity_add_function = get_integration_function("conditional_entity_addition")
-            conditional_relationship_add_function = get_integration_function("conditional_relationship_addition")
-
-            if not conditional_entity_add_function or not conditional_relationship_add_function:
-                raise ValueError("Integration function(s) not found")
+            # Backends with batch writes get the whole graph in one transaction
+            if supports_batch_writes():
+                resolutions = {
+                    entity["id"]: find_matching_entity(entity)
+                    for entity in data.get("nodes", []) if entity.get("name")
+                }
+                created_entities, processed_relationships = write_graph_batched(data, resolutions, document_id)
+                logger.debug("Created entities: %s", truncated(created_entities))
+                return {
+                    "success": True,
+                    "created_entities": created_entities,
+                    "relationships": processed_relationships
+                }, 200
 
             # Handle entity additions
             nodes = data.get("nodes", [])
@@ -46,34 +150,37 @@ def add_multiple_conditional(app, data):
                 temp_id = entity["id"]
                 name = entity["name"]
                 entity_names[temp_id] = name
-                print(f"\nProcessing entity {temp_id} with name {name}\n")
+                logger.debug("Processing entity %s with name %s", temp_id, name)
 
                 # Prepare the payload as expected by the conditional_entity_addition
-                payload = {"data": entity}
-                # Use conditional_entity_addition to add the entity
-                response, status_code = conditional_entity_add_function(app, payload)
+                payload = dict(entity)
+                if document_id:
+                    payload["source_documents"] = [document_id]
+                # Use conditional_entity_addition to add the entity, its result comes back as a dict
+                response_data, status_code = call_integration("conditional_entity_addition", app, payload)
 
                 if status_code != 200:
-                    print(f"Error while adding entity: Status code {status_code}")
+                    logger.warning("Error while adding entity %s: status code %s", name, status_code)
                     continue
 
-                response_data = response.get_json()
-                print(f"Response data: {response_data}")
+                logger.debug("Response data: %s", truncated(response_data))
 
                 if response_data.get("success") is False:
-                    print(f"Match found, using existing entity with data: {response_data.get('match_data')}")
+                    logger.debug("Match found, using existing entity with data: %s", truncated(response_data.get("match_data")))
                     entity_id = response_data.get("match_id")
+                    if document_id and entity_id:
+                        add_entity_provenance(entity_id, document_id)
                 else:
-                    print(f"New entity added with data: {response_data.get('created_data')}")
+                    logger.debug("New entity added with data: %s", truncated(response_data.get("created_data")))
                     entity_id = response_data.get("entity_id")
 
                 if entity_id:
                     created_entities[temp_id] = entity_id
                 else:
-                    print(f"Warning: No entity ID returned for {name}")
+                    logger.warning("No entity ID returned for %s", name)
 
-            print(f"\n\nEntity Names: {entity_names}\n\n")
-            print(f"Created Entities: {created_entities}\n\n")
+            logger.debug("Entity names: %s", truncated(entity_names))
+            logger.debug("Created entities: %s", truncated(created_entities))
 
             # Handle relationship additions
             relationships = data.get("relationships", [])
@@ -82,7 +189,7 @@ def add_multiple_conditional(app, data):
                 to_id = created_entities.get(relationship["to_id"])
                 
                 if from_id is None or to_id is None:
-                    print(f"Error: Missing entity for relationship: {relationship}")
+                    logger.warning("Missing entity for relationship: %s", truncated(relationship))
                     continue
 
                 relationship_data = {
@@ -91,28 +198,124 @@ def add_multiple_conditional(app, data):
                     "relationship": relationship.get("relationship", "associated"),
                     "snippet": relationship.get("snippet", "")
                 }
+                if document_id:
+                    relationship_data["source_documents"] = [document_id]
 
                 # Use conditional_relationship_addition to add the relationship
-                response, status_code = conditional_relationship_add_function(app, relationship_data)
+                response_data, status_code = call_integration("conditional_relationship_addition", app, relationship_data)
 
                 if status_code != 200:
-                    print(f"Error while adding relationship: Status code {status_code}")
+                    logger.warning("Error while adding relationship: status code %s", status_code)
                     continue
 
-                response_data = response.get_json()
+                if response_data.get("success") is False:
+                    logger.debug("Match found, relationship already exists with data: %s", truncated(response_data.get("match_data")))
+                else:
+                    logger.debug("New relationship added with data: %s", truncated(relationship_data))
+
+                processed_relationships.append({
+                    "from_id": from_id,
+                    "to_id": to_id,
+                    "relationship": relationship_data["relationship"]
+                })
+
+            return {
+                "success": True,
+                "created_entities": created_entities,
+                "relationships": processed_relationships
+            }, 200
+        except Exception as e:
+            logger.exception("Failed to add multiple nodes and relationships: %s", e)
+            return {"error": str(e)}, 500
+
+async def add_multiple_conditional_async(app, data):
+    # Same steps as add_multiple_conditional, entity matches of a batch are asked to the model concurrently
+    with app.app_context():
+        try:
+            logger.debug("Data received: %s", truncated(data))
+            created_entities = {}
+            processed_relationships = []
+            document_id = data.get("document_id")
+
+            if supports_batch_writes():
+                entities = [entity for entity in data.get("nodes", []) if entity.get("name")]
+                matches = await asyncio.gather(*(find_matching_entity_async(entity) for entity in entities))
+                resolutions = {entity["id"]: match for entity, match in zip(entities, matches, strict=True)}
+                created_entities, processed_relationships = await asyncio.to_thread(
+                    write_graph_batched, data, resolutions, document_id
+                )
+                logger.debug("Created entities: %s", truncated(created_entities))
+                return {
+                    "success": True,
+                    "created_entities": created_entities,
+                    "relationships": processed_relationships
+                }, 200
+
+            # One at a time, a later entity may match one created just before
+            for entity in data.get("nodes", []):
+                temp_id = entity["id"]
+                name = entity["name"]
+                payload = dict(entity)
+                if document_id:
+                    payload["source_documents"] = [document_id]
+                response_data, status_code = await call_integration_async("conditional_entity_addition", app, payload)
+
+                if status_code != 200:
+                    logger.warning("Error while adding entity %s: status code %s", name, status_code)
+                    continue
 
                 if response_data.get("success") is False:
-                    print(f"Match found, relationship already exists with data: {response_data.get('match_data')}")
+                    entity_id = response_data.get("match_id")
+                    if document_id and entity_id:
+                        await asyncio.to_thread(add_entity_provenance, entity_id, document_id)
                 else:
-                    print(f"New relationship added with data: {relationship_data}")
+                    entity_id = response_data.get("entity_id")
+
+                if entity_id:
+                    created_entities[temp_id] = entity_id
+                else:
+                    logger.warning("No entity ID returned for %s", name)
+
+            logger.debug("Created entities: %s", truncated(created_entities))
+
+            for relationship in data.get("relationships", []):
+                from_id = created_entities.get(relationship["from_id"])
+                to_id = created_entities.get(relationship["to_id"])
+                if from_id is None or to_id is None:
+                    logger.warning("Missing entity for relationship: %s", truncated(relationship))
+                    continue
+
+                relationship_data = {
+                    "from_id": from_id,
+                    "to_id": to_id,
+                    "relationship": relationship.get("relationship", "associated"),
+                    "snippet": relationship.get("snippet", "")
+                }
+                if document_id:
+                    relationship_data["source_documents"] = [document_id]
+
+                response_data, status_code = await call_integration_async(
+                    "conditional_relationship_addition", app, relationship_data
+                )
+                if status_code != 200:
+                    logger.warning("Error while adding relationship: status code %s", status_code)
+                    continue
+
+                processed_relationships.append({
+                    "from_id": from_id,
+                    "to_id": to_id,
+                    "relationship": relationship_data["relationship"]
+                })
 
-            return jsonify({
+            return {
                 "success": True,
-                "created_entities": created_entities
-            }), 200
+                "created_entities": created_entities,
+                "relationships": processed_relationships
+            }, 200
         except Exception as e:
-            print(f"Failed to add multiple nodes and relationships: {e}")
-            return jsonify({"error": str(e)}), 500
+            logger.exception("Failed to add multiple nodes and relationships: %s", e)
+            return {"error": str(e)}, 500
 
 def register(integration_manager):
-    integration_manager.register("add_multiple_conditional", add_multiple_conditional)
\ No newline at end of file
+    integration_manager.register("add_multiple_conditional", add_multiple_conditional)
+    integration_manager.register_async("add_multiple_conditional", add_multiple_conditional_async)
\ No newline at end of file
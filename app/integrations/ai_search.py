@@ -1,12 +1,23 @@
+import asyncio
+import logging
 import os
 import openai
 from flask import jsonify
 import json
-from app.models import get_full_graph, search_entities, search_relationships
+from app.models import get_full_graph, search_entities, search_relationships, shortest_path
 import re as regex
+from app.llm import async_openai
+from app.logs import truncated
 
 openai.api_key = os.getenv('OPENAI_API_KEY')
 
+logger = logging.getLogger(__name__)
+
+# Paths are searched between every pair of the first PATH_SEARCH_ENTITIES matched entities, at most
+# PATH_SEARCH_MAX_DEPTH relationships long
+PATH_SEARCH_ENTITIES = int(os.getenv('PATH_SEARCH_ENTITIES', '5'))
+PATH_SEARCH_MAX_DEPTH = int(os.getenv('PATH_SEARCH_MAX_DEPTH', '4'))
+
 def collect_connections(entities, relationships):
     graph = get_full_graph()
     triplets = []
@@ -25,14 +36,20 @@ def collect_connections(entities, relationships):
 
     return triplets
 
+def entity_name(node):
+    # The in-memory backend keeps entity properties under `data`, the other backends store them flat
+    if not node:
+        return 'Unknown'
+    return node.get('name') or node.get('data', {}).get('name') or 'Unknown'
+
 def find_connected_triplets(entity_id, graph):
     connected_triplets = []
+    # Entities are keyed by id in the full graph
+    entities = graph['entities']
     for relationship in graph['relationships']:
         if relationship['from_id'] == entity_id or relationship['to_id'] == entity_id:
-            from_node = next((node for node in graph['entities'] if node['id'] == relationship['from_id']), None)
-            to_node = next((node for node in graph['entities'] if node['id'] == relationship['to_id']), None)
-            from_name = from_node['name'] if from_node else 'Unknown'
-            to_name = to_node['name'] if to_node else 'Unknown'
+            from_name = entity_name(entities.get(relationship['from_id']))
+            to_name = entity_name(entities.get(relationship['to_id']))
             relationship_type = relationship.get('relationship', 'connected to')
             triplet = relationship.get('snippet', f"{from_name} {relationship_type} {to_name}")
             connected_triplets.append(triplet)
@@ -40,81 +57,155 @@ def find_connected_triplets(entity_id, graph):
     return connected_triplets
 
 
-def generate_search_parameters(input_text):
-    try:
-        response = openai.chat.completions.create(
-            model="gpt-4-turbo",
-            messages=[
-                {"role": "system", "content": """You are a helpful assistant expected to generate search parameters in an array format for entities and relationships based on the given user input. Output should be in array format that looks like this with "name" as the key for every parameter. User: Did Johnny Appleseed plant apple seeds? Assistant:[{"name":"John"},{"name":"Appleseed"},{"name":"Apple"},{"name":"Seed"}]."""},
-                {"role": "user", "content": f"User input:{input_text}"}
-            ],
-        )
-        search_parameters = response.choices[0].message.content
-        print("search_para: ", search_parameters)
-        
-        if search_parameters:
-            # Ensure we're parsing a list of dictionaries
-            parsed_parameters = json.loads(search_parameters)
-            if isinstance(parsed_parameters, list) and all(isinstance(item, dict) for item in parsed_parameters):
-                return parsed_parameters
-            else:
-                print("Invalid format: Expected a list of dictionaries")
-                return []
+def describe_path(path):
+    # "Ada -[works_at]-> Acme <-[located_in]- Paris", followed by the snippets of the relationships
+    entities = path['entities']
+    parts = [entity_name(entities[0])]
+    for index, relationship in enumerate(path['relationships']):
+        label = relationship.get('relationship') or 'related_to'
+        forward = relationship.get('from_id') == (entities[index] or {}).get('id')
+        parts.append(f"-[{label}]->" if forward else f"<-[{label}]-")
+        parts.append(entity_name(entities[index + 1]))
+    snippets = [relationship['snippet'] for relationship in path['relationships'] if relationship.get('snippet')]
+    description = " ".join(parts)
+    return f"{description} ({'; '.join(snippets)})" if snippets else description
+
+def find_connecting_paths(entities):
+    # Shortest paths between the matched entities, only what connects them goes into the prompt
+    entity_ids = list(dict.fromkeys(entity['id'] for entity in entities if entity.get('id') is not None))
+    entity_ids = entity_ids[:PATH_SEARCH_ENTITIES]
+    paths = []
+    for index, from_id in enumerate(entity_ids):
+        for to_id in entity_ids[index + 1:]:
+            path = shortest_path(from_id, to_id, PATH_SEARCH_MAX_DEPTH)
+            if path is not None and path['length'] > 0:
+                paths.append(path)
+    return paths
+
+
+def _search_parameters_request(input_text):
+    return {
+        "model": "gpt-4-turbo",
+        "messages": [
+            {"role": "system", "content": """You are a helpful assistant expected to generate search parameters in an array format for entities and relationships based on the given user input. Output should be in array format that looks like this with "name" as the key for every parameter. User: Did Johnny Appleseed plant apple seeds? Assistant:[{"name":"John"},{"name":"Appleseed"},{"name":"Apple"},{"name":"Seed"}]."""},
+            {"role": "user", "content": f"User input:{input_text}"}
+        ],
+    }
+
+def _search_parameters_answer(response):
+    search_parameters = response.choices[0].message.content
+    logger.debug("Search parameters answer: %s", truncated(search_parameters))
+    
+    if search_parameters:
+        # Ensure we're parsing a list of dictionaries
+        parsed_parameters = json.loads(search_parameters)
+        if isinstance(parsed_parameters, list) and all(isinstance(item, dict) for item in parsed_parameters):
+            return parsed_parameters
         else:
-            print("No content in API response")
+            logger.warning("Invalid search parameters format: expected a list of dictionaries")
             return []
+    else:
+        logger.warning("No content in API response")
+        return []
+
+def generate_search_parameters(input_text):
+    try:
+        return _search_parameters_answer(openai.chat.completions.create(**_search_parameters_request(input_text)))
+    except json.JSONDecodeError as e:
+        logger.warning("Error decoding search parameters JSON: %s", e)
+        return []
+    except Exception as e:
+        logger.error("Error generating search parameters: %s", e)
+        return []
+
+async def generate_search_parameters_async(input_text):
+    try:
+        response = await async_openai().chat.completions.create(**_search_parameters_request(input_text))
+        return _search_parameters_answer(response)
     except json.JSONDecodeError as e:
-        print(f"Error decoding JSON: {e}")
+        logger.warning("Error decoding search parameters JSON: %s", e)
         return []
     except Exception as e:
-        print(f"Error generating search parameters: {e}")
+        logger.error("Error generating search parameters: %s", e)
         return []
   
 
+def build_answer_message(input_text, search_parameters):
+    # Searches the graph for the parameters, returns the prompt of the answer and the connections it is based on
+    entity_results = []
+    relationship_results = []
+
+    for param in search_parameters:
+        for key, value in param.items():
+            param_dict = {key: value}
+            logger.debug("param_dict: %s", param_dict)
+            entity_results.extend(search_entities(param_dict))
+            relationship_results.extend(search_relationships(param_dict))
+
+    logger.debug("Entity results: %s", truncated(entity_results))
+    logger.debug("Relationship results: %s", truncated(relationship_results))
+    paths = [describe_path(path) for path in find_connecting_paths(entity_results)]
+    logger.debug("Paths: %s", truncated(paths))
+    # Without a path between the matched entities, fall back to every relationship around them
+    triplets = paths or collect_connections(entity_results, relationship_results)
+    logger.debug("Triplets: %s", truncated(triplets))
+
+    if paths:
+        message = f"Based on the user input '{input_text}', here is how the entities it mentions are connected: {', '.join(paths)}. Generate an insightful response."
+    elif triplets:
+        message = f"Based on the user input '{input_text}', here are the relationships found: {', '.join(triplets)}. Generate an insightful response."
+    else:
+        message = f"Based on the user input '{input_text}', no specific relationships were found. Generate a general insight."
+
+    logger.debug("Message: %s", truncated(message))
+    return message, triplets
+
+def _answer_request(message):
+    return {
+        "model": "gpt-4-turbo",
+        "messages": [
+            {"role": "system", "content": "You're an assistant that generates a concise answer to the user input based on the data provided following the user input."},
+            {"role": "user", "content": message}
+        ]
+    }
+
 def ai_search(app, input_text):
-    print("ai_search start")
+    logger.debug("ai_search start")
     with app.app_context():
         search_parameters = generate_search_parameters(input_text)
-        print("search_parameters", search_parameters)
+        logger.debug("Search parameters: %s", truncated(search_parameters))
         if not search_parameters:
             return jsonify({"error": "Failed to generate search parameters"}), 400
 
-        entity_results = []
-        relationship_results = []
-
-        for param in search_parameters:
-            for key, value in param.items():
-                param_dict = {key: value}
-                print(f"param_dict: {param_dict}")
-                entity_results.extend(search_entities(param_dict))
-                relationship_results.extend(search_relationships(param_dict))
+        message, triplets = build_answer_message(input_text, search_parameters)
 
-        print("entity_results: ", entity_results)
-        print("relationship_results: ", relationship_results)
-        triplets = collect_connections(entity_results, relationship_results)
-        print("triplet: ", triplets)
+        try:
+            response = openai.chat.completions.create(**_answer_request(message))
+            answer = response.choices[0].message.content
+            logger.debug("Answer: %s", truncated(answer))
+            return jsonify({"answer": answer, "triplets": str(triplets)}), 200
+        except Exception as e:
+            logger.error("Error processing AI search: %s", e)
+            return jsonify({"error": str(e)}), 500
 
-        if triplets:
-            message = f"Based on the user input '{input_text}', here are the relationships found: {', '.join(triplets)}. Generate an insightful response."
-        else:
-            message = f"Based on the user input '{input_text}', no specific relationships were found. Generate a general insight."
+async def ai_search_async(app, input_text):
+    with app.app_context():
+        search_parameters = await generate_search_parameters_async(input_text)
+        if not search_parameters:
+            return {"error": "Failed to generate search parameters"}, 400
 
-        print("message: ", message)
+        # Searches and path finding run in a worker thread, the database drivers are blocking
+        message, triplets = await asyncio.to_thread(build_answer_message, input_text, search_parameters)
 
         try:
-            response = openai.chat.completions.create(
-                model="gpt-4-turbo",
-                messages=[
-                    {"role": "system", "content": "You're an assistant that generates a concise answer to the user input based on the data provided following the user input."},
-                    {"role": "user", "content": message}
-                ]
-            )
+            response = await async_openai().chat.completions.create(**_answer_request(message))
             answer = response.choices[0].message.content
-            print("answer: ", answer)
-            return jsonify({"answer": answer, "triplets": str(triplets)}), 200
+            logger.debug("Answer: %s", truncated(answer))
+            return {"answer": answer, "triplets": str(triplets)}, 200
         except Exception as e:
-            print(f"Error processing AI search: {e}")
-            return jsonify({"error": str(e)}), 500
+            logger.error("Error processing AI search: %s", e)
+            return {"error": str(e)}, 500
 
 def register(integration_manager):
-    integration_manager.register('ai_search', ai_search)
\ No newline at end of file
+    integration_manager.register('ai_search', ai_search)
+    integration_manager.register_async('ai_search', ai_search_async)
\ No newline at end of file
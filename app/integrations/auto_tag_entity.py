@@ -1,10 +1,14 @@
 # this is an example integration that automatically triggers based on an entity creation using the blinker signals by importing entity_created from app.signals.
+# With SIGNAL_DISPATCH=async, tag_entity runs on the signal event bus workers instead of in the request (see app/signals.py).
+import logging
 from flask import request, current_app, jsonify
 from app.signals import entity_created
 
+logger = logging.getLogger(__name__)
+
 def tag_entity(sender, **extra):
     # Logic for tagging entity goes here
-    print('Tagged entity with id:', extra.get('entity_id'))
+    logger.debug('Tagged entity with id: %s', extra.get('entity_id'))
 
 def auto_tag_entity(next):
     def wrapper(*args, **kwargs):
@@ -21,7 +25,7 @@ def auto_tag_entity(next):
                 if entity_id:
                     # Emit the signal here, after the entity has been created
                     entity_created.send(current_app, entity_id=entity_id)
-                    print('Tagged entity after creation.')
+                    logger.debug('Tagged entity after creation.')
         
         # Return the original response
         return response
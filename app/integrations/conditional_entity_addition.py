@@ -22,6 +22,9 @@
 
 # Error handling is included to catch and report issues during the OpenAI API call process.
 
+# `conditional_entity_addition_async` does the same on the event loop of the ASGI entry point: the model call goes
+# through the shared async client (app/llm.py) and the database calls run in worker threads.
+
 # Finally, a `register` function is provided to make `conditional_entity_addition` available within the application's 
 # integration manager, allowing it to be dynamically loaded and invoked as part of the application's integration ecosystem.
 
@@ -30,56 +33,92 @@
 
 
 # app/integrations/conditional_entity_addition.py
+import asyncio
+import logging
 import os
 import openai
-from flask import jsonify
 from app.models import search_entities, add_entity
+from app.llm import async_openai
+from app.logs import truncated
+
+logger = logging.getLogger(__name__)
 
 openai.api_key = os.environ['OPENAI_API_KEY']
 OPENAI_MODEL_NAME = "gpt-4-turbo"
 
+def _candidates(data):
+    # Run a search for the entity name
+    search_params = {'name': data['name']}
+    logger.debug("Search parameters: %s", search_params)
+    results = search_entities(search_params)
+    logger.debug("Search results: %s", truncated(results))
+    return results
+
+def _match_request(search_results, data):
+    return {
+        "model": os.environ.get('OPENAI_MODEL_NAME', OPENAI_MODEL_NAME),
+        "messages": [
+    {"role": "system", "content": "You are a helpful assistant specializing in determining if new input data matches existing data in our database. Review the search results provided and compare them against the input data. If there's a match, respond with the ID number of the match, and only the ID number. If there are no matches, respond with 'No Matches'. Your response should ALWAYS be either an ID number alone or 'No Matches'. Consider that names may not match perfectly (e.g., nicknames, partial names). If there's a strong likelihood of a match based on available information, respond with the ID number. If the likelihood is low, respond with 'No Matches'."},
+    {"role": "user", "content": f"Here are the search results: {search_results}. Does any entry match the input data: {data}?"}]
+    }
+
+def _match_answer(response):
+    ai_response = response.choices[0].message.content if response.choices else None
+
+    if ai_response is None:
+        raise ValueError("No response from OpenAI")
+    
+    ai_response = ai_response.strip()
+    
+    logger.debug("AI response: %s", truncated(ai_response))
+
+    if "no matches" in ai_response.lower():
+        return None
+    return ai_response
+
+def find_matching_entity(data):
+    # Returns the id of an existing entity matching `data` according to the model, or None
+    response = openai.chat.completions.create(**_match_request(_candidates(data), data))
+    return _match_answer(response)
+
+async def find_matching_entity_async(data):
+    search_results = await asyncio.to_thread(_candidates, data)
+    response = await async_openai().chat.completions.create(**_match_request(search_results, data))
+    return _match_answer(response)
+
+
+def _add_unless_matched(data, match_id):
+    if match_id is None:
+        # If no match found, add the new entity
+        entity_id = add_entity(data)
+        return {"success": True, "entity_id": entity_id}, 200
+    else:
+        # If a match is found, return the match details
+        return {"success": False, "message": "Match found", "match_id": match_id}, 200
+
 def conditional_entity_addition(app, data):
     with app.app_context():
         if not isinstance(data, dict) or 'name' not in data:
-            return jsonify({"error": "Invalid entity data. 'name' is required."}), 400
+            return {"error": "Invalid entity data. 'name' is required."}, 400
 
-        search_results = []
+        try:
+            return _add_unless_matched(data, find_matching_entity(data))
+        except Exception as e:
+            logger.error("Error calling OpenAI: %s", e)
+            return {"error": str(e)}, 500
 
-        # Run a search for the entity name
-        search_params = {'name': data['name']}
-        print(f"Search parameters: {search_params}")
-        results = search_entities(search_params)
-        print(f"Search results: {results}")
-        search_results.extend(results)
+async def conditional_entity_addition_async(app, data):
+    with app.app_context():
+        if not isinstance(data, dict) or 'name' not in data:
+            return {"error": "Invalid entity data. 'name' is required."}, 400
 
         try:
-            response = openai.chat.completions.create(
-                model=os.environ.get('OPENAI_MODEL_NAME', OPENAI_MODEL_NAME),
-                messages=[
-            {"role": "system", "content": "You are a helpful assistant specializing in determining if new input data matches existing data in our database. Review the search results provided and compare them against the input data. If there's a match, respond with the ID number of the match, and only the ID number. If there are no matches, respond with 'No Matches'. Your response should ALWAYS be either an ID number alone or 'No Matches'. Consider that names may not match perfectly (e.g., nicknames, partial names). If there's a strong likelihood of a match based on available information, respond with the ID number. If the likelihood is low, respond with 'No Matches'."},
-            {"role": "user", "content": f"Here are the search results: {search_results}. Does any entry match the input data: {data}?"}]
-            )
-            ai_response = response.choices[0].message.content if response.choices else None
-
-            if ai_response is None:
-                raise ValueError("No response from OpenAI")
-            
-            ai_response = ai_response.strip()
-            
-            print(f"AI response: {ai_response}")
-
-            if "no matches" in ai_response.lower():
-                # If no match found, add the new entity
-                entity_id = add_entity(data)
-                return jsonify({"success": True, "entity_id": entity_id}), 200
-            else:
-                # If a match is found, return the match details
-                match_id = ai_response
-                return jsonify({"success": False, "message": "Match found", "match_id": match_id}), 200
-
+            match_id = await find_matching_entity_async(data)
+            return await asyncio.to_thread(_add_unless_matched, data, match_id)
         except Exception as e:
-            print(f"Error calling OpenAI: {e}")
-            return jsonify({"error": str(e)}), 500
+            logger.error("Error calling OpenAI: %s", e)
+            return {"error": str(e)}, 500
 
 def register(integration_manager):
-    integration_manager.register('conditional_entity_addition', conditional_entity_addition)
\ No newline at end of file
+    integration_manager.register('conditional_entity_addition', conditional_entity_addition)
+    integration_manager.register_async('conditional_entity_addition', conditional_entity_addition_async)
\ No newline at end of file
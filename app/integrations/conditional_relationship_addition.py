@@ -19,6 +19,9 @@
 
 # Error handling is incorporated to manage and report any issues encountered during the OpenAI API call.
 
+# `conditional_relationship_addition_async` is its variant for the event loop of the ASGI entry point, with the model
+# call on the shared async client (app/llm.py) and the database calls in worker threads.
+
 # Additionally, a `register` function is included to ensure the `conditional_relationship_addition` integration is available 
 # within the application's integration manager. This allows for dynamic loading and invocation within the application's 
 # integration framework.
@@ -29,51 +32,96 @@
 
 
 # app/integrations/conditional_relationship_addition.py
+import asyncio
+import logging
 import os
 import openai
-from flask import jsonify
+from app.llm import async_openai
 from app.models import search_relationships, add_relationship
 
+logger = logging.getLogger(__name__)
+
 openai.api_key = os.environ['OPENAI_API_KEY']
 
 OPENAI_MODEL_NAME = "gpt-4-turbo"
 
+REQUIRED_FIELDS = ['from_id', 'to_id', 'relationship']
+
+
+def _candidates(data):
+    search_params = {key: data[key] for key in REQUIRED_FIELDS}
+
+    logger.debug("Search parameters: %s", search_params)
+    return search_relationships(search_params)
+
+def _match_request(search_results, data):
+    return {
+        "model": os.environ.get('OPENAI_MODEL_NAME', OPENAI_MODEL_NAME),
+        "messages": [
+    {"role": "system", "content": "You are a helpful assistant. Your task is to determine whether a proposed new relationship between two nodes already exists in the database. You should only consider a relationship a match if all the search parameters correspond exactly to an existing relationship. If you find a match, your response should be the full details of the matching relationship, and only the full details as JSON. If there is no match, respond with 'No Matches'. Your response should always be either just JSON response or 'No Matches'."},
+    {"role": "user", "content": f"Existing relationships: {search_results}. Do any of these match the proposed relationship details: {data}?"}]
+    }
+
+def _match_answer(response):
+    ai_response = response.choices[0].message.content if response.choices else None
+
+    if ai_response is None:
+        raise ValueError("Unexpected empty response from OpenAI")
+
+    ai_response = ai_response.strip()
+
+    if "No Matches" in ai_response:
+        return None
+    return ai_response
+
+def find_matching_relationship(data):
+    # Returns the model's description of an existing relationship matching `data`, or None
+    response = openai.chat.completions.create(**_match_request(_candidates(data), data))
+    return _match_answer(response)
+
+async def find_matching_relationship_async(data):
+    search_results = await asyncio.to_thread(_candidates, data)
+    response = await async_openai().chat.completions.create(**_match_request(search_results, data))
+    return _match_answer(response)
+
+
+def _add_unless_matched(data, matching_relationship):
+    if matching_relationship is None:
+        relationship_id = add_relationship(data)
+        return {"success": True, "relationship": data}, 200
+    else:
+        return {"success": False, "message": "Match found", "matching_relationship": matching_relationship}, 200
+
+def _missing_field(data):
+    for field in REQUIRED_FIELDS:
+        if field not in data:
+            return {"error": f"'{field}' is required."}, 400
+
 def conditional_relationship_addition(app, data):
     with app.app_context():
-        required_fields = ['from_id', 'to_id', 'relationship']
-        for field in required_fields:
-            if field not in data:
-                return jsonify({"error": f"'{field}' is required."}), 400
+        missing = _missing_field(data)
+        if missing:
+            return missing
 
-        search_params = {key: data[key] for key in required_fields}
+        try:
+            return _add_unless_matched(data, find_matching_relationship(data))
+        except Exception as e:
+            logger.error("Error calling OpenAI: %s", e)
+            return {"error": str(e)}, 500
 
-        print(f"Search parameters: {search_params}")
-        search_results = search_relationships(search_params)
+async def conditional_relationship_addition_async(app, data):
+    with app.app_context():
+        missing = _missing_field(data)
+        if missing:
+            return missing
 
         try:
-            response = openai.chat.completions.create(
-                model=os.environ.get('OPENAI_MODEL_NAME', OPENAI_MODEL_NAME),
-                messages=[
-            {"role": "system", "content": "You are a helpful assistant. Your task is to determine whether a proposed new relationship between two nodes already exists in the database. You should only consider a relationship a match if all the search parameters correspond exactly to an existing relationship. If you find a match, your response should be the full details of the matching relationship, and only the full details as JSON. If there is no match, respond with 'No Matches'. Your response should always be either just JSON response or 'No Matches'."},
-            {"role": "user", "content": f"Existing relationships: {search_results}. Do any of these match the proposed relationship details: {data}?"}]
-            )
-            
-            ai_response = response.choices[0].message.content if response.choices else None
-
-            if ai_response is None:
-                raise ValueError("Unexpected empty response from OpenAI")
-
-            ai_response = ai_response.strip()
-
-            if "No Matches" in ai_response:
-                relationship_id = add_relationship(data)
-                return jsonify({"success": True, "relationship": data}), 200
-            else:
-                return jsonify({"success": False, "message": "Match found", "matching_relationship": ai_response}), 200
-
+            matching_relationship = await find_matching_relationship_async(data)
+            return await asyncio.to_thread(_add_unless_matched, data, matching_relationship)
         except Exception as e:
-            print(f"Error calling OpenAI: {e}")
-            return jsonify({"error": str(e)}), 500
+            logger.error("Error calling OpenAI: %s", e)
+            return {"error": str(e)}, 500
 
 def register(integration_manager):
     integration_manager.register('conditional_relationship_addition', conditional_relationship_addition)
+    integration_manager.register_async('conditional_relationship_addition', conditional_relationship_addition_async)
@@ -1,11 +1,27 @@
+import importlib
 import os
 
-from .memory import InMemoryDatabase
-from .neo4jdb import Neo4jIntegration
+# Backends are imported when selected: the Neo4j driver is only loaded with DATABASE_TYPE=neo4j or neo4j_async.
+# `CurrentDBIntegration` and the backend classes stay importable from this package, resolved on first access.
+BACKENDS = {
+  'memory': ('.memory', 'InMemoryDatabase'),
+  'neo4j': ('.neo4jdb', 'Neo4jIntegration'),
+  'neo4j_async': ('.neo4j_async', 'AsyncNeo4jIntegration'),
+  'sqlite': ('.sqlitedb', 'SQLiteIntegration'),
+}
 
 db_type = os.getenv("DATABASE_TYPE", "memory").lower()
 
-if db_type == 'neo4j':
-  CurrentDBIntegration = Neo4jIntegration
-else:
-  CurrentDBIntegration = InMemoryDatabase
+
+def database_class(name=None):
+  module_path, class_name = BACKENDS.get(name or db_type, BACKENDS['memory'])
+  return getattr(importlib.import_module(module_path, __name__), class_name)
+
+
+def __getattr__(name):
+  if name == 'CurrentDBIntegration':
+    return database_class()
+  for module_path, class_name in BACKENDS.values():
+    if name == class_name:
+      return getattr(importlib.import_module(module_path, __name__), class_name)
+  raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,4 +1,6 @@
 from abc import ABC, abstractmethod
+from .paths import DEFAULT_MAX_DEPTH, MAX_PATHS, adjacency_from_edges, k_shortest_paths, relationship_filter
+from .snapshot import read_snapshot, write_snapshot
 
 class DatabaseIntegration(ABC):
 
@@ -34,6 +36,55 @@ class DatabaseIntegration(ABC):
     def search_entities(self, search_params):
         pass
 
+    @abstractmethod
+    def search_entities_with_type(self, entity_type, search_params):
+        pass
+
     @abstractmethod
     def search_relationships(self, search_params):
         pass
+
+    @abstractmethod
+    def dump_graph(self):
+        pass
+
+    @abstractmethod
+    def load_graph(self, nodes, edges):
+        pass
+
+    def graph_counts(self):
+        # Generic fallback reading the whole graph, backends able to count on their own override it
+        nodes, edges = self.dump_graph()
+        return {"entities": len(nodes), "relationships": len(edges)}
+
+    def export_snapshot(self, fp, compression="zlib"):
+        nodes, edges = self.dump_graph()
+        return write_snapshot(fp, nodes, edges, compression)
+
+    def import_snapshot(self, fp):
+        nodes, edges = read_snapshot(fp)
+        return self.load_graph(nodes, edges)
+
+    def _path_expander(self):
+        # Generic fallback reading the whole graph, backends with an adjacency index of their own override it
+        adjacency = adjacency_from_edges(self.dump_graph()[1])
+        return lambda entity_ids: {entity_id: adjacency.get(entity_id, ()) for entity_id in entity_ids}
+
+    def _path(self, nodes, relationships):
+        return {
+            "length": len(relationships),
+            "entities": [self.get_entity(entity_id) for entity_id in nodes],
+            "relationships": relationships,
+        }
+
+    def k_shortest_paths(self, from_id, to_id, k=3, max_depth=DEFAULT_MAX_DEPTH, relationship_types=None):
+        if self.get_entity(from_id) is None or self.get_entity(to_id) is None:
+            return []
+        paths = k_shortest_paths(
+            self._path_expander(), from_id, to_id, min(k, MAX_PATHS), max_depth, relationship_filter(relationship_types)
+        )
+        return [self._path(nodes, relationships) for nodes, relationships in paths]
+
+    def shortest_path(self, from_id, to_id, max_depth=DEFAULT_MAX_DEPTH, relationship_types=None):
+        paths = self.k_shortest_paths(from_id, to_id, 1, max_depth, relationship_types)
+        return paths[0] if paths else None
@@ -0,0 +1,330 @@
+# Read-through cache in front of any `DatabaseIntegration`.
+#
+# `CachedDatabase(backend)` implements the same interface as the backend it wraps. Reads of the cached operations are
+# served from an LRU of at most `max_entries` entries, each living at most `ttl` seconds; other calls go straight to
+# the backend. It is enabled in create_app with DB_CACHE=true and configured with:
+# - DB_CACHE_MAX_ENTRIES (10000) and DB_CACHE_TTL (60 seconds, 0 for no expiry),
+# - DB_CACHE_OPERATIONS, a comma separated list among CACHEABLE_OPERATIONS. get_full_graph and get_all_entities
+#   return the whole graph and are left out by default.
+#
+# Writes going through the wrapper invalidate exactly the entries they can change:
+# - get_entity entries of the written entity id,
+# - entity searches that returned the entity, or whose search keys are among the written properties (the entity may
+#   start matching), or any entity search for an added entity with such keys,
+# - relationship searches that returned a relationship of a deleted entity or search by its id, and on
+#   add_relationship the searches whose keys all appear in the new relationship,
+# - whole graph reads on every write.
+# Batch writes (add_entities, add_relationships, upsert_graph, load_graph) clear the whole cache.
+# The entity_created, entity_updated and entity_deleted signals also invalidate their entity, which covers writes
+# made to the backend without going through the wrapper.
+#
+# A read that started before an invalidation does not store its result, so a slow read cannot put back stale data.
+# Cached values are copied on the way in and out, callers can modify what they get.
+#
+# Per operation hit, miss, store, eviction, expiry and invalidation counters are returned by `cache_stats`.
+
+import copy
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from app.signals import entity_created, entity_deleted, entity_updated
+from .base import DatabaseIntegration
+from .lazy import resolved
+
+CACHEABLE_OPERATIONS = (
+    "get_entity",
+    "search_entities",
+    "search_entities_with_type",
+    "search_relationships",
+    "get_all_entities",
+    "get_full_graph",
+)
+DEFAULT_OPERATIONS = ("get_entity", "search_entities", "search_entities_with_type", "search_relationships")
+ENTITY_SEARCHES = ("search_entities", "search_entities_with_type")
+WHOLE_GRAPH_READS = ("get_all_entities", "get_full_graph")
+BATCH_WRITES = ("add_entities", "add_relationships", "upsert_graph")
+
+_MISSING = object()
+
+
+def cache_settings():
+    operations = os.getenv("DB_CACHE_OPERATIONS")
+    return {
+        "max_entries": int(os.getenv("DB_CACHE_MAX_ENTRIES", "10000")),
+        "ttl": float(os.getenv("DB_CACHE_TTL", "60")),
+        "operations": [op.strip() for op in operations.split(",") if op.strip()] if operations else DEFAULT_OPERATIONS,
+    }
+
+
+def cache_enabled():
+    return os.getenv("DB_CACHE", "false").lower() == "true"
+
+
+def _params_key(params):
+    return json.dumps(params, sort_keys=True, default=str)
+
+
+class _Entry:
+    __slots__ = ("operation", "value", "expires_at", "keys", "entity_type", "ids")
+
+    def __init__(self, operation, value, expires_at, keys=(), entity_type=None, ids=()):
+        self.operation = operation
+        self.value = value
+        self.expires_at = expires_at
+        # Search keys, type filter and ids in the result, used to find the entries a write invalidates
+        self.keys = frozenset(keys)
+        self.entity_type = entity_type
+        self.ids = frozenset(ids)
+
+
+class CachedDatabase(DatabaseIntegration):
+    def __init__(self, backend, max_entries=10000, ttl=60, operations=DEFAULT_OPERATIONS):
+        unknown = set(operations) - set(CACHEABLE_OPERATIONS)
+        if unknown:
+            raise ValueError(f"Operations cannot be cached: {', '.join(sorted(unknown))}")
+        self.backend = backend
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.operations = frozenset(operations)
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.generation = 0
+        self.counters = {
+            operation: {"hits": 0, "misses": 0, "stores": 0, "evictions": 0, "expirations": 0, "invalidations": 0}
+            for operation in self.operations
+        }
+        # Inline even with SIGNAL_DISPATCH=async, a read following the write must not see the cached entity
+        entity_created.connect(self._on_entity_created, inline=True)
+        entity_updated.connect(self._on_entity_updated, inline=True)
+        entity_deleted.connect(self._on_entity_deleted, inline=True)
+
+    def __getattr__(self, name):
+        # Backend specific methods (get_neighborhood, search_text, close...) are passed through, batch writes
+        # clear the cache once done. Only reached for attributes the wrapper does not define, so `hasattr` keeps
+        # answering for the backend, e.g. in supports_batch_writes.
+        if name == "backend":
+            raise AttributeError(name)
+        attribute = getattr(self.backend, name)
+        if name in BATCH_WRITES and callable(attribute):
+            def batch_write(*args, **kwargs):
+                try:
+                    return attribute(*args, **kwargs)
+                finally:
+                    self.clear()
+            return batch_write
+        return attribute
+
+    # Cache bookkeeping
+
+    def _lookup(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            counters = self.counters[key[0]]
+            if entry is None:
+                counters["misses"] += 1
+                return _MISSING, self.generation
+            if entry.expires_at is not None and entry.expires_at <= time.monotonic():
+                del self.entries[key]
+                counters["expirations"] += 1
+                counters["misses"] += 1
+                return _MISSING, self.generation
+            self.entries.move_to_end(key)
+            counters["hits"] += 1
+            return entry.value, self.generation
+
+    def _store(self, key, generation, value, **metadata):
+        with self.lock:
+            if generation != self.generation:
+                return
+            expires_at = time.monotonic() + self.ttl if self.ttl else None
+            self.entries[key] = _Entry(key[0], copy.deepcopy(value), expires_at, **metadata)
+            self.entries.move_to_end(key)
+            self.counters[key[0]]["stores"] += 1
+            while len(self.entries) > self.max_entries:
+                _, evicted = self.entries.popitem(last=False)
+                self.counters[evicted.operation]["evictions"] += 1
+
+    def _read(self, key, load, describe=None):
+        if key[0] not in self.operations:
+            return load()
+        value, generation = self._lookup(key)
+        if value is not _MISSING:
+            return copy.deepcopy(value)
+        value = load()
+        self._store(key, generation, value, **(describe(value) if describe else {}))
+        return value
+
+    def invalidate_where(self, predicate):
+        with self.lock:
+            self.generation += 1
+            stale = [key for key, entry in self.entries.items() if predicate(entry)]
+            for key in stale:
+                self.counters[key[0]]["invalidations"] += 1
+                del self.entries[key]
+            return len(stale)
+
+    def clear(self):
+        return self.invalidate_where(lambda _entry: True)
+
+    def invalidate_entity(self, entity_id, properties=(), entity_type=None, deleted=False, created=False):
+        properties = frozenset(properties)
+
+        def stale(entry):
+            if entry.operation in WHOLE_GRAPH_READS:
+                return True
+            if entry.operation == "get_entity":
+                return entry.ids == {entity_id}
+            if entry.operation in ENTITY_SEARCHES:
+                if entity_id in entry.ids:
+                    return True
+                if created:
+                    # A new entity matches searches on properties it has, of its type when they filter on it
+                    if entry.entity_type is not None and entry.entity_type != entity_type:
+                        return False
+                    return entry.keys <= properties
+                # Updates may make the entity match searches on the properties they change
+                return bool(entry.keys & properties) or ("type" in properties and entry.entity_type is not None)
+            if entry.operation == "search_relationships":
+                return deleted and (entity_id in entry.ids)
+            return False
+
+        return self.invalidate_where(stale)
+
+    def invalidate_relationship(self, data):
+        keys = frozenset(data)
+
+        def stale(entry):
+            if entry.operation in WHOLE_GRAPH_READS:
+                return True
+            # A new relationship can only match searches on keys it has
+            return entry.operation == "search_relationships" and entry.keys <= keys
+
+        return self.invalidate_where(stale)
+
+    def _on_entity_created(self, _sender, entity_id=None, data=None, entity_type=None, **_kwargs):
+        if entity_id is None:
+            return
+        if entity_type == "relationship":
+            self.invalidate_relationship(data if isinstance(data, dict) else {})
+        elif isinstance(data, dict):
+            self.invalidate_entity(entity_id, data.keys(), data.get("type"), created=True)
+        else:
+            # Without the entity properties any entity search may now match it
+            self.invalidate_entity(entity_id)
+            self.invalidate_where(lambda entry: entry.operation in ENTITY_SEARCHES)
+
+    def _on_entity_updated(self, _sender, entity_id=None, data=None, **_kwargs):
+        if entity_id is None:
+            return
+        if isinstance(data, dict):
+            self.invalidate_entity(entity_id, data.keys())
+        else:
+            self.invalidate_entity(entity_id)
+            self.invalidate_where(lambda entry: entry.operation in ENTITY_SEARCHES)
+
+    def _on_entity_deleted(self, _sender, entity_id=None, **_kwargs):
+        if entity_id is not None:
+            self.invalidate_entity(entity_id, deleted=True)
+
+    def cache_stats(self):
+        with self.lock:
+            operations = {operation: dict(counters) for operation, counters in self.counters.items()}
+            size = len(self.entries)
+        for counters in operations.values():
+            lookups = counters["hits"] + counters["misses"]
+            counters["hit_rate"] = round(counters["hits"] / lookups, 4) if lookups else None
+        return {
+            "enabled": True,
+            "backend": type(resolved(self.backend)).__name__,
+            "entries": size,
+            "max_entries": self.max_entries,
+            "ttl": self.ttl,
+            "operations": operations,
+        }
+
+    # Reads
+
+    def get_entity(self, entity_id):
+        return self._read(("get_entity", entity_id), lambda: self.backend.get_entity(entity_id),
+                          lambda _value: {"ids": (entity_id,)})
+
+    def get_all_entities(self):
+        return self._read(("get_all_entities",), self.backend.get_all_entities)
+
+    def get_full_graph(self):
+        return self._read(("get_full_graph",), self.backend.get_full_graph)
+
+    def _entity_ids(self, results):
+        return [result.get("id") for result in results or [] if isinstance(result, dict)]
+
+    def search_entities(self, search_params):
+        return self._read(
+            ("search_entities", _params_key(search_params)),
+            lambda: self.backend.search_entities(search_params),
+            lambda value: {"keys": search_params.keys(), "ids": self._entity_ids(value)},
+        )
+
+    def search_entities_with_type(self, entity_type, search_params):
+        return self._read(
+            ("search_entities_with_type", entity_type, _params_key(search_params)),
+            lambda: self.backend.search_entities_with_type(entity_type, search_params),
+            lambda value: {"keys": search_params.keys(), "entity_type": entity_type, "ids": self._entity_ids(value)},
+        )
+
+    def search_relationships(self, search_params):
+        def describe(value):
+            ids = {result.get(end) for result in value or [] for end in ("from_id", "to_id")}
+            ids.update(search_params[end] for end in ("from_id", "to_id") if end in search_params)
+            return {"keys": search_params.keys(), "ids": ids}
+
+        return self._read(
+            ("search_relationships", _params_key(search_params)),
+            lambda: self.backend.search_relationships(search_params),
+            describe,
+        )
+
+    def k_shortest_paths(self, *args, **kwargs):
+        # Not cached, the backend's own path search is used instead of the generic one of DatabaseIntegration
+        return self.backend.k_shortest_paths(*args, **kwargs)
+
+    def shortest_path(self, *args, **kwargs):
+        return self.backend.shortest_path(*args, **kwargs)
+
+    def graph_counts(self):
+        return self.backend.graph_counts()
+
+    # Writes
+
+    def add_entity(self, data):
+        entity_id = self.backend.add_entity(data)
+        self.invalidate_entity(entity_id, data.keys(), data.get("type"), created=True)
+        return entity_id
+
+    def update_entity(self, entity_id, data):
+        try:
+            return self.backend.update_entity(entity_id, data)
+        finally:
+            self.invalidate_entity(entity_id, data.keys())
+
+    def delete_entity(self, entity_id):
+        try:
+            return self.backend.delete_entity(entity_id)
+        finally:
+            self.invalidate_entity(entity_id, deleted=True)
+
+    def add_relationship(self, data):
+        try:
+            return self.backend.add_relationship(data)
+        finally:
+            self.invalidate_relationship(data)
+
+    def dump_graph(self):
+        return self.backend.dump_graph()
+
+    def load_graph(self, nodes, edges):
+        try:
+            return self.backend.load_graph(nodes, edges)
+        finally:
+            self.clear()
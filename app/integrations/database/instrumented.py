@@ -0,0 +1,64 @@
+# Timing of the calls made to a `DatabaseIntegration`.
+#
+# `InstrumentedDatabase(backend)` forwards every attribute to the backend it wraps (which may itself be a
+# CachedDatabase), the methods of TIMED_OPERATIONS go through a wrapper recording their duration and failures in
+# kgraph_db_operation_duration_seconds / kgraph_db_operation_errors_total (see app/metrics.py). Wrappers are made on
+# first use and kept on the instance, later calls only pay for two perf_counter calls and a histogram observation.
+# It is installed by create_app unless METRICS=false.
+
+import time
+from app.metrics import db_operation_duration, db_operation_errors
+
+TIMED_OPERATIONS = frozenset((
+    "add_entity",
+    "add_entities",
+    "add_relationship",
+    "add_relationships",
+    "upsert_graph",
+    "get_entity",
+    "get_entities",
+    "get_all_entities",
+    "get_full_graph",
+    "update_entity",
+    "delete_entity",
+    "search_entities",
+    "search_entities_with_type",
+    "search_relationships",
+    "search_text",
+    "get_neighborhood",
+    "shortest_path",
+    "k_shortest_paths",
+    "dump_graph",
+    "load_graph",
+    "export_snapshot",
+    "import_snapshot",
+    "graph_counts",
+))
+
+
+def timed(operation, function):
+    def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        except Exception:
+            db_operation_errors.inc(operation)
+            raise
+        finally:
+            db_operation_duration.observe(time.perf_counter() - started, operation)
+    return wrapper
+
+
+class InstrumentedDatabase:
+    def __init__(self, backend):
+        self.backend = backend
+
+    def __getattr__(self, name):
+        # Only reached for attributes not set on the wrapper, `hasattr` keeps answering for the backend
+        if name == "backend":
+            raise AttributeError(name)
+        attribute = getattr(self.backend, name)
+        if name in TIMED_OPERATIONS and callable(attribute):
+            attribute = timed(name, attribute)
+            setattr(self, name, attribute)
+        return attribute
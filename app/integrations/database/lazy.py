@@ -0,0 +1,36 @@
+# Deferred construction of the database backend.
+#
+# `LazyDatabase(factory)` stands for the backend returned by `factory()`, which is only called on the first attribute
+# access, e.g. the first database call of a request. create_app installs it around the backend selected by
+# DATABASE_TYPE, so a Neo4j backend does not import the driver, connect nor check connectivity at boot. Concurrent
+# first calls wait on a lock for the one build; a build that raises is tried again by the next call. Methods of the
+# built backend are kept on the proxy, later calls do not go through `__getattr__`.
+
+import threading
+
+
+class LazyDatabase:
+    def __init__(self, factory):
+        self.factory = factory
+        self.backend = None
+        self.lock = threading.Lock()
+
+    def resolve(self):
+        # The backend, built on the first call
+        if self.backend is None:
+            with self.lock:
+                if self.backend is None:
+                    self.backend = self.factory()
+        return self.backend
+
+    def __getattr__(self, name):
+        # Only reached for attributes not set on the proxy, `hasattr` keeps answering for the backend
+        attribute = getattr(self.resolve(), name)
+        if callable(attribute):
+            setattr(self, name, attribute)
+        return attribute
+
+
+def resolved(backend):
+    # The backend itself, built if it is a LazyDatabase, e.g. to report its type
+    return backend.resolve() if isinstance(backend, LazyDatabase) else backend
@@ -11,12 +11,18 @@
 # - search_entities: Searches for entities based on a set of search parameters.
 # - search_entities_with_type: Searches for entities of a specific type based on search parameters.
 # - search_relationships: Searches for relationships that match given search parameters.
+# - shortest_path / k_shortest_paths: Bidirectional BFS over an adjacency index kept up to date by the writes.
+# - graph_counts: Numbers of entities and relationships, for the graph size metrics.
 # This representation is basic and intended for demonstration or prototyping. For production use, a database and an ORM (Object-Relational Mapping) should be utilized for data persistence and management.
 
 # This is a very basic representation. For a real application, use a database and ORM.
 
+import logging
 from .base import DatabaseIntegration
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional, Tuple
+from ...logs import sampled
+
+logger = logging.getLogger(__name__)
 
 next_id = 1
 
@@ -27,39 +33,67 @@ class InMemoryDatabase(DatabaseIntegration):
             "entities": {},  # Stores all entities by ID
             "relationships": [],  # Stores relationships
         }
+        # Entity id -> list of (neighbour id, relationship), both directions, for path finding
+        self.adjacency = {}
 
-    def add_entity(self, entity_type: str, data: Dict[str, Any]) -> None:
+    def add_entity(self, data: Dict[str, Any]) -> int:
         global next_id
         entity_id = next_id
+        entity_type = data.get("type")
         self.graph["entities"][entity_id] = {"type": entity_type, "data": data}
         next_id += 1
-        print(f"Added {entity_type} with ID: {entity_id}, next ID: {next_id}")
+        logger.debug("Added %s with ID: %s, next ID: %s", entity_type, entity_id, next_id, extra=sampled("memory.add_entity"))
+        return entity_id
+
+    def get_full_graph(self) -> Dict[str, Any]:
+        return self.graph
 
-    def get_full_graph(self) -> None:
-        self.graph
+    def graph_counts(self) -> Dict[str, int]:
+        return {"entities": len(self.graph["entities"]), "relationships": len(self.graph["relationships"])}
 
-    def get_entity(self, entity_id: int) -> None:
-        self.graph["entities"].get(entity_id)
+    def _entity(self, entity_id: int, entity_details: Dict[str, Any]) -> Dict[str, Any]:
+        return {"id": entity_id, "type": entity_details["type"], **entity_details["data"]}
 
-    def get_all_entities(self) -> None:
-        self.graph["entities"]
+    def get_entity(self, entity_id: int) -> Optional[Dict[str, Any]]:
+        entity_details = self.graph["entities"].get(entity_id)
+        if entity_details is not None:
+            return self._entity(entity_id, entity_details)
 
-    def update_entity(self, entity_id: int, data: Dict[str, Any]) -> None:
+    def get_all_entities(self) -> List[Dict[str, Any]]:
+        return [self._entity(entity_id, entity_details) for entity_id, entity_details in self.graph["entities"].items()]
+
+    def update_entity(self, entity_id: int, data: Dict[str, Any]) -> bool:
         if entity_id in self.graph["entities"]:
             self.graph["entities"][entity_id]["data"].update(data)
+            return True
+        return False
 
-    def delete_entity(self, entity_id: int) -> None:
+    def delete_entity(self, entity_id: int) -> bool:
         if entity_id in self.graph["entities"]:
             del self.graph["entities"][entity_id]
+            for neighbour, _ in self.adjacency.pop(entity_id, ()):
+                if neighbour in self.adjacency:
+                    self.adjacency[neighbour] = [pair for pair in self.adjacency[neighbour] if pair[0] != entity_id]
             self.graph["relationships"] = [
                 relationship for relationship in self.graph["relationships"]
                 if relationship["from_id"] != entity_id and relationship["to_id"] != entity_id
             ]
+            return True
+        return False
 
     def add_relationship(self, data: Dict[str, Any]) -> None:
         self.graph["relationships"].append(data)
+        self._index_relationship(data)
+
+    def _index_relationship(self, relationship: Dict[str, Any]) -> None:
+        from_id, to_id = relationship.get("from_id"), relationship.get("to_id")
+        self.adjacency.setdefault(from_id, []).append((to_id, relationship))
+        self.adjacency.setdefault(to_id, []).append((from_id, relationship))
 
-    def search_entities(self, search_params: Dict[str, Any]) -> None:
+    def _path_expander(self):
+        return lambda entity_ids: {entity_id: self.adjacency.get(entity_id, ()) for entity_id in entity_ids}
+
+    def search_entities(self, search_params: Dict[str, Any]) -> List[Dict[str, Any]]:
         results = []
         for entity_id, entity_details in self.graph["entities"].items():
             entity_data = entity_details["data"]
@@ -68,9 +102,22 @@ class InMemoryDatabase(DatabaseIntegration):
                 for key, value in search_params.items()
             ):
                 results.append({"id": entity_id, "type": entity_details["type"], **entity_data})
+        return results
 
+    def search_entities_with_type(self, entity_type: str, search_params: Dict[str, Any]) -> List[Dict[str, Any]]:
+        results = []
+        for entity_id, entity_details in self.graph["entities"].items():
+            if entity_details["type"] != entity_type:
+                continue
+            entity_data = entity_details["data"]
+            if all(
+                str(value).lower() in str(entity_data.get(key, "")).lower()
+                for key, value in search_params.items()
+            ):
+                results.append({"id": entity_id, "type": entity_type, **entity_data})
+        return results
 
-    def search_relationships(self, search_params: Dict[str, Any]) -> None:
+    def search_relationships(self, search_params: Dict[str, Any]) -> List[Dict[str, Any]]:
         results = []
         for relationship in self.graph["relationships"]:
             if all(
@@ -78,3 +125,33 @@ class InMemoryDatabase(DatabaseIntegration):
                 for key, value in search_params.items()
             ):
                 results.append(relationship)
+        return results
+
+    def dump_graph(self) -> Tuple[List[tuple], List[tuple]]:
+        nodes = [
+            (entity_id, entity_details["type"], entity_details["data"])
+            for entity_id, entity_details in self.graph["entities"].items()
+        ]
+        edges = [
+            (
+                relationship.get("from_id"),
+                relationship.get("to_id"),
+                {key: value for key, value in relationship.items() if key not in ("from_id", "to_id")},
+            )
+            for relationship in self.graph["relationships"]
+        ]
+        return nodes, edges
+
+    def load_graph(self, nodes: List[tuple], edges: List[tuple]) -> Dict[str, int]:
+        # Imported ids are kept as they are, so the id counter is moved past the largest imported integer id.
+        global next_id
+        entities = self.graph["entities"]
+        for entity_id, entity_type, data in nodes:
+            entities[entity_id] = {"type": entity_type, "data": data}
+            if isinstance(entity_id, int) and entity_id >= next_id:
+                next_id = entity_id + 1
+        for from_id, to_id, properties in edges:
+            relationship = {"from_id": from_id, "to_id": to_id, **properties}
+            self.graph["relationships"].append(relationship)
+            self._index_relationship(relationship)
+        return {"entities": len(nodes), "relationships": len(edges)}
@@ -0,0 +1,303 @@
+# app/integrations/database/neo4j_async.py
+# Neo4j backend built on the async driver, selected with DATABASE_TYPE=neo4j_async.
+#
+# The driver runs on its own event loop in a background thread, so the backend keeps the synchronous
+# `DatabaseIntegration` interface used by the Flask views and integrations: every public method submits its coroutine
+# to that loop and waits for the result. Async callers can use the `a*` coroutines (e.g. `aget_full_graph`) through
+# `submit`, which returns a future without blocking.
+#
+# Compared to `Neo4jIntegration`:
+# - queries go through `driver.execute_query`, which reuses the driver's pooled sessions instead of opening one per
+#   call, and retries transient errors like managed transactions do,
+# - reads are sent with READ routing, so in a cluster (neo4j:// URIs) they are served by secondaries,
+# - independent reads run concurrently, e.g. nodes and relationships of the full graph on two connections,
+# - pool size and acquisition timeout come from NEO4J_MAX_POOL_SIZE and NEO4J_ACQUISITION_TIMEOUT (`driver_config`).
+#
+# Queries, row builders and result mapping are shared with `Neo4jIntegration`.
+
+import asyncio
+import logging
+import os
+import threading
+from neo4j import AsyncGraphDatabase, RoutingControl
+from neo4j.exceptions import Neo4jError
+from .neo4jdb import (
+    ADD_ENTITY_QUERY,
+    ADD_RELATIONSHIP_QUERY,
+    ALL_ENTITIES_QUERY,
+    CREATE_ENTITIES_QUERY,
+    CREATE_RELATIONSHIPS_QUERY,
+    DELETE_ENTITY_QUERY,
+    DUMP_NODES_QUERY,
+    DUMP_RELATIONSHIPS_QUERY,
+    GET_ENTITY_QUERY,
+    GRAPH_COUNTS_QUERY,
+    GRAPH_NODES_QUERY,
+    GRAPH_RELATIONSHIPS_QUERY,
+    LOAD_RELATIONSHIPS_QUERY,
+    NEO4J_DATABASE,
+    SCHEMA_STATEMENTS,
+    SNAPSHOT_BATCH_SIZE,
+    UPDATE_ENTITIES_QUERY,
+    UPDATE_ENTITY_QUERY,
+    Neo4jIntegration,
+    driver_config,
+)
+from .paths import DEFAULT_MAX_DEPTH, MAX_PATHS
+from typeid import TypeID
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncNeo4jIntegration(Neo4jIntegration):
+    def __init__(self):
+        self.uri = os.getenv("NEO4J_URI", "bolt://localhost:7687")
+        self.user = os.getenv("NEO4J_USER", "neo4j")
+        self.password = os.getenv("NEO4J_PASSWORD")
+        if not self.password:
+            raise ValueError("NEO4J_PASSWORD environment variable is not set")
+
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name="neo4j-async", daemon=True)
+        self.thread.start()
+        try:
+            self.driver = self.run(self._connect())
+            if os.getenv("NEO4J_BOOTSTRAP_SCHEMA", "true").lower() == "true":
+                self.ensure_schema()
+        except Exception:
+            self._stop_loop()
+            raise
+
+    async def _connect(self):
+        # The driver binds to the loop it is created on
+        driver = AsyncGraphDatabase.driver(self.uri, auth=(self.user, self.password), **driver_config())
+        try:
+            await driver.verify_connectivity()
+        except Exception:
+            await driver.close()
+            raise
+        return driver
+
+    def submit(self, coroutine):
+        # Schedules a coroutine on the driver loop, returns a concurrent.futures.Future
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop)
+
+    def run(self, coroutine):
+        if threading.current_thread() is self.thread:
+            coroutine.close()
+            raise RuntimeError("Blocking Neo4j calls cannot run on the driver loop, await the a* methods instead")
+        return self.submit(coroutine).result()
+
+    async def _read(self, query, params=None):
+        records, _, _ = await self.driver.execute_query(
+            query, params, routing_=RoutingControl.READ, database_=NEO4J_DATABASE
+        )
+        return records
+
+    async def _write(self, query, params=None):
+        records, _, _ = await self.driver.execute_query(
+            query, params, routing_=RoutingControl.WRITE, database_=NEO4J_DATABASE
+        )
+        return records
+
+    async def aensure_schema(self):
+        for statement in SCHEMA_STATEMENTS:
+            try:
+                await self._write(statement)
+            except Neo4jError as e:
+                logger.warning("Could not apply schema statement '%s': %s", statement, e)
+
+    def ensure_schema(self):
+        return self.run(self.aensure_schema())
+
+    async def aadd_entity(self, data):
+        entity_id = str(TypeID(prefix="entity"))
+        data["id"] = entity_id
+        await self._write(ADD_ENTITY_QUERY, {"props": data})
+        return entity_id
+
+    def add_entity(self, data):
+        return self.run(self.aadd_entity(data))
+
+    async def aadd_entities(self, entities):
+        rows = self._entity_rows(entities)
+        await self._write(CREATE_ENTITIES_QUERY, {"rows": rows})
+        return [row["id"] for row in rows]
+
+    def add_entities(self, entities):
+        return self.run(self.aadd_entities(entities))
+
+    async def aadd_relationships(self, relationships):
+        rows = self._relationship_rows(relationships)
+        records = await self._write(CREATE_RELATIONSHIPS_QUERY, {"rows": rows})
+        return records[0]["created"]
+
+    def add_relationships(self, relationships):
+        return self.run(self.aadd_relationships(relationships))
+
+    async def aupsert_graph(self, entities, relationships, entity_updates=()):
+        # Same contract as Neo4jIntegration.upsert_graph, in one managed transaction
+        refs = list(entities)
+        entity_rows = self._entity_rows(entities[ref] for ref in refs)
+        entity_ids = {ref: row["id"] for ref, row in zip(refs, entity_rows, strict=True)}
+        update_rows = self._update_rows(entity_updates)
+        relationship_rows = self._relationship_rows(relationships, entity_ids)
+
+        async def work(tx):
+            if entity_rows:
+                await (await tx.run(CREATE_ENTITIES_QUERY, rows=entity_rows)).consume()
+            updated = []
+            if update_rows:
+                result = await tx.run(UPDATE_ENTITIES_QUERY, rows=update_rows)
+                updated = [record["id"] async for record in result]
+            created = 0
+            if relationship_rows:
+                result = await tx.run(CREATE_RELATIONSHIPS_QUERY, rows=relationship_rows)
+                created = (await result.single())["created"]
+            return updated, created
+
+        async with self.driver.session(database=NEO4J_DATABASE) as session:
+            updated, created = await session.execute_write(work)
+
+        return {"entity_ids": entity_ids, "updated": updated, "relationships": created}
+
+    def upsert_graph(self, entities, relationships, entity_updates=()):
+        return self.run(self.aupsert_graph(entities, relationships, entity_updates))
+
+    async def aget_entity(self, entity_id):
+        records = await self._read(GET_ENTITY_QUERY, {"id": entity_id})
+        if records:
+            return dict(records[0]["n"])
+
+    def get_entity(self, entity_id):
+        return self.run(self.aget_entity(entity_id))
+
+    async def aget_entities(self, entity_ids):
+        # Looks entities up concurrently, each on its own pooled connection
+        return await asyncio.gather(*(self.aget_entity(entity_id) for entity_id in entity_ids))
+
+    def get_entities(self, entity_ids):
+        return self.run(self.aget_entities(entity_ids))
+
+    async def aget_all_entities(self):
+        return [dict(record["n"]) for record in await self._read(ALL_ENTITIES_QUERY)]
+
+    def get_all_entities(self):
+        return self.run(self.aget_all_entities())
+
+    async def aupdate_entity(self, entity_id, data):
+        records = await self._write(UPDATE_ENTITY_QUERY, {"id": entity_id, "props": data})
+        return bool(records)
+
+    def update_entity(self, entity_id, data):
+        return self.run(self.aupdate_entity(entity_id, data))
+
+    async def adelete_entity(self, entity_id):
+        _, summary, _ = await self.driver.execute_query(
+            DELETE_ENTITY_QUERY, {"id": entity_id}, routing_=RoutingControl.WRITE, database_=NEO4J_DATABASE
+        )
+        return summary.counters.nodes_deleted > 0
+
+    def delete_entity(self, entity_id):
+        return self.run(self.adelete_entity(entity_id))
+
+    async def aadd_relationship(self, data):
+        records = await self._write(ADD_RELATIONSHIP_QUERY, self._relationship_params(data))
+        return records[0]["relationship_id"]
+
+    def add_relationship(self, data):
+        return self.run(self.aadd_relationship(data))
+
+    async def aget_full_graph(self):
+        nodes, relationships = await asyncio.gather(
+            self._read(GRAPH_NODES_QUERY),
+            self._read(GRAPH_RELATIONSHIPS_QUERY),
+        )
+        return self._full_graph(nodes, relationships)
+
+    def get_full_graph(self):
+        return self.run(self.aget_full_graph())
+
+    async def agraph_counts(self):
+        record = (await self._read(GRAPH_COUNTS_QUERY))[0]
+        return {"entities": record["entities"], "relationships": record["relationships"]}
+
+    def graph_counts(self):
+        return self.run(self.agraph_counts())
+
+    async def asearch_entities(self, search_params):
+        query, params = self._search_entities_query(search_params)
+        return [dict(record["n"]) for record in await self._read(query, params)]
+
+    def search_entities(self, search_params):
+        return self.run(self.asearch_entities(search_params))
+
+    async def asearch_entities_with_type(self, entity_type, search_params):
+        query, params = self._search_entities_query(search_params, entity_type)
+        return [dict(record["n"]) for record in await self._read(query, params)]
+
+    def search_entities_with_type(self, entity_type, search_params):
+        return self.run(self.asearch_entities_with_type(entity_type, search_params))
+
+    async def asearch_relationships(self, search_params):
+        query, params = self._search_relationships_query(search_params)
+        return [dict(record) for record in await self._read(query, params)]
+
+    def search_relationships(self, search_params):
+        return self.run(self.asearch_relationships(search_params))
+
+    async def ak_shortest_paths(self, from_id, to_id, k=3, max_depth=DEFAULT_MAX_DEPTH, relationship_types=None):
+        query, params = self._path_query(from_id, to_id, min(k, MAX_PATHS), max_depth, relationship_types)
+        return [self._path_record(record) for record in await self._read(query, params)]
+
+    def k_shortest_paths(self, from_id, to_id, k=3, max_depth=DEFAULT_MAX_DEPTH, relationship_types=None):
+        paths = self._trivial_paths(from_id, to_id, max_depth)
+        if paths is not None:
+            return paths
+        return self.run(self.ak_shortest_paths(from_id, to_id, k, max_depth, relationship_types))
+
+    async def adump_graph(self):
+        nodes, edges = await asyncio.gather(
+            self._read(DUMP_NODES_QUERY),
+            self._read(DUMP_RELATIONSHIPS_QUERY),
+        )
+        return self._snapshot_nodes(nodes), self._snapshot_edges(edges)
+
+    def dump_graph(self):
+        return self.run(self.adump_graph())
+
+    async def aload_graph(self, nodes, edges):
+        node_rows, relationship_rows = self._load_rows(nodes, edges)
+
+        async def write_batches(query, rows):
+            async with self.driver.session(database=NEO4J_DATABASE) as session:
+                for start in range(0, len(rows), SNAPSHOT_BATCH_SIZE):
+                    batch = rows[start:start + SNAPSHOT_BATCH_SIZE]
+
+                    async def work(tx, batch=batch):
+                        await (await tx.run(query, rows=batch)).consume()
+
+                    await session.execute_write(work)
+
+        # Relationships match their endpoints, so all entities are written first
+        await write_batches(CREATE_ENTITIES_QUERY, node_rows)
+        await write_batches(LOAD_RELATIONSHIPS_QUERY, relationship_rows)
+        return {"entities": len(node_rows), "relationships": len(relationship_rows)}
+
+    def load_graph(self, nodes, edges):
+        return self.run(self.aload_graph(nodes, edges))
+
+    def _stop_loop(self):
+        # The default executor resolves host names for the driver
+        self.submit(self.loop.shutdown_default_executor()).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+
+    def close(self):
+        self.run(self.driver.close())
+        self._stop_loop()
+
+
+def register(integration_manager):
+    integration_manager.register_lazy('neo4j_async', AsyncNeo4jIntegration)
@@ -1,8 +1,129 @@
 # app/integrations/database/neo4j.py
+import logging
 import os
+import re
 from neo4j import GraphDatabase
+from neo4j.exceptions import Neo4jError
 from typeid import TypeID
 from .base import DatabaseIntegration
+from .paths import DEFAULT_MAX_DEPTH, MAX_PATHS
+
+logger = logging.getLogger(__name__)
+
+# Number of rows written per transaction when importing a snapshot
+SNAPSHOT_BATCH_SIZE = int(os.getenv("NEO4J_SNAPSHOT_BATCH_SIZE", "5000"))
+# Managed transactions (execute_write) are retried on transient errors for up to this many seconds
+MAX_TRANSACTION_RETRY_TIME = float(os.getenv("NEO4J_MAX_RETRY_TIME", "30"))
+# Connections kept open per server, and how long a query waits for one before failing
+MAX_CONNECTION_POOL_SIZE = int(os.getenv("NEO4J_MAX_POOL_SIZE", "100"))
+CONNECTION_ACQUISITION_TIMEOUT = float(os.getenv("NEO4J_ACQUISITION_TIMEOUT", "60"))
+# Database queries run against, None lets the server pick its default database
+NEO4J_DATABASE = os.getenv("NEO4J_DATABASE") or None
+
+# Indexes and constraints created at startup, all statements are idempotent
+ENTITY_FULLTEXT_INDEX = "entity_names"
+ENTITY_FULLTEXT_PROPERTIES = ("name", "title", "alias")
+RELATIONSHIP_FULLTEXT_INDEX = "relationship_snippets"
+RELATIONSHIP_FULLTEXT_PROPERTIES = ("snippet",)
+SCHEMA_STATEMENTS = [
+    "CREATE CONSTRAINT entity_id_unique IF NOT EXISTS FOR (n:Entity) REQUIRE n.id IS UNIQUE",
+    "CREATE RANGE INDEX entity_type IF NOT EXISTS FOR (n:Entity) ON (n.type)",
+    f"CREATE FULLTEXT INDEX {ENTITY_FULLTEXT_INDEX} IF NOT EXISTS FOR (n:Entity) "
+    f"ON EACH [{', '.join(f'n.{name}' for name in ENTITY_FULLTEXT_PROPERTIES)}]",
+    f"CREATE FULLTEXT INDEX {RELATIONSHIP_FULLTEXT_INDEX} IF NOT EXISTS FOR ()-[r:RELATED]-() "
+    f"ON EACH [{', '.join(f'r.{name}' for name in RELATIONSHIP_FULLTEXT_PROPERTIES)}]",
+]
+
+ADD_ENTITY_QUERY = (
+    "CREATE (n:Entity $props) "
+    "RETURN n.id AS id"
+)
+GET_ENTITY_QUERY = (
+    "MATCH (n:Entity {id: $id}) "
+    "RETURN n"
+)
+ALL_ENTITIES_QUERY = "MATCH (n:Entity) RETURN n"
+UPDATE_ENTITY_QUERY = (
+    "MATCH (n:Entity {id: $id}) "
+    "SET n += $props "
+    "RETURN n.id AS id"
+)
+DELETE_ENTITY_QUERY = (
+    "MATCH (n:Entity {id: $id}) "
+    "DETACH DELETE n"
+)
+ADD_RELATIONSHIP_QUERY = (
+    "MATCH (a:Entity {id: $from_id}), (b:Entity {id: $to_id}) "
+    "CREATE (a)-[r:RELATED {type: $relationship, snippet: $snippet, source_documents: $source_documents}]->(b) "
+    "RETURN id(r) AS relationship_id"
+)
+GRAPH_NODES_QUERY = "MATCH (n:Entity) RETURN n"
+GRAPH_RELATIONSHIPS_QUERY = "MATCH (a:Entity)-[r]->(b:Entity) RETURN a.id AS from_id, b.id AS to_id, type(r) AS relationship, r.snippet AS snippet"
+# Both counts come from the count store, without reading the graph
+GRAPH_COUNTS_QUERY = (
+    "CALL { MATCH (n:Entity) RETURN count(n) AS entities } "
+    "CALL { MATCH (:Entity)-[r]->() RETURN count(r) AS relationships } "
+    "RETURN entities, relationships"
+)
+DUMP_NODES_QUERY = "MATCH (n:Entity) RETURN n.id AS id, properties(n) AS props"
+DUMP_RELATIONSHIPS_QUERY = (
+    "MATCH (a:Entity)-[r]->(b:Entity) "
+    "RETURN a.id AS from_id, b.id AS to_id, properties(r) AS props"
+)
+LOAD_RELATIONSHIPS_QUERY = (
+    "UNWIND $rows AS row "
+    "MATCH (a:Entity {id: row.from_id}), (b:Entity {id: row.to_id}) "
+    "CREATE (a)-[r:RELATED]->(b) SET r = row.props"
+)
+# Paths follow relationships in both directions. Depth bounds and k cannot be parameters, they are formatted in.
+SHORTEST_PATH_QUERY = (
+    "MATCH (a:Entity {{id: $from_id}}), (b:Entity {{id: $to_id}}) "
+    "MATCH p = shortestPath((a)-[*..{max_depth}]-(b)) "
+    "WHERE $types IS NULL OR all(r IN relationships(p) WHERE r.type IN $types) "
+)
+# SHORTEST k needs Neo4j 5.21 or later
+K_SHORTEST_PATHS_QUERY = (
+    "MATCH p = SHORTEST {k} (a:Entity {{id: $from_id}}) "
+    "(()-[r]-() WHERE $types IS NULL OR r.type IN $types){{1,{max_depth}}} "
+    "(b:Entity {{id: $to_id}}) "
+)
+PATH_RETURN = (
+    "RETURN [n IN nodes(p) | properties(n)] AS entities, "
+    "[r IN relationships(p) | {from_id: startNode(r).id, to_id: endNode(r).id, props: properties(r)}] AS relationships"
+)
+
+CREATE_ENTITIES_QUERY = (
+    "UNWIND $rows AS row "
+    "CREATE (n:Entity) SET n = row"
+)
+UPDATE_ENTITIES_QUERY = (
+    "UNWIND $rows AS row "
+    "MATCH (n:Entity {id: row.id}) "
+    "SET n += row.props, "
+    "n.source_documents = coalesce(n.source_documents, []) + "
+    "[d IN row.source_documents WHERE NOT d IN coalesce(n.source_documents, [])] "
+    "RETURN n.id AS id"
+)
+CREATE_RELATIONSHIPS_QUERY = (
+    "UNWIND $rows AS row "
+    "MATCH (a:Entity {id: row.from_id}), (b:Entity {id: row.to_id}) "
+    "CREATE (a)-[r:RELATED]->(b) SET r = row.props "
+    "RETURN count(r) AS created"
+)
+
+def driver_config():
+    # Keyword arguments shared by the sync and async drivers
+    return {
+        "max_connection_pool_size": MAX_CONNECTION_POOL_SIZE,
+        "connection_acquisition_timeout": CONNECTION_ACQUISITION_TIMEOUT,
+        "max_transaction_retry_time": MAX_TRANSACTION_RETRY_TIME,
+    }
+
+
+def _fulltext_terms(value):
+    # Words of a search value as lowercase Lucene prefix terms, word characters need no escaping
+    return re.findall(r"\w+", str(value).lower())
+
 
 class Neo4jIntegration(DatabaseIntegration):
     def __init__(self):
@@ -12,117 +133,337 @@ class Neo4jIntegration(DatabaseIntegration):
         if not self.password:
             raise ValueError("NEO4J_PASSWORD environment variable is not set")
         
-        self.driver = GraphDatabase.driver(self.uri, auth=(self.user, self.password))
+        self.driver = GraphDatabase.driver(self.uri, auth=(self.user, self.password), **driver_config())
         self.driver.verify_connectivity()
+        if os.getenv("NEO4J_BOOTSTRAP_SCHEMA", "true").lower() == "true":
+            self.ensure_schema()
+
+    def ensure_schema(self):
+        with self.driver.session(database=NEO4J_DATABASE) as session:
+            for statement in SCHEMA_STATEMENTS:
+                try:
+                    session.run(statement).consume()
+                except Neo4jError as e:
+                    # e.g. duplicate ids in an existing graph prevent the uniqueness constraint
+                    logger.warning("Could not apply schema statement '%s': %s", statement, e)
 
     def add_entity(self, data):
         type_id = TypeID(prefix="entity")
         entity_id = str(type_id)
         data["id"] = entity_id
 
-        query = (
-            "CREATE (n:Entity $props) "
-            "RETURN n.id AS id"
-        )
-
-        with self.driver.session() as session:
-            result = session.run(query, props=data)
+        with self.driver.session(database=NEO4J_DATABASE) as session:
+            result = session.run(ADD_ENTITY_QUERY, props=data)
             result.single()
+        return entity_id
 
-    def get_entity(self, entity_id):
-        query = (
-            "MATCH (n:Entity {id: $id}) "
-            "RETURN n"
-        )
+    def _entity_rows(self, entities):
+        rows = []
+        for data in entities:
+            row = dict(data)
+            row["id"] = str(TypeID(prefix="entity"))
+            rows.append(row)
+        return rows
+
+    def _relationship_rows(self, relationships, refs=None):
+        # Endpoints are given by id, or by `from_ref`/`to_ref` pointing at entities created in the same batch
+        refs = refs or {}
+        rows = []
+        for data in relationships:
+            from_id = refs[data["from_ref"]] if "from_ref" in data else data["from_id"]
+            to_id = refs[data["to_ref"]] if "to_ref" in data else data["to_id"]
+            props = {
+                "type": data["relationship"],
+                "snippet": data.get("snippet", ""),
+                "source_documents": data.get("source_documents", []),
+            }
+            rows.append({"from_id": from_id, "to_id": to_id, "props": props})
+        return rows
+
+    def _update_rows(self, entity_updates):
+        rows = []
+        for data in entity_updates:
+            props = {key: value for key, value in data.items() if key not in ("id", "source_documents")}
+            rows.append({"id": data["id"], "props": props, "source_documents": data.get("source_documents", [])})
+        return rows
 
-        with self.driver.session() as session:
-            result = session.run(query, id=entity_id)
+    def add_entities(self, entities):
+        rows = self._entity_rows(entities)
+
+        with self.driver.session(database=NEO4J_DATABASE) as session:
+            session.execute_write(lambda tx: tx.run(CREATE_ENTITIES_QUERY, rows=rows).consume())
+        return [row["id"] for row in rows]
+
+    def add_relationships(self, relationships):
+        rows = self._relationship_rows(relationships)
+
+        with self.driver.session(database=NEO4J_DATABASE) as session:
+            return session.execute_write(lambda tx: tx.run(CREATE_RELATIONSHIPS_QUERY, rows=rows).single()["created"])
+
+    def upsert_graph(self, entities, relationships, entity_updates=()):
+        # Writes an extracted graph in one managed transaction:
+        # - `entities` maps a caller reference to the properties of a new entity,
+        # - `entity_updates` sets properties on existing entities, `source_documents` is appended to, not replaced,
+        # - `relationships` are created between existing entities (`from_id`/`to_id`) or new ones (`from_ref`/`to_ref`).
+        # Ids are generated before the transaction so a retried transaction writes the same graph.
+        refs = list(entities)
+        entity_rows = self._entity_rows(entities[ref] for ref in refs)
+        entity_ids = {ref: row["id"] for ref, row in zip(refs, entity_rows, strict=True)}
+        update_rows = self._update_rows(entity_updates)
+        relationship_rows = self._relationship_rows(relationships, entity_ids)
+
+        def work(tx):
+            if entity_rows:
+                tx.run(CREATE_ENTITIES_QUERY, rows=entity_rows).consume()
+            updated = []
+            if update_rows:
+                updated = [record["id"] for record in tx.run(UPDATE_ENTITIES_QUERY, rows=update_rows)]
+            created = 0
+            if relationship_rows:
+                created = tx.run(CREATE_RELATIONSHIPS_QUERY, rows=relationship_rows).single()["created"]
+            return updated, created
+
+        with self.driver.session(database=NEO4J_DATABASE) as session:
+            updated, created = session.execute_write(work)
+
+        return {"entity_ids": entity_ids, "updated": updated, "relationships": created}
+
+    def get_entity(self, entity_id):
+        with self.driver.session(database=NEO4J_DATABASE) as session:
+            result = session.run(GET_ENTITY_QUERY, id=entity_id)
             record = result.single()
             if record:
                 return dict(record["n"])
 
-    def update_entity(self, entity_id, data):
-        query = (
-            "MATCH (n:Entity {id: $id}) "
-            "SET n += $props "
-            "RETURN n.id AS id"
-        )
+    def get_all_entities(self):
+        with self.driver.session(database=NEO4J_DATABASE) as session:
+            return [dict(record["n"]) for record in session.run(ALL_ENTITIES_QUERY)]
 
-        with self.driver.session() as session:
-            result = session.run(query, id=entity_id, props=data)
+    def update_entity(self, entity_id, data):
+        with self.driver.session(database=NEO4J_DATABASE) as session:
+            result = session.run(UPDATE_ENTITY_QUERY, id=entity_id, props=data)
             return result.single() is not None
 
     def delete_entity(self, entity_id):
-        query = (
-            "MATCH (n:Entity {id: $id}) "
-            "DETACH DELETE n"
-        )
-
-        with self.driver.session() as session:
-            result = session.run(query, id=entity_id)
+        with self.driver.session(database=NEO4J_DATABASE) as session:
+            result = session.run(DELETE_ENTITY_QUERY, id=entity_id)
             return result.consume().counters.nodes_deleted > 0
 
     def add_relationship(self, data):
-        query = (
-            "MATCH (a:Entity {id: $from_id}), (b:Entity {id: $to_id}) "
-            "CREATE (a)-[r:RELATED {type: $relationship, snippet: $snippet}]->(b) "
-            "RETURN id(r) AS relationship_id"
-        )
-
-        with self.driver.session() as session:
-            result = session.run(query, 
-                                 from_id=data["from_id"],
-                                 to_id=data["to_id"],
-                                 relationship=data["relationship"],
-                                 snippet=data.get("snippet", ""))
+        with self.driver.session(database=NEO4J_DATABASE) as session:
+            result = session.run(ADD_RELATIONSHIP_QUERY, self._relationship_params(data))
             return result.single()["relationship_id"]
 
-    def get_full_graph(self):
-        nodes_query = "MATCH (n:Entity) RETURN n"
-        relationships_query = "MATCH (a:Entity)-[r]->(b:Entity) RETURN a.id AS from_id, b.id AS to_id, type(r) AS relationship, r.snippet AS snippet"
-
-        with self.driver.session() as session:
-            nodes = session.run(nodes_query)
-            relationships = session.run(relationships_query)
-
-            entities = {}
-            for record in nodes:
-                node = record["n"]
-                entities[node["id"]] = dict(node)
-
-            relationships_list = [
-                {
-                    "from_id": rel["from_id"],
-                    "to_id": rel["to_id"],
-                    "relationship": rel["relationship"],
-                    "snippet": rel["snippet"]
-                }
-                for rel in relationships
-            ]
+    def _relationship_params(self, data):
+        return {
+            "from_id": data["from_id"],
+            "to_id": data["to_id"],
+            "relationship": data["relationship"],
+            "snippet": data.get("snippet", ""),
+            "source_documents": data.get("source_documents", []),
+        }
+
+    def _full_graph(self, nodes, relationships):
+        entities = {}
+        for record in nodes:
+            node = record["n"]
+            entities[node["id"]] = dict(node)
+
+        relationships_list = [
+            {
+                "from_id": rel["from_id"],
+                "to_id": rel["to_id"],
+                "relationship": rel["relationship"],
+                "snippet": rel["snippet"]
+            }
+            for rel in relationships
+        ]
 
         return {
             "entities": entities,
             "relationships": relationships_list
         }
 
+    def get_full_graph(self):
+        with self.driver.session(database=NEO4J_DATABASE) as session:
+            nodes = session.run(GRAPH_NODES_QUERY)
+            relationships = session.run(GRAPH_RELATIONSHIPS_QUERY)
+            return self._full_graph(nodes, relationships)
+
+    def graph_counts(self):
+        with self.driver.session(database=NEO4J_DATABASE) as session:
+            record = session.run(GRAPH_COUNTS_QUERY).single()
+            return {"entities": record["entities"], "relationships": record["relationships"]}
+
+    def _search_entities_query(self, search_params, entity_type=None):
+        # Name-like properties go through the full-text index (words are matched by prefix, case insensitive),
+        # the type through the range index and anything else through a CONTAINS filter
+        params = {"props": search_params}
+        fulltext_terms = []
+        conditions = []
+        for key, value in search_params.items():
+            terms = _fulltext_terms(value) if key in ENTITY_FULLTEXT_PROPERTIES else []
+            if terms:
+                fulltext_terms.extend(f"{key}:{term}*" for term in terms)
+            else:
+                conditions.append(f"n.{key} CONTAINS $props.{key}")
+        if entity_type is not None:
+            conditions.append("n.type = $type")
+            params["type"] = entity_type
+
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+        if fulltext_terms:
+            params["query"] = " AND ".join(fulltext_terms)
+            query = f"CALL db.index.fulltext.queryNodes('{ENTITY_FULLTEXT_INDEX}', $query) YIELD node AS n{where} RETURN n"
+        else:
+            query = f"MATCH (n:Entity){where} RETURN n"
+        return query, params
+
     def search_entities(self, search_params):
-        conditions = " AND ".join([f"n.{key} CONTAINS $props.{key}" for key in search_params.keys()])
-        query = f"MATCH (n:Entity) WHERE {conditions} RETURN n"
+        query, params = self._search_entities_query(search_params)
 
-        with self.driver.session() as session:
-            result = session.run(query, props=search_params)
+        with self.driver.session(database=NEO4J_DATABASE) as session:
+            result = session.run(query, params)
             return [dict(record["n"]) for record in result]
 
+    def search_entities_with_type(self, entity_type, search_params):
+        query, params = self._search_entities_query(search_params, entity_type)
+
+        with self.driver.session(database=NEO4J_DATABASE) as session:
+            result = session.run(query, params)
+            return [dict(record["n"]) for record in result]
+
+    def _search_relationships_query(self, search_params):
+        # Endpoint ids are looked up through the uniqueness constraint, snippets through the full-text index
+        params = {"props": search_params}
+        fulltext_terms = []
+        conditions = []
+        for key, value in search_params.items():
+            terms = _fulltext_terms(value) if key in RELATIONSHIP_FULLTEXT_PROPERTIES else []
+            if key == "from_id":
+                conditions.append("a.id = $props.from_id")
+            elif key == "to_id":
+                conditions.append("b.id = $props.to_id")
+            elif key == "relationship":
+                # The relationship label is stored in the `type` property
+                conditions.append("r.type CONTAINS $props.relationship")
+            elif terms:
+                fulltext_terms.extend(f"{key}:{term}*" for term in terms)
+            else:
+                conditions.append(f"r.{key} CONTAINS $props.{key}")
+
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+        returns = (
+            " RETURN a.id AS from_id, b.id AS to_id, coalesce(r.type, type(r)) AS relationship, r.snippet AS snippet"
+        )
+        if fulltext_terms:
+            params["query"] = " AND ".join(fulltext_terms)
+            query = (
+                f"CALL db.index.fulltext.queryRelationships('{RELATIONSHIP_FULLTEXT_INDEX}', $query) "
+                f"YIELD relationship AS r "
+                f"MATCH (a:Entity)-[r]->(b:Entity){where}{returns}"
+            )
+        else:
+            query = f"MATCH (a:Entity)-[r]->(b:Entity){where}{returns}"
+        return query, params
+
     def search_relationships(self, search_params):
-        conditions = " AND ".join([f"r.{key} CONTAINS $props.{key}" for key in search_params.keys()])
-        query = f"MATCH (a:Entity)-[r]->(b:Entity) WHERE {conditions} RETURN a.id AS from_id, b.id AS to_id, type(r) AS relationship, r.snippet AS snippet"
+        query, params = self._search_relationships_query(search_params)
 
-        with self.driver.session() as session:
-            result = session.run(query, props=search_params)
+        with self.driver.session(database=NEO4J_DATABASE) as session:
+            result = session.run(query, params)
             return [dict(record) for record in result]
 
+    def _snapshot_nodes(self, records):
+        nodes = []
+        for record in records:
+            props = dict(record["props"])
+            props.pop("id", None)
+            nodes.append((record["id"], props.get("type"), props))
+        return nodes
+
+    def _snapshot_edges(self, records):
+        edges = []
+        for record in records:
+            props = dict(record["props"])
+            # Relationships keep their label in a `type` property, snapshots use the `relationship` key
+            if "type" in props:
+                props["relationship"] = props.pop("type")
+            edges.append((record["from_id"], record["to_id"], props))
+        return edges
+
+    def _path_query(self, from_id, to_id, k, max_depth, relationship_types):
+        if k == 1:
+            query = SHORTEST_PATH_QUERY.format(max_depth=int(max_depth))
+        else:
+            query = K_SHORTEST_PATHS_QUERY.format(k=int(k), max_depth=int(max_depth))
+        params = {"from_id": from_id, "to_id": to_id, "types": list(relationship_types) if relationship_types else None}
+        return query + PATH_RETURN, params
+
+    def _path_record(self, record):
+        relationships = []
+        for relationship in record["relationships"]:
+            props = dict(relationship["props"])
+            if "type" in props:
+                props["relationship"] = props.pop("type")
+            relationships.append({"from_id": relationship["from_id"], "to_id": relationship["to_id"], **props})
+        return {"length": len(relationships), "entities": record["entities"], "relationships": relationships}
+
+    def _trivial_paths(self, from_id, to_id, max_depth):
+        # shortestPath rejects equal endpoints, None when the query has to run
+        if max_depth < 1 and from_id != to_id:
+            return []
+        if from_id == to_id:
+            entity = self.get_entity(from_id)
+            return [{"length": 0, "entities": [entity], "relationships": []}] if entity else []
+        return None
+
+    def k_shortest_paths(self, from_id, to_id, k=3, max_depth=DEFAULT_MAX_DEPTH, relationship_types=None):
+        paths = self._trivial_paths(from_id, to_id, max_depth)
+        if paths is not None:
+            return paths
+        query, params = self._path_query(from_id, to_id, min(k, MAX_PATHS), max_depth, relationship_types)
+        with self.driver.session(database=NEO4J_DATABASE) as session:
+            return [self._path_record(record) for record in session.run(query, params)]
+
+    def dump_graph(self):
+        with self.driver.session(database=NEO4J_DATABASE) as session:
+            nodes = self._snapshot_nodes(session.run(DUMP_NODES_QUERY))
+            edges = self._snapshot_edges(session.run(DUMP_RELATIONSHIPS_QUERY))
+
+        return nodes, edges
+
+    def _load_rows(self, nodes, edges):
+        node_rows = []
+        for node_id, node_type, props in nodes:
+            row = dict(props, id=node_id)
+            if node_type is not None:
+                row.setdefault("type", node_type)
+            node_rows.append(row)
+
+        relationship_rows = []
+        for from_id, to_id, props in edges:
+            props = dict(props)
+            if "relationship" in props:
+                props["type"] = props.pop("relationship")
+            relationship_rows.append({"from_id": from_id, "to_id": to_id, "props": props})
+        return node_rows, relationship_rows
+
+    def load_graph(self, nodes, edges):
+        node_rows, relationship_rows = self._load_rows(nodes, edges)
+
+        with self.driver.session(database=NEO4J_DATABASE) as session:
+            for start in range(0, len(node_rows), SNAPSHOT_BATCH_SIZE):
+                batch = node_rows[start:start + SNAPSHOT_BATCH_SIZE]
+                session.execute_write(lambda tx, rows=batch: tx.run(CREATE_ENTITIES_QUERY, rows=rows).consume())
+            for start in range(0, len(relationship_rows), SNAPSHOT_BATCH_SIZE):
+                batch = relationship_rows[start:start + SNAPSHOT_BATCH_SIZE]
+                session.execute_write(lambda tx, rows=batch: tx.run(LOAD_RELATIONSHIPS_QUERY, rows=rows).consume())
+
+        return {"entities": len(node_rows), "relationships": len(relationship_rows)}
+
     def close(self):
         self.driver.close()
 
 def register(integration_manager):
-    integration_manager.register('neo4j', Neo4jIntegration())
\ No newline at end of file
+    integration_manager.register_lazy('neo4j', Neo4jIntegration)
\ No newline at end of file
@@ -0,0 +1,139 @@
+# Path finding between two entities, shared by the backends that search paths in Python.
+#
+# Relationships are followed in both directions, a path is a sequence of distinct entities from the start to the end
+# entity with one relationship between each pair of consecutive entities (parallel relationships between the same pair
+# do not make distinct paths, the first one found is used).
+#
+# Backends give the graph through an `expand(entity_ids)` function, returning for each entity id the list of its
+# `(neighbour_id, relationship)` pairs. It receives a whole BFS frontier at once, so backends backed by a store can
+# fetch a level with one query.
+#
+# - `bidirectional_bfs` grows one BFS from each end, always the smaller frontier, until they meet. It visits about
+#   2 * b^(d/2) entities instead of b^d for a one sided BFS of a path of length d with branching factor b.
+# - `k_shortest_paths` is Yen's algorithm on top of it: every next path is the shortest deviation from the paths
+#   already found, so paths come by increasing length.
+# Both stop at `max_depth` relationships and, when `relationship_types` is given, only follow relationships whose
+# `relationship` (or `type`) is in it.
+
+import heapq
+import itertools
+import os
+
+DEFAULT_MAX_DEPTH = int(os.getenv("PATH_MAX_DEPTH", "6"))
+MAX_PATHS = 10
+
+
+def relationship_type(relationship):
+    return relationship.get("relationship") or relationship.get("type")
+
+
+def relationship_filter(relationship_types):
+    if not relationship_types:
+        return None
+    allowed = set(relationship_types)
+    return lambda relationship: relationship_type(relationship) in allowed
+
+
+def _join(parents_forward, parents_backward, meeting):
+    nodes = []
+    relationships = []
+    node = meeting
+    while parents_forward[node] is not None:
+        previous, relationship = parents_forward[node]
+        nodes.append(node)
+        relationships.append(relationship)
+        node = previous
+    nodes.append(node)
+    nodes.reverse()
+    relationships.reverse()
+    node = meeting
+    while parents_backward[node] is not None:
+        following, relationship = parents_backward[node]
+        nodes.append(following)
+        relationships.append(relationship)
+        node = following
+    return nodes, relationships
+
+
+def bidirectional_bfs(expand, source, target, max_depth=DEFAULT_MAX_DEPTH, accept=None,
+                      blocked_nodes=(), blocked_edges=()):
+    # Shortest path as (entity ids, relationships), or None. `blocked_edges` holds (from, to) pairs in the order the
+    # path would go through them.
+    if source == target:
+        return [source], []
+    parents = ({source: None}, {target: None})
+    distances = ({source: 0}, {target: 0})
+    frontiers = ([source], [target])
+    depth = 0
+    while frontiers[0] and frontiers[1] and depth < max_depth:
+        side = 0 if len(frontiers[0]) <= len(frontiers[1]) else 1
+        own_parents, own_distances = parents[side], distances[side]
+        other_distances = distances[1 - side]
+        neighbours = expand(frontiers[side])
+        next_frontier = []
+        best = None
+        for node in frontiers[side]:
+            for neighbour, relationship in neighbours.get(node, ()):
+                if neighbour in own_parents or neighbour in blocked_nodes:
+                    continue
+                edge = (node, neighbour) if side == 0 else (neighbour, node)
+                if edge in blocked_edges or (accept is not None and not accept(relationship)):
+                    continue
+                own_parents[neighbour] = (node, relationship)
+                own_distances[neighbour] = own_distances[node] + 1
+                next_frontier.append(neighbour)
+                if neighbour in other_distances:
+                    length = own_distances[neighbour] + other_distances[neighbour]
+                    if length <= max_depth and (best is None or length < best[0]):
+                        best = (length, neighbour)
+        # The first level where both searches meet holds the shortest paths, the shortest meeting point wins
+        if best is not None:
+            return _join(parents[0], parents[1], best[1])
+        frontiers = (next_frontier, frontiers[1]) if side == 0 else (frontiers[0], next_frontier)
+        depth += 1
+    return None
+
+
+def k_shortest_paths(expand, source, target, k=3, max_depth=DEFAULT_MAX_DEPTH, accept=None):
+    first = bidirectional_bfs(expand, source, target, max_depth, accept)
+    if first is None:
+        return []
+    paths = [first]
+    seen = {tuple(first[0])}
+    candidates = []
+    counter = itertools.count()
+    while len(paths) < k:
+        last_nodes, last_relationships = paths[-1]
+        for index in range(len(last_nodes) - 1):
+            spur = last_nodes[index]
+            root_nodes = last_nodes[:index + 1]
+            # Edges leaving the spur entity on the paths sharing this root, and the root entities, are taken out
+            blocked_edges = {
+                (nodes[index], nodes[index + 1]) for nodes, _ in paths
+                if len(nodes) > index + 1 and nodes[:index + 1] == root_nodes
+            }
+            spur_path = bidirectional_bfs(
+                expand, spur, target, max_depth - index, accept, set(root_nodes[:-1]), blocked_edges
+            )
+            if spur_path is None:
+                continue
+            nodes = root_nodes[:-1] + spur_path[0]
+            if tuple(nodes) in seen:
+                continue
+            seen.add(tuple(nodes))
+            relationships = last_relationships[:index] + spur_path[1]
+            heapq.heappush(candidates, (len(relationships), next(counter), (nodes, relationships)))
+        if not candidates:
+            break
+        paths.append(heapq.heappop(candidates)[2])
+    return paths
+
+
+def adjacency_from_edges(edges):
+    # Both directions of every relationship of a `dump_graph()` edge list, for backends without an index of their own
+    adjacency = {}
+    for from_id, to_id, properties in edges:
+        relationship = {"from_id": from_id, "to_id": to_id, **properties}
+        adjacency.setdefault(from_id, []).append((to_id, relationship))
+        adjacency.setdefault(to_id, []).append((from_id, relationship))
+    return adjacency
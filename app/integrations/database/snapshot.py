@@ -0,0 +1,318 @@
+# Binary graph snapshots used for backups, warm starts and moving a graph between database backends.
+#
+# A snapshot is backend neutral. Backends hand over their graph as two lists through `dump_graph`:
+# - nodes: (node_id, node_type, properties) tuples
+# - edges: (from_id, to_id, properties) tuples
+# and receive the same shape back in `load_graph`.
+#
+# File layout: a fixed header (magic, format version, compression codec) followed by the body, which is
+# optionally compressed as a whole. The body is made of:
+# - a string table. Every property key and every short string value is stored once and referenced by index.
+# - the id column. Node ids are replaced by their dense position in this column, so edges reference nodes
+#   with small varints. Integer ids are stored as zigzag varint deltas, anything else as tagged values.
+#   Edge endpoints that do not belong to any node are appended after the nodes so edges always resolve.
+# - the node blocks: one column of type references, one column of property rows.
+# - the edge blocks: a column of source positions, a column of target positions and a column of property rows.
+#
+# All integers are LEB128 varints, signed integers are zigzag encoded first.
+
+import bz2
+import lzma
+import struct
+import zlib
+
+MAGIC = b"KGSNAP"
+VERSION = 1
+
+CODECS = {
+    "none": 0,
+    "zlib": 1,
+    "lzma": 2,
+    "bz2": 3,
+}
+_CODEC_NAMES = {code: name for name, code in CODECS.items()}
+
+# Strings up to this length are interned in the string table, longer ones are written inline.
+INTERN_MAX_LENGTH = 64
+
+_ID_KIND_INT = 0
+_ID_KIND_TAGGED = 1
+
+_TAG_NONE = 0
+_TAG_FALSE = 1
+_TAG_TRUE = 2
+_TAG_INT = 3
+_TAG_FLOAT = 4
+_TAG_STR = 5
+_TAG_STR_REF = 6
+_TAG_LIST = 7
+_TAG_DICT = 8
+
+_DOUBLE = struct.Struct("<d")
+
+
+class SnapshotError(ValueError):
+    pass
+
+
+def _compress(body, codec):
+    if codec == "none":
+        return body
+    if codec == "zlib":
+        return zlib.compress(body, 6)
+    if codec == "lzma":
+        return lzma.compress(body)
+    if codec == "bz2":
+        return bz2.compress(body)
+    raise SnapshotError(f"Unknown compression codec '{codec}'")
+
+
+def _decompress(body, codec):
+    if codec == "none":
+        return body
+    if codec == "zlib":
+        return zlib.decompress(body)
+    if codec == "lzma":
+        return lzma.decompress(body)
+    if codec == "bz2":
+        return bz2.decompress(body)
+    raise SnapshotError(f"Unknown compression codec '{codec}'")
+
+
+class _Writer:
+    def __init__(self):
+        self.buffer = bytearray()
+        self.strings = {}
+
+    def intern(self, value):
+        index = self.strings.get(value)
+        if index is None:
+            index = self.strings[value] = len(self.strings)
+        return index
+
+    def varint(self, value):
+        buffer = self.buffer
+        while value > 0x7F:
+            buffer.append((value & 0x7F) | 0x80)
+            value >>= 7
+        buffer.append(value)
+
+    def zigzag(self, value):
+        self.varint(value << 1 if value >= 0 else ((-value) << 1) - 1)
+
+    def raw_string(self, value):
+        encoded = value.encode("utf-8")
+        self.varint(len(encoded))
+        self.buffer += encoded
+
+    def value(self, value):
+        buffer = self.buffer
+        if value is None:
+            buffer.append(_TAG_NONE)
+        elif value is True:
+            buffer.append(_TAG_TRUE)
+        elif value is False:
+            buffer.append(_TAG_FALSE)
+        elif isinstance(value, int):
+            buffer.append(_TAG_INT)
+            self.zigzag(value)
+        elif isinstance(value, float):
+            buffer.append(_TAG_FLOAT)
+            buffer += _DOUBLE.pack(value)
+        elif isinstance(value, str):
+            if len(value) <= INTERN_MAX_LENGTH:
+                buffer.append(_TAG_STR_REF)
+                self.varint(self.intern(value))
+            else:
+                buffer.append(_TAG_STR)
+                self.raw_string(value)
+        elif isinstance(value, (list, tuple)):
+            buffer.append(_TAG_LIST)
+            self.varint(len(value))
+            for item in value:
+                self.value(item)
+        elif isinstance(value, dict):
+            buffer.append(_TAG_DICT)
+            self.properties(value)
+        else:
+            raise SnapshotError(f"Cannot store value of type {type(value).__name__} in a snapshot")
+
+    def properties(self, properties):
+        properties = properties or {}
+        self.varint(len(properties))
+        for key, value in properties.items():
+            self.varint(self.intern(str(key)))
+            self.value(value)
+
+
+class _Reader:
+    def __init__(self, data):
+        self.data = memoryview(data)
+        self.position = 0
+        self.strings = []
+
+    def varint(self):
+        data = self.data
+        position = self.position
+        result = 0
+        shift = 0
+        while True:
+            byte = data[position]
+            position += 1
+            result |= (byte & 0x7F) << shift
+            if byte < 0x80:
+                break
+            shift += 7
+        self.position = position
+        return result
+
+    def zigzag(self):
+        value = self.varint()
+        return (value >> 1) ^ -(value & 1)
+
+    def raw_string(self):
+        length = self.varint()
+        start = self.position
+        self.position = start + length
+        return str(self.data[start:self.position], "utf-8")
+
+    def value(self):
+        tag = self.data[self.position]
+        self.position += 1
+        if tag == _TAG_STR_REF:
+            return self.strings[self.varint()]
+        if tag == _TAG_INT:
+            return self.zigzag()
+        if tag == _TAG_NONE:
+            return None
+        if tag == _TAG_TRUE:
+            return True
+        if tag == _TAG_FALSE:
+            return False
+        if tag == _TAG_FLOAT:
+            (value,) = _DOUBLE.unpack_from(self.data, self.position)
+            self.position += _DOUBLE.size
+            return value
+        if tag == _TAG_STR:
+            return self.raw_string()
+        if tag == _TAG_LIST:
+            return [self.value() for _ in range(self.varint())]
+        if tag == _TAG_DICT:
+            return self.properties()
+        raise SnapshotError(f"Corrupt snapshot: unknown value tag {tag}")
+
+    def properties(self):
+        strings = self.strings
+        return {strings[self.varint()]: self.value() for _ in range(self.varint())}
+
+
+def encode_snapshot(nodes, edges, compression="zlib"):
+    if compression not in CODECS:
+        raise SnapshotError(f"Unknown compression codec '{compression}'")
+
+    nodes = list(nodes)
+    edges = list(edges)
+
+    ids = [node[0] for node in nodes]
+    positions = {node_id: position for position, node_id in enumerate(ids)}
+    if len(positions) != len(ids):
+        raise SnapshotError("Duplicate node ids cannot be stored in a snapshot")
+    for from_id, to_id, _ in edges:
+        for endpoint in (from_id, to_id):
+            if endpoint not in positions:
+                positions[endpoint] = len(ids)
+                ids.append(endpoint)
+
+    columns = _Writer()
+
+    columns.varint(len(nodes))
+    columns.varint(len(ids))
+    if all(type(node_id) is int for node_id in ids):
+        columns.buffer.append(_ID_KIND_INT)
+        previous = 0
+        for node_id in ids:
+            columns.zigzag(node_id - previous)
+            previous = node_id
+    else:
+        columns.buffer.append(_ID_KIND_TAGGED)
+        for node_id in ids:
+            columns.value(node_id)
+
+    for _, node_type, _ in nodes:
+        columns.varint(0 if node_type is None else columns.intern(str(node_type)) + 1)
+    for _, _, properties in nodes:
+        columns.properties(properties)
+
+    columns.varint(len(edges))
+    for from_id, _, _ in edges:
+        columns.varint(positions[from_id])
+    for _, to_id, _ in edges:
+        columns.varint(positions[to_id])
+    for _, _, properties in edges:
+        columns.properties(properties)
+
+    # The string table has to precede the columns that reference it, so it is written last and prepended.
+    body = _Writer()
+    body.varint(len(columns.strings))
+    for value in columns.strings:
+        body.raw_string(value)
+    body.buffer += columns.buffer
+
+    header = MAGIC + bytes([VERSION, CODECS[compression]])
+    return header + _compress(bytes(body.buffer), compression)
+
+
+def decode_snapshot(data):
+    header_size = len(MAGIC) + 2
+    if len(data) < header_size or data[:len(MAGIC)] != MAGIC:
+        raise SnapshotError("Not a graph snapshot")
+    version = data[len(MAGIC)]
+    if version != VERSION:
+        raise SnapshotError(f"Unsupported snapshot version {version}")
+    codec = _CODEC_NAMES.get(data[len(MAGIC) + 1])
+    if codec is None:
+        raise SnapshotError("Unknown compression codec in snapshot header")
+
+    try:
+        reader = _Reader(_decompress(bytes(data[header_size:]), codec))
+        reader.strings = [reader.raw_string() for _ in range(reader.varint())]
+        strings = reader.strings
+
+        node_count = reader.varint()
+        id_count = reader.varint()
+        id_kind = reader.data[reader.position]
+        reader.position += 1
+        if id_kind == _ID_KIND_INT:
+            ids = []
+            previous = 0
+            for _ in range(id_count):
+                previous += reader.zigzag()
+                ids.append(previous)
+        else:
+            ids = [reader.value() for _ in range(id_count)]
+
+        types = []
+        for _ in range(node_count):
+            reference = reader.varint()
+            types.append(strings[reference - 1] if reference else None)
+        nodes = [(ids[position], types[position], reader.properties()) for position in range(node_count)]
+
+        edge_count = reader.varint()
+        sources = [ids[reader.varint()] for _ in range(edge_count)]
+        targets = [ids[reader.varint()] for _ in range(edge_count)]
+        edges = [(sources[position], targets[position], reader.properties()) for position in range(edge_count)]
+    # bz2 reports corrupt data as OSError, bz2 and lzma truncated data as ValueError or EOFError
+    except (IndexError, ValueError, EOFError, struct.error, zlib.error, lzma.LZMAError, OSError) as e:
+        raise SnapshotError(f"Corrupt snapshot: {e}") from e
+
+    return nodes, edges
+
+
+def write_snapshot(fp, nodes, edges, compression="zlib"):
+    data = encode_snapshot(nodes, edges, compression)
+    fp.write(data)
+    return len(data)
+
+
+def read_snapshot(fp):
+    return decode_snapshot(fp.read())
@@ -0,0 +1,436 @@
+# app/integrations/database/sqlitedb.py
+# SQLite backend, selected with DATABASE_TYPE=sqlite. It stores the graph in the file at SQLITE_PATH (kgraph.db by
+# default), so single node deployments get durable, indexed storage without running a Neo4j server.
+#
+# Entities and relationships follow the same contract as `Neo4jIntegration`: entities are flat dictionaries with an
+# `id` generated by `add_entity`, relationships have `from_id`, `to_id`, `relationship` and `snippet` keys. Other
+# properties are kept as JSON in the `props` column.
+#
+# Storage:
+# - the database runs in WAL mode, so readers are not blocked by the writer and commits only append to the log,
+# - every thread gets its own connection, whose statement cache keeps the fixed SQL below prepared, and which is
+#   closed when the thread ends, so short-lived request and worker threads do not leave connections open. A
+#   `:memory:` path therefore gives every thread its own empty database and is only meant for single threaded use,
+# - entity ids are unique-indexed, entity types and both relationship endpoints are indexed,
+# - name-like properties and relationship snippets are indexed in FTS5 tables with the trigram tokenizer, which
+#   serves both the substring searches of `search_entities` (case insensitive, like the other backends) and ranked
+#   full-text queries through `search_text`. Values shorter than a trigram fall back to a LIKE filter,
+# - neighborhoods are expanded with a recursive CTE in `get_neighborhood`, each hop going through an endpoint index.
+# - path finding expands a whole BFS frontier per query, through the same endpoint indexes.
+
+import json
+import os
+import sqlite3
+import threading
+import weakref
+from typeid import TypeID
+from .base import DatabaseIntegration
+
+SQLITE_PATH = os.getenv("SQLITE_PATH", "kgraph.db")
+# Statements kept prepared per connection
+STATEMENT_CACHE_SIZE = 256
+BUSY_TIMEOUT_MS = 5000
+
+ENTITY_FULLTEXT_PROPERTIES = ("name", "title", "alias", "description")
+RELATIONSHIP_COLUMNS = ("from_id", "to_id", "relationship", "snippet")
+
+# Columns without a declared type keep the type of their values, so integer ids imported from a snapshot of the
+# in-memory backend stay integers
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS entities (
+    rowid INTEGER PRIMARY KEY,
+    id NOT NULL UNIQUE,
+    type TEXT,
+    props TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entities_type ON entities (type);
+
+CREATE TABLE IF NOT EXISTS relationships (
+    rowid INTEGER PRIMARY KEY,
+    from_id NOT NULL,
+    to_id NOT NULL,
+    relationship TEXT,
+    snippet TEXT,
+    props TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS relationships_from ON relationships (from_id, to_id);
+CREATE INDEX IF NOT EXISTS relationships_to ON relationships (to_id, from_id);
+
+CREATE VIRTUAL TABLE IF NOT EXISTS entities_fts USING fts5 (
+    {", ".join(ENTITY_FULLTEXT_PROPERTIES)}, tokenize = 'trigram'
+);
+CREATE TRIGGER IF NOT EXISTS entities_fts_insert AFTER INSERT ON entities BEGIN
+    INSERT INTO entities_fts (rowid, {", ".join(ENTITY_FULLTEXT_PROPERTIES)})
+    VALUES (new.rowid, {", ".join(f"json_extract(new.props, '$.{name}')" for name in ENTITY_FULLTEXT_PROPERTIES)});
+END;
+CREATE TRIGGER IF NOT EXISTS entities_fts_delete AFTER DELETE ON entities BEGIN
+    DELETE FROM entities_fts WHERE rowid = old.rowid;
+END;
+CREATE TRIGGER IF NOT EXISTS entities_fts_update AFTER UPDATE OF props ON entities BEGIN
+    DELETE FROM entities_fts WHERE rowid = old.rowid;
+    INSERT INTO entities_fts (rowid, {", ".join(ENTITY_FULLTEXT_PROPERTIES)})
+    VALUES (new.rowid, {", ".join(f"json_extract(new.props, '$.{name}')" for name in ENTITY_FULLTEXT_PROPERTIES)});
+END;
+
+CREATE VIRTUAL TABLE IF NOT EXISTS relationships_fts USING fts5 (
+    snippet, content = 'relationships', content_rowid = 'rowid', tokenize = 'trigram'
+);
+CREATE TRIGGER IF NOT EXISTS relationships_fts_insert AFTER INSERT ON relationships BEGIN
+    INSERT INTO relationships_fts (rowid, snippet) VALUES (new.rowid, new.snippet);
+END;
+CREATE TRIGGER IF NOT EXISTS relationships_fts_delete AFTER DELETE ON relationships BEGIN
+    INSERT INTO relationships_fts (relationships_fts, rowid, snippet) VALUES ('delete', old.rowid, old.snippet);
+END;
+"""
+
+INSERT_ENTITY = "INSERT INTO entities (id, type, props) VALUES (?, ?, ?)"
+SELECT_ENTITY = "SELECT id, props FROM entities WHERE id = ?"
+SELECT_ALL_ENTITIES = "SELECT id, props FROM entities"
+UPDATE_ENTITY = "UPDATE entities SET type = ?, props = ? WHERE id = ?"
+DELETE_ENTITY = "DELETE FROM entities WHERE id = ?"
+DELETE_ENTITY_RELATIONSHIPS = "DELETE FROM relationships WHERE from_id = ? OR to_id = ?"
+INSERT_RELATIONSHIP = (
+    "INSERT INTO relationships (from_id, to_id, relationship, snippet, props) VALUES (?, ?, ?, ?, ?)"
+)
+SELECT_RELATIONSHIPS = "SELECT from_id, to_id, relationship, snippet, props FROM relationships"
+COUNT_GRAPH = "SELECT (SELECT COUNT(*) FROM entities), (SELECT COUNT(*) FROM relationships)"
+SEARCH_TEXT = (
+    "SELECT e.id, e.props FROM entities_fts JOIN entities e ON e.rowid = entities_fts.rowid "
+    "WHERE entities_fts MATCH ? ORDER BY bm25(entities_fts) LIMIT ?"
+)
+# Entities reachable from a start entity in at most `depth` hops, following relationships in both directions.
+# UNION drops repeated (id, depth) pairs, so cycles stop growing the frontier.
+NEIGHBORHOOD = """
+WITH RECURSIVE reach (id, depth) AS (
+    SELECT :id, 0
+    UNION
+    SELECT r.to_id, reach.depth + 1 FROM reach JOIN relationships r ON r.from_id = reach.id
+    WHERE reach.depth < :depth
+    UNION
+    SELECT r.from_id, reach.depth + 1 FROM reach JOIN relationships r ON r.to_id = reach.id
+    WHERE reach.depth < :depth
+)
+SELECT id, min(depth) FROM reach GROUP BY id
+"""
+
+
+def _fts_phrase(value):
+    # A quoted FTS5 phrase, matched as a substring by the trigram tokenizer
+    return '"' + str(value).replace('"', '""') + '"'
+
+
+def _release(connections, lock, connection):
+    # Called once the thread that opened the connection is gone, or by `close`
+    with lock:
+        if connection in connections:
+            connections.remove(connection)
+    connection.close()
+
+
+class _ThreadConnection:
+    # Held by the thread-local only, so it is collected with the thread
+    def __init__(self, connection):
+        self.connection = connection
+
+
+def _like_pattern(value):
+    escaped = str(value).replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+
+class SQLiteIntegration(DatabaseIntegration):
+    def __init__(self, path=None):
+        self.path = path or SQLITE_PATH
+        self.local = threading.local()
+        self.connections = []
+        self.connections_lock = threading.Lock()
+        self.connection().executescript(SCHEMA)
+
+    def connection(self):
+        held = getattr(self.local, "held", None)
+        if held is None:
+            connection = sqlite3.connect(
+                self.path, cached_statements=STATEMENT_CACHE_SIZE, isolation_level=None, check_same_thread=False
+            )
+            connection.execute("PRAGMA journal_mode = WAL")
+            connection.execute("PRAGMA synchronous = NORMAL")
+            connection.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+            held = self.local.held = _ThreadConnection(connection)
+            with self.connections_lock:
+                self.connections.append(connection)
+            weakref.finalize(held, _release, self.connections, self.connections_lock, connection)
+        return held.connection
+
+    def transaction(self):
+        # BEGIN IMMEDIATE takes the write lock up front, so concurrent writers wait on busy_timeout instead of
+        # failing when they upgrade a read transaction
+        return _Transaction(self.connection())
+
+    def _entity(self, entity_id, props):
+        entity = json.loads(props)
+        entity["id"] = entity_id
+        return entity
+
+    def _relationship(self, row):
+        from_id, to_id, relationship, snippet, props = row
+        return {"from_id": from_id, "to_id": to_id, "relationship": relationship, "snippet": snippet,
+                **json.loads(props)}
+
+    def _entity_row(self, entity_id, data):
+        props = {key: value for key, value in data.items() if key != "id"}
+        return entity_id, props.get("type"), json.dumps(props, default=str)
+
+    def _relationship_row(self, data):
+        props = {key: value for key, value in data.items() if key not in RELATIONSHIP_COLUMNS}
+        return (data["from_id"], data["to_id"], data.get("relationship"), data.get("snippet", ""),
+                json.dumps(props, default=str))
+
+    def add_entity(self, data):
+        entity_id = str(TypeID(prefix="entity"))
+        data["id"] = entity_id
+        with self.transaction() as connection:
+            connection.execute(INSERT_ENTITY, self._entity_row(entity_id, data))
+        return entity_id
+
+    def add_entities(self, entities):
+        rows = [self._entity_row(str(TypeID(prefix="entity")), data) for data in entities]
+        with self.transaction() as connection:
+            connection.executemany(INSERT_ENTITY, rows)
+        return [row[0] for row in rows]
+
+    def add_relationships(self, relationships):
+        rows = [self._relationship_row(data) for data in relationships]
+        with self.transaction() as connection:
+            connection.executemany(INSERT_RELATIONSHIP, rows)
+        return len(rows)
+
+    def upsert_graph(self, entities, relationships, entity_updates=()):
+        # Same contract as Neo4jIntegration.upsert_graph, in one transaction
+        entity_ids = {ref: str(TypeID(prefix="entity")) for ref in entities}
+        updated = []
+        with self.transaction() as connection:
+            connection.executemany(
+                INSERT_ENTITY, [self._entity_row(entity_ids[ref], data) for ref, data in entities.items()]
+            )
+            for data in entity_updates:
+                row = connection.execute(SELECT_ENTITY, (data["id"],)).fetchone()
+                if row is None:
+                    continue
+                entity = json.loads(row[1])
+                sources = list(entity.get("source_documents") or [])
+                sources.extend(d for d in data.get("source_documents", []) if d not in sources)
+                entity.update({key: value for key, value in data.items() if key not in ("id", "source_documents")})
+                entity["source_documents"] = sources
+                connection.execute(UPDATE_ENTITY, self._entity_row(data["id"], entity)[1:] + (data["id"],))
+                updated.append(data["id"])
+
+            rows = []
+            for data in relationships:
+                data = dict(data)
+                if "from_ref" in data:
+                    data["from_id"] = entity_ids[data.pop("from_ref")]
+                if "to_ref" in data:
+                    data["to_id"] = entity_ids[data.pop("to_ref")]
+                rows.append(self._relationship_row(data))
+            connection.executemany(INSERT_RELATIONSHIP, rows)
+
+        return {"entity_ids": entity_ids, "updated": updated, "relationships": len(rows)}
+
+    def get_entity(self, entity_id):
+        row = self.connection().execute(SELECT_ENTITY, (entity_id,)).fetchone()
+        if row:
+            return self._entity(*row)
+
+    def get_all_entities(self):
+        return [self._entity(*row) for row in self.connection().execute(SELECT_ALL_ENTITIES)]
+
+    def update_entity(self, entity_id, data):
+        with self.transaction() as connection:
+            row = connection.execute(SELECT_ENTITY, (entity_id,)).fetchone()
+            if row is None:
+                return False
+            entity = json.loads(row[1])
+            entity.update(data)
+            connection.execute(UPDATE_ENTITY, self._entity_row(entity_id, entity)[1:] + (entity_id,))
+        return True
+
+    def delete_entity(self, entity_id):
+        with self.transaction() as connection:
+            deleted = connection.execute(DELETE_ENTITY, (entity_id,)).rowcount
+            if deleted:
+                connection.execute(DELETE_ENTITY_RELATIONSHIPS, (entity_id, entity_id))
+        return deleted > 0
+
+    def add_relationship(self, data):
+        with self.transaction() as connection:
+            return connection.execute(INSERT_RELATIONSHIP, self._relationship_row(data)).lastrowid
+
+    def get_full_graph(self):
+        connection = self.connection()
+        entities = {}
+        for entity_id, props in connection.execute(SELECT_ALL_ENTITIES):
+            entities[entity_id] = self._entity(entity_id, props)
+        relationships = [self._relationship(row) for row in connection.execute(SELECT_RELATIONSHIPS)]
+        return {"entities": entities, "relationships": relationships}
+
+    def graph_counts(self):
+        entities, relationships = self.connection().execute(COUNT_GRAPH).fetchone()
+        return {"entities": entities, "relationships": relationships}
+
+    def _search_entities_query(self, search_params, entity_type=None):
+        # Name-like properties go through the trigram index, the type through its index and anything else through a
+        # LIKE filter on the JSON properties
+        fulltext = []
+        conditions = []
+        params = []
+        for key, value in search_params.items():
+            if key in ENTITY_FULLTEXT_PROPERTIES and len(str(value)) >= 3:
+                fulltext.append(f"{key} : {_fts_phrase(value)}")
+            elif key == "type":
+                conditions.append("e.type LIKE ? ESCAPE '\\'")
+                params.append(_like_pattern(value))
+            else:
+                conditions.append("json_extract(e.props, ?) LIKE ? ESCAPE '\\'")
+                params.extend([f'$."{key}"', _like_pattern(value)])
+        if entity_type is not None:
+            conditions.append("e.type = ?")
+            params.append(entity_type)
+
+        if fulltext:
+            # As a subquery the full-text match runs once, instead of once per row of the type index
+            conditions.insert(0, "e.rowid IN (SELECT rowid FROM entities_fts WHERE entities_fts MATCH ?)")
+            params.insert(0, " AND ".join(fulltext))
+
+        query = "SELECT e.id, e.props FROM entities e"
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        return query, params
+
+    def search_entities(self, search_params):
+        query, params = self._search_entities_query(search_params)
+        return [self._entity(*row) for row in self.connection().execute(query, params)]
+
+    def search_entities_with_type(self, entity_type, search_params):
+        query, params = self._search_entities_query(search_params, entity_type)
+        return [self._entity(*row) for row in self.connection().execute(query, params)]
+
+    def search_text(self, text, limit=20):
+        # Ranked full-text search over the name-like properties of all entities
+        return [self._entity(*row) for row in self.connection().execute(SEARCH_TEXT, (_fts_phrase(text), limit))]
+
+    def search_relationships(self, search_params):
+        # Endpoint ids are looked up through the endpoint indexes, snippets through the trigram index
+        conditions = []
+        params = []
+        for key, value in search_params.items():
+            if key in ("from_id", "to_id"):
+                conditions.append(f"r.{key} = ?")
+                params.append(value)
+            elif key == "snippet" and len(str(value)) >= 3:
+                conditions.append("r.rowid IN (SELECT rowid FROM relationships_fts WHERE relationships_fts MATCH ?)")
+                params.append(_fts_phrase(value))
+            elif key in RELATIONSHIP_COLUMNS:
+                conditions.append(f"r.{key} LIKE ? ESCAPE '\\'")
+                params.append(_like_pattern(value))
+            else:
+                conditions.append("json_extract(r.props, ?) LIKE ? ESCAPE '\\'")
+                params.extend([f'$."{key}"', _like_pattern(value)])
+
+        query = "SELECT r.from_id, r.to_id, r.relationship, r.snippet, r.props FROM relationships r"
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        return [self._relationship(row) for row in self.connection().execute(query, params)]
+
+    def get_neighborhood(self, entity_id, depth=1):
+        # The subgraph of entities at most `depth` hops away from `entity_id`, with the relationships between them
+        connection = self.connection()
+        depths = dict(connection.execute(NEIGHBORHOOD, {"id": entity_id, "depth": depth}).fetchall())
+        if entity_id not in depths or connection.execute(SELECT_ENTITY, (entity_id,)).fetchone() is None:
+            return {"entities": {}, "relationships": []}
+
+        ids = list(depths)
+        entities = {}
+        relationships = []
+        # Stay below SQLite's limit on host parameters per statement
+        for start in range(0, len(ids), 500):
+            batch = ids[start:start + 500]
+            placeholders = ", ".join("?" * len(batch))
+            query = f"SELECT id, props FROM entities WHERE id IN ({placeholders})"
+            for found_id, props in connection.execute(query, batch):
+                entities[found_id] = dict(self._entity(found_id, props), depth=depths[found_id])
+            query = f"{SELECT_RELATIONSHIPS} WHERE from_id IN ({placeholders})"
+            relationships.extend(
+                relationship for relationship in map(self._relationship, connection.execute(query, batch))
+                if relationship["to_id"] in depths
+            )
+        return {"entities": entities, "relationships": relationships}
+
+    def _path_expander(self):
+        connection = self.connection()
+
+        def expand(entity_ids):
+            neighbours = {}
+            for start in range(0, len(entity_ids), 500):
+                batch = entity_ids[start:start + 500]
+                placeholders = ", ".join("?" * len(batch))
+                query = (f"{SELECT_RELATIONSHIPS} WHERE from_id IN ({placeholders}) "
+                         f"UNION ALL {SELECT_RELATIONSHIPS} WHERE to_id IN ({placeholders})")
+                for relationship in map(self._relationship, connection.execute(query, batch + batch)):
+                    neighbours.setdefault(relationship["from_id"], []).append((relationship["to_id"], relationship))
+                    neighbours.setdefault(relationship["to_id"], []).append((relationship["from_id"], relationship))
+            return neighbours
+
+        return expand
+
+    def dump_graph(self):
+        connection = self.connection()
+        nodes = []
+        for entity_id, props in connection.execute(SELECT_ALL_ENTITIES):
+            props = json.loads(props)
+            nodes.append((entity_id, props.get("type"), props))
+        edges = []
+        for row in connection.execute(SELECT_RELATIONSHIPS):
+            relationship = self._relationship(row)
+            edges.append((relationship.pop("from_id"), relationship.pop("to_id"), relationship))
+        return nodes, edges
+
+    def load_graph(self, nodes, edges):
+        entity_rows = []
+        for entity_id, entity_type, props in nodes:
+            props = dict(props)
+            if entity_type is not None:
+                props.setdefault("type", entity_type)
+            entity_rows.append(self._entity_row(entity_id, props))
+        relationship_rows = [
+            self._relationship_row({**properties, "from_id": from_id, "to_id": to_id})
+            for from_id, to_id, properties in edges
+        ]
+        with self.transaction() as connection:
+            connection.executemany(INSERT_ENTITY, entity_rows)
+            connection.executemany(INSERT_RELATIONSHIP, relationship_rows)
+        return {"entities": len(entity_rows), "relationships": len(relationship_rows)}
+
+    def close(self):
+        with self.connections_lock:
+            connections = list(self.connections)
+            self.connections.clear()
+        for connection in connections:
+            connection.close()
+        self.local = threading.local()
+
+
+class _Transaction:
+    def __init__(self, connection):
+        self.connection = connection
+
+    def __enter__(self):
+        self.connection.execute("BEGIN IMMEDIATE")
+        return self.connection
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.connection.execute("ROLLBACK" if exc_type else "COMMIT")
+        return False
+
+
+def register(integration_manager):
+    integration_manager.register_lazy('sqlite', SQLiteIntegration)
@@ -0,0 +1,240 @@
+# This integration, `ingestion_pipeline`, ingests a batch of URLs and texts through a staged pipeline (see
+# app/pipeline.py) instead of the chain of nested integration calls url_input -> natural_input ->
+# add_multiple_conditional -> conditional_entity_addition / conditional_relationship_addition.
+
+# The stages are:
+# - fetch: scrapes URLs with `scrape_url`, texts pass through untouched.
+# - clean: normalises the text and claims its document id in the document registry. Documents that were already
+#   ingested are dropped here, unless `force` is set.
+# - chunk: splits long documents in chunks of at most CHUNK_SIZE characters, on sentence boundaries when possible.
+# - extract: asks the model for the knowledge graph of a chunk (`create_knowledge_graph`).
+# - resolve: looks for an existing entity matching every extracted node (`find_matching_entity`).
+# - write: adds the new entities and the relationships, and records provenance on matched entities. It runs on a
+#   single worker so entities created by one chunk are reused by the next ones instead of being created twice.
+#   Relationships touching an entity created by the same chunk cannot exist yet and skip the duplicate check.
+#   Backends with batch writes get every chunk in one transaction through `write_graph_batched`.
+
+# Stages exchange plain Python objects and run with their own number of workers, so fetching, extraction and
+# resolution of different documents overlap. A document is marked as ingested in the registry once all its chunks
+# are written; documents with a failed chunk are released so they can be submitted again.
+
+# The response lists the outcome of every document and the per-stage metrics of the run, also available from the
+# /pipeline-metrics endpoint while and after the pipeline runs.
+
+import logging
+import os
+import threading
+from flask import jsonify
+from app.documents import add_entity_provenance, document_id_for, document_registry, normalize_document
+from app.integrations.add_multiple_conditional import write_graph_batched
+from app.integrations.conditional_entity_addition import find_matching_entity
+from app.integrations.conditional_relationship_addition import find_matching_relationship
+from app.integrations.natural_input import create_knowledge_graph
+from app.integrations.url_input import page_to_natural_input, scrape_url
+from app.logs import truncated
+from app.models import add_entity, add_relationship, supports_batch_writes
+from app.pipeline import Pipeline, Stage
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = int(os.getenv("INGEST_CHUNK_SIZE", "6000"))
+QUEUE_SIZE = 16
+STAGE_WORKERS = {
+    "fetch": 4,
+    "clean": 1,
+    "chunk": 1,
+    "extract": 4,
+    "resolve": 4,
+    "write": 1,
+}
+
+
+def chunk_text(text, size=CHUNK_SIZE):
+    chunks = []
+    start = 0
+    while start < len(text):
+        end = min(start + size, len(text))
+        if end < len(text):
+            # Cut after the last sentence, or at least the last word, of the second half of the window
+            cut = text.rfind(". ", start + size // 2, end)
+            if cut == -1:
+                cut = text.rfind(" ", start + size // 2, end)
+            if cut != -1:
+                end = cut + 1
+        chunk = text[start:end].strip()
+        if chunk:
+            chunks.append(chunk)
+        start = end
+    return chunks
+
+
+class IngestionRun:
+    def __init__(self, app, force=False):
+        self.app = app
+        self.force = force
+        self.documents = {}
+        self.created_by_name = {}
+        self.lock = threading.Lock()
+
+    def add_document(self, item):
+        self.documents[item["key"]] = {"source": item.get("url") or item["key"], "status": "queued"}
+
+    def fetch(self, item):
+        if item.get("text") is None:
+            item["text"] = page_to_natural_input(scrape_url(item["url"]))["natural_input"]
+        return [item]
+
+    def clean(self, item):
+        report = self.documents[item["key"]]
+        text = normalize_document(item["text"])
+        if not text:
+            report["status"] = "empty"
+            return []
+
+        document_id = document_id_for(text)
+        report["document_id"] = document_id
+        if not self.force:
+            existing = document_registry.claim(document_id, source=item.get("url"))
+            if existing is not None:
+                report["status"] = "duplicate"
+                return []
+        report["status"] = "processing"
+        return [{"key": item["key"], "document_id": document_id, "text": text}]
+
+    def chunk(self, item):
+        chunks = chunk_text(item["text"])
+        report = self.documents[item["key"]]
+        report.update({"chunks": len(chunks), "pending_chunks": len(chunks), "entities": set(), "relationships": []})
+        return [
+            {"key": item["key"], "document_id": item["document_id"], "chunk": index, "text": chunk}
+            for index, chunk in enumerate(chunks)
+        ]
+
+    def extract(self, item):
+        graph = create_knowledge_graph(self.app, item["text"])
+        if graph is None:
+            raise ValueError("Failed to create knowledge graph")
+        return [{"key": item["key"], "document_id": item["document_id"], "chunk": item["chunk"], "graph": graph}]
+
+    def resolve(self, item):
+        resolutions = {}
+        for node in item["graph"].get("nodes", []):
+            if node.get("name"):
+                resolutions[node.get("id")] = find_matching_entity(node)
+        return [dict(item, resolutions=resolutions)]
+
+    def write(self, item):
+        document_id = item["document_id"]
+        graph = item["graph"]
+        if supports_batch_writes():
+            entity_ids, relationships = write_graph_batched(
+                graph, item["resolutions"], document_id, self.created_by_name
+            )
+        else:
+            entity_ids, relationships = self.write_one_by_one(graph, item["resolutions"], document_id)
+
+        report = self.documents[item["key"]]
+        with self.lock:
+            report["entities"].update(entity_ids.values())
+            report["relationships"].extend(relationships)
+            report["pending_chunks"] -= 1
+            done = report["pending_chunks"] == 0
+        if done:
+            document_registry.complete(document_id, report["entities"], report["relationships"])
+            report["status"] = "ingested"
+        return [{"key": item["key"], "chunk": item["chunk"], "entities": len(entity_ids)}]
+
+    def write_one_by_one(self, graph, resolutions, document_id):
+        entity_ids = {}
+        new_ids = set()
+
+        for node in graph.get("nodes", []):
+            temp_id = node.get("id")
+            name = node.get("name")
+            if not name:
+                continue
+            entity_id = resolutions.get(temp_id) or self.created_by_name.get(name.strip().lower())
+            # A match the graph does not know about is treated as a new entity
+            if not entity_id or not add_entity_provenance(entity_id, document_id):
+                entity_id = add_entity(dict(node, source_documents=[document_id]))
+                if entity_id is None:
+                    logger.warning("No entity ID returned for %s", name)
+                    continue
+                self.created_by_name[name.strip().lower()] = entity_id
+                new_ids.add(entity_id)
+            entity_ids[temp_id] = entity_id
+
+        relationships = []
+        for relationship in graph.get("relationships", []):
+            from_id = entity_ids.get(relationship.get("from_id"))
+            to_id = entity_ids.get(relationship.get("to_id"))
+            if from_id is None or to_id is None:
+                logger.warning("Missing entity for relationship: %s", truncated(relationship))
+                continue
+
+            relationship_data = {
+                "from_id": from_id,
+                "to_id": to_id,
+                "relationship": relationship.get("relationship", "associated"),
+                "snippet": relationship.get("snippet", ""),
+                "source_documents": [document_id]
+            }
+            try:
+                if from_id in new_ids or to_id in new_ids or find_matching_relationship(relationship_data) is None:
+                    add_relationship(relationship_data)
+            except Exception as e:
+                logger.warning("Failed to add relationship %s: %s", truncated(relationship_data), e)
+                continue
+            relationships.append({"from_id": from_id, "to_id": to_id, "relationship": relationship_data["relationship"]})
+
+        return entity_ids, relationships
+
+    def finish(self):
+        # Documents left processing had a failing stage, release them so they can be submitted again
+        for report in self.documents.values():
+            if report["status"] in ("queued", "processing"):
+                if report.get("document_id"):
+                    document_registry.release(report["document_id"])
+                report["status"] = "failed"
+            if isinstance(report.get("entities"), set):
+                report["entities"] = sorted(report["entities"], key=str)
+            report.pop("pending_chunks", None)
+
+
+def run_ingestion(app, items, force=False):
+    run = IngestionRun(app, force=force)
+    for item in items:
+        run.add_document(item)
+
+    pipeline = Pipeline("ingestion", [
+        Stage("fetch", run.fetch, STAGE_WORKERS["fetch"], QUEUE_SIZE),
+        Stage("clean", run.clean, STAGE_WORKERS["clean"], QUEUE_SIZE),
+        Stage("chunk", run.chunk, STAGE_WORKERS["chunk"], QUEUE_SIZE),
+        Stage("extract", run.extract, STAGE_WORKERS["extract"], QUEUE_SIZE),
+        Stage("resolve", run.resolve, STAGE_WORKERS["resolve"], QUEUE_SIZE),
+        Stage("write", run.write, STAGE_WORKERS["write"], QUEUE_SIZE),
+    ])
+    _, errors = pipeline.run(items)
+    run.finish()
+
+    return {
+        "documents": list(run.documents.values()),
+        "errors": errors,
+        "metrics": pipeline.metrics()
+    }
+
+
+def ingestion_pipeline(app, data):
+    with app.app_context():
+        logger.debug("Ingestion Pipeline Integration")
+        items = [{"key": url, "url": url} for url in dict.fromkeys(data.get('urls', []))]
+        items.extend({"key": f"text-{index}", "text": text} for index, text in enumerate(data.get('texts', [])))
+        if not items:
+            return jsonify({"error": "Provide 'urls' and/or 'texts' to ingest"}), 400
+
+        report = run_ingestion(app, items, force=bool(data.get('force')))
+        return jsonify(report), 200
+
+
+def register(integration_manager):
+    integration_manager.register('ingestion_pipeline', ingestion_pipeline)
@@ -11,21 +11,51 @@
 # It is initialized with a Flask app instance and provides a method `register` to associate integration names 
 # with their corresponding callable functions, effectively making them available application-wide.
 
+# Registered integrations are wrapped by `instrument_integration` (unless METRICS=false), which counts their calls,
+# errors and durations for the /metrics route.
+
 # The `get_integration_function` function retrieves a callable integration function by its name from the Flask app's 
 # `integration_manager`, allowing for easy access to integration functionalities throughout the app.
 
+# The `call_integration` function runs an integration from another one and returns its result as plain Python objects.
+# Integrations called this way (conditional additions, add_multiple_conditional, natural_input) return
+# `(payload, status_code)` tuples of dicts instead of `jsonify` responses, so chained integrations pass their data along
+# without encoding and parsing JSON at every step, and Flask serialises it once when an integration answers a request.
+# Integrations still returning Flask responses keep working, their JSON body is parsed.
+
+# Integrations bound by model calls also register an async variant (`register_async`), run on the event loop by the
+# ASGI entry point (asgi.py, see app/asgi.py) so that many in-flight model calls share a few processes instead of
+# holding a thread each. Their admission limits come from the `async_max_concurrent` / `async_max_queued` entries of
+# INTEGRATION_LIMITS and are enforced without blocking the loop by `AsyncAdmissionLimiter`. `call_integration_async`
+# awaits the async variant of an integration, or runs its sync function in a worker thread when it has none, and the
+# WSGI app runs async-only integrations with `asyncio.run`.
+
 # The `initialize_integrations` function is responsible for initializing the `IntegrationManager` with the Flask app 
 # and dynamically loading integration modules from a specified directory. It checks the `INTEGRATIONS` dictionary to 
 # determine if an integration is active, and if so, it imports the module, checks for a `register` function, and 
 # executes it to register the integration. This dynamic loading mechanism allows for flexible integration management, 
 # enabling or disabling integrations as needed without modifying the core application code.
 
+# Integration modules are loaded lazily (unless LAZY_INTEGRATIONS=false): `initialize_integrations` only records the
+# active modules found in the directory, and a module is imported and its `register` run the first time one of its
+# integrations is looked up. The app starts without importing openai, requests or bs4, which only the integrations
+# need. `register_lazy` registers an object built by a factory on first lookup, e.g. a database client connecting when
+# it is first used rather than at boot.
+
 
 
 # app/integration_manager.py
+import asyncio
 import os
 import importlib
-from flask import Flask, current_app, has_app_context
+import math
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from flask import Flask, Response, current_app, has_app_context
+from app.metrics import METRICS_ENABLED, instrument_async_integration, instrument_integration
+
+LAZY_INTEGRATIONS = os.getenv("LAZY_INTEGRATIONS", "true").lower() not in ("0", "false", "no")
 
 # Dictionary to hold the status of integrations
 INTEGRATIONS = {
@@ -40,22 +70,252 @@ INTEGRATIONS = {
     'natural_input_flexible': True,
     'url_input': True,
     'url_array_processor': True,
+    'url_crawler': True,
+    'ingestion_pipeline': True,
     'latent_input': True,
     'ai_search': True,
     'neo4j': True
 }
+
+# Admission limits for integrations triggered through /trigger-integration/<integration_name>.
+# `max_concurrent` runs are admitted at once, up to `max_queued` more requests wait at most `queue_timeout`
+# seconds for a slot. Requests arriving on a full queue get a 429, requests timing out in the queue a 503,
+# both with a Retry-After header. Integrations without an entry are not limited.
+# Async variants served on the event loop only hold a coroutine while they wait for the model, `async_max_concurrent`
+# and `async_max_queued` (defaulting to the sync limits) let far more of them run at once.
+DEFAULT_QUEUE_TIMEOUT = 30
+INTEGRATION_LIMITS = {
+    'conditional_entity_addition': {'max_concurrent': 8, 'max_queued': 16,
+                                    'async_max_concurrent': 128, 'async_max_queued': 256},
+    'conditional_relationship_addition': {'max_concurrent': 8, 'max_queued': 16,
+                                          'async_max_concurrent': 128, 'async_max_queued': 256},
+    'add_multiple_conditional': {'max_concurrent': 4, 'max_queued': 8,
+                                 'async_max_concurrent': 64, 'async_max_queued': 128},
+    'natural_input': {'max_concurrent': 4, 'max_queued': 8, 'async_max_concurrent': 64, 'async_max_queued': 128},
+    'url_input': {'max_concurrent': 4, 'max_queued': 8},
+    'url_array_processor': {'max_concurrent': 1, 'max_queued': 2},
+    'url_crawler': {'max_concurrent': 1, 'max_queued': 1},
+    'ingestion_pipeline': {'max_concurrent': 2, 'max_queued': 4},
+    'latent_input': {'max_concurrent': 2, 'max_queued': 4},
+    'ai_search': {'max_concurrent': 8, 'max_queued': 16, 'queue_timeout': 10,
+                  'async_max_concurrent': 256, 'async_max_queued': 512},
+}
+
+
+def async_limits(limits):
+    return {
+        'max_concurrent': limits.get('async_max_concurrent', limits['max_concurrent']),
+        'max_queued': limits.get('async_max_queued', limits.get('max_queued', 0)),
+        'queue_timeout': limits.get('queue_timeout', DEFAULT_QUEUE_TIMEOUT),
+    }
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, status_code, retry_after):
+        super().__init__(f"Integration saturated, retry after {retry_after}s")
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class AdmissionLimiter:
+    def __init__(self, max_concurrent, max_queued=0, queue_timeout=DEFAULT_QUEUE_TIMEOUT):
+        self.max_concurrent = max_concurrent
+        self.max_queued = max_queued
+        self.queue_timeout = queue_timeout
+        self.condition = threading.Condition()
+        self.in_flight = 0
+        self.queued = 0
+        self.rejected = 0
+        # Moving average of run durations, used to estimate Retry-After
+        self.average_duration = 1.0
+
+    def retry_after(self):
+        return max(1, math.ceil(self.average_duration * (self.queued + 1) / self.max_concurrent))
+
+    def acquire(self):
+        with self.condition:
+            # Requests already waiting go first, a new request only takes a free slot when nobody is queued
+            if self.in_flight < self.max_concurrent and self.queued == 0:
+                self.in_flight += 1
+                return
+            if self.queued >= self.max_queued:
+                self.rejected += 1
+                raise AdmissionRejected(429, self.retry_after())
+
+            self.queued += 1
+            try:
+                admitted = self.condition.wait_for(lambda: self.in_flight < self.max_concurrent, self.queue_timeout)
+            finally:
+                self.queued -= 1
+            if not admitted:
+                self.rejected += 1
+                raise AdmissionRejected(503, self.retry_after())
+            self.in_flight += 1
+
+    def release(self, duration):
+        with self.condition:
+            self.in_flight -= 1
+            self.average_duration = 0.8 * self.average_duration + 0.2 * duration
+            self.condition.notify()
+
+    @contextmanager
+    def admit(self):
+        self.acquire()
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.release(time.monotonic() - started)
+
+    def _stats(self):
+        return {
+            'in_flight': self.in_flight,
+            'queued': self.queued,
+            'rejected': self.rejected,
+            'max_concurrent': self.max_concurrent,
+            'max_queued': self.max_queued,
+            'average_duration': round(self.average_duration, 3),
+        }
+
+    def stats(self):
+        with self.condition:
+            return self._stats()
+
+
+class AsyncAdmissionLimiter(AdmissionLimiter):
+    # Same admission rules, waiting on an asyncio.Condition so queued requests do not block the event loop
+    def __init__(self, max_concurrent, max_queued=0, queue_timeout=DEFAULT_QUEUE_TIMEOUT):
+        super().__init__(max_concurrent, max_queued, queue_timeout)
+        self.condition = asyncio.Condition()
+
+    async def acquire(self):
+        async with self.condition:
+            if self.in_flight < self.max_concurrent and self.queued == 0:
+                self.in_flight += 1
+                return
+            if self.queued >= self.max_queued:
+                self.rejected += 1
+                raise AdmissionRejected(429, self.retry_after())
+
+            self.queued += 1
+            try:
+                await asyncio.wait_for(
+                    self.condition.wait_for(lambda: self.in_flight < self.max_concurrent), self.queue_timeout
+                )
+            except asyncio.TimeoutError:
+                self.rejected += 1
+                raise AdmissionRejected(503, self.retry_after()) from None
+            finally:
+                self.queued -= 1
+            self.in_flight += 1
+
+    async def release(self, duration):
+        async with self.condition:
+            self.in_flight -= 1
+            self.average_duration = 0.8 * self.average_duration + 0.2 * duration
+            self.condition.notify()
+
+    @asynccontextmanager
+    async def admit(self):
+        await self.acquire()
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            await self.release(time.monotonic() - started)
+
+    def stats(self):
+        # Only changed on the event loop, a slightly stale read is fine
+        return self._stats()
+
+
 class IntegrationManager:
     def __init__(self, app):
         self.app = app
         self.integration_functions = {}
+        self.async_integration_functions = {}
+        # Integration name -> module path of the active integrations not imported yet
+        self.pending_modules = {}
+        self.factories = {}
+        self.loading_lock = threading.RLock()
+        self.limiters = {
+            integration_name: AdmissionLimiter(
+                **{key: value for key, value in limits.items() if not key.startswith('async_')}
+            )
+            for integration_name, limits in INTEGRATION_LIMITS.items()
+        }
+        self.async_limiters = {
+            integration_name: AsyncAdmissionLimiter(**async_limits(limits))
+            for integration_name, limits in INTEGRATION_LIMITS.items()
+        }
 
     def register(self, integration_name, integration_function):
         # Register the callable function for the integration
+        if METRICS_ENABLED:
+            integration_function = instrument_integration(integration_name, integration_function)
         self.integration_functions[integration_name] = integration_function
 
+    def register_async(self, integration_name, integration_function):
+        # Register the coroutine function of an integration, `async def f(app, data)`
+        if METRICS_ENABLED:
+            integration_function = instrument_async_integration(integration_name, integration_function)
+        self.async_integration_functions[integration_name] = integration_function
+
+    def register_lazy(self, integration_name, factory):
+        # Register the object returned by `factory()`, built the first time the integration is looked up
+        self.factories[integration_name] = factory
+
+    def add_module(self, integration_name, module_path):
+        self.pending_modules[integration_name] = module_path
+
+    def load_module(self, integration_name):
+        # Import the module of an integration and run its `register`, once
+        # Entries are removed once registered, a concurrent lookup waits on the lock until then
+        with self.loading_lock:
+            module_path = self.pending_modules.get(integration_name)
+            if module_path is not None:
+                mod = importlib.import_module(module_path)
+                if hasattr(mod, 'register'):
+                    mod.register(self)
+                del self.pending_modules[integration_name]
+            factory = self.factories.get(integration_name)
+            if factory is not None:
+                self.register(integration_name, factory())
+                del self.factories[integration_name]
+
+    def ensure_loaded(self, integration_name):
+        if integration_name in self.pending_modules or integration_name in self.factories:
+            self.load_module(integration_name)
+
+    def load_all(self):
+        for integration_name in list(self.pending_modules) + list(self.factories):
+            self.load_module(integration_name)
+
     def get_integration_function(self, integration_name):
-        # Retrieve a callable integration function by name
-        return self.integration_functions.get(integration_name)
+        # Retrieve a callable integration function by name, async-only integrations run in their own event loop
+        self.ensure_loaded(integration_name)
+        integration_function = self.integration_functions.get(integration_name)
+        async_function = self.async_integration_functions.get(integration_name)
+        if integration_function is None and async_function is not None:
+            return lambda app, data: asyncio.run(async_function(app, data))
+        return integration_function
+
+    def get_async_integration_function(self, integration_name):
+        self.ensure_loaded(integration_name)
+        return self.async_integration_functions.get(integration_name)
+
+    def get_limiter(self, integration_name):
+        # Admission limiter for an integration, None when it is not limited
+        return self.limiters.get(integration_name)
+
+    def get_async_limiter(self, integration_name):
+        return self.async_limiters.get(integration_name)
+
+    def load(self):
+        return {
+            integration_name: {**limiter.stats(), 'async': self.async_limiters[integration_name].stats()}
+            for integration_name, limiter in self.limiters.items()
+        }
 
 # def get_integration_function(integration_name):
 #     # Check if we're in an application context
@@ -81,6 +341,32 @@ def get_integration_function(integration_name):
     
     return integration_function
 
+def integration_result(result):
+    # (payload, status_code) of an integration return value: a payload, a Flask response, or a tuple of either
+    status_code = 200
+    if isinstance(result, tuple):
+        result, status_code = result[0], result[1]
+    if isinstance(result, Response):
+        if result.status_code != 200 and status_code == 200:
+            status_code = result.status_code
+        result = result.get_json(silent=True)
+    return result, status_code
+
+def call_integration(integration_name, app, data):
+    integration_function = get_integration_function(integration_name)
+    return integration_result(integration_function(app, data))
+
+async def call_integration_async(integration_name, app, data):
+    # Awaits the async variant of an integration, sync integrations run in a worker thread
+    integration_manager = app.integration_manager
+    integration_function = integration_manager.get_async_integration_function(integration_name)
+    if integration_function is not None:
+        return integration_result(await integration_function(app, data))
+    integration_function = integration_manager.get_integration_function(integration_name)
+    if integration_function is None:
+        raise ValueError(f"No integration function found for '{integration_name}'")
+    return integration_result(await asyncio.to_thread(integration_function, app, data))
+
 def initialize_integrations(app):
     app.integration_manager = IntegrationManager(app)
 
@@ -90,7 +376,6 @@ def initialize_integrations(app):
             continue
         integration_name = module_name[:-3]
         if INTEGRATIONS.get(integration_name):
-            module_path = f'app.integrations.{integration_name}'
-            mod = importlib.import_module(module_path)
-            if hasattr(mod, 'register'):
-                mod.register(app.integration_manager)
+            app.integration_manager.add_module(integration_name, f'app.integrations.{integration_name}')
+    if not LAZY_INTEGRATIONS:
+        app.integration_manager.load_all()
@@ -1,6 +1,10 @@
+import logging
 import openai
 from flask import jsonify
-from app.integrations.integration_manager import get_integration_function
+from app.integrations.integration_manager import get_integration_function, integration_result
+from app.logs import truncated
+
+logger = logging.getLogger(__name__)
 
 def latent_input(app, data):
     """ """
@@ -11,7 +15,7 @@ def latent_input(app, data):
 
         try:
             # OpenAI Chat Completion request
-            print(f"User input: {user_input}")
+            logger.debug("User input: %s", truncated(user_input))
             response = openai.chat.completions.create(
                 model="gpt-4-turbo",
                 messages=[
@@ -22,7 +26,7 @@ def latent_input(app, data):
 
             # Extracting the assistant's reply
             assistant_reply = response.choices[0].message.content
-            print(f"Assistant reply: {assistant_reply}")
+            logger.debug("Assistant reply: %s", truncated(assistant_reply))
 
             result = {
                 'natural_input': assistant_reply
@@ -32,7 +36,7 @@ def latent_input(app, data):
             natural_input_function = get_integration_function('natural_input_flexible')
             if natural_input_function:
                 # Call the natural_input_flexible integration with the assistant's reply
-                ni_response, status_code = natural_input_function(app, result)
+                ni_response, status_code = integration_result(natural_input_function(app, result))
                 if status_code == 200:
                     return jsonify(ni_response), 200
                 else:
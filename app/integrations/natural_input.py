@@ -56,120 +56,201 @@
 # into structured data through automated knowledge graph generation and the conditional addition of this data into the application's
 # operational context, leveraging the `add_multiple_conditional_function` for dynamic data integration based on AI-generated content.
 
-from flask import Flask, request, jsonify
+# `natural_input_async` is registered next to it for the ASGI entry point: the extraction and the conditional additions
+# await the shared async OpenAI client instead of holding a worker thread for the whole request.
+
+import logging
+from flask import Flask, request
 import openai
 import json
-from app.integrations.integration_manager import get_integration_function
+from app.integrations.integration_manager import call_integration, call_integration_async
+from app.documents import document_id_for, document_registry
+from app.llm import async_openai
+from app.logs import truncated
+
+logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
 
-def create_knowledge_graph(app, natural_input):
-    with app.app_context():
-        try:
-            print("start openai call")
-
-            completion = openai.chat.completions.create(
-                model="gpt-4-turbo",
-                messages=[
-                    {
-                        "role": "system",
-                        "content": """
-                    You are an AI expert specializing in knowledge graph creation with the goal of capturing relationships based on a given input or request.
-                    You are given input in various forms such as paragraph, email, text files, and more.
-                    Your task is to create a knowledge graph based on the input.
-                    Add all relevant entities and their relationships, regardless of their type.
-                    Ensure that every entity is connected to at least one other entity.
-                    """
+def _knowledge_graph_request(natural_input):
+    return {
+        "model": "gpt-4-turbo",
+        "messages": [
+            {
+                "role": "system",
+                "content": """
+            You are an AI expert specializing in knowledge graph creation with the goal of capturing relationships based on a given input or request.
+            You are given input in various forms such as paragraph, email, text files, and more.
+            Your task is to create a knowledge graph based on the input.
+            Add all relevant entities and their relationships, regardless of their type.
+            Ensure that every entity is connected to at least one other entity.
+            """
+            },
+            {
+                "role": "user",
+                "content": f"Create a knowledge graph from the following text: {natural_input}"
+            }
+        ],
+        "functions": [{
+            "name": "knowledge_graph",
+            "description": "Generate a knowledge graph with entities and relationships based on the input. Capture all relevant relationships. Do not abbreviate anything.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "nodes": {
+                        "type": "array",
+                        "items": {
+                            "type": "object",
+                            "properties": {
+                                "id": {"type": "integer"},
+                                "name": {"type": "string"}
+                            },
+                            "required": ["id", "name"]
+                        }
                     },
-                    {
-                        "role": "user",
-                        "content": f"Create a knowledge graph from the following text: {natural_input}"
-                    }
-                ],
-                functions=[{
-                    "name": "knowledge_graph",
-                    "description": "Generate a knowledge graph with entities and relationships based on the input. Capture all relevant relationships. Do not abbreviate anything.",
-                    "parameters": {
-                        "type": "object",
-                        "properties": {
-                            "nodes": {
-                                "type": "array",
-                                "items": {
-                                    "type": "object",
-                                    "properties": {
-                                        "id": {"type": "integer"},
-                                        "name": {"type": "string"}
-                                    },
-                                    "required": ["id", "name"]
-                                }
+                    "relationships": {
+                        "type": "array",
+                        "items": {
+                            "type": "object",
+                            "properties": {
+                                "from_id": {"type": "integer"},
+                                "to_id": {"type": "integer"},
+                                "relationship": {"type": "string"},
+                                "snippet": {"type": "string"}
                             },
-                            "relationships": {
-                                "type": "array",
-                                "items": {
-                                    "type": "object",
-                                    "properties": {
-                                        "from_id": {"type": "integer"},
-                                        "to_id": {"type": "integer"},
-                                        "relationship": {"type": "string"},
-                                        "snippet": {"type": "string"}
-                                    },
-                                    "required": ["from_id", "to_id", "relationship", "snippet"]
-                                }
-                            }
-                        },
-                        "required": ["nodes", "relationships"]
+                            "required": ["from_id", "to_id", "relationship", "snippet"]
+                        }
                     }
-                }
-            ],
-                function_call={"name": "knowledge_graph"}
-            )
-   
-            print("OPENAI END")
-            print(completion.choices[0])
+                },
+                "required": ["nodes", "relationships"]
+            }
+        }],
+        "function_call": {"name": "knowledge_graph"}
+    }
 
-            response_data = completion.choices[0].message.function_call
+def _knowledge_graph_answer(completion):
+    logger.debug("Knowledge graph extraction answer: %s", truncated(completion.choices[0]))
 
-            if response_data and response_data.arguments:
-                return json.loads(response_data.arguments)
-            else:
-                raise ValueError("No valid function call arguments found in the API response")
-            
+    response_data = completion.choices[0].message.function_call
+
+    if response_data and response_data.arguments:
+        return json.loads(response_data.arguments)
+    else:
+        raise ValueError("No valid function call arguments found in the API response")
+
+def create_knowledge_graph(app, natural_input):
+    with app.app_context():
+        try:
+            logger.debug("Knowledge graph extraction started")
+            completion = openai.chat.completions.create(**_knowledge_graph_request(natural_input))
+            return _knowledge_graph_answer(completion)
+        except Exception as e:
+            logger.error("Error during knowledge graph creation: %s", e)
+            return None
+
+async def create_knowledge_graph_async(app, natural_input):
+    with app.app_context():
+        try:
+            logger.debug("Knowledge graph extraction started")
+            completion = await async_openai().chat.completions.create(**_knowledge_graph_request(natural_input))
+            return _knowledge_graph_answer(completion)
         except Exception as e:
-            print(f"Error during knowledge graph creation: {e}")
+            logger.error("Error during knowledge graph creation: %s", e)
             return None
 
 
+def _claim_document(data):
+    # (document id, None) for a document to extract, (document id, response) for one already ingested
+    document_id = document_id_for(data['natural_input'])
+    if not data.get('force'):
+        existing = document_registry.claim(document_id, source=data.get('url'))
+        if existing is not None:
+            logger.info("Document %s already %s, skipping extraction", document_id, existing["status"])
+            return document_id, ({
+                "success": True,
+                "duplicate": True,
+                "document_id": document_id,
+                "status": existing["status"],
+                "created_entities": existing.get("entities", []),
+                "relationships": existing.get("relationships", [])
+            }, 200)
+    return document_id, None
+
+def _finish_document(document_id, response_data, status_code):
+    if status_code == 200:
+        document_registry.complete(
+            document_id,
+            response_data.get("created_entities", {}).values(),
+            response_data.get("relationships", [])
+        )
+    else:
+        document_registry.release(document_id)
+
 def natural_input(app, data):
     with app.app_context():
+        document_id = None
         try:
             # Get the natural input from the data
-            natural_input_text = data.get('natural_input')
-            if not natural_input_text:
-                return jsonify({"error": "No natural input provided"}), 400
+            if not data.get('natural_input'):
+                return {"error": "No natural input provided"}, 400
+
+            # Skip documents that were already ingested, unless the caller forces a re-ingestion
+            document_id, duplicate = _claim_document(data)
+            if duplicate is not None:
+                return duplicate
 
             # Create the knowledge graph
-            knowledge_graph_data = create_knowledge_graph(app, natural_input_text)
+            knowledge_graph_data = create_knowledge_graph(app, data['natural_input'])
             
             if knowledge_graph_data is None:
-                return jsonify({"error": "Failed to create knowledge graph"}), 500
+                document_registry.release(document_id)
+                return {"error": "Failed to create knowledge graph"}, 500
+            knowledge_graph_data["document_id"] = document_id
+
+            # Call the add_multiple_conditional integration, its result comes back as a dict
+            logger.debug("Adding the extracted graph")
+            response_data, status_code = call_integration("add_multiple_conditional", app, knowledge_graph_data)
+            _finish_document(document_id, response_data, status_code)
+
+            # Flask serialises the dict when this answers a request
+            return response_data, status_code
+        
+        except Exception as e:
+            logger.exception("Failed to process natural input: %s", e)
+            if document_id:
+                document_registry.release(document_id)
+            return {"error": str(e)}, 500
+
+async def natural_input_async(app, data):
+    with app.app_context():
+        document_id = None
+        try:
+            if not data.get('natural_input'):
+                return {"error": "No natural input provided"}, 400
 
-            # Retrieve the callable function for the add_multiple_conditional integration
-            print("get function")
-            add_multiple_conditional_function = get_integration_function("add_multiple_conditional")
+            document_id, duplicate = _claim_document(data)
+            if duplicate is not None:
+                return duplicate
 
-            if not add_multiple_conditional_function:
-                return jsonify({"error": "Target integration function not found"}), 500
+            knowledge_graph_data = await create_knowledge_graph_async(app, data['natural_input'])
+            if knowledge_graph_data is None:
+                document_registry.release(document_id)
+                return {"error": "Failed to create knowledge graph"}, 500
+            knowledge_graph_data["document_id"] = document_id
 
-            # Call the target integration function and get the response
-            print("start adding")
-            response, status_code = add_multiple_conditional_function(app, knowledge_graph_data)
+            logger.debug("Adding the extracted graph")
+            response_data, status_code = await call_integration_async(
+                "add_multiple_conditional", app, knowledge_graph_data
+            )
+            _finish_document(document_id, response_data, status_code)
+            return response_data, status_code
 
-            # The response should already be a Flask response object, so we can return it directly
-            return response, status_code
-        
         except Exception as e:
-            print(f"Failed to process natural input: {e}")
-            return jsonify({"error": str(e)}), 500
+            logger.exception("Failed to process natural input: %s", e)
+            if document_id:
+                document_registry.release(document_id)
+            return {"error": str(e)}, 500
 
 def register(integration_manager):
-    integration_manager.register("natural_input", natural_input)
\ No newline at end of file
+    integration_manager.register("natural_input", natural_input)
+    integration_manager.register_async("natural_input", natural_input_async)
\ No newline at end of file
@@ -1,21 +1,25 @@
 # basic search
 
+import logging
 from flask import jsonify
 from app.models import search_entities_with_type
+from app.logs import truncated
+
+logger = logging.getLogger(__name__)
 
 def search_integration(app, data):
   with app.app_context():
-      print("SEARCHING!")
+      logger.debug("Searching %s entities", data.get('entity_type'))
       entity_type = data.get('entity_type')
       search_params = data.get('search_params')
 
       if entity_type and search_params:
           results = search_entities_with_type(entity_type, search_params)
-          print(f"Search results: {results}")
+          logger.debug("Search results: %s", truncated(results))
           # Return a Flask response object
           return jsonify(results), 200
       else:
-          print("Invalid search parameters")
+          logger.info("Invalid search parameters")
           # Return a Flask response object
           return jsonify({"error": "Invalid search parameters"}), 400
 
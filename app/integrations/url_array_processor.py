@@ -1,8 +1,11 @@
-# Used for the csv input, which sends an array of URLs to this function, which splits up and sends to the url_input function which is loaded with the integration manager.
+# Used for the csv input, which sends an array of URLs to this function, which feeds them to the ingestion pipeline.
 
+import logging
 from flask import jsonify
-from urllib.parse import urlparse, quote
-from app.integrations.integration_manager import get_integration_function
+from urllib.parse import urlparse
+from app.integrations.ingestion_pipeline import run_ingestion
+
+logger = logging.getLogger(__name__)
 
 # Function to check if a string is a valid URL
 def is_valid_url(url):
@@ -12,38 +15,29 @@ def is_valid_url(url):
     except ValueError:
         return False
 
-# Updated integration function to process an array of URLs using the Integration Manager
+# Integration function to process an array of URLs through the ingestion pipeline
 def url_array_processor(app, data):
     with app.app_context():
-        print("URL Array Processor Integration")
+        logger.debug("URL Array Processor Integration")
         urls = data.get('urls', [])  # Expecting 'urls' to be an array of URLs
-    
-        results = []
-        errors = []
-    
-        # Retrieve the url_input integration function
-        url_input_function = get_integration_function('url_input')
-    
-        if not url_input_function:
-            return jsonify({"error": "url_input integration not found"}), 404
-    
-        for url in urls:
-            if is_valid_url(url):
-                # Encode the URL
-                encoded_url = quote(url, safe='')
-                url_input_data = {'natural_input': encoded_url}
-    
-                # Dynamically call the url_input function
-                response, status_code = url_input_function(app, url_input_data)
-    
-                if status_code == 200:
-                    results.append(response)
-                else:
-                    errors.append(f"Failed to process URL {url}: Status Code {status_code}")
-            else:
-                errors.append(f"Invalid URL: {url}")
-    
-        return jsonify({"results": "success", "errors": errors}), 200
+
+        errors = [f"Invalid URL: {url}" for url in urls if not is_valid_url(url)]
+        valid_urls = [url for url in urls if is_valid_url(url)]
+
+        # Pages are fetched, extracted and written concurrently by the pipeline stages
+        report = run_ingestion(app, [{"key": url, "url": url} for url in dict.fromkeys(valid_urls)])
+        errors.extend(
+            f"Failed to process URL {error['item'].get('key')}: {error['error']}"
+            if isinstance(error['item'], dict) else f"Failed to process: {error['error']}"
+            for error in report["errors"]
+        )
+
+        return jsonify({
+            "results": "success",
+            "errors": errors,
+            "documents": report["documents"],
+            "metrics": report["metrics"]
+        }), 200
 
 # Function to register this integration with the IntegrationManager
 def register(integration_manager):
@@ -0,0 +1,181 @@
+# This integration, `url_crawler`, crawls a website starting from one or more seed URLs and feeds every page it finds
+# into the knowledge graph through the `natural_input` integration.
+
+# Pages are scraped with `scrape_url` from `url_input`, which already collects the links of every page. Links are
+# resolved against the page URL, stripped of their fragment and added to a deduplicated frontier as long as:
+# - the page they were found on is shallower than `max_depth` (seeds are depth 0),
+# - their host is allowed: the hosts of the seed URLs by default, or the `allowed_domains` list when given,
+# - the page budget `max_pages` is not exhausted.
+
+# Pages are fetched in parallel by a pool of `concurrency` workers. Requests to the same host are spaced by at least
+# `politeness_delay` seconds. The options given to the integration are bounded by MIN_PARAMS and MAX_PARAMS, a
+# request out of them is answered with 400. Each worker hands its page to the extraction step as soon as it is fetched, so pages are
+# extracted while the rest of the site is still being crawled.
+
+# The `Crawler` class has no dependency on Flask: fetching and page handling are injected, which keeps it testable
+# against a local static site.
+
+import logging
+import math
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from urllib.parse import urldefrag, urljoin, urlparse
+from flask import jsonify
+from app.integrations.integration_manager import get_integration_function, integration_result
+from app.integrations.url_array_processor import is_valid_url
+from app.integrations.url_input import page_to_natural_input, scrape_url
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_DEPTH = 1
+DEFAULT_MAX_PAGES = 50
+DEFAULT_CONCURRENCY = 4
+DEFAULT_POLITENESS_DELAY = 1.0
+DEFAULT_PARAMS = {
+    "max_depth": DEFAULT_MAX_DEPTH,
+    "max_pages": DEFAULT_MAX_PAGES,
+    "concurrency": DEFAULT_CONCURRENCY,
+    "politeness_delay": DEFAULT_POLITENESS_DELAY,
+}
+# Bounds of the options of a request: every unit of concurrency is a thread, every page a call to natural_input
+MIN_PARAMS = {"max_depth": 0, "max_pages": 1, "concurrency": 1, "politeness_delay": 0.0}
+MAX_PARAMS = {"max_depth": 5, "max_pages": 500, "concurrency": 16, "politeness_delay": 60.0}
+
+
+def normalize_url(url):
+    url, _ = urldefrag(url)
+    parsed = urlparse(url)
+    return parsed._replace(scheme=parsed.scheme.lower(), netloc=parsed.netloc.lower()).geturl()
+
+
+class HostThrottle:
+    def __init__(self, delay):
+        self.delay = delay
+        self.next_slot = {}
+        self.lock = threading.Lock()
+
+    def wait(self, host):
+        # Reserve the next free slot for the host, then sleep until it starts
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.next_slot.get(host, now))
+            self.next_slot[host] = slot + self.delay
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class Crawler:
+    def __init__(self, seeds, max_depth=DEFAULT_MAX_DEPTH, max_pages=DEFAULT_MAX_PAGES, allowed_domains=None,
+                 concurrency=DEFAULT_CONCURRENCY, politeness_delay=DEFAULT_POLITENESS_DELAY, fetch=scrape_url,
+                 on_page=None):
+        self.seeds = [normalize_url(seed) for seed in seeds]
+        self.max_depth = max_depth
+        self.max_pages = max_pages
+        if allowed_domains:
+            self.allowed_domains = [domain.lower() for domain in allowed_domains]
+        else:
+            self.allowed_domains = [urlparse(seed).netloc for seed in self.seeds]
+        self.concurrency = concurrency
+        self.throttle = HostThrottle(politeness_delay)
+        self.fetch = fetch
+        self.on_page = on_page
+        self.seen = set()
+
+    def is_allowed(self, url):
+        parsed = urlparse(url)
+        if parsed.scheme not in ("http", "https"):
+            return False
+        host = parsed.netloc
+        return any(host == domain or host.endswith("." + domain) for domain in self.allowed_domains)
+
+    def visit(self, url):
+        self.throttle.wait(urlparse(url).netloc)
+        page = self.fetch(url)
+        result = self.on_page(page) if self.on_page else None
+        return page, result
+
+    def run(self):
+        pages = []
+        errors = []
+        pending = {}
+        self.seen = set()
+
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            def schedule(url, depth):
+                if len(self.seen) >= self.max_pages or url in self.seen or not self.is_allowed(url):
+                    return
+                self.seen.add(url)
+                pending[executor.submit(self.visit, url)] = (url, depth)
+
+            for seed in self.seeds:
+                schedule(seed, 0)
+
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    url, depth = pending.pop(future)
+                    try:
+                        page, result = future.result()
+                    except Exception as e:
+                        logger.warning("Failed to crawl %s: %s", url, e)
+                        errors.append(f"Failed to crawl {url}: {e}")
+                        continue
+
+                    pages.append({"url": url, "depth": depth, "result": result})
+                    if depth < self.max_depth:
+                        for link in page.get("links", []):
+                            schedule(normalize_url(urljoin(url, link)), depth + 1)
+
+        return {"pages": pages, "errors": errors}
+
+
+def crawl_params(data):
+    # Crawl options of a request with their defaults, converted to the type of the default, ValueError when invalid
+    params = {}
+    for key, default in DEFAULT_PARAMS.items():
+        value = data.get(key, default)
+        try:
+            if isinstance(value, bool) or not isinstance(value, (int, float, str)):
+                raise ValueError
+            value = type(default)(value)
+        except ValueError:
+            raise ValueError(f"{key} must be a number") from None
+        if not math.isfinite(value) or not MIN_PARAMS[key] <= value <= MAX_PARAMS[key]:
+            raise ValueError(f"{key} must be between {MIN_PARAMS[key]} and {MAX_PARAMS[key]}")
+        params[key] = value
+    allowed_domains = data.get('allowed_domains')
+    if allowed_domains is not None and (
+            not isinstance(allowed_domains, list) or not all(isinstance(domain, str) for domain in allowed_domains)):
+        raise ValueError("allowed_domains must be a list of host names")
+    params["allowed_domains"] = allowed_domains
+    return params
+
+
+def url_crawler(app, data):
+    with app.app_context():
+        logger.debug("URL Crawler Integration")
+        seeds = [url for url in data.get('urls', []) if is_valid_url(url)]
+        if not seeds:
+            return jsonify({"error": "At least one valid seed URL is required"}), 400
+        try:
+            params = crawl_params(data)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        natural_input_function = get_integration_function('natural_input')
+
+        def extract(page):
+            # Runs on the crawler workers, natural_input pushes its own app context
+            _, status_code = integration_result(natural_input_function(app, page_to_natural_input(page)))
+            return status_code
+
+        crawler = Crawler(seeds, on_page=extract, **params)
+        report = crawler.run()
+
+        pages = [{"url": page["url"], "depth": page["depth"], "status_code": page["result"]} for page in report["pages"]]
+        return jsonify({"pages": pages, "errors": report["errors"]}), 200
+
+
+def register(integration_manager):
+    integration_manager.register('url_crawler', url_crawler)
@@ -0,0 +1,225 @@
+# Server-side force-directed layout of the graph, served with the graph data for a preset layout in the browser.
+#
+# `force_layout` runs Fruchterman-Reingold on the undirected CSR adjacency of the analytics snapshot (see
+# analytics.py), every step computed on whole NumPy arrays:
+# - attraction along each relationship (d^2 / k), accumulated per node with bincount,
+# - repulsion between nodes (k^2 / d): exact, in blocks of LAYOUT_BLOCK rows, up to LAYOUT_EXACT_NODES nodes; above,
+#   each node is repelled by LAYOUT_SAMPLES random nodes, scaled up to the node count, which keeps an iteration
+#   O(n * samples) instead of O(n^2),
+# - a weak gravity towards the centre, so disconnected components stay in view,
+# - moves capped by a temperature cooling down linearly over the iterations.
+# `multilevel_layout` coarsens the graph by pairing nodes along randomly weighted edges (a pair becomes one node of
+# the next level) until at most LAYOUT_COARSEST_NODES are left, lays out the coarsest graph with LAYOUT_ITERATIONS
+# iterations, then places the nodes of each finer level at their parent's position and refines them with
+# LAYOUT_REFINE_ITERATIONS iterations at a low temperature. The global shape comes from the small graphs, large graphs
+# only get a few cheap iterations: 20,000 entities take a few seconds.
+# Positions are in units of the ideal edge length k = 1 and scaled by LAYOUT_SPACING pixels when served.
+#
+# `GraphLayout` caches the positions of the snapshot until the graph version changes. The next layout starts from
+# the previous positions: entities still in the graph keep theirs, new entities are placed at the mean position of
+# their placed neighbours (or at random within the current layout), then LAYOUT_REFINE_ITERATIONS iterations settle
+# them, the entities already laid out only moving at INCREMENTAL_MOBILITY of the temperature so that the graph is not
+# reshuffled. When more than half of the entities are new, the multilevel layout is computed
+# from scratch.
+
+import os
+import threading
+import time
+import numpy as np
+from scipy import sparse
+
+LAYOUT_ITERATIONS = int(os.getenv("LAYOUT_ITERATIONS", "60"))
+LAYOUT_REFINE_ITERATIONS = int(os.getenv("LAYOUT_REFINE_ITERATIONS", "15"))
+LAYOUT_EXACT_NODES = int(os.getenv("LAYOUT_EXACT_NODES", "1000"))
+LAYOUT_SAMPLES = int(os.getenv("LAYOUT_SAMPLES", "64"))
+# Graphs are coarsened until they have at most this many nodes, or a level stops shrinking them
+LAYOUT_COARSEST_NODES = 300
+LAYOUT_BLOCK = 512
+LAYOUT_SPACING = float(os.getenv("LAYOUT_SPACING", "150"))
+GRAVITY = 0.02
+# Share of the temperature of the entities already laid out when new ones are added
+INCREMENTAL_MOBILITY = 0.1
+
+
+def _repulsion(x, y, rng):
+    n = len(x)
+    if n <= LAYOUT_EXACT_NODES:
+        fx = np.empty(n)
+        fy = np.empty(n)
+        for start in range(0, n, LAYOUT_BLOCK):
+            dx = x[start:start + LAYOUT_BLOCK, None] - x[None, :]
+            dy = y[start:start + LAYOUT_BLOCK, None] - y[None, :]
+            # A node's own term has a zero delta and adds nothing
+            distance2 = np.maximum(dx * dx + dy * dy, 1e-4)
+            fx[start:start + LAYOUT_BLOCK] = (dx / distance2).sum(axis=1)
+            fy[start:start + LAYOUT_BLOCK] = (dy / distance2).sum(axis=1)
+        return fx, fy
+    samples = rng.integers(0, n, size=(n, LAYOUT_SAMPLES))
+    dx = x[:, None] - x[samples]
+    dy = y[:, None] - y[samples]
+    distance2 = np.maximum(dx * dx + dy * dy, 1e-4)
+    scale = (n - 1) / LAYOUT_SAMPLES
+    return (dx / distance2).sum(axis=1) * scale, (dy / distance2).sum(axis=1) * scale
+
+
+def force_layout(adjacency, positions=None, iterations=LAYOUT_ITERATIONS, temperature=None, mobility=None, seed=0):
+    # (n, 2) positions of the nodes of a symmetric sparse adjacency, starting from `positions` when given.
+    # `mobility` scales the temperature per node, e.g. to let new nodes move while the others stay put
+    n = adjacency.shape[0]
+    rng = np.random.default_rng(seed)
+    if positions is None:
+        positions = (rng.random((n, 2)) - 0.5) * np.sqrt(max(n, 1))
+    x = np.array(positions[:, 0], dtype=np.float64)
+    y = np.array(positions[:, 1], dtype=np.float64)
+    if n >= 2:
+        edges = sparse.triu(adjacency, k=1).tocoo()
+        rows, cols = edges.row, edges.col
+        temperature = 0.1 * np.sqrt(n) if temperature is None else temperature
+        cooling = temperature / (iterations + 1)
+        mobility = np.ones(n) if mobility is None else mobility
+        for _ in range(iterations):
+            fx, fy = _repulsion(x, y, rng)
+            dx = x[rows] - x[cols]
+            dy = y[rows] - y[cols]
+            distance = np.sqrt(dx * dx + dy * dy)
+            ax = dx * distance
+            ay = dy * distance
+            fx += np.bincount(cols, weights=ax, minlength=n) - np.bincount(rows, weights=ax, minlength=n)
+            fy += np.bincount(cols, weights=ay, minlength=n) - np.bincount(rows, weights=ay, minlength=n)
+            fx -= GRAVITY * (x - x.mean())
+            fy -= GRAVITY * (y - y.mean())
+            length = np.maximum(np.sqrt(fx * fx + fy * fy), 1e-9)
+            step = np.minimum(length, temperature * mobility) / length
+            x += fx * step
+            y += fy * step
+            temperature -= cooling
+    return np.column_stack([x, y])
+
+
+def coarsen(adjacency, rng, weighted=False):
+    # Parent of every node in a coarser graph: nodes are paired along the edges that are the heaviest, by random
+    # weight (or by the weights of the adjacency when `weighted`, ties broken at random), of both of their endpoints,
+    # unpaired nodes keep a parent of their own
+    n = adjacency.shape[0]
+    edges = sparse.triu(adjacency, k=1).tocoo()
+    weights = rng.random(len(edges.row))
+    scores = edges.data if weighted else np.zeros(len(edges.row))
+    rows = np.concatenate([edges.row, edges.col])
+    cols = np.concatenate([edges.col, edges.row])
+    order = np.lexsort((np.concatenate([weights, weights]), np.concatenate([scores, scores]), rows))
+    rows, cols = rows[order], cols[order]
+    heaviest = np.ones(len(rows), dtype=bool)
+    heaviest[:-1] = rows[1:] != rows[:-1]
+    best = np.arange(n)
+    best[rows[heaviest]] = cols[heaviest]
+    nodes = np.arange(n)
+    paired = best[best] == nodes
+    _, parent = np.unique(np.where(paired, np.minimum(nodes, best), nodes), return_inverse=True)
+    return parent
+
+
+def multilevel_layout(adjacency, seed=0):
+    # Lays out the coarsest graph, then every finer one from the positions of its parents
+    rng = np.random.default_rng(seed)
+    levels = []
+    while adjacency.shape[0] > LAYOUT_COARSEST_NODES:
+        parent = coarsen(adjacency, rng)
+        size = parent.max() + 1
+        if size > 0.9 * adjacency.shape[0]:
+            break
+        prolongation = sparse.csr_matrix((np.ones(len(parent)), (np.arange(len(parent)), parent)))
+        levels.append((adjacency, parent))
+        adjacency = (prolongation.T @ adjacency @ prolongation).tocsr()
+        adjacency.setdiag(0)
+        adjacency.eliminate_zeros()
+
+    positions = force_layout(adjacency, seed=seed)
+    for adjacency, parent in reversed(levels):
+        # Layouts take an area proportional to the node count
+        spread = np.sqrt(len(parent) / (parent.max() + 1))
+        positions = positions[parent] * spread + (rng.random((len(parent), 2)) - 0.5) * 0.5
+        positions = force_layout(adjacency, positions, LAYOUT_REFINE_ITERATIONS, temperature=1.0, seed=seed)
+    return positions
+
+
+def place_new_nodes(adjacency, positions, known, seed=0):
+    # Positions of the nodes not `known` from their placed neighbours, in two passes so that chains of new nodes
+    # hanging off the graph are placed too; the others at random within the bounds of the known nodes
+    rng = np.random.default_rng(seed)
+    positions = positions.copy()
+    known = known.copy()
+    for _ in range(2):
+        placed = known.astype(np.float64)
+        neighbour_sum = adjacency @ (positions * placed[:, None])
+        neighbour_count = adjacency @ placed
+        fill = ~known & (neighbour_count > 0)
+        jitter = (rng.random((int(fill.sum()), 2)) - 0.5) * 0.5
+        positions[fill] = neighbour_sum[fill] / neighbour_count[fill, None] + jitter
+        known |= fill
+    if not known.all():
+        if known.any():
+            low, high = positions[known].min(axis=0), positions[known].max(axis=0)
+        else:
+            low, high = np.zeros(2), np.ones(2)
+        positions[~known] = low + rng.random((int((~known).sum()), 2)) * np.maximum(high - low, 1.0)
+    return positions
+
+
+class GraphLayout:
+    def __init__(self, analytics=None, spacing=LAYOUT_SPACING):
+        # Defaults to the analytics snapshot of the app
+        self.analytics = analytics
+        self.spacing = spacing
+        self.lock = threading.Lock()
+        self.graph = None
+        self.positions = None
+        self.served = None
+        self.timings = {}
+        self.runs = {"full": 0, "incremental": 0}
+
+    def _analytics(self):
+        if self.analytics is not None:
+            return self.analytics
+        from app.analytics import analytics
+        return analytics
+
+    def _layout(self, graph):
+        n = graph.node_count
+        previous = {}
+        if self.graph is not None:
+            previous = {entity_id: self.positions[position] for position, entity_id in enumerate(self.graph.ids)}
+        known = np.array([entity_id in previous for entity_id in graph.ids], dtype=bool)
+        if n and known.sum() * 2 >= n:
+            positions = np.zeros((n, 2))
+            positions[known] = [previous[entity_id] for entity_id, placed in zip(graph.ids, known, strict=True) if placed]
+            positions = place_new_nodes(graph.undirected, positions, known)
+            self.runs["incremental"] += 1
+            mobility = np.where(known, INCREMENTAL_MOBILITY, 1.0)
+            return force_layout(graph.undirected, positions, LAYOUT_REFINE_ITERATIONS, 1.0, mobility)
+        self.runs["full"] += 1
+        return multilevel_layout(graph.undirected)
+
+    def layout(self):
+        # {entity id: [x, y]} in pixels, for the current graph version
+        with self.lock:
+            graph = self._analytics().snapshot()
+            if graph is not self.graph:
+                started = time.perf_counter()
+                positions = self._layout(graph)
+                self.graph = graph
+                self.positions = positions
+                scaled = np.round(positions * self.spacing, 1).tolist()
+                self.served = dict(zip(graph.ids, scaled, strict=True))
+                self.timings["layout"] = time.perf_counter() - started
+            return self.served
+
+    def stats(self):
+        with self.lock:
+            return {
+                "nodes": self.graph.node_count if self.graph is not None else None,
+                "runs": dict(self.runs),
+                "seconds": {name: round(seconds, 6) for name, seconds in self.timings.items()},
+            }
+
+
+graph_layout = GraphLayout()
@@ -0,0 +1,25 @@
+# OpenAI client of the async integrations.
+#
+# The sync integrations call the module level `openai` client. Their async variants (run on the event loop of the ASGI
+# entry point, see app/asgi.py) share one `openai.AsyncOpenAI` per event loop: its connection pool belongs to the
+# loop that opened it, so a loop started by `asyncio.run` (async-only integrations called from the WSGI app) gets a
+# client of its own. Key and base URL follow the module level client, e.g. OPENAI_API_KEY and OPENAI_BASE_URL.
+
+import asyncio
+import os
+import weakref
+import openai
+
+_clients = weakref.WeakKeyDictionary()
+
+
+def async_openai():
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None:
+        client = openai.AsyncOpenAI(
+            api_key=openai.api_key or os.getenv("OPENAI_API_KEY"),
+            base_url=openai.base_url or os.getenv("OPENAI_BASE_URL") or None,
+        )
+        _clients[loop] = client
+    return client
@@ -0,0 +1,143 @@
+# Logging of the app, configured once by create_app.
+#
+# Modules log through `logging.getLogger(__name__)`, every logger under `app` ends up in one handler:
+# - LOG_LEVEL (default INFO) sets the level, debug messages (payloads, model answers, per-entity progress) are
+#   skipped before any formatting in production,
+# - every record carries the correlation id of the request it was logged in, taken from the X-Request-ID header or
+#   generated, and sent back in the X-Request-ID response header ("-" outside of requests),
+# - `truncated(value)` wraps large values (graphs, model answers, request bodies) so they are only turned into text
+#   when the record is emitted, cut to LOG_PAYLOAD_CHARS characters,
+# - records logged with `extra=sampled("key")` are high-volume messages (one per inserted entity...), only the first
+#   and then one in LOG_SAMPLE_EVERY of each key are kept, with the number of records they stand for,
+# - records are put on a queue by the request threads and written to stderr by a background listener thread, slow
+#   terminals or pipes no longer hold requests up.
+# LOG_FORMAT=json writes one JSON object per line instead of text.
+
+import atexit
+import contextvars
+import itertools
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+import uuid
+from flask import g, request
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text").lower()
+LOG_PAYLOAD_CHARS = int(os.getenv("LOG_PAYLOAD_CHARS", "500"))
+LOG_SAMPLE_EVERY = int(os.getenv("LOG_SAMPLE_EVERY", "100"))
+REQUEST_ID_HEADER = "X-Request-ID"
+TEXT_FORMAT = "%(asctime)s %(levelname)s [%(request_id)s] %(name)s: %(message)s"
+
+request_id_var = contextvars.ContextVar("request_id", default="-")
+
+_listener = None
+_configure_lock = threading.Lock()
+
+
+class truncated:
+    # Lazy, truncated text of a value, for `%s` arguments of log calls
+    __slots__ = ("value", "limit")
+
+    def __init__(self, value, limit=None):
+        self.value = value
+        self.limit = LOG_PAYLOAD_CHARS if limit is None else limit
+
+    def __str__(self):
+        text = self.value if isinstance(self.value, str) else repr(self.value)
+        if self.limit and len(text) > self.limit:
+            return f"{text[:self.limit]}... ({len(text)} chars)"
+        return text
+
+    __repr__ = __str__
+
+
+def sampled(key):
+    return {"sample_key": key}
+
+
+class RequestIdFilter(logging.Filter):
+    def filter(self, record):
+        record.request_id = request_id_var.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    def __init__(self, every=LOG_SAMPLE_EVERY):
+        super().__init__()
+        self.every = max(1, every)
+        self.lock = threading.Lock()
+        self.counters = {}
+
+    def filter(self, record):
+        key = getattr(record, "sample_key", None)
+        if key is None or self.every == 1:
+            return True
+        with self.lock:
+            counter = self.counters.setdefault(key, itertools.count())
+            seen = next(counter)
+        if seen == 0:
+            return True
+        if seen % self.every:
+            return False
+        record.msg = f"{record.msg} [sampled, 1 of {self.every}]"
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "request_id": getattr(record, "request_id", "-"),
+            "message": record.getMessage(),
+        }
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def _start_request():
+    g.request_id = request.headers.get(REQUEST_ID_HEADER) or uuid.uuid4().hex
+    g.request_id_token = request_id_var.set(g.request_id)
+
+
+def _tag_response(response):
+    request_id = g.get("request_id")
+    if request_id is not None:
+        response.headers[REQUEST_ID_HEADER] = request_id
+    return response
+
+
+def _end_request(_exc):
+    token = g.pop("request_id_token", None)
+    if token is not None:
+        request_id_var.reset(token)
+
+
+def configure_logging(app, level=None, stream=None):
+    # Handlers are installed on the first call, every app gets the request id hooks
+    global _listener
+    with _configure_lock:
+        if _listener is None:
+            output = logging.StreamHandler(stream)
+            output.setFormatter(JsonFormatter() if LOG_FORMAT == "json" else logging.Formatter(TEXT_FORMAT))
+            records = queue.SimpleQueue()
+            handler = logging.handlers.QueueHandler(records)
+            # Filters run in the logging thread, where the request id is known
+            handler.addFilter(RequestIdFilter())
+            handler.addFilter(SamplingFilter())
+            logger = logging.getLogger("app")
+            logger.addHandler(handler)
+            logger.setLevel(level or LOG_LEVEL)
+            logger.propagate = False
+            _listener = logging.handlers.QueueListener(records, output)
+            _listener.start()
+            atexit.register(_listener.stop)
+    app.before_request(_start_request)
+    app.after_request(_tag_response)
+    app.teardown_request(_end_request)
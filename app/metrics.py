@@ -0,0 +1,269 @@
+# In-process metrics, exposed in the Prometheus text format by the /metrics route.
+#
+# Counters, histograms and callback gauges are plain dicts of label values behind a lock, an observation is a
+# bisect and a few additions, so they stay on under full load. Nothing is exported on its own, Prometheus (or
+# anything reading its text format) scrapes /metrics. Set METRICS=false to leave the instrumentation out.
+#
+# Series:
+# - kgraph_http_request_duration_seconds{method,route} and kgraph_http_requests_total{method,route,status} for every
+#   request of the app, timed by the hooks `instrument_app` installs. Routes are labelled with their URL rule
+#   (/<entity_id>, not the entity id) to keep the number of series bounded,
+# - kgraph_integration_calls_total, kgraph_integration_errors_total (exceptions and 5xx results) and
+#   kgraph_integration_duration_seconds{integration} for integrations registered with the IntegrationManager (sync and
+#   async variants alike), whether triggered by a request or called by another integration,
+# - kgraph_db_operation_duration_seconds and kgraph_db_operation_errors_total{operation} for the calls made to the
+#   database integration through `InstrumentedDatabase`,
+# - kgraph_graph_entities and kgraph_graph_relationships, counted by the database at scrape time, once per graph
+#   version,
+# - kgraph_signal_deliveries_queued and kgraph_signal_deliveries_dead_lettered for the signal event bus (signals.py).
+
+import math
+import os
+import threading
+import time
+from bisect import bisect_left
+from functools import wraps
+from flask import Response, g, request
+from .signals import event_bus
+
+METRICS_ENABLED = os.getenv("METRICS", "true").lower() == "true"
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+# Seconds, from cache hits to model calls and crawls
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values, strict=True)]
+    pairs.extend(f'{name}="{value}"' for name, value in extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    type = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.lock = threading.Lock()
+        self.values = {}
+
+    def inc(self, *labels, amount=1):
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def value(self, *labels):
+        return self.values.get(labels, 0)
+
+    def render(self):
+        with self.lock:
+            values = sorted(self.values.items())
+        for labels, value in values:
+            yield f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+
+
+class Histogram:
+    type = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self.lock = threading.Lock()
+        # label values -> [per bucket counts (last one is +Inf), sum]
+        self.series = {}
+
+    def observe(self, value, *labels):
+        index = bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.series.get(labels)
+            if series is None:
+                series = self.series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def count(self, *labels):
+        series = self.series.get(labels)
+        return sum(series[0]) if series else 0
+
+    def render(self):
+        with self.lock:
+            series = sorted((labels, (list(counts), total)) for labels, (counts, total) in self.series.items())
+        for labels, (counts, total) in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts, strict=True):
+                cumulative += count
+                bucket = _format_labels(self.labelnames, labels, [("le", _format_value(float(bound)))])
+                yield f"{self.name}_bucket{bucket} {cumulative}"
+            label_text = _format_labels(self.labelnames, labels)
+            yield f"{self.name}_sum{label_text} {_format_value(total)}"
+            yield f"{self.name}_count{label_text} {cumulative}"
+
+
+class Gauge:
+    # Read when rendered, `function` returns {label values: value}
+    type = "gauge"
+
+    def __init__(self, name, documentation, function, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.function = function
+        self.labelnames = tuple(labelnames)
+
+    def render(self):
+        for labels, value in sorted(self.function().items()):
+            yield f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.metrics = {}
+
+    def register(self, metric):
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def gauge(self, name, documentation, function, labelnames=()):
+        return self.register(Gauge(name, documentation, function, labelnames))
+
+    def render(self):
+        lines = []
+        for metric in self.metrics.values():
+            try:
+                samples = list(metric.render())
+            except Exception as e:
+                # A failing gauge (e.g. the database is down) does not take the other series with it
+                lines.append(f"# {metric.name} unavailable: {_escape(e)}")
+                continue
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            lines.extend(samples)
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+http_request_duration = registry.histogram(
+    "kgraph_http_request_duration_seconds", "Time spent answering HTTP requests.", ("method", "route"))
+http_requests = registry.counter(
+    "kgraph_http_requests_total", "HTTP requests answered.", ("method", "route", "status"))
+integration_duration = registry.histogram(
+    "kgraph_integration_duration_seconds", "Time spent in integration calls.", ("integration",))
+integration_calls = registry.counter(
+    "kgraph_integration_calls_total", "Integration calls.", ("integration",))
+integration_errors = registry.counter(
+    "kgraph_integration_errors_total", "Integration calls that raised or returned a 5xx status.", ("integration",))
+db_operation_duration = registry.histogram(
+    "kgraph_db_operation_duration_seconds", "Time spent in database integration calls.", ("operation",))
+db_operation_errors = registry.counter(
+    "kgraph_db_operation_errors_total", "Database integration calls that raised.", ("operation",))
+
+
+class GraphSize:
+    # Entity and relationship counts, only asked again to the database when the graph version changed
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.version = None
+        self.counts = None
+
+    def get(self):
+        from app.models import get_graph_version, graph_counts
+        version = get_graph_version()
+        with self.lock:
+            if self.counts is None or version != self.version:
+                self.counts = graph_counts()
+                self.version = version
+            return self.counts
+
+
+graph_size = GraphSize()
+registry.gauge("kgraph_graph_entities", "Entities in the graph.", lambda: {(): graph_size.get()["entities"]})
+registry.gauge(
+    "kgraph_graph_relationships", "Relationships in the graph.", lambda: {(): graph_size.get()["relationships"]})
+registry.gauge(
+    "kgraph_signal_deliveries_queued", "Signal deliveries waiting for the event bus workers.",
+    lambda: {(): event_bus.pending()})
+registry.gauge(
+    "kgraph_signal_deliveries_dead_lettered", "Signal deliveries dead-lettered since startup.",
+    lambda: {(): event_bus.counters["dead_lettered"]})
+
+
+def _status_code(result):
+    if isinstance(result, tuple) and len(result) > 1 and isinstance(result[1], int):
+        return result[1]
+    return getattr(result, "status_code", 200)
+
+
+def instrument_integration(integration_name, integration_function):
+    @wraps(integration_function)
+    def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        failed = True
+        try:
+            result = integration_function(*args, **kwargs)
+            failed = _status_code(result) >= 500
+            return result
+        finally:
+            integration_duration.observe(time.perf_counter() - started, integration_name)
+            integration_calls.inc(integration_name)
+            if failed:
+                integration_errors.inc(integration_name)
+    return wrapper
+
+
+def instrument_async_integration(integration_name, integration_function):
+    @wraps(integration_function)
+    async def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        failed = True
+        try:
+            result = await integration_function(*args, **kwargs)
+            failed = _status_code(result) >= 500
+            return result
+        finally:
+            integration_duration.observe(time.perf_counter() - started, integration_name)
+            integration_calls.inc(integration_name)
+            if failed:
+                integration_errors.inc(integration_name)
+    return wrapper
+
+
+def _start_timer():
+    g.metrics_started = time.perf_counter()
+
+
+def _record_request(response):
+    started = g.pop("metrics_started", None)
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule is not None else "unmatched"
+        http_request_duration.observe(time.perf_counter() - started, request.method, route)
+        http_requests.inc(request.method, route, str(response.status_code))
+    return response
+
+
+def instrument_app(app):
+    app.before_request(_start_timer)
+    app.after_request(_record_request)
+
+
+def metrics_response():
+    return Response(registry.render(), content_type=CONTENT_TYPE)
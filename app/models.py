@@ -1,13 +1,32 @@
+import threading
+from app.integrations.database.paths import DEFAULT_MAX_DEPTH
+
 current_db_integration = None
+# Bumped by every write going through this module, lets derived data (analytics, caches) know when to recompute
+graph_version = 0
+_graph_version_lock = threading.Lock()
+
+def graph_changed():
+    global graph_version
+    with _graph_version_lock:
+        graph_version += 1
+        return graph_version
+
+def get_graph_version():
+    return graph_version
 
 def set_database_integration(db_integration_instance):
     global current_db_integration
     current_db_integration = db_integration_instance
+    graph_changed()
 
 def add_entity(data):
     if current_db_integration is None:
         raise ValueError("Database integration is not set.")
-    return current_db_integration.add_entity(data)
+    try:
+        return current_db_integration.add_entity(data)
+    finally:
+        graph_changed()
 
 def get_full_graph():
     if current_db_integration is None:
@@ -27,17 +46,26 @@ def get_all_entities():
 def update_entity(entity_id, data):
     if current_db_integration is None:
         raise ValueError("Database integration is not set.")
-    return current_db_integration.update_entity(entity_id, data)
+    try:
+        return current_db_integration.update_entity(entity_id, data)
+    finally:
+        graph_changed()
 
 def delete_entity(entity_id):
     if current_db_integration is None:
         raise ValueError("Database integration is not set.")
-    return current_db_integration.delete_entity(entity_id)
+    try:
+        return current_db_integration.delete_entity(entity_id)
+    finally:
+        graph_changed()
 
 def add_relationship(data):
     if current_db_integration is None:
         raise ValueError("Database integration is not set.")
-    return current_db_integration.add_relationship(data)
+    try:
+        return current_db_integration.add_relationship(data)
+    finally:
+        graph_changed()
 
 def search_entities(search_params):
     if current_db_integration is None:
@@ -50,5 +78,53 @@ def search_relationships(search_params):
     return current_db_integration.search_relationships(search_params)
 
 def search_entities_with_type(entity_type, search_params):
-    # Implementation here
-    pass
\ No newline at end of file
+    if current_db_integration is None:
+        raise ValueError("Database integration is not set.")
+    return current_db_integration.search_entities_with_type(entity_type, search_params)
+
+def shortest_path(from_id, to_id, max_depth=DEFAULT_MAX_DEPTH, relationship_types=None):
+    if current_db_integration is None:
+        raise ValueError("Database integration is not set.")
+    return current_db_integration.shortest_path(from_id, to_id, max_depth, relationship_types)
+
+def k_shortest_paths(from_id, to_id, k=3, max_depth=DEFAULT_MAX_DEPTH, relationship_types=None):
+    if current_db_integration is None:
+        raise ValueError("Database integration is not set.")
+    return current_db_integration.k_shortest_paths(from_id, to_id, k, max_depth, relationship_types)
+
+def graph_counts():
+    if current_db_integration is None:
+        raise ValueError("Database integration is not set.")
+    return current_db_integration.graph_counts()
+
+def export_snapshot(fp, compression="zlib"):
+    if current_db_integration is None:
+        raise ValueError("Database integration is not set.")
+    return current_db_integration.export_snapshot(fp, compression)
+
+def import_snapshot(fp):
+    if current_db_integration is None:
+        raise ValueError("Database integration is not set.")
+    try:
+        return current_db_integration.import_snapshot(fp)
+    finally:
+        graph_changed()
+
+def supports_batch_writes():
+    return current_db_integration is not None and hasattr(current_db_integration, "upsert_graph")
+
+def upsert_graph(entities, relationships, entity_updates=()):
+    if current_db_integration is None:
+        raise ValueError("Database integration is not set.")
+    try:
+        return current_db_integration.upsert_graph(entities, relationships, entity_updates)
+    finally:
+        graph_changed()
+
+def database_cache_stats():
+    # Hit/miss metrics of the read-through cache, when the database integration is wrapped in one
+    if current_db_integration is None:
+        raise ValueError("Database integration is not set.")
+    if not hasattr(current_db_integration, "cache_stats"):
+        return {"enabled": False}
+    return current_db_integration.cache_stats()
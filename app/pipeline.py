@@ -0,0 +1,199 @@
+# A small staged pipeline built on threads and bounded queues.
+#
+# A `Pipeline` is a list of `Stage`s. Every stage owns an input queue of `queue_size` items and a pool of `workers`
+# threads. A stage function takes one item and returns an iterable of output items, which lets a stage drop items
+# (return nothing) or fan them out (return several), e.g. one document into several chunks. Outputs are pushed into
+# the next stage's queue, and the outputs of the last stage are collected as the pipeline results.
+#
+# Queues are bounded, so a slow stage pushes back on the stages before it instead of letting items pile up in memory,
+# while every stage keeps working on its own items: many items are in flight at different stages at once.
+#
+# An exception raised by a stage function drops the item and is recorded in the run errors, other items carry on.
+#
+# Each stage keeps counters (items processed, emitted and failed, busy time, current and peak queue depth). Running
+# pipelines and the last few finished runs are listed in `active_pipelines` and `recent_pipelines`, which back the
+# /pipeline-metrics endpoint.
+
+import itertools
+import logging
+import queue
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+_run_ids = itertools.count(1)
+
+active_pipelines = {}
+recent_pipelines = deque(maxlen=10)
+_registry_lock = threading.Lock()
+
+
+class Stage:
+    def __init__(self, name, function, workers=1, queue_size=16):
+        self.name = name
+        self.function = function
+        self.workers = workers
+        self.queue_size = queue_size
+
+
+class StageMetrics:
+    def __init__(self, stage, input_queue):
+        self.stage = stage
+        self.input_queue = input_queue
+        self.lock = threading.Lock()
+        self.processed = 0
+        self.emitted = 0
+        self.failed = 0
+        self.busy_time = 0.0
+        self.max_queue_depth = 0
+
+    def observe_queue(self):
+        depth = self.input_queue.qsize()
+        with self.lock:
+            self.max_queue_depth = max(self.max_queue_depth, depth)
+
+    def record(self, duration, emitted, failed):
+        with self.lock:
+            self.processed += 1
+            self.emitted += emitted
+            self.failed += int(failed)
+            self.busy_time += duration
+
+    def snapshot(self, elapsed):
+        with self.lock:
+            return {
+                "workers": self.stage.workers,
+                "processed": self.processed,
+                "emitted": self.emitted,
+                "failed": self.failed,
+                "busy_seconds": round(self.busy_time, 3),
+                "throughput_per_second": round(self.processed / elapsed, 3) if elapsed > 0 else 0.0,
+                "utilization": round(self.busy_time / (elapsed * self.stage.workers), 3) if elapsed > 0 else 0.0,
+                "queue_depth": self.input_queue.qsize(),
+                "max_queue_depth": self.max_queue_depth,
+            }
+
+
+class Pipeline:
+    def __init__(self, name, stages):
+        self.name = name
+        self.stages = stages
+        self.run_id = None
+        self.queues = []
+        self.stage_metrics = []
+        self.results = []
+        self.errors = []
+        self.lock = threading.Lock()
+        self.started_at = None
+        self.finished_at = None
+
+    def describe(self, item):
+        if isinstance(item, dict):
+            return {key: value for key, value in item.items() if isinstance(value, (str, int, float)) and key != "text"}
+        return repr(item)[:200]
+
+    def worker(self, index, remaining):
+        stage = self.stages[index]
+        metrics = self.stage_metrics[index]
+        input_queue = self.queues[index]
+        output_queue = self.queues[index + 1] if index + 1 < len(self.stages) else None
+
+        while True:
+            item = input_queue.get()
+            if item is _STOP:
+                break
+            started = time.monotonic()
+            outputs = []
+            failed = False
+            try:
+                outputs = list(stage.function(item) or [])
+            except Exception as e:
+                failed = True
+                logger.warning("Pipeline %s stage %s failed: %s", self.name, stage.name, e)
+                with self.lock:
+                    self.errors.append({"stage": stage.name, "item": self.describe(item), "error": str(e)})
+            metrics.record(time.monotonic() - started, len(outputs), failed)
+
+            for output in outputs:
+                if output_queue is None:
+                    with self.lock:
+                        self.results.append(output)
+                else:
+                    output_queue.put(output)
+                    self.stage_metrics[index + 1].observe_queue()
+
+        # The last worker of a stage to stop tells the next stage that no more items are coming
+        with self.lock:
+            remaining[index] -= 1
+            last = remaining[index] == 0
+        if last and output_queue is not None:
+            for _ in range(self.stages[index + 1].workers):
+                output_queue.put(_STOP)
+
+    def run(self, items):
+        self.run_id = next(_run_ids)
+        self.queues = [queue.Queue(maxsize=stage.queue_size) for stage in self.stages]
+        self.stage_metrics = [StageMetrics(stage, self.queues[i]) for i, stage in enumerate(self.stages)]
+        self.results = []
+        self.errors = []
+        self.started_at = time.monotonic()
+        self.finished_at = None
+        remaining = [stage.workers for stage in self.stages]
+
+        with _registry_lock:
+            active_pipelines[self.run_id] = self
+
+        threads = [
+            threading.Thread(target=self.worker, args=(index, remaining), name=f"{self.name}-{stage.name}-{n}", daemon=True)
+            for index, stage in enumerate(self.stages)
+            for n in range(stage.workers)
+        ]
+        for thread in threads:
+            thread.start()
+
+        try:
+            # Blocks when the first stage is full, so producers are held back as well
+            for item in items:
+                self.queues[0].put(item)
+                self.stage_metrics[0].observe_queue()
+        finally:
+            for _ in range(self.stages[0].workers):
+                self.queues[0].put(_STOP)
+            for thread in threads:
+                thread.join()
+            self.finished_at = time.monotonic()
+            with _registry_lock:
+                active_pipelines.pop(self.run_id, None)
+                recent_pipelines.append(self)
+
+        return self.results, self.errors
+
+    def metrics(self):
+        if self.started_at is None:
+            elapsed = 0.0
+        else:
+            elapsed = (self.finished_at or time.monotonic()) - self.started_at
+        return {
+            "name": self.name,
+            "run_id": self.run_id,
+            "running": self.started_at is not None and self.finished_at is None,
+            "elapsed_seconds": round(elapsed, 3),
+            "errors": len(self.errors),
+            "stages": {
+                stage.name: metrics.snapshot(elapsed)
+                for stage, metrics in zip(self.stages, self.stage_metrics, strict=True)
+            },
+        }
+
+
+def pipeline_metrics():
+    with _registry_lock:
+        active = list(active_pipelines.values())
+        recent = list(recent_pipelines)
+    return {
+        "active": [pipeline.metrics() for pipeline in active],
+        "recent": [pipeline.metrics() for pipeline in reversed(recent)],
+    }
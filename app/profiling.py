@@ -0,0 +1,191 @@
+# On-demand profiling of single requests.
+#
+# Off unless PROFILE_TOKEN is set, the hooks below are not even installed then. With a token, a request sending it in
+# the X-Profile header (or the `profile` query parameter) is profiled from its first before_request hook to its
+# after_request hooks, every other request runs as usual. The profiled request answers as it would without profiling,
+# with two more headers:
+# - X-Profile-File: the profile saved in PROFILE_DIR, named after the request id, the method and the route,
+# - X-Profile-Summary: JSON list of the PROFILE_TOP functions with the highest cumulative time, as
+#   [cumulative ms, "path:line(function)"]. The same summary is written next to the profile as a .txt file.
+#
+# Two profilers, chosen with PROFILE_MODE or per request with X-Profile-Mode / `profile_mode`:
+# - deterministic (default): cProfile, every call of the request thread. Saved as a .prof file, readable with
+#   `python -m pstats` or snakeviz. Exact call counts, but the overhead inflates call-heavy code.
+# - sampling: a background thread records the stack of the request thread every PROFILE_SAMPLE_INTERVAL seconds.
+#   Saved as collapsed stacks (.folded, the flamegraph.pl / speedscope input). Low overhead, times are estimates.
+# Only the request thread is profiled, work handed to other threads (crawler and pipeline workers) is not. One request
+# is profiled at a time, a request asking while another one is profiled gets `X-Profile: busy` and runs unprofiled.
+
+import cProfile
+import hmac
+import json
+import os
+import pstats
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from flask import g, request
+
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN")
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+PROFILE_TOP = int(os.getenv("PROFILE_TOP", "15"))
+PROFILE_MODE = os.getenv("PROFILE_MODE", "deterministic").lower()
+PROFILE_SAMPLE_INTERVAL = float(os.getenv("PROFILE_SAMPLE_INTERVAL", "0.005"))
+
+_profiling_lock = threading.Lock()
+
+
+def _location(filename, line, name):
+    # Project files relative to the working directory, library files from their package directory
+    if filename.startswith("~") or filename.startswith("<"):
+        return name
+    path = os.path.relpath(filename)
+    if path.startswith(".."):
+        parts = filename.replace("\\", "/").split("/")
+        path = "/".join(parts[-2:])
+    return f"{path}:{line}({name})"
+
+
+class DeterministicProfiler:
+    extension = ".prof"
+
+    def __init__(self):
+        self.profile = cProfile.Profile()
+
+    def start(self):
+        self.profile.enable()
+
+    def stop(self):
+        self.profile.disable()
+
+    def summary(self, limit):
+        stats = pstats.Stats(self.profile).stats
+        top = sorted(stats.items(), key=lambda item: item[1][3], reverse=True)[:limit]
+        return [[round(cumulative * 1000, 3), _location(*function)]
+                for function, (_, _, _, cumulative, _) in top]
+
+    def save(self, path):
+        self.profile.dump_stats(path)
+
+
+class SamplingProfiler:
+    extension = ".folded"
+
+    def __init__(self, interval=PROFILE_SAMPLE_INTERVAL):
+        self.interval = interval
+        self.thread_id = threading.get_ident()
+        self.stacks = Counter()
+        self.samples = 0
+        self.stopped = threading.Event()
+        self.sampler = threading.Thread(target=self._sample, daemon=True, name="request-profiler")
+
+    def _sample(self):
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append((code.co_filename, code.co_firstlineno, code.co_name))
+                frame = frame.f_back
+            # Root first
+            self.stacks[tuple(reversed(stack))] += 1
+            self.samples += 1
+
+    def start(self):
+        self.started = time.perf_counter()
+        self.sampler.start()
+
+    def stop(self):
+        self.stopped.set()
+        self.sampler.join()
+        self.elapsed = time.perf_counter() - self.started
+
+    def summary(self, limit):
+        # A function's cumulative time is the share of the samples it appears in
+        cumulative = Counter()
+        for stack, count in self.stacks.items():
+            for function in set(stack):
+                cumulative[function] += count
+        per_sample = self.elapsed * 1000 / self.samples if self.samples else 0
+        return [[round(count * per_sample, 3), _location(*function)]
+                for function, count in cumulative.most_common(limit)]
+
+    def save(self, path):
+        with open(path, "w", encoding="utf-8") as fp:
+            for stack, count in self.stacks.most_common():
+                fp.write(";".join(_location(*function) for function in stack) + f" {count}\n")
+
+
+PROFILERS = {"deterministic": DeterministicProfiler, "sampling": SamplingProfiler}
+
+
+def _requested_token():
+    return request.headers.get("X-Profile") or request.args.get("profile")
+
+
+def _start_profile():
+    token = _requested_token()
+    if not token or not hmac.compare_digest(token.encode(), PROFILE_TOKEN.encode()):
+        return
+    mode = (request.headers.get("X-Profile-Mode") or request.args.get("profile_mode") or PROFILE_MODE).lower()
+    if not _profiling_lock.acquire(blocking=False):
+        g.profile_busy = True
+        return
+    try:
+        profiler = PROFILERS.get(mode, DeterministicProfiler)()
+        profiler.start()
+    except Exception:
+        _profiling_lock.release()
+        raise
+    g.profiler = profiler
+
+
+def _profile_name():
+    route = request.url_rule.rule if request.url_rule is not None else "unmatched"
+    route = re.sub(r"[^A-Za-z0-9]+", "_", route).strip("_") or "index"
+    request_id = g.get("request_id") or str(int(time.time() * 1000))
+    return f"{time.strftime('%Y%m%d-%H%M%S')}-{request_id}-{request.method}-{route}"
+
+
+def _finish_profile(response):
+    if g.pop("profile_busy", False):
+        response.headers["X-Profile"] = "busy"
+        return response
+    profiler = g.pop("profiler", None)
+    if profiler is None:
+        return response
+    try:
+        profiler.stop()
+    finally:
+        _profiling_lock.release()
+
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    path = os.path.join(PROFILE_DIR, _profile_name() + profiler.extension)
+    profiler.save(path)
+    summary = profiler.summary(PROFILE_TOP)
+    with open(os.path.splitext(path)[0] + ".txt", "w", encoding="utf-8") as fp:
+        fp.writelines(f"{cumulative:>12.3f} ms  {function}\n" for cumulative, function in summary)
+    response.headers["X-Profile-File"] = path
+    response.headers["X-Profile-Summary"] = json.dumps(summary, ensure_ascii=True)
+    return response
+
+
+def _abandon_profile(_exc):
+    # A request failing before its after_request hooks still releases the profiler
+    profiler = g.pop("profiler", None)
+    if profiler is not None:
+        try:
+            profiler.stop()
+        finally:
+            _profiling_lock.release()
+
+
+def install_profiling(app):
+    if not PROFILE_TOKEN:
+        return False
+    app.before_request(_start_profile)
+    app.after_request(_finish_profile)
+    app.teardown_request(_abandon_profile)
+    return True
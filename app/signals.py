@@ -1,6 +1,255 @@
-from blinker import signal
+# Signals sent after writes (entity_created, entity_updated, entity_deleted), with an optional asynchronous dispatch.
+#
+# With SIGNAL_DISPATCH=sync (the default) a send calls every receiver in the sending thread, as blinker does.
+# With SIGNAL_DISPATCH=async a send hands the payload to `event_bus` and returns: the write request does not wait for
+# its subscribers (tagging, enrichment...). Receivers connected with `inline=True`, e.g. the invalidation of the
+# database cache which a following read depends on, are still called in the sending thread.
+#
+# The event bus keeps a queue of at most SIGNAL_QUEUE_SIZE deliveries per subscriber (the object of a bound method,
+# or the function), served by SIGNAL_WORKERS threads. A subscriber is served by one worker at a time, one delivery at
+# a time, so it gets its events in the order they were sent, while the other workers serve other subscribers. A full
+# queue blocks the sender until there is room, which keeps the ordering and pushes back on writes when a subscriber
+# cannot keep up.
+# A receiver that raises is retried up to SIGNAL_MAX_RETRIES times, after SIGNAL_RETRY_DELAY seconds doubled every
+# attempt, then the delivery is dead-lettered: kept, at most SIGNAL_DEAD_LETTERS of them, for /signal-metrics and
+# `redeliver`. The failed delivery stays at the head of its subscriber's queue, so that subscriber's later events wait
+# for it, but no worker waits: the retry is scheduled and the workers serve the other subscribers meanwhile. A failing
+# receiver never affects the sender nor the other receivers. Senders that are Flask apps (`current_app` is resolved to the app) are delivered within an app
+# context. At exit, the deliveries still queued are given SIGNAL_EXIT_TIMEOUT seconds to finish.
+
+import atexit
+import heapq
+import logging
+import os
+import threading
+import time
+import weakref
+from collections import deque
+from blinker import ANY, NamedSignal
+from .logs import truncated
+
+logger = logging.getLogger(__name__)
+
+SIGNAL_DISPATCH = os.getenv("SIGNAL_DISPATCH", "sync").lower()
+SIGNAL_WORKERS = int(os.getenv("SIGNAL_WORKERS", "4"))
+SIGNAL_QUEUE_SIZE = int(os.getenv("SIGNAL_QUEUE_SIZE", "1000"))
+SIGNAL_MAX_RETRIES = int(os.getenv("SIGNAL_MAX_RETRIES", "3"))
+SIGNAL_RETRY_DELAY = float(os.getenv("SIGNAL_RETRY_DELAY", "0.5"))
+SIGNAL_DEAD_LETTERS = int(os.getenv("SIGNAL_DEAD_LETTERS", "100"))
+SIGNAL_EXIT_TIMEOUT = float(os.getenv("SIGNAL_EXIT_TIMEOUT", "5"))
+
+
+def subscriber_key(receiver):
+    # The object of a bound method, so that all the receivers of one subscriber share a worker
+    return id(getattr(receiver, "__self__", receiver))
+
+
+def receiver_name(receiver):
+    return getattr(receiver, "__qualname__", None) or repr(receiver)
+
+
+class Delivery:
+    def __init__(self, signal_name, receiver, sender, kwargs):
+        self.signal_name = signal_name
+        self.receiver = receiver
+        self.sender = sender
+        self.kwargs = kwargs
+        self.attempts = 0
+        self.error = None
+
+
+class EventBus:
+    def __init__(self, workers=SIGNAL_WORKERS, queue_size=SIGNAL_QUEUE_SIZE, max_retries=SIGNAL_MAX_RETRIES,
+                 retry_delay=SIGNAL_RETRY_DELAY, dead_letters=SIGNAL_DEAD_LETTERS, enabled=SIGNAL_DISPATCH == "async"):
+        self.enabled = enabled
+        self.workers = workers
+        self.queue_size = queue_size
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.lock = threading.Lock()
+        # Signalled whenever a delivery is queued or done
+        self.changed = threading.Condition(self.lock)
+        # Subscriber key -> deque of its deliveries, the head one being delivered or waiting for a retry
+        self.queues = {}
+        # Subscribers with deliveries that no worker is on, in turn
+        self.ready = deque()
+        # (monotonic time, subscriber key) of the retries to come
+        self.retries = []
+        self.threads = []
+        self.dead_letters = deque(maxlen=dead_letters)
+        self.counters = {"published": 0, "delivered": 0, "retried": 0, "dead_lettered": 0, "blocked": 0}
+        self.busy_time = 0.0
+
+    def _start(self):
+        # Workers are started by the first event, queued deliveries are given SIGNAL_EXIT_TIMEOUT seconds at exit
+        atexit.register(self.flush, SIGNAL_EXIT_TIMEOUT)
+        for index in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"signals-{index}", daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+    def publish(self, delivery):
+        key = subscriber_key(delivery.receiver)
+        with self.changed:
+            if not self.threads:
+                self._start()
+            jobs = self.queues.get(key)
+            # A receiver sending a signal is not blocked by a full queue, its own could never drain
+            if jobs is not None and len(jobs) >= self.queue_size and threading.current_thread() not in self.threads:
+                self.counters["blocked"] += 1
+                self.changed.wait_for(lambda: len(self.queues.get(key, ())) < self.queue_size)
+                jobs = self.queues.get(key)
+            if jobs is None:
+                jobs = self.queues[key] = deque()
+                self.ready.append(key)
+            jobs.append(delivery)
+            self.counters["published"] += 1
+            self.changed.notify_all()
+
+    def _next(self):
+        # Subscriber key whose head delivery is to be made now, or the seconds until the next retry
+        now = time.monotonic()
+        while self.retries and self.retries[0][0] <= now:
+            self.ready.append(heapq.heappop(self.retries)[1])
+        if self.ready:
+            return self.ready.popleft(), None
+        return None, self.retries[0][0] - now if self.retries else None
+
+    def _work(self):
+        while True:
+            with self.changed:
+                key, timeout = self._next()
+                while key is None:
+                    self.changed.wait(timeout)
+                    key, timeout = self._next()
+                # Left in the queue until done, so that `pending` and `flush` count it
+                delivery = self.queues[key][0]
+            outcome = self._deliver(delivery)
+            with self.changed:
+                jobs = self.queues[key]
+                if outcome == "retried":
+                    # The subscriber waits, its later deliveries stay behind this one, the worker moves on
+                    delay = self.retry_delay * 2 ** (delivery.attempts - 1)
+                    heapq.heappush(self.retries, (time.monotonic() + delay, key))
+                else:
+                    jobs.popleft()
+                    if jobs:
+                        self.ready.append(key)
+                    else:
+                        del self.queues[key]
+                self.changed.notify_all()
+
+    def _deliver(self, delivery):
+        # One attempt, returns its outcome
+        delivery.attempts += 1
+        started = time.perf_counter()
+        try:
+            self._call(delivery)
+            outcome = "delivered"
+        except Exception as e:
+            delivery.error = f"{type(e).__name__}: {e}"
+            outcome = "retried" if delivery.attempts <= self.max_retries else "dead_lettered"
+            logger.warning("Signal %s receiver %s failed (attempt %d): %s", delivery.signal_name,
+                           receiver_name(delivery.receiver), delivery.attempts, delivery.error)
+        with self.lock:
+            self.busy_time += time.perf_counter() - started
+            self.counters[outcome] += 1
+            if outcome == "dead_lettered":
+                self.dead_letters.append(delivery)
+        return outcome
+
+    def _call(self, delivery):
+        if hasattr(delivery.sender, "app_context"):
+            with delivery.sender.app_context():
+                return delivery.receiver(delivery.sender, **delivery.kwargs)
+        return delivery.receiver(delivery.sender, **delivery.kwargs)
+
+    def pending(self):
+        with self.lock:
+            return sum(len(jobs) for jobs in self.queues.values())
+
+    def flush(self, timeout=None):
+        # Waits until every queued delivery is done, returns False on timeout
+        with self.changed:
+            return self.changed.wait_for(lambda: not self.queues, timeout)
+
+    def redeliver(self):
+        # Queues the dead letters again, returns how many
+        with self.lock:
+            deliveries = list(self.dead_letters)
+            self.dead_letters.clear()
+        for delivery in deliveries:
+            delivery.attempts = 0
+            self.publish(delivery)
+        return len(deliveries)
+
+    def stats(self):
+        with self.lock:
+            return {
+                "mode": "async" if self.enabled else "sync",
+                "workers": self.workers,
+                "queue_size": self.queue_size,
+                "subscribers": len(self.queues),
+                "queued": sum(len(jobs) for jobs in self.queues.values()),
+                "waiting_retry": len(self.retries),
+                **self.counters,
+                "busy_seconds": round(self.busy_time, 6),
+                "dead_letters": [
+                    {"signal": delivery.signal_name, "receiver": receiver_name(delivery.receiver),
+                     "attempts": delivery.attempts, "error": delivery.error,
+                     "payload": str(truncated(delivery.kwargs))}
+                    for delivery in self.dead_letters
+                ],
+            }
+
+
+event_bus = EventBus()
+
+
+class BusSignal(NamedSignal):
+    # A blinker signal dispatched through `event_bus` when it is enabled
+
+    def __init__(self, name, doc=None, bus=None):
+        super().__init__(name, doc)
+        self.bus = bus or event_bus
+        # Object of a bound method (or the function) -> functions connected inline, weakly held so that a receiver
+        # collected or disconnected is forgotten, never mistaken for a new one
+        self.inline = weakref.WeakKeyDictionary()
+
+    def connect(self, receiver, sender=ANY, weak=True, inline=False):
+        if inline:
+            owner = getattr(receiver, "__self__", receiver)
+            self.inline.setdefault(owner, set()).add(getattr(receiver, "__func__", None))
+        return super().connect(receiver, sender, weak)
+
+    def disconnect(self, receiver, sender=ANY):
+        functions = self.inline.get(getattr(receiver, "__self__", receiver))
+        if functions is not None:
+            functions.discard(getattr(receiver, "__func__", None))
+        super().disconnect(receiver, sender)
+
+    def is_inline(self, receiver):
+        return getattr(receiver, "__func__", None) in self.inline.get(getattr(receiver, "__self__", receiver), ())
+
+    def send(self, sender=None, /, **kwargs):
+        # Receivers connected for the app also get the sends of `current_app`
+        if hasattr(sender, "_get_current_object"):
+            sender = sender._get_current_object()
+        if not self.bus.enabled:
+            return super().send(sender, **kwargs)
+        if self.is_muted:
+            return []
+        results = []
+        for receiver in self.receivers_for(sender):
+            if self.is_inline(receiver):
+                results.append((receiver, receiver(sender, **kwargs)))
+            else:
+                self.bus.publish(Delivery(self.name, receiver, sender, kwargs))
+                results.append((receiver, None))
+        return results
+
 
 # Define the signals at the top level of the module
-entity_created = signal('entity-created')
-entity_updated = signal('entity-updated')
-entity_deleted = signal('entity-deleted')
+entity_created = BusSignal('entity-created')
+entity_updated = BusSignal('entity-updated')
+entity_deleted = BusSignal('entity-deleted')
@@ -7,7 +7,29 @@
 # - Routes for CRUD operations on entities, including creating, retrieving (both single and all entities), updating, and deleting.
 # - A route for adding relationships between entities.
 # - Routes for searching entities and relationships based on provided search parameters.
-# - A special route for triggering integrations by name, allowing external functionalities to be executed.
+# - A special route for triggering integrations by name, allowing external functionalities to be executed. Expensive
+#   integrations go through admission limits and are answered with 429/503 and Retry-After when saturated.
+# - A route reporting the in-flight and queued requests of every limited integration.
+# - A route reporting the per-stage throughput and queue depths of running and recent ingestion pipelines.
+# - A route reporting the hit/miss metrics of the database read-through cache, when DB_CACHE is enabled.
+# - A route reporting the queues, retries and dead letters of the signal event bus (SIGNAL_DISPATCH=async runs the
+#   receivers of entity_created/updated/deleted on background workers, see signals.py), and one redelivering the dead
+#   letters.
+# - A /metrics route exposing request, integration and database latencies and the graph size to Prometheus.
+# - A route finding the shortest (or k shortest) paths between two entities.
+# - Routes running graph analytics (PageRank, components, degree, betweenness, communities) on a cached CSR snapshot.
+# - Routes serving statistics charts (degree distribution, entity types, ingest rate) as PNG or SVG. Charts are drawn
+#   by a background worker and cached per graph version, see charts.py: a chart that is not drawn yet for the current
+#   version is served from its last version (X-Chart-Status: stale) or answered with 202 and Retry-After.
+# - /get-graph-data?layout=1 adds the positions of a server-side force-directed layout of the graph (layout.py),
+#   computed once per graph version and updated incrementally, so the browser does not lay out large graphs itself;
+#   /layout reports its timings.
+# - /clusters serves a level-of-detail view of large graphs: the communities of the graph grouped into a hierarchy of
+#   clusters (clusters.py), served as super-nodes with their sizes and the number of relationships between them;
+#   /clusters/<cluster_id> expands one cluster into its child clusters, or its entities at the lowest level.
+# Graph routes answer with graph-version ETags (304 on If-None-Match) and cache their encoded bodies per graph version,
+# and large JSON responses of every route are compressed with gzip or brotli, see http_cache.py.
+# Routes log through the `app` loggers configured in logs.py, large payloads only at debug level.
 # Each route is associated with a specific HTTP method (GET, POST, PUT, DELETE) and includes logic for handling request data,
 # interacting with the database through model functions, and sending responses in JSON format. Signals are used to notify
 # other parts of the application about the creation, update, or deletion of entities.
@@ -17,9 +39,11 @@ from flask import (
     send_from_directory,
     current_app,
     jsonify,
+    make_response,
     request,
     render_template,
 )
+import logging
 import os
 from .models import (
     add_entity,
@@ -31,11 +55,26 @@ from .models import (
     add_relationship,
     search_entities,
     search_relationships,
+    database_cache_stats,
+    k_shortest_paths,
+    get_graph_version,
 )
-from .signals import entity_created, entity_updated, entity_deleted
-from .integrations.integration_manager import get_integration_function
+from .charts import FORMATS, charts
+from .http_cache import compress_response, graph_etag, versioned
+from .logs import truncated
+from .metrics import metrics_response
+from .pipeline import pipeline_metrics
+from .signals import entity_created, entity_updated, entity_deleted, event_bus
+from .integrations.database.paths import DEFAULT_MAX_DEPTH
+from .integrations.integration_manager import AdmissionRejected, get_integration_function
+
+logger = logging.getLogger(__name__)
 
 main = Blueprint("main", __name__)
+main.after_request(compress_response)
+
+# Longest wait a chart request may ask for, in seconds
+CHART_MAX_WAIT = 10
 
 
 @main.route("/")
@@ -44,14 +83,58 @@ def index():
 
 
 @main.route("/get-graph-data", methods=["GET"])
+@versioned
 def get_graph_data():
   # Assuming get_all_entities returns all the graph data you need
   all_entities = get_full_graph()
-  print("ALL ENTITIES")
-  print(all_entities)
+  logger.debug("Full graph: %s", truncated(all_entities))
+  if request.args.get("layout") in ("1", "true"):
+    # Entity id -> [x, y] of the server-side layout, for a preset layout in the browser
+    from .layout import graph_layout
+
+    all_entities = {**all_entities, "positions": graph_layout.layout()}
   return jsonify(all_entities), 200
 
 
+@main.route("/layout", methods=["GET"])
+def get_layout_stats():
+  from .layout import graph_layout
+
+  return jsonify(graph_layout.stats()), 200
+
+
+@main.route("/clusters", methods=["GET"])
+@versioned
+def get_clusters():
+  # ?level=<level> (the top level by default), ?limit=<clusters>, ?max_edges=<edges>
+  from .clusters import DEFAULT_LIMIT, DEFAULT_MAX_EDGES, graph_clusters
+
+  try:
+    level = request.args.get("level")
+    level = int(level) if level is not None else None
+    limit = int(request.args.get("limit", DEFAULT_LIMIT))
+    max_edges = int(request.args.get("max_edges", DEFAULT_MAX_EDGES))
+    return jsonify(graph_clusters.overview(level, limit=limit, max_edges=max_edges)), 200
+  except ValueError as e:
+    return jsonify(error=str(e)), 400
+
+
+@main.route("/clusters/<cluster_id>", methods=["GET"])
+@versioned
+def expand_cluster(cluster_id):
+  # Child clusters of a cluster, or its entities for a level 0 cluster
+  from .clusters import DEFAULT_LIMIT, DEFAULT_MAX_EDGES, graph_clusters
+
+  try:
+    limit = int(request.args.get("limit", DEFAULT_LIMIT))
+    max_edges = int(request.args.get("max_edges", DEFAULT_MAX_EDGES))
+    return jsonify(graph_clusters.expand(cluster_id, limit=limit, max_edges=max_edges)), 200
+  except KeyError:
+    return jsonify(error=f"Unknown cluster '{cluster_id}'"), 404
+  except ValueError as e:
+    return jsonify(error=str(e)), 400
+
+
 @main.route("/favicon.ico")
 def favicon():
   return send_from_directory(
@@ -63,18 +146,146 @@ def favicon():
 
 @main.route("/trigger-integration/<integration_name>", methods=["POST"])
 def trigger_integration(integration_name):
-  print("Triggered!")
+  logger.debug("Triggered integration %s", integration_name)
   data = request.json
   integration_function = get_integration_function(integration_name)
   if integration_function:
-    # Capture the return value which should be a Flask response
-    response = integration_function(current_app, data)
-    return response
+    limiter = current_app.integration_manager.get_limiter(integration_name)
+    if limiter is None:
+      # Capture the return value which should be a Flask response
+      return integration_function(current_app, data)
+    try:
+      with limiter.admit():
+        return integration_function(current_app, data)
+    except AdmissionRejected as e:
+      response = jsonify(error=str(e), retry_after=e.retry_after)
+      response.headers["Retry-After"] = str(e.retry_after)
+      return response, e.status_code
   return jsonify(error="Integration function not found"), 404
 
 
+@main.route("/integration-load", methods=["GET"])
+def integration_load():
+  return jsonify(current_app.integration_manager.load()), 200
+
+
+@main.route("/pipeline-metrics", methods=["GET"])
+def get_pipeline_metrics():
+  return jsonify(pipeline_metrics()), 200
+
+
+@main.route("/signal-metrics", methods=["GET"])
+def get_signal_metrics():
+  return jsonify(event_bus.stats()), 200
+
+
+@main.route("/signal-metrics/redeliver", methods=["POST"])
+def redeliver_signals():
+  # Queues the dead-lettered deliveries again
+  return jsonify(redelivered=event_bus.redeliver()), 200
+
+
+@main.route("/cache-metrics", methods=["GET"])
+def get_cache_metrics():
+  return jsonify(database_cache_stats()), 200
+
+
+@main.route("/metrics", methods=["GET"])
+def get_metrics():
+  # Prometheus text format
+  return metrics_response()
+
+
+def parse_entity_id(value):
+  # The in-memory backend uses integer ids, the other backends string ids
+  return int(value) if value.isdigit() else value
+
+
+@main.route("/paths", methods=["GET"])
+@versioned
+def find_paths():
+  # ?from_id=...&to_id=...&k=3&max_depth=4&types=works_at,knows
+  from_id = request.args.get("from_id")
+  to_id = request.args.get("to_id")
+  if not from_id or not to_id:
+    return jsonify(error="Missing from_id or to_id"), 400
+  try:
+    k = int(request.args.get("k", 1))
+    max_depth = int(request.args.get("max_depth", DEFAULT_MAX_DEPTH))
+  except ValueError:
+    return jsonify(error="k and max_depth must be integers"), 400
+  types = [name for name in request.args.get("types", "").split(",") if name] or None
+  paths = k_shortest_paths(parse_entity_id(from_id), parse_entity_id(to_id), k, max_depth, types)
+  return jsonify(paths=paths), 200
+
+
+@main.route("/analytics", methods=["GET"])
+def get_analytics_stats():
+  # numpy and scipy are imported by the first analytics request, not at startup
+  from .analytics import analytics
+
+  return jsonify(analytics.stats()), 200
+
+
+@main.route("/analytics/<algorithm>", methods=["GET"])
+@versioned
+def get_analytics(algorithm):
+  # Query parameters: limit and members (groups), plus the parameters of the algorithm, e.g. ?samples=256
+  from .analytics import DEFAULT_PARAMS, analytics
+
+  if algorithm not in DEFAULT_PARAMS:
+    return jsonify(error=f"Unknown algorithm '{algorithm}'"), 404
+  args = request.args.to_dict()
+  try:
+    limit = int(args.pop("limit", 20))
+    members = int(args.pop("members", 10))
+    params = {
+        key: type(DEFAULT_PARAMS[algorithm][key])(value) if key in DEFAULT_PARAMS[algorithm] else value
+        for key, value in args.items()
+    }
+    return jsonify(analytics.report(algorithm, limit=limit, members=members, **params)), 200
+  except ValueError as e:
+    return jsonify(error=str(e)), 400
+
+
+@main.route("/charts", methods=["GET"])
+def get_charts_stats():
+  return jsonify(charts.stats()), 200
+
+
+@main.route("/charts/<chart>", methods=["GET"])
+def get_chart(chart):
+  # ?format=png|svg, ?wait=<seconds> to wait for a render, plus the parameters of the chart, e.g. ?bucket=600
+  args = request.args.to_dict()
+  fmt = args.pop("format", "png")
+  try:
+    wait = min(float(args.pop("wait", 0)), CHART_MAX_WAIT)
+    image, version, fresh = charts.get(chart, fmt, wait=wait, **args)
+  except KeyError:
+    return jsonify(error=f"Unknown chart '{chart}'"), 404
+  except ValueError as e:
+    return jsonify(error=str(e)), 400
+  except RuntimeError as e:
+    return jsonify(error=str(e)), 500
+  if image is None:
+    # Never drawn yet, the render runs in the background
+    response = jsonify(status="rendering", graph_version=get_graph_version())
+    response.headers["Retry-After"] = "1"
+    return response, 202
+
+  response = make_response(image)
+  response.mimetype = FORMATS[fmt]
+  response.headers["Cache-Control"] = "no-cache"
+  response.headers["X-Chart-Status"] = "fresh" if fresh else "stale"
+  if fresh:
+    response.set_etag(graph_etag(version), weak=True)
+    response.make_conditional(request)
+  return response
+
+
 @main.route("/<int:entity_id>", methods=["POST"])
-def create_entity():
+def create_entity(entity_id=None):
+  # The id in the URL is not used, the database assigns one
   data = request.json
   entity_id = add_entity(data)
 
@@ -118,7 +329,7 @@ def update_entity_route( entity_id):
 
 @main.route("/<entity_id>", methods=["DELETE"])
 def delete_entity_route( entity_id):
-  print(f"Deleting entity with id {entity_id}")
+  logger.info("Deleting entity with id %s", entity_id)
   if delete_entity( entity_id):
     # Send signal for the deleted entity
     entity_deleted.send(
@@ -0,0 +1,12 @@
+# ASGI entry point, next to main.py (WSGI). Model-bound integrations are served on the event loop, see app/asgi.py.
+#   uvicorn asgi:app --host 0.0.0.0 --port 81 --workers 2
+
+from app import create_app
+from app.asgi import AsgiApp
+
+app = AsgiApp(create_app())
+
+if __name__ == '__main__':
+    import uvicorn
+
+    uvicorn.run(app, host='0.0.0.0', port=81)
@@ -0,0 +1,267 @@
+# Benchmark suite for the database backends, run through the `DatabaseIntegration` interface.
+#
+#   python -m benchmarks.backends --backends memory sqlite --profiles uniform power_law --elements 1000 100000 \
+#       --output results.json
+#   python -m benchmarks.backends --backends sqlite --elements 100000 --compare results.json
+#
+# For every backend, graph profile and size (see benchmarks/graphs.py) a fresh backend instance is filled with the
+# synthetic graph, entity by entity and relationship by relationship, then queried:
+# - add_entity, add_relationship: every element of the graph,
+# - get_entity, search_entities, search_entities_with_type, search_relationships, get_neighborhood (backends that
+#   have it): `--samples` calls on random entities,
+# - get_full_graph: a few calls, skipped above `--full-graph-limit` elements,
+# - delete_entity: `--samples` distinct entities, last since it changes the graph.
+# Each operation reports its number of calls, throughput and mean/p50/p95/p99/max latency in milliseconds.
+#
+# `--output` writes the results as JSON, with the parameters and environment of the run. `--compare` reads such a
+# file and flags every operation whose p50 latency grew by more than `--tolerance` (25% by default) for the same
+# backend, profile and size; the command then exits with status 1, so it can guard a CI job.
+#
+# The SQLite database lives in a temporary directory removed afterwards. The Neo4j backends are only available when
+# NEO4J_PASSWORD is set: they write into the configured server, point NEO4J_DATABASE at a scratch database. The
+# entities they created are removed at the end of each run.
+
+import argparse
+import json
+import math
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from array import array
+from app.integrations.database.memory import InMemoryDatabase
+from app.integrations.database.sqlitedb import SQLiteIntegration
+from benchmarks.graphs import PROFILES, TYPES, WORDS, spec_for_elements
+
+DEFAULT_TOLERANCE = 0.25
+DELETE_BATCH_SIZE = 10000
+
+
+def make_memory(_directory):
+    return InMemoryDatabase()
+
+
+def make_sqlite(directory):
+    return SQLiteIntegration(os.path.join(directory, "benchmark.db"))
+
+
+def make_neo4j(_directory):
+    from app.integrations.database.neo4jdb import Neo4jIntegration
+    return Neo4jIntegration()
+
+
+def make_neo4j_async(_directory):
+    from app.integrations.database.neo4j_async import AsyncNeo4jIntegration
+    return AsyncNeo4jIntegration()
+
+
+BACKENDS = {
+    "memory": make_memory,
+    "sqlite": make_sqlite,
+    "neo4j": make_neo4j,
+    "neo4j_async": make_neo4j_async,
+}
+
+
+def cleanup_neo4j(db, ids):
+    # Removes what a run wrote into a Neo4j server, through a sync session of its own
+    from neo4j import GraphDatabase
+    from app.integrations.database.neo4jdb import NEO4J_DATABASE
+    with GraphDatabase.driver(db.uri, auth=(db.user, db.password)) as driver, \
+            driver.session(database=NEO4J_DATABASE) as session:
+        for start in range(0, len(ids), DELETE_BATCH_SIZE):
+            batch = ids[start:start + DELETE_BATCH_SIZE]
+            session.run("MATCH (n:Entity) WHERE n.id IN $ids DETACH DELETE n", ids=batch).consume()
+
+
+def percentile(durations, fraction):
+    # Nearest rank percentile of sorted durations
+    if not durations:
+        return None
+    return durations[min(len(durations) - 1, max(0, math.ceil(fraction * len(durations)) - 1))]
+
+
+def to_ms(value):
+    return round(value * 1000, 4) if value is not None else None
+
+
+def summarize(durations, elapsed):
+    durations = sorted(durations)
+    calls = len(durations)
+    return {
+        "calls": calls,
+        "seconds": round(elapsed, 6),
+        "ops_per_second": round(calls / elapsed, 1) if elapsed > 0 else None,
+        "mean_ms": to_ms(sum(durations) / calls) if calls else None,
+        "p50_ms": to_ms(percentile(durations, 0.50)),
+        "p95_ms": to_ms(percentile(durations, 0.95)),
+        "p99_ms": to_ms(percentile(durations, 0.99)),
+        "max_ms": to_ms(durations[-1]) if calls else None,
+    }
+
+
+def timed(function, calls):
+    durations = array("d")
+    started = time.perf_counter()
+    for args in calls:
+        call_started = time.perf_counter()
+        function(*args)
+        durations.append(time.perf_counter() - call_started)
+    return summarize(durations, time.perf_counter() - started)
+
+
+def run_backend(name, spec, samples, full_graph_limit):
+    rng = random.Random(f"{spec.seed}-queries")
+    directory = tempfile.mkdtemp(prefix=f"kgraph-bench-{name}-")
+    db = BACKENDS[name](directory)
+    operations = {}
+    ids = []
+    try:
+        operations["add_entity"] = timed(
+            lambda data: ids.append(db.add_entity(data)), ((data,) for data in spec.generate_entities())
+        )
+        operations["add_relationship"] = timed(
+            db.add_relationship,
+            (
+                ({"from_id": ids[data["from"]], "to_id": ids[data["to"]], "relationship": data["relationship"],
+                  "snippet": data["snippet"]},)
+                for data in spec.generate_relationships()
+            ),
+        )
+
+        sample_ids = [rng.choice(ids) for _ in range(samples)]
+        operations["get_entity"] = timed(db.get_entity, [(entity_id,) for entity_id in sample_ids])
+        operations["search_entities"] = timed(
+            db.search_entities, [({"name": spec.name_of(rng.randrange(spec.entities))},) for _ in range(samples)]
+        )
+        operations["search_entities_with_type"] = timed(
+            db.search_entities_with_type,
+            [(rng.choice(TYPES), {"name": rng.choice(WORDS)}) for _ in range(samples)],
+        )
+        operations["search_relationships"] = timed(
+            db.search_relationships, [({"from_id": entity_id},) for entity_id in sample_ids]
+        )
+        if hasattr(db, "get_neighborhood"):
+            operations["get_neighborhood"] = timed(db.get_neighborhood, [(entity_id, 2) for entity_id in sample_ids])
+        if spec.elements <= full_graph_limit:
+            operations["get_full_graph"] = timed(db.get_full_graph, [() for _ in range(3)])
+        operations["delete_entity"] = timed(db.delete_entity, [(entity_id,) for entity_id in dict.fromkeys(sample_ids)])
+    finally:
+        if name.startswith("neo4j"):
+            cleanup_neo4j(db, ids)
+        if hasattr(db, "close"):
+            db.close()
+        shutil.rmtree(directory, ignore_errors=True)
+
+    return {"backend": name, **spec.describe(), "operations": operations}
+
+
+def environment():
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "commit": commit,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+    }
+
+
+def run_key(run):
+    return run["backend"], run["profile"], run["entities"], run["relationships"]
+
+
+def compare(results, baseline, tolerance=DEFAULT_TOLERANCE):
+    # Operations whose p50 latency grew by more than `tolerance` since the baseline run
+    baseline_runs = {run_key(run): run for run in baseline["runs"]}
+    regressions = []
+    for run in results["runs"]:
+        previous = baseline_runs.get(run_key(run))
+        if previous is None:
+            continue
+        for operation, stats in run["operations"].items():
+            before = previous["operations"].get(operation, {}).get("p50_ms")
+            after = stats.get("p50_ms")
+            if before and after and after > before * (1 + tolerance):
+                regressions.append({
+                    "backend": run["backend"],
+                    "profile": run["profile"],
+                    "elements": run["entities"] + run["relationships"],
+                    "operation": operation,
+                    "baseline_p50_ms": before,
+                    "p50_ms": after,
+                    "change": round(after / before - 1, 3),
+                })
+    return regressions
+
+
+def print_results(results):
+    for run in results["runs"]:
+        print(f"\n{run['backend']} / {run['profile']} / {run['entities']} entities, {run['relationships']} relationships")
+        print(f"{'operation':<28}{'calls':>10}{'ops/s':>14}{'p50 ms':>12}{'p95 ms':>12}{'p99 ms':>12}")
+        for operation, stats in run["operations"].items():
+            print(f"{operation:<28}{stats['calls']:>10}{stats['ops_per_second'] or '-':>14}"
+                  f"{stats['p50_ms'] or '-':>12}{stats['p95_ms'] or '-':>12}{stats['p99_ms'] or '-':>12}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark DatabaseIntegration backends")
+    parser.add_argument("--backends", nargs="+", default=["memory", "sqlite"], choices=list(BACKENDS))
+    parser.add_argument("--profiles", nargs="+", default=["uniform"], choices=PROFILES)
+    parser.add_argument("--elements", nargs="+", type=int, default=[1000, 10000],
+                        help="graph sizes, entities plus relationships")
+    parser.add_argument("--relationships-per-entity", type=float, default=3)
+    parser.add_argument("--samples", type=int, default=1000)
+    parser.add_argument("--full-graph-limit", type=int, default=1000000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    parser.add_argument("--compare", help="JSON results of a previous run to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    args = parser.parse_args(argv)
+
+    if any(name.startswith("neo4j") for name in args.backends) and not os.getenv("NEO4J_PASSWORD"):
+        parser.error("the Neo4j backends need NEO4J_PASSWORD and a running server")
+
+    runs = []
+    for elements in args.elements:
+        for profile in args.profiles:
+            spec = spec_for_elements(profile, elements, args.relationships_per_entity, args.seed)
+            for name in args.backends:
+                runs.append(run_backend(name, spec, args.samples, args.full_graph_limit))
+
+    results = {"environment": environment(), "parameters": vars(args), "runs": runs}
+    print_results(results)
+
+    regressions = []
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as fp:
+            regressions = compare(results, json.load(fp), args.tolerance)
+        results["regressions"] = regressions
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as fp:
+            json.dump(results, fp, indent=2)
+
+    if args.compare:
+        for regression in regressions:
+            print(f"REGRESSION {regression['backend']} / {regression['profile']} / {regression['elements']} "
+                  f"{regression['operation']}: p50 {regression['baseline_p50_ms']} ms -> {regression['p50_ms']} ms "
+                  f"(+{regression['change']:.0%})")
+        if regressions:
+            return 1
+        print("No regressions")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,173 @@
+# A local stand-in for the OpenAI chat completions API, for load tests that must run offline.
+#
+#   python -m benchmarks.fake_openai --port 8089 --latency 0.5 --jitter 0.2
+#   OPENAI_BASE_URL=http://127.0.0.1:8089/v1 OPENAI_API_KEY=fake python main.py
+#
+# It answers POST /v1/chat/completions like the model would answer the prompts of the integrations:
+# - `knowledge_graph` function calls (natural_input) get a small graph built from the capitalised words of the text,
+# - search parameter requests (ai_search) get a JSON list of `{"name": ...}` parameters,
+# - entity and relationship matching requests (conditional_*) get "No Matches",
+# - anything else gets a short canned answer.
+# Every response waits `latency` seconds, plus or minus a uniform `jitter`, to model the time spent in the model.
+# Counters of the requests served by kind are kept in `FakeOpenAIServer.stats`.
+
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+_WORD = re.compile(r"\b[A-Z][a-zA-Z]+\b")
+
+
+def _names(text, limit=6):
+    return list(dict.fromkeys(_WORD.findall(text)))[:limit]
+
+
+def knowledge_graph_for(text):
+    names = _names(text) or ["Unknown"]
+    nodes = [{"id": index + 1, "name": name} for index, name in enumerate(names)]
+    relationships = [
+        {
+            "from_id": nodes[index]["id"],
+            "to_id": nodes[index + 1]["id"],
+            "relationship": "related_to",
+            "snippet": f"{nodes[index]['name']} is related to {nodes[index + 1]['name']}",
+        }
+        for index in range(len(nodes) - 1)
+    ]
+    return {"nodes": nodes, "relationships": relationships}
+
+
+def classify(body):
+    messages = body.get("messages") or []
+    system = next((m.get("content") or "" for m in messages if m.get("role") == "system"), "")
+    user = next((m.get("content") or "" for m in reversed(messages) if m.get("role") == "user"), "")
+    function_call = body.get("function_call")
+    if isinstance(function_call, dict) and function_call.get("name") == "knowledge_graph":
+        return "knowledge_graph", user
+    # The relationship matching prompt also mentions search parameters, so matching is recognised first
+    if "No Matches" in system:
+        return "match", user
+    if "search parameters" in system:
+        return "search_parameters", user
+    return "answer", user
+
+
+def completion(body, kind, user):
+    message = {"role": "assistant", "content": None}
+    finish_reason = "stop"
+    if kind == "knowledge_graph":
+        message["function_call"] = {"name": "knowledge_graph", "arguments": json.dumps(knowledge_graph_for(user))}
+        finish_reason = "function_call"
+    elif kind == "search_parameters":
+        message["content"] = json.dumps([{"name": name} for name in _names(user.split(":", 1)[-1])] or [{"name": "Unknown"}])
+    elif kind == "match":
+        message["content"] = "No Matches"
+    else:
+        message["content"] = "This is a canned answer from the fake model."
+    return {
+        "id": f"chatcmpl-fake-{random.getrandbits(48):x}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model", "fake"),
+        "choices": [{"index": 0, "message": message, "finish_reason": finish_reason}],
+        "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+    }
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, payload):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self.send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+            return
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            body = json.loads(self.rfile.read(length) or b"{}")
+        except json.JSONDecodeError as e:
+            self.send_json(400, {"error": {"message": str(e)}})
+            return
+
+        kind, user = classify(body)
+        self.server.fake.wait()
+        self.server.fake.record(kind)
+        self.send_json(200, completion(body, kind, user))
+
+
+class FakeOpenAIServer:
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0, jitter=0.0, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.rng = random.Random(seed)
+        self.stats = {}
+        self.lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer((host, port), _Handler)
+        self.httpd.daemon_threads = True
+        self.httpd.fake = self
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def wait(self):
+        with self.lock:
+            delay = self.latency + self.rng.uniform(-self.jitter, self.jitter)
+        if delay > 0:
+            time.sleep(delay)
+
+    def record(self, kind):
+        with self.lock:
+            self.stats[kind] = self.stats.get(kind, 0) + 1
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, name="fake-openai", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.stop()
+        return False
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake OpenAI chat completions server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds spent per completion")
+    parser.add_argument("--jitter", type=float, default=0.0, help="uniform +/- variation of the latency")
+    args = parser.parse_args()
+
+    server = FakeOpenAIServer(args.host, args.port, args.latency, args.jitter)
+    print(f"Fake OpenAI server listening on {server.url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
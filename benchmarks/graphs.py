@@ -0,0 +1,87 @@
+# Synthetic graphs for the backend benchmarks.
+#
+# A graph is described by a `GraphSpec`: a profile, a number of entities and a number of relationships. Entities and
+# relationships are generated lazily and deterministically from the seed, so graphs of millions of elements do not
+# have to be held in memory before they are written, and two runs with the same spec write the same graph.
+#
+# Profiles:
+# - uniform: relationship endpoints are drawn uniformly, every entity has about the same degree,
+# - power_law: endpoints follow a power law over the entity index, a few hub entities get most relationships, like
+#   the organisations and people mentioned in every document of a real graph,
+# - text_heavy: uniform endpoints, but entities carry a long description and relationships a long snippet, which
+#   stresses property storage, full-text indexes and serialisation.
+#
+# Relationship endpoints are entity indexes (0 .. entities - 1), the benchmark maps them to the ids returned by
+# `add_entity`.
+
+import random
+
+WORDS = [
+    "alpha", "bravo", "charlie", "delta", "echo", "foxtrot", "golf", "hotel", "india", "juliet", "kilo", "lima",
+    "mike", "november", "oscar", "papa", "quebec", "romeo", "sierra", "tango", "uniform", "victor", "whiskey",
+    "xray", "yankee", "zulu",
+]
+TYPES = ["Person", "Organization", "Event", "Place", "Concept"]
+RELATIONSHIPS = ["works_at", "knows", "located_in", "attended", "founded", "mentions", "part_of"]
+PROFILES = ("uniform", "power_law", "text_heavy")
+# Exponent of the degree distribution of the power_law profile
+POWER_LAW_EXPONENT = 1.5
+TEXT_HEAVY_WORDS = 200
+
+
+class GraphSpec:
+    def __init__(self, profile, entities, relationships, seed=0):
+        if profile not in PROFILES:
+            raise ValueError(f"Unknown graph profile '{profile}', expected one of {', '.join(PROFILES)}")
+        self.profile = profile
+        self.entities = entities
+        self.relationships = relationships
+        self.seed = seed
+
+    @property
+    def elements(self):
+        return self.entities + self.relationships
+
+    def describe(self):
+        return {"profile": self.profile, "entities": self.entities, "relationships": self.relationships,
+                "seed": self.seed}
+
+    def name_of(self, index):
+        # Names are unique thanks to the index, and share their words with many other entities
+        return f"{WORDS[index % len(WORDS)]} {WORDS[(index // len(WORDS)) % len(WORDS)]} {index}"
+
+    def text(self, rng, words):
+        return " ".join(rng.choice(WORDS) for _ in range(words))
+
+    def generate_entities(self):
+        rng = random.Random(f"{self.seed}-entities")
+        for index in range(self.entities):
+            entity = {"name": self.name_of(index), "type": TYPES[index % len(TYPES)]}
+            if self.profile == "text_heavy":
+                entity["description"] = self.text(rng, TEXT_HEAVY_WORDS)
+            yield entity
+
+    def endpoint(self, rng):
+        if self.profile == "power_law":
+            # Inverse transform sampling of a continuous power law over [1, entities + 1)
+            a = 1 - POWER_LAW_EXPONENT
+            rank = (((self.entities + 1) ** a - 1) * rng.random() + 1) ** (1 / a)
+            return min(int(rank) - 1, self.entities - 1)
+        return rng.randrange(self.entities)
+
+    def generate_relationships(self):
+        rng = random.Random(f"{self.seed}-relationships")
+        snippet_words = TEXT_HEAVY_WORDS if self.profile == "text_heavy" else 6
+        for _ in range(self.relationships):
+            yield {
+                "from": self.endpoint(rng),
+                "to": self.endpoint(rng),
+                "relationship": rng.choice(RELATIONSHIPS),
+                "snippet": self.text(rng, snippet_words),
+            }
+
+
+def spec_for_elements(profile, elements, relationships_per_entity=3, seed=0):
+    # Splits a total number of elements between entities and relationships
+    entities = max(1, round(elements / (1 + relationships_per_entity)))
+    return GraphSpec(profile, entities, elements - entities, seed)
@@ -0,0 +1,118 @@
+# Time spent in JSON on large graphs, stdlib provider against the app's FastJSONProvider.
+#
+#   python -m benchmarks.json_encoding --elements 10000 100000 --profiles uniform text_heavy --output json.json
+#
+# For every size and profile (see benchmarks/graphs.py) the graph is loaded into the in-memory backend, then:
+# - encode: `jsonify(get_full_graph())`, what /get-graph-data does, with Flask's DefaultJSONProvider and with
+#   FastJSONProvider,
+# - decode: parsing that body back with each provider's `loads`,
+# - chained call: handing the result of add_multiple_conditional (created entities and relationships of a whole
+#   graph) to natural_input, as a `jsonify` response parsed with `get_json()` before, and as the plain dict that
+#   `call_integration` passes along now.
+# Each measure is the best of `--repeat` runs, the report gives the time saved by the fast path for each.
+
+import argparse
+import contextlib
+import functools
+import json
+import os
+import sys
+import time
+from flask import Flask, jsonify
+from flask.json.provider import DefaultJSONProvider
+from app.integrations.database.memory import InMemoryDatabase
+from app.integrations.integration_manager import integration_result
+from app.json_provider import FastJSONProvider, orjson
+from benchmarks.graphs import PROFILES, spec_for_elements
+
+
+def best_of(function, repeat):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def build_graph(spec):
+    db = InMemoryDatabase()
+    ids = [db.add_entity(data) for data in spec.generate_entities()]
+    for data in spec.generate_relationships():
+        db.add_relationship({"from_id": ids[data["from"]], "to_id": ids[data["to"]],
+                             "relationship": data["relationship"], "snippet": data["snippet"]})
+    return db, ids
+
+
+def compare(before, after):
+    return {
+        "stdlib_ms": round(before * 1000, 3),
+        "fast_ms": round(after * 1000, 3),
+        "saved_ms": round((before - after) * 1000, 3),
+        "speedup": round(before / after, 2) if after > 0 else None,
+    }
+
+
+def run(spec, repeat):
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        db, ids = build_graph(spec)
+    graph = db.get_full_graph()
+    result = {
+        "created_entities": dict(enumerate(ids)),
+        "relationships": [{"from_id": r["from_id"], "to_id": r["to_id"], "relationship": r["relationship"]}
+                          for r in graph["relationships"]],
+    }
+
+    measures = {}
+    bodies = {}
+    for name, provider_class in (("stdlib", DefaultJSONProvider), ("fast", FastJSONProvider)):
+        app = Flask(__name__)
+        app.json = provider_class(app)
+        with app.app_context():
+            bodies[name] = jsonify(graph).get_data()
+            measures[f"{name}_encode"] = best_of(lambda: jsonify(graph), repeat)
+            measures[f"{name}_decode"] = best_of(functools.partial(app.json.loads, bodies[name]), repeat)
+            measures[f"{name}_chained"] = best_of(lambda: integration_result((jsonify(result), 200)), repeat)
+        if name == "fast":
+            measures["fast_chained"] = best_of(lambda: integration_result((result, 200)), repeat)
+
+    return {
+        **spec.describe(),
+        "body_bytes": len(bodies["fast"]),
+        "encode": compare(measures["stdlib_encode"], measures["fast_encode"]),
+        "decode": compare(measures["stdlib_decode"], measures["fast_decode"]),
+        "chained_call": compare(measures["stdlib_chained"], measures["fast_chained"]),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="JSON encode/decode time of the graph endpoints")
+    parser.add_argument("--elements", nargs="+", type=int, default=[10000, 100000])
+    parser.add_argument("--profiles", nargs="+", default=["uniform"], choices=PROFILES)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", help="write the report as JSON to this file")
+    args = parser.parse_args(argv)
+
+    runs = [
+        run(spec_for_elements(profile, elements), args.repeat)
+        for elements in args.elements for profile in args.profiles
+    ]
+    report = {"orjson": orjson is not None, "runs": runs}
+
+    print(f"orjson {'available' if orjson is not None else 'not installed, fast provider uses the stdlib'}")
+    print(f"{'profile':<12}{'elements':>10}{'MB':>8}{'measure':>14}{'stdlib ms':>12}{'fast ms':>10}{'saved ms':>11}{'speedup':>11}")
+    for entry in runs:
+        for measure in ("encode", "decode", "chained_call"):
+            stats = entry[measure]
+            print(f"{entry['profile']:<12}{entry['entities'] + entry['relationships']:>10}"
+                  f"{entry['body_bytes'] / 1e6:>8.1f}{measure:>14}{stats['stdlib_ms']:>12}{stats['fast_ms']:>10}"
+                  f"{stats['saved_ms']:>11}{stats['speedup'] or '-':>11}")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as fp:
+            json.dump(report, fp, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,243 @@
+# End-to-end HTTP load test of the Flask app, fully offline.
+#
+#   python -m benchmarks.load_test --concurrency 16 --duration 30 --mix natural_input=1 ai_search=3 \
+#       --model-latency 0.5 --model-jitter 0.2 --output load.json
+#
+# The harness starts the fake OpenAI server (benchmarks/fake_openai.py), points the openai client at it, serves the
+# real app from `create_app` on a local port with werkzeug's threaded server, then runs `--concurrency` clients that
+# send requests for `--duration` seconds (or `--requests` in total). Each request picks a route from the weighted
+# `--mix`:
+# - natural_input: POST /trigger-integration/natural_input with a generated paragraph, unique per request so the
+#   document registry does not short-circuit it as a duplicate,
+# - ai_search: POST /trigger-integration/ai_search with a question about the generated names,
+# - graph: GET /get-graph-data.
+#
+# With `--target URL` the requests go to an app that is already running instead; start it with OPENAI_BASE_URL
+# pointing at a fake server (`python -m benchmarks.fake_openai`) to stay offline.
+#
+# The report gives, per route and overall: requests, throughput, mean/p50/p95/p99/max latency, the error rate
+# (connection errors, 4xx and 5xx) and the rate of admission rejections (429/503 from the integration limiter),
+# plus the status codes seen and the number of model calls by kind. `--output` writes it as JSON.
+
+import argparse
+import contextlib
+import itertools
+import json
+import logging
+import os
+import random
+import sys
+import threading
+import time
+import requests
+from benchmarks.backends import percentile
+from benchmarks.fake_openai import FakeOpenAIServer
+
+ROUTES = ("natural_input", "ai_search", "graph")
+DEFAULT_MIX = {"natural_input": 1, "ai_search": 3, "graph": 1}
+FIRST_NAMES = ["Ada", "Alan", "Grace", "Edsger", "Barbara", "Donald", "Margaret", "Linus", "Guido", "Ken"]
+COMPANIES = ["Acme", "Globex", "Initech", "Umbrella", "Hooli", "Stark", "Wayne", "Tyrell"]
+CITIES = ["Paris", "Boston", "Lagos", "Osaka", "Lima", "Oslo"]
+REQUEST_TIMEOUT = 120
+
+
+def to_ms(value):
+    return round(value * 1000, 2) if value is not None else None
+
+
+class Workload:
+    def __init__(self, mix, seed=0):
+        self.routes = list(mix)
+        self.weights = [mix[route] for route in self.routes]
+        self.rng = random.Random(seed)
+        self.counter = itertools.count()
+        self.lock = threading.Lock()
+
+    def next_request(self):
+        with self.lock:
+            route = self.rng.choices(self.routes, self.weights)[0]
+            person = self.rng.choice(FIRST_NAMES)
+            company = self.rng.choice(COMPANIES)
+            city = self.rng.choice(CITIES)
+            number = next(self.counter)
+        if route == "natural_input":
+            text = f"{person} joined {company} in {city}. Report {number} mentions {company} and {person}."
+            return route, "POST", "/trigger-integration/natural_input", {"natural_input": text}
+        if route == "ai_search":
+            return route, "POST", "/trigger-integration/ai_search", f"Where does {person} work, {company}?"
+        return route, "GET", "/get-graph-data", None
+
+
+class RouteStats:
+    def __init__(self):
+        self.durations = []
+        self.statuses = {}
+        self.errors = 0
+        self.rejected = 0
+
+    def record(self, duration, status):
+        self.durations.append(duration)
+        self.statuses[str(status)] = self.statuses.get(str(status), 0) + 1
+        if status in (429, 503):
+            self.rejected += 1
+        elif status == "error" or status >= 400:
+            self.errors += 1
+
+    def merge(self, other):
+        self.durations.extend(other.durations)
+        for status, count in other.statuses.items():
+            self.statuses[status] = self.statuses.get(status, 0) + count
+        self.errors += other.errors
+        self.rejected += other.rejected
+
+    def report(self, elapsed):
+        durations = sorted(self.durations)
+        count = len(durations)
+        return {
+            "requests": count,
+            "throughput_rps": round(count / elapsed, 2) if elapsed > 0 else None,
+            "mean_ms": to_ms(sum(durations) / count) if count else None,
+            "p50_ms": to_ms(percentile(durations, 0.50)),
+            "p95_ms": to_ms(percentile(durations, 0.95)),
+            "p99_ms": to_ms(percentile(durations, 0.99)),
+            "max_ms": to_ms(durations[-1]) if count else None,
+            "error_rate": round(self.errors / count, 4) if count else 0.0,
+            "rejection_rate": round(self.rejected / count, 4) if count else 0.0,
+            "status_codes": self.statuses,
+        }
+
+
+def client(base_url, workload, deadline, budget, stats, lock):
+    session = requests.Session()
+    while time.monotonic() < deadline:
+        if budget is not None:
+            with lock:
+                if budget[0] <= 0:
+                    return
+                budget[0] -= 1
+        route, method, path, payload = workload.next_request()
+        started = time.monotonic()
+        try:
+            response = session.request(method, base_url + path, json=payload, timeout=REQUEST_TIMEOUT)
+            status = response.status_code
+        except requests.RequestException:
+            status = "error"
+        duration = time.monotonic() - started
+        with lock:
+            stats.setdefault(route, RouteStats()).record(duration, status)
+
+
+def run_load(base_url, mix, concurrency, duration=None, total_requests=None, seed=0):
+    workload = Workload(mix, seed)
+    stats = {}
+    lock = threading.Lock()
+    budget = [total_requests] if total_requests is not None else None
+    deadline = time.monotonic() + duration if duration else float("inf")
+
+    started = time.monotonic()
+    threads = [
+        threading.Thread(target=client, args=(base_url, workload, deadline, budget, stats, lock), daemon=True)
+        for _ in range(concurrency)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - started
+
+    overall = RouteStats()
+    for route_stats in stats.values():
+        overall.merge(route_stats)
+    return {
+        "elapsed_seconds": round(elapsed, 3),
+        "concurrency": concurrency,
+        "routes": {route: route_stats.report(elapsed) for route, route_stats in sorted(stats.items())},
+        "overall": overall.report(elapsed),
+    }
+
+
+@contextlib.contextmanager
+def serve_app(fake_url):
+    # Points the openai client at the fake server before the integrations make any call
+    os.environ["OPENAI_BASE_URL"] = fake_url
+    os.environ.setdefault("OPENAI_API_KEY", "fake")
+    import openai
+    openai.base_url = fake_url + "/"
+    from werkzeug.serving import make_server
+    from app import create_app
+
+    server = make_server("127.0.0.1", 0, create_app(), threaded=True)
+    thread = threading.Thread(target=server.serve_forever, name="load-test-app", daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{server.server_port}"
+    finally:
+        server.shutdown()
+
+
+def parse_mix(values):
+    mix = {}
+    for value in values:
+        route, _, weight = value.partition("=")
+        if route not in ROUTES:
+            raise ValueError(f"Unknown route '{route}', expected one of {', '.join(ROUTES)}")
+        mix[route] = float(weight or 1)
+    return mix
+
+
+def print_report(report):
+    print(f"{report['concurrency']} clients, {report['elapsed_seconds']} s")
+    print(f"{'route':<16}{'requests':>10}{'rps':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>9}{'rejected':>10}")
+    for route, stats in [*report["routes"].items(), ("overall", report["overall"])]:
+        print(f"{route:<16}{stats['requests']:>10}{stats['throughput_rps'] or 0:>10}{stats['p50_ms'] or '-':>10}"
+              f"{stats['p95_ms'] or '-':>10}{stats['p99_ms'] or '-':>10}{stats['error_rate']:>9.1%}"
+              f"{stats['rejection_rate']:>10.1%}")
+    if report.get("model_calls"):
+        print("model calls: " + ", ".join(f"{kind}={count}" for kind, count in sorted(report["model_calls"].items())))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="HTTP load test of the app against a fake model backend")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=30, help="seconds, ignored when --requests is given")
+    parser.add_argument("--requests", type=int, help="total number of requests to send")
+    parser.add_argument("--mix", nargs="+", default=None, help="route=weight pairs, e.g. natural_input=1 ai_search=3")
+    parser.add_argument("--model-latency", type=float, default=0.2, help="seconds per fake model call")
+    parser.add_argument("--model-jitter", type=float, default=0.05)
+    parser.add_argument("--target", help="base URL of an already running app")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the report as JSON to this file")
+    parser.add_argument("--quiet-app", action="store_true", help="silence the app's own output")
+    args = parser.parse_args(argv)
+
+    try:
+        mix = parse_mix(args.mix) if args.mix else dict(DEFAULT_MIX)
+    except ValueError as e:
+        parser.error(str(e))
+    duration = None if args.requests else args.duration
+
+    if args.target:
+        report = run_load(args.target.rstrip("/"), mix, args.concurrency, duration, args.requests, args.seed)
+    else:
+        with FakeOpenAIServer(latency=args.model_latency, jitter=args.model_jitter, seed=args.seed) as fake:
+            with contextlib.ExitStack() as stack:
+                if args.quiet_app:
+                    stack.enter_context(contextlib.redirect_stdout(stack.enter_context(open(os.devnull, "w"))))
+                    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+                base_url = stack.enter_context(serve_app(fake.url))
+                if args.quiet_app:
+                    logging.getLogger("app").setLevel(logging.ERROR)
+                report = run_load(base_url, mix, args.concurrency, duration, args.requests, args.seed)
+            report["model_calls"] = dict(fake.stats)
+            report["model_latency"] = {"seconds": args.model_latency, "jitter": args.model_jitter}
+
+    report["mix"] = mix
+    print_report(report)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as fp:
+            json.dump(report, fp, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,121 @@
+# Cold start of the app: import and create_app time in fresh interpreters, lazy against eager integration loading.
+#
+#   python -m benchmarks.startup --runs 10 --modes lazy eager --top 10 --output startup.json
+#
+# Every run starts a new Python process (no warm module cache in memory, the .pyc files are compiled by a first
+# discarded run) which measures, with the in-memory backend:
+# - import_ms: `from app import create_app`,
+# - create_app_ms: `create_app()`,
+# - first_request_ms: the first GET /get-graph-data through the test client,
+# - first_integration_ms: the first POST /trigger-integration/search_integration, which imports and registers the
+#   integration module in lazy mode,
+# - the heavy optional modules (openai, neo4j, bs4, requests, numpy, scipy) loaded once the app is created.
+# Modes set LAZY_INTEGRATIONS: `lazy` (default of the app) imports integration modules on first use, `eager` imports
+# all of them in create_app. The report gives the median and max of each measure per mode and, with `--top`, the
+# slowest top-level imports of create_app from `python -X importtime`.
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+MODES = {"lazy": "true", "eager": "false"}
+HEAVY_MODULES = ("openai", "neo4j", "bs4", "requests", "numpy", "scipy")
+
+PROBE = """
+import json, sys, time
+started = time.perf_counter()
+from app import create_app
+imported = time.perf_counter()
+app = create_app()
+created = time.perf_counter()
+loaded = [name for name in %r if name in sys.modules]
+client = app.test_client()
+client.get('/get-graph-data')
+requested = time.perf_counter()
+client.post('/trigger-integration/search_integration',
+            json={'entity_type': 'Organization', 'search_params': {'name': 'Acme'}})
+integrated = time.perf_counter()
+print(json.dumps({
+    'import_ms': (imported - started) * 1000,
+    'create_app_ms': (created - imported) * 1000,
+    'first_request_ms': (requested - created) * 1000,
+    'first_integration_ms': (integrated - requested) * 1000,
+    'modules': loaded,
+}))
+""" % (HEAVY_MODULES,)
+
+MEASURES = ("import_ms", "create_app_ms", "first_request_ms", "first_integration_ms")
+
+
+def environment(mode):
+    env = dict(os.environ)
+    env.update({
+        "LAZY_INTEGRATIONS": MODES[mode],
+        "DATABASE_TYPE": "memory",
+        "OPENAI_API_KEY": env.get("OPENAI_API_KEY", "test"),
+        "LOG_LEVEL": "ERROR",
+        "PYTHONPATH": os.pathsep.join(filter(None, [os.getcwd(), env.get("PYTHONPATH")])),
+    })
+    return env
+
+
+def probe(mode):
+    completed = subprocess.run([sys.executable, "-c", PROBE], env=environment(mode), capture_output=True, text=True,
+                               check=True)
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def slowest_imports(mode, top):
+    # Top-level imports only, the time of a dependency is included in the module importing it first
+    completed = subprocess.run([sys.executable, "-X", "importtime", "-c", "from app import create_app; create_app()"],
+                               env=environment(mode), capture_output=True, text=True, check=True)
+    imports = []
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if cumulative.strip().isdigit() and not name.startswith("  "):
+            imports.append((int(cumulative) / 1000, name.strip()))
+    return [[round(ms, 1), name] for ms, name in sorted(imports, reverse=True)[:top]]
+
+
+def run(mode, runs, top):
+    probe(mode)
+    samples = [probe(mode) for _ in range(runs)]
+    result = {"mode": mode, "runs": runs, "modules": samples[-1]["modules"]}
+    for measure in MEASURES:
+        values = [sample[measure] for sample in samples]
+        result[measure] = {"median": round(statistics.median(values), 1), "max": round(max(values), 1)}
+    if top:
+        result["slowest_imports"] = slowest_imports(mode, top)
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Import and startup time of the app in fresh interpreters")
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--modes", nargs="+", default=list(MODES), choices=MODES)
+    parser.add_argument("--top", type=int, default=0, help="also list the N slowest top-level imports")
+    parser.add_argument("--output", help="write the report as JSON to this file")
+    args = parser.parse_args(argv)
+
+    report = {"python": sys.version.split()[0], "results": [run(mode, args.runs, args.top) for mode in args.modes]}
+
+    print(f"{'mode':<8}{'measure':>22}{'median ms':>12}{'max ms':>10}")
+    for result in report["results"]:
+        for measure in MEASURES:
+            print(f"{result['mode']:<8}{measure:>22}{result[measure]['median']:>12}{result[measure]['max']:>10}")
+        print(f"{result['mode']:<8}{'heavy modules':>22}  {', '.join(result['modules']) or '-'}")
+        for ms, name in result.get("slowest_imports", []):
+            print(f"{result['mode']:<8}  import {name:<42}{ms:>10}")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as fp:
+            json.dump(report, fp, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
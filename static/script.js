@@ -79,6 +79,27 @@ $(document).ready(function () {
         selector: 'node[type="Product"]',
         style: { "background-color": "#FFC400" },
       },
+      // Clusters of the level-of-detail view, sized by their entity count
+      {
+        selector: 'node[type="cluster"]',
+        style: {
+          content: "data(name)",
+          shape: "ellipse",
+          "background-color": "#E0E0E0",
+          "border-width": 2,
+          "border-color": "#9E9E9E",
+          width: "data(diameter)",
+          height: "data(diameter)",
+        },
+      },
+      {
+        selector: "edge[weight]",
+        style: {
+          label: "data(weight)",
+          width: "data(width)",
+          "target-arrow-shape": "none",
+        },
+      },
       // Highlighted style
       {
         selector: ".highlighted",
@@ -97,12 +118,51 @@ $(document).ready(function () {
     },
   });
 
-  // Modify the refresh button to also update the Matplotlib image
+  // Modify the refresh button to also update the statistics charts
   $("#refresh-btn").click(function () {
     fetchAndUpdateGraph();
-    fetchAndDisplayMatplotlibImage();
+    fetchAndDisplayCharts();
   });
 
+  // Statistics charts are drawn by the server in the background and cached per graph version:
+  // a 202 means a chart is not drawn yet, X-Chart-Status: stale that a newer version is being drawn
+  const CHARTS = ["degree_distribution", "entity_types", "ingest_rate"];
+  const CHART_ATTEMPTS = 10;
+
+  function fetchChart(name, attempt) {
+    fetch("/charts/" + name + "?format=svg")
+      .then((response) => {
+        if (response.status === 202) {
+          if (attempt < CHART_ATTEMPTS) {
+            const retryAfter = parseFloat(response.headers.get("Retry-After")) || 1;
+            setTimeout(() => fetchChart(name, attempt + 1), retryAfter * 1000);
+          }
+          return null;
+        }
+        if (!response.ok) {
+          throw new Error("Chart " + name + " failed with status " + response.status);
+        }
+        if (response.headers.get("X-Chart-Status") === "stale" && attempt < CHART_ATTEMPTS) {
+          setTimeout(() => fetchChart(name, attempt + 1), 1000);
+        }
+        return response.blob();
+      })
+      .then((blob) => {
+        if (!blob) return;
+        const image = $("#chart-" + name);
+        const previous = image.attr("src");
+        image.attr("src", URL.createObjectURL(blob));
+        if (previous && previous.startsWith("blob:")) {
+          URL.revokeObjectURL(previous);
+        }
+      })
+      .catch((error) => console.error("Error fetching chart:", error));
+  }
+
+  function fetchAndDisplayCharts() {
+    CHARTS.forEach((name) => fetchChart(name, 0));
+  }
+
   $("#search-btn").on("click", function () {
     var query = $("#search-box").val();
     // Perform the AJAX request to the dynamic endpoint
@@ -174,6 +234,10 @@ $(document).ready(function () {
   // Listen for cytoscape node click events and update the sidebar
   cy.on("tap", "node", function (evt) {
     var node = evt.target;
+    if (node.data("cluster")) {
+      expandCluster(node);
+      return;
+    }
     var deleteButtonHtml = "<button id='deleteBtn'>Delete</button>";
     $("#sidebar").html(
       "<h2>" +
@@ -192,18 +256,24 @@ $(document).ready(function () {
 
   function transformDataToCytoscapeFormat(data) {
     const { entities, relationships } = data; // Adjusted for new data structure
+    // Positions computed by the server-side layout, keyed by entity id
+    const positions = data.positions || {};
 
     const nodes = [];
     // Iterate over each entity type (e.g., 'people', 'organizations') and their entities
     Object.entries(entities).forEach(([entityType, entityGroup]) => {
       Object.entries(entityGroup).forEach(([entityId, entityData]) => {
-        nodes.push({
+        const node = {
           data: {
             id: entityId,
             name: entityData.data.name, // Assuming 'name' is a consistent property
             type: entityType, // Used for styling based on the entity type
           },
-        });
+        };
+        if (positions[entityId]) {
+          node.position = { x: positions[entityId][0], y: positions[entityId][1] };
+        }
+        nodes.push(node);
       });
     });
 
@@ -233,17 +303,138 @@ $(document).ready(function () {
 
     cy.add([...cytoscapeData.nodes, ...cytoscapeData.edges]);
 
-    // Relayout the graph
+    // Use the server-side layout when every node has a position, otherwise lay the graph out here
+    const preset = cytoscapeData.nodes.every((node) => node.position);
     cy.layout({
-      name: "cose",
+      name: preset ? "preset" : "cose",
     }).run();
 
     // Fit the graph to the viewport
     cy.fit();
   }
 
+  // Graphs with more entities than this are shown as clusters, expanded on tap
+  const CLUSTER_VIEW_ENTITIES = 2000;
+
+  function clusterNode(cluster, position) {
+    return {
+      data: {
+        id: "cluster-" + cluster.id,
+        cluster: cluster.id,
+        name: cluster.label + " (" + cluster.size + ")",
+        type: "cluster",
+        diameter: 30 + 10 * Math.log2(cluster.size),
+      },
+      position: position,
+    };
+  }
+
+  function clusterEdge(edge, source, target) {
+    return {
+      data: {
+        id: "weight-" + source + "-" + target,
+        source: source,
+        target: target,
+        weight: edge.weight,
+        width: Math.min(1 + Math.log2(edge.weight), 12),
+      },
+    };
+  }
+
+  function ring(center, count, radius, index) {
+    const angle = (2 * Math.PI * index) / Math.max(count, 1);
+    return { x: center.x + radius * Math.cos(angle), y: center.y + radius * Math.sin(angle) };
+  }
+
+  function showClusters(data) {
+    cy.elements().remove();
+    const radius = 60 * Math.sqrt(data.clusters.length);
+    cy.add(
+      data.clusters.map((cluster, index) =>
+        clusterNode(cluster, ring({ x: 0, y: 0 }, data.clusters.length, radius, index))
+      )
+    );
+    cy.add(data.edges.map((edge) => clusterEdge(edge, "cluster-" + edge.from, "cluster-" + edge.to)));
+    cy.layout({ name: "cose", animate: false, randomize: false }).run();
+    cy.fit();
+    $("#sidebar").html(
+      "<p>" + data.entities + " entities in " + data.clusters.length + " clusters" +
+        (data.hidden.clusters ? " (" + data.hidden.clusters + " small clusters not shown)" : "") +
+        ". Click a cluster to expand it.</p>"
+    );
+  }
+
+  function expandCluster(node) {
+    fetch("/clusters/" + encodeURIComponent(node.data("cluster")))
+      .then((response) => response.json())
+      .then((data) => {
+        if (data.error) {
+          // The hierarchy was rebuilt since the clusters were shown
+          fetchAndUpdateGraph();
+          return;
+        }
+        const center = node.position();
+        node.remove();
+        const added = [];
+        const children = data.entities
+          ? data.entities.map((entity) => ({ data: { id: entity.id.toString(), name: entity.name, type: entity.type } }))
+          : data.clusters.map((cluster) => clusterNode(cluster));
+        const radius = 40 * Math.sqrt(children.length) + 40;
+        children.forEach((child, index) => {
+          child.position = ring(center, children.length, radius, index);
+          if (cy.getElementById(child.data.id).empty()) {
+            added.push(child);
+          }
+        });
+        (data.relationships || []).forEach((rel) => {
+          added.push({
+            data: {
+              id: "rel-" + rel.from + "-" + rel.to,
+              source: rel.from.toString(),
+              target: rel.to.toString(),
+            },
+          });
+        });
+        (data.edges || []).forEach((edge) => {
+          added.push(clusterEdge(edge, "cluster-" + edge.from, "cluster-" + edge.to));
+        });
+        // Only towards the clusters still shown
+        data.external.forEach((edge) => {
+          const source = data.entities ? edge.from.toString() : "cluster-" + edge.from;
+          if (!cy.getElementById("cluster-" + edge.to).empty()) {
+            added.push(clusterEdge(edge, source, "cluster-" + edge.to));
+          }
+        });
+        cy.add(added.filter((element) => cy.getElementById(element.data.id).empty()));
+        $("#sidebar").html(
+          "<h2>" + data.cluster.label + "</h2><p>" + data.cluster.size + " entities" +
+            (data.hidden.entities ? ", " + data.hidden.entities + " not shown" : "") + "</p>"
+        );
+      })
+      .catch((error) => {
+        console.error("Error expanding cluster:", error);
+      });
+  }
+
   function fetchAndUpdateGraph() {
-    fetch("/get-graph-data")
+    // Large graphs start from the cluster overview instead of every entity
+    fetch("/clusters")
+      .then((response) => response.json())
+      .then((data) => {
+        if (data.entities > CLUSTER_VIEW_ENTITIES) {
+          showClusters(data);
+        } else {
+          fetchFullGraph();
+        }
+      })
+      .catch((error) => {
+        console.error("Error fetching clusters:", error);
+        fetchFullGraph();
+      });
+  }
+
+  function fetchFullGraph() {
+    fetch("/get-graph-data?layout=1")
       .then((response) => response.json())
       .then((data) => {
         console.log(data);
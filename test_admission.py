@@ -0,0 +1,50 @@
+import threading
+import time
+import unittest
+from app.integrations.integration_manager import AdmissionLimiter, AdmissionRejected
+
+
+class AdmissionLimiterTestCase(unittest.TestCase):
+
+    def test_rejects_when_queue_is_full(self):
+        limiter = AdmissionLimiter(max_concurrent=1, max_queued=0)
+        limiter.acquire()
+        with self.assertRaises(AdmissionRejected) as context:
+            limiter.acquire()
+        self.assertEqual(context.exception.status_code, 429)
+        self.assertGreaterEqual(context.exception.retry_after, 1)
+        limiter.release(0.1)
+        limiter.acquire()
+        self.assertEqual(limiter.stats()['in_flight'], 1)
+
+    def test_queue_timeout(self):
+        limiter = AdmissionLimiter(max_concurrent=1, max_queued=1, queue_timeout=0.05)
+        limiter.acquire()
+        with self.assertRaises(AdmissionRejected) as context:
+            limiter.acquire()
+        self.assertEqual(context.exception.status_code, 503)
+        self.assertEqual(limiter.stats()['queued'], 0)
+        self.assertEqual(limiter.stats()['rejected'], 1)
+
+    def test_queued_request_is_admitted_on_release(self):
+        limiter = AdmissionLimiter(max_concurrent=1, max_queued=1, queue_timeout=5)
+        limiter.acquire()
+        admitted = threading.Event()
+
+        def waiter():
+            with limiter.admit():
+                admitted.set()
+
+        thread = threading.Thread(target=waiter)
+        thread.start()
+        while limiter.stats()['queued'] == 0:
+            time.sleep(0.001)
+        self.assertFalse(admitted.is_set())
+        limiter.release(0.1)
+        thread.join(5)
+        self.assertTrue(admitted.is_set())
+        self.assertEqual(limiter.stats()['in_flight'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,119 @@
+import unittest
+from collections import deque
+from app.analytics import CSRGraph, GraphAnalytics, betweenness
+from app.integrations.database.memory import InMemoryDatabase
+
+
+def exact_betweenness(ids, edges):
+    # Plain Brandes on the undirected graph, as a reference
+    neighbours = {entity_id: set() for entity_id in ids}
+    for from_id, to_id, _ in edges:
+        if from_id != to_id:
+            neighbours[from_id].add(to_id)
+            neighbours[to_id].add(from_id)
+    scores = dict.fromkeys(ids, 0.0)
+    for source in ids:
+        stack, predecessors = [], {v: [] for v in ids}
+        sigma, distance = dict.fromkeys(ids, 0), dict.fromkeys(ids, -1)
+        sigma[source], distance[source] = 1, 0
+        queue = deque([source])
+        while queue:
+            v = queue.popleft()
+            stack.append(v)
+            for w in neighbours[v]:
+                if distance[w] < 0:
+                    distance[w] = distance[v] + 1
+                    queue.append(w)
+                if distance[w] == distance[v] + 1:
+                    sigma[w] += sigma[v]
+                    predecessors[w].append(v)
+        delta = dict.fromkeys(ids, 0.0)
+        while stack:
+            w = stack.pop()
+            for v in predecessors[w]:
+                delta[v] += sigma[v] / sigma[w] * (1 + delta[w])
+            if w != source:
+                scores[w] += delta[w]
+    return {entity_id: score / 2 for entity_id, score in scores.items()}
+
+
+class GraphAnalyticsTestCase(unittest.TestCase):
+
+    def setUp(self):
+        # Two triangles joined by a bridge, plus an isolated entity
+        self.db = InMemoryDatabase()
+        self.ids = [self.db.add_entity({'name': f'Entity {index}', 'type': 'Concept'}) for index in range(7)]
+        a, b, c, d, e, f, _ = self.ids
+        for from_id, to_id in [(a, b), (b, c), (c, a), (d, e), (e, f), (f, d), (c, d)]:
+            self.db.add_relationship({'from_id': from_id, 'to_id': to_id, 'relationship': 'related_to'})
+        self.version = 1
+        self.analytics = GraphAnalytics(self.db.dump_graph, lambda: self.version)
+
+    def test_pagerank(self):
+        ranks = self.analytics.pagerank()
+        self.assertAlmostEqual(sum(ranks.values()), 1.0)
+        # The bridge endpoint receives from its triangle and from the bridge
+        self.assertEqual(max(ranks, key=ranks.get), self.ids[3])
+        self.assertEqual(min(ranks, key=ranks.get), self.ids[6])
+
+    def test_components_and_communities(self):
+        components = self.analytics.components()
+        self.assertEqual({components[entity_id] for entity_id in self.ids[:6]}, {0})
+        self.assertEqual(components[self.ids[6]], 1)
+
+        communities = self.analytics.communities()
+        self.assertEqual(len({communities[entity_id] for entity_id in self.ids[:3]}), 1)
+        self.assertEqual(len({communities[entity_id] for entity_id in self.ids[3:6]}), 1)
+        self.assertNotEqual(communities[self.ids[0]], communities[self.ids[3]])
+
+    def test_degree(self):
+        degree = self.analytics.degree()
+        self.assertEqual(degree[self.ids[2]], {'in': 1, 'out': 2, 'total': 3})
+        self.assertEqual(degree[self.ids[6]]['total'], 0)
+
+    def test_betweenness_matches_brandes(self):
+        nodes, edges = self.db.dump_graph()
+        expected = exact_betweenness([node[0] for node in nodes], edges)
+        scores = self.analytics.betweenness(samples=len(nodes))
+        for entity_id, score in expected.items():
+            self.assertAlmostEqual(scores[entity_id], score)
+        self.assertEqual(scores[self.ids[2]], 6.0)
+
+    def test_betweenness_sampling_is_scaled(self):
+        graph = CSRGraph.from_dump(*self.db.dump_graph())
+        estimate = betweenness(graph, samples=3, seed=1)
+        self.assertGreater(estimate.sum(), 0)
+        self.assertEqual(estimate[6], 0)
+
+    def test_results_cached_until_version_changes(self):
+        calls = []
+
+        def load_graph():
+            calls.append(1)
+            return self.db.dump_graph()
+
+        analytics = GraphAnalytics(load_graph, lambda: self.version)
+        analytics.pagerank()
+        analytics.components()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(analytics.stats()['nodes'], 7)
+
+        self.db.add_entity({'name': 'New', 'type': 'Concept'})
+        self.version += 1
+        self.assertEqual(len(analytics.pagerank()), 8)
+        self.assertEqual(len(calls), 2)
+
+    def test_report(self):
+        report = self.analytics.report('pagerank', limit=2)
+        self.assertEqual([entity['id'] for entity in report['top']][:1], [self.ids[3]])
+        self.assertEqual(report['top'][0]['name'], 'Entity 3')
+        groups = self.analytics.report('components', limit=5, members=2)
+        self.assertEqual(groups['count'], 2)
+        self.assertEqual([group['size'] for group in groups['groups']], [6, 1])
+        self.assertEqual(len(groups['groups'][0]['members']), 2)
+        with self.assertRaises(ValueError):
+            self.analytics.report('pagerank', alpha=0.5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+import asyncio
+import json
+import os
+import time
+import unittest
+
+os.environ.setdefault('OPENAI_API_KEY', 'test')
+
+import openai
+from app import create_app
+from app.asgi import AsgiApp
+from app.integrations.integration_manager import AdmissionRejected, AsyncAdmissionLimiter
+from benchmarks.fake_openai import FakeOpenAIServer
+
+
+async def request(app, method, path, body=None, headers=()):
+    payload = json.dumps(body).encode() if body is not None else b''
+    scope = {
+        'type': 'http', 'method': method, 'path': path, 'query_string': b'', 'http_version': '1.1',
+        'headers': [(b'content-type', b'application/json'), *headers],
+        'server': ('testserver', 80), 'client': ('127.0.0.1', 5000),
+    }
+    messages = iter([{'type': 'http.request', 'body': payload, 'more_body': False}])
+    sent = []
+
+    async def receive():
+        return next(messages)
+
+    async def send(message):
+        sent.append(message)
+
+    await app(scope, receive, send)
+    start, body_message = sent
+    headers = {name.decode(): value.decode() for name, value in start['headers']}
+    return start['status'], headers, body_message['body']
+
+
+class AsgiTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.fake = FakeOpenAIServer(latency=0.2).start()
+        self.base_url = (openai.base_url, os.environ.get('OPENAI_BASE_URL'))
+        openai.base_url = self.fake.url + '/'
+        os.environ['OPENAI_BASE_URL'] = self.fake.url
+        self.app = AsgiApp(create_app())
+
+    def tearDown(self):
+        self.fake.stop()
+        openai.base_url = self.base_url[0]
+        if self.base_url[1] is None:
+            os.environ.pop('OPENAI_BASE_URL', None)
+        else:
+            os.environ['OPENAI_BASE_URL'] = self.base_url[1]
+
+    def test_model_calls_are_multiplexed(self):
+        async def run():
+            await request(self.app, 'POST', '/trigger-integration/natural_input',
+                          {'natural_input': 'Ada works at Acme in Paris.'})
+            started = time.monotonic()
+            results = await asyncio.gather(*(
+                request(self.app, 'POST', '/trigger-integration/ai_search', {'question': f'Where does Ada {index} work?'})
+                for index in range(40)
+            ))
+            return results, time.monotonic() - started
+
+        results, elapsed = asyncio.run(run())
+        self.assertTrue(all(status == 200 for status, _, _ in results))
+        self.assertIn('answer', json.loads(results[0][2]))
+        self.assertIn('X-Request-ID'.lower(), results[0][1])
+        # Two model calls of 0.2 s per search, 16 s one after the other
+        self.assertLess(elapsed, 4)
+        self.assertEqual(self.fake.stats['answer'], 40)
+
+    def test_sync_routes_go_through_wsgi(self):
+        async def run():
+            return await request(self.app, 'GET', '/get-graph-data')
+
+        status, headers, body = asyncio.run(run())
+        self.assertEqual(status, 200)
+        self.assertIn('entities', json.loads(body))
+        self.assertIn('etag', headers)
+
+    def test_async_limiter(self):
+        async def run():
+            limiter = AsyncAdmissionLimiter(max_concurrent=1, max_queued=1, queue_timeout=0.05)
+            async with limiter.admit():
+                with self.assertRaises(AdmissionRejected) as timed_out:
+                    await limiter.acquire()
+                waiting = asyncio.ensure_future(limiter.acquire())
+                await asyncio.sleep(0)
+                with self.assertRaises(AdmissionRejected) as full:
+                    await limiter.acquire()
+            await waiting
+            await limiter.release(0)
+            return timed_out.exception, full.exception, limiter.stats()
+
+        timed_out, full, stats = asyncio.run(run())
+        self.assertEqual(timed_out.status_code, 503)
+        self.assertEqual(full.status_code, 429)
+        self.assertEqual(stats['in_flight'], 0)
+        self.assertEqual(stats['rejected'], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+import os
+import unittest
+from unittest import mock
+
+os.environ.setdefault('OPENAI_API_KEY', 'test')
+
+from app import models
+from app.integrations.add_multiple_conditional import write_graph_batched
+
+
+class RecordingBackend:
+    """Records upsert_graph calls and pretends only `entity_existing` is in the graph."""
+
+    def __init__(self):
+        self.calls = []
+
+    def upsert_graph(self, entities, relationships, entity_updates=()):
+        self.calls.append((entities, relationships, list(entity_updates)))
+        return {
+            'entity_ids': {ref: f'entity_new_{ref}' for ref in entities},
+            'updated': [update['id'] for update in entity_updates if update['id'] == 'entity_existing'],
+            'relationships': len(relationships),
+        }
+
+    def get_entity(self, entity_id):
+        return {'id': entity_id} if entity_id == 'entity_existing' else None
+
+
+class WriteGraphBatchedTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.backend = RecordingBackend()
+        models.set_database_integration(self.backend)
+
+    def tearDown(self):
+        models.set_database_integration(None)
+
+    def test_single_upsert_per_graph(self):
+        graph = {
+            'nodes': [
+                {'id': 1, 'name': 'Alice'},
+                {'id': 2, 'name': 'Bob'},
+                {'id': 3, 'name': 'alice '},
+                {'id': 4, 'name': 'Ghost'},
+            ],
+            'relationships': [
+                {'from_id': 1, 'to_id': 2, 'relationship': 'knows'},
+                {'from_id': 3, 'to_id': 2, 'relationship': 'likes'},
+                {'from_id': 4, 'to_id': 1, 'relationship': 'haunts'},
+                {'from_id': 1, 'to_id': 99, 'relationship': 'unknown'},
+            ],
+        }
+        resolutions = {1: None, 2: 'entity_existing', 3: None, 4: 'entity_made_up'}
+        known = {}
+
+        self.assertTrue(models.supports_batch_writes())
+        created, relationships = write_graph_batched(graph, resolutions, 'doc_1', known)
+
+        self.assertEqual(len(self.backend.calls), 1)
+        entities, relationship_rows, updates = self.backend.calls[0]
+        # The match the graph does not know about is created, with its relationships
+        self.assertEqual(list(entities), [1, 4])
+        self.assertEqual(entities[1]['source_documents'], ['doc_1'])
+        self.assertEqual(entities[4]['name'], 'Ghost')
+        self.assertEqual(len(relationship_rows), 3)
+        self.assertEqual([update['id'] for update in updates], ['entity_existing'])
+
+        self.assertEqual(created, {1: 'entity_new_1', 2: 'entity_existing', 3: 'entity_new_1', 4: 'entity_new_4'})
+        self.assertEqual(known, {'alice': 'entity_new_1', 'ghost': 'entity_new_4'})
+        self.assertEqual(
+            [relationship['relationship'] for relationship in relationships],
+            ['knows', 'likes', 'haunts'],
+        )
+        self.assertEqual(relationships[2], {'from_id': 'entity_new_4', 'to_id': 'entity_new_1',
+                                            'relationship': 'haunts'})
+
+    def test_existing_relationships_are_not_written_twice(self):
+        graph = {
+            'nodes': [{'id': 1, 'name': 'Bob'}, {'id': 2, 'name': 'Bob Junior'}],
+            'relationships': [{'from_id': 1, 'to_id': 2, 'relationship': 'parent_of'}],
+        }
+        resolutions = {1: 'entity_existing', 2: 'entity_existing'}
+        with mock.patch(
+            'app.integrations.add_multiple_conditional.find_matching_relationship',
+            return_value='{"relationship": "parent_of"}',
+        ):
+            _, relationships = write_graph_batched(graph, resolutions)
+
+        _, relationship_rows, _ = self.backend.calls[0]
+        self.assertEqual(relationship_rows, [])
+        self.assertEqual(len(relationships), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,59 @@
+import contextlib
+import io
+import json
+import os
+import tempfile
+import unittest
+from collections import Counter
+from benchmarks.backends import compare, main
+from benchmarks.graphs import GraphSpec, spec_for_elements
+
+
+class GraphSpecTestCase(unittest.TestCase):
+
+    def test_generation_is_deterministic(self):
+        spec = GraphSpec('text_heavy', 20, 50, seed=3)
+        self.assertEqual(list(spec.generate_entities()), list(GraphSpec('text_heavy', 20, 50, seed=3).generate_entities()))
+        self.assertEqual(len(list(spec.generate_relationships())), 50)
+        self.assertIn('description', next(spec.generate_entities()))
+
+    def test_power_law_has_hubs(self):
+        spec = GraphSpec('power_law', 1000, 10000)
+        degrees = Counter(relationship['from'] for relationship in spec.generate_relationships())
+        self.assertTrue(all(0 <= index < 1000 for index in degrees))
+        # The most connected entity gets far more than the uniform average of 10 relationships
+        self.assertGreater(degrees.most_common(1)[0][1], 500)
+
+    def test_spec_for_elements(self):
+        spec = spec_for_elements('uniform', 1000, relationships_per_entity=3)
+        self.assertEqual((spec.entities, spec.relationships), (250, 750))
+
+
+class BenchmarkSuiteTestCase(unittest.TestCase):
+
+    def test_json_output_and_compare(self):
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, 'results.json')
+            with contextlib.redirect_stdout(io.StringIO()):
+                status = main(['--backends', 'memory', 'sqlite', '--elements', '200', '--samples', '20',
+                               '--output', output])
+            self.assertEqual(status, 0)
+            with open(output) as fp:
+                results = json.load(fp)
+
+        self.assertEqual([run['backend'] for run in results['runs']], ['memory', 'sqlite'])
+        operations = results['runs'][1]['operations']
+        for operation in ('add_entity', 'add_relationship', 'get_entity', 'search_entities', 'search_relationships',
+                          'get_full_graph', 'delete_entity'):
+            self.assertGreater(operations[operation]['calls'], 0)
+            self.assertLessEqual(operations[operation]['p50_ms'], operations[operation]['p99_ms'])
+
+        self.assertEqual(compare(results, results), [])
+        slower = json.loads(json.dumps(results))
+        slower['runs'][1]['operations']['get_entity']['p50_ms'] *= 2
+        regressions = compare(slower, results)
+        self.assertEqual([(r['backend'], r['operation']) for r in regressions], [('sqlite', 'get_entity')])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,122 @@
+import time
+import unittest
+from app.integrations.database.cache import CachedDatabase
+from app.integrations.database.lazy import LazyDatabase
+from app.integrations.database.memory import InMemoryDatabase
+from app.signals import entity_created, entity_deleted, entity_updated
+
+
+class CountingDatabase(InMemoryDatabase):
+
+    def __init__(self):
+        super().__init__()
+        self.calls = {}
+
+    def count(self, name):
+        self.calls[name] = self.calls.get(name, 0) + 1
+
+    def get_entity(self, entity_id):
+        self.count('get_entity')
+        return super().get_entity(entity_id)
+
+    def search_entities(self, search_params):
+        self.count('search_entities')
+        return super().search_entities(search_params)
+
+    def search_relationships(self, search_params):
+        self.count('search_relationships')
+        return super().search_relationships(search_params)
+
+
+class CachedDatabaseTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.backend = CountingDatabase()
+        self.db = CachedDatabase(self.backend, max_entries=100, ttl=60)
+        self.john = self.db.add_entity({'name': 'John Doe', 'type': 'Person'})
+        self.acme = self.db.add_entity({'name': 'Acme', 'type': 'Organization'})
+        self.db.add_relationship({'from_id': self.john, 'to_id': self.acme, 'relationship': 'works_at'})
+
+    def test_read_through(self):
+        self.assertEqual(self.db.get_entity(self.john)['name'], 'John Doe')
+        self.db.get_entity(self.john)['name'] = 'Changed by the caller'
+        self.assertEqual(self.db.get_entity(self.john)['name'], 'John Doe')
+        self.assertEqual(self.backend.calls['get_entity'], 1)
+
+        stats = self.db.cache_stats()['operations']['get_entity']
+        self.assertEqual((stats['hits'], stats['misses']), (2, 1))
+
+    def test_update_invalidates_precisely(self):
+        self.db.get_entity(self.john)
+        self.db.get_entity(self.acme)
+        self.db.search_entities({'name': 'doe'})
+        self.db.search_entities({'type': 'org'})
+
+        self.db.update_entity(self.john, {'name': 'Johnny Doe'})
+        self.assertEqual(self.db.get_entity(self.john)['name'], 'Johnny Doe')
+        self.assertEqual(self.db.search_entities({'name': 'doe'})[0]['name'], 'Johnny Doe')
+        # Untouched entries are still served from the cache
+        self.db.get_entity(self.acme)
+        self.db.search_entities({'type': 'org'})
+        self.assertEqual(self.backend.calls, {'get_entity': 3, 'search_entities': 3})
+
+    def test_added_entity_shows_up_in_matching_searches(self):
+        self.assertEqual(len(self.db.search_entities({'name': 'doe'})), 1)
+        self.db.search_entities({'alias': 'x'})
+        self.db.add_entity({'name': 'Jane Doe'})
+        self.assertEqual(len(self.db.search_entities({'name': 'doe'})), 2)
+        self.db.search_entities({'alias': 'x'})
+        self.assertEqual(self.backend.calls['search_entities'], 3)
+
+    def test_delete_invalidates_relationship_searches(self):
+        self.assertEqual(len(self.db.search_relationships({'relationship': 'works'})), 1)
+        self.db.delete_entity(self.acme)
+        self.assertEqual(self.db.search_relationships({'relationship': 'works'}), [])
+        self.assertIsNone(self.db.get_entity(self.acme))
+
+    def test_signals_invalidate(self):
+        self.db.get_entity(self.john)
+        # A write made to the backend directly, announced through the signal
+        self.backend.update_entity(self.john, {'name': 'Signalled'})
+        entity_updated.send(None, entity_id=self.john, data={'name': 'Signalled'})
+        self.assertEqual(self.db.get_entity(self.john)['name'], 'Signalled')
+
+        self.db.search_relationships({'from_id': self.john})
+        self.backend.add_relationship({'from_id': self.john, 'to_id': self.john, 'relationship': 'self'})
+        entity_created.send(None, entity_type='relationship', entity_id=1,
+                            data={'from_id': self.john, 'to_id': self.john, 'relationship': 'self'})
+        self.assertEqual(len(self.db.search_relationships({'from_id': self.john})), 2)
+
+        self.backend.delete_entity(self.john)
+        entity_deleted.send(None, entity_id=self.john)
+        self.assertIsNone(self.db.get_entity(self.john))
+
+    def test_lru_and_ttl_bounds(self):
+        db = CachedDatabase(self.backend, max_entries=2, ttl=0.05)
+        for entity_id in (self.john, self.acme, "missing"):
+            db.get_entity(entity_id)
+        self.assertEqual(db.cache_stats()['operations']['get_entity']['evictions'], 1)
+        time.sleep(0.06)
+        db.get_entity(self.acme)
+        self.assertEqual(db.cache_stats()['operations']['get_entity']['expirations'], 1)
+
+    def test_per_operation_enablement(self):
+        db = CachedDatabase(self.backend, operations=['search_entities'])
+        db.get_entity(self.john)
+        db.get_entity(self.john)
+        self.assertEqual(self.backend.calls['get_entity'], 2)
+        self.assertNotIn('get_entity', db.cache_stats()['operations'])
+        with self.assertRaises(ValueError):
+            CachedDatabase(self.backend, operations=['add_entity'])
+
+    def test_passes_backend_methods_through(self):
+        self.assertFalse(hasattr(self.db, 'upsert_graph'))
+        self.assertEqual(self.db.dump_graph(), self.backend.dump_graph())
+
+    def test_reports_the_type_of_a_lazy_backend(self):
+        db = CachedDatabase(LazyDatabase(InMemoryDatabase))
+        self.assertEqual(db.cache_stats()['backend'], 'InMemoryDatabase')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,108 @@
+import os
+import threading
+import unittest
+
+os.environ.setdefault('OPENAI_API_KEY', 'test')
+
+from app import create_app
+from app.analytics import GraphAnalytics
+from app.charts import ChartService, ingest_rate_data
+from app.documents import DocumentRegistry
+from app.integrations.database.memory import InMemoryDatabase
+from app.models import add_entity
+
+PNG = b'\x89PNG\r\n\x1a\n'
+
+
+class ChartServiceTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.db = InMemoryDatabase()
+        ids = [self.db.add_entity({'name': f'n{index}', 'type': 'Person'}) for index in range(5)]
+        self.db.add_relationship({'from_id': ids[0], 'to_id': ids[1], 'relationship': 'knows', 'snippet': ''})
+        self.version = 1
+        # Renders wait for the gate, so the test decides when the worker is done
+        self.gate = threading.Event()
+
+        def load_graph():
+            self.gate.wait(10)
+            return self.db.dump_graph()
+
+        def version():
+            return self.version
+
+        self.charts = ChartService(GraphAnalytics(load_graph, version), DocumentRegistry(), version)
+
+    def test_renders_in_background_once_per_version(self):
+        self.assertEqual(self.charts.get('entity_types'), (None, None, False))
+        self.assertEqual(self.charts.get('entity_types'), (None, None, False))
+        self.gate.set()
+        image, version, fresh = self.charts.get('entity_types', wait=10)
+        self.assertTrue(image.startswith(PNG))
+        self.assertEqual((version, fresh), (1, True))
+        self.assertEqual(self.charts.stats()['renders'], 1)
+
+        self.gate.clear()
+        self.version = 2
+        self.assertEqual(self.charts.get('entity_types'), (image, 1, False))
+        self.gate.set()
+        self.assertEqual(self.charts.get('entity_types', wait=10)[1:], (2, True))
+        self.assertEqual(self.charts.stats()['renders'], 2)
+
+    def test_formats_and_params(self):
+        self.gate.set()
+        self.assertTrue(self.charts.get('degree_distribution', 'svg', wait=10)[0].startswith(b'<?xml'))
+        self.assertIsNotNone(self.charts.get('degree_distribution', 'svg', wait=10, scale='linear')[0])
+        with self.assertRaises(KeyError):
+            self.charts.get('unknown')
+        for fmt, params in (('gif', {}), ('png', {'limit': 'many'}), ('png', {'limit': 0}), ('png', {'size': 3})):
+            with self.assertRaises(ValueError):
+                self.charts.get('entity_types', fmt, **params)
+        for chart, params in (('entity_types', {'limit': 51}), ('ingest_rate', {'bucket': 1, 'window': 2000000}),
+                              ('ingest_rate', {'bucket': 30 * 24 * 3600})):
+            with self.assertRaises(ValueError):
+                self.charts.get(chart, **params)
+
+    def test_ingest_rate_goes_stale_with_the_clock(self):
+        self.gate.set()
+        now = [7200.0]
+        charts = ChartService(self.charts.analytics, DocumentRegistry(), lambda: self.version, clock=lambda: now[0])
+        image, version, fresh = charts.get('ingest_rate', wait=10)
+        self.assertEqual((version, fresh), ((1, 2), True))
+        now[0] = 10800.0
+        self.assertEqual(charts.get('ingest_rate')[1:], ((1, 2), False))
+        self.assertEqual(charts.get('ingest_rate', wait=10)[1:], ((1, 3), True))
+
+    def test_ingest_rate_buckets(self):
+        registry = DocumentRegistry()
+        registry.complete('doc_a', [1, 2], [])
+        registry.complete('doc_b', [3], [])
+        registry.documents['doc_a']['ingested_at'] = 7200
+        registry.documents['doc_b']['ingested_at'] = 10799
+        registry.claim('doc_c')
+        self.assertEqual(ingest_rate_data(registry, 3600, 3, now=10800),
+                         [(3600, 0, 0), (7200, 2, 3), (10800, 0, 0)])
+
+
+class ChartRoutesTestCase(unittest.TestCase):
+
+    def test_chart_route(self):
+        app = create_app()
+        add_entity({'name': 'Acme', 'type': 'Organization'})
+        client = app.test_client()
+        response = client.get('/charts/entity_types?wait=10')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, 'image/png')
+        self.assertEqual(response.headers['X-Chart-Status'], 'fresh')
+        self.assertEqual(client.get('/charts/ingest_rate?window=2000000').status_code, 400)
+        self.assertTrue(response.data.startswith(PNG))
+        self.assertEqual(client.get('/charts/entity_types', headers={'If-None-Match': response.headers['ETag']})
+                         .status_code, 304)
+
+        self.assertEqual(client.get('/charts/unknown').status_code, 404)
+        self.assertEqual(client.get('/charts/ingest_rate?bucket=-1').status_code, 400)
+        self.assertIn('degree_distribution', client.get('/charts').get_json()['charts'])
+
+
+if __name__ == '__main__':
+    unittest.main()
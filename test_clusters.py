@@ -0,0 +1,119 @@
+import os
+import unittest
+
+os.environ.setdefault('OPENAI_API_KEY', 'test')
+
+from app import create_app
+from app.analytics import GraphAnalytics
+from app.clusters import GraphClusters
+from app.integrations.database.memory import InMemoryDatabase
+from app.models import add_entity, add_relationship
+
+
+def link(db, a, b):
+    db.add_relationship({'from_id': a, 'to_id': b, 'relationship': 'knows', 'snippet': ''})
+
+
+class ClustersTestCase(unittest.TestCase):
+
+    def setUp(self):
+        # 80 cliques of 6 entities, each joined to the next one by a single relationship
+        self.db = InMemoryDatabase()
+        self.version = [1]
+        self.cliques = []
+        for clique in range(80):
+            ids = [self.db.add_entity({'name': f'c{clique}-{index}', 'type': 'Person' if index else 'Organization'})
+                   for index in range(6)]
+            for a in range(6):
+                for b in range(a + 1, 6):
+                    link(self.db, ids[a], ids[b])
+            if self.cliques:
+                link(self.db, self.cliques[-1][0], ids[0])
+            self.cliques.append(ids)
+        self.clusters = GraphClusters(GraphAnalytics(self.db.dump_graph, lambda: self.version[0]))
+
+    def test_overview(self):
+        overview = self.clusters.overview()
+        self.assertGreater(overview['levels'], 1)
+        self.assertEqual(overview['entities'], 480)
+        self.assertEqual(overview['level'], overview['levels'] - 1)
+        self.assertLessEqual(len(overview['clusters']), 50)
+        self.assertEqual(sum(cluster['size'] for cluster in overview['clusters']), 480)
+        self.assertEqual(overview['hidden'], {'clusters': 0, 'entities': 0})
+        # Only the 79 relationships between cliques can join two clusters
+        self.assertTrue(overview['edges'])
+        self.assertLessEqual(sum(edge['weight'] for edge in overview['edges']), 79)
+
+        bottom = self.clusters.overview(level=0, limit=10, max_edges=5)
+        self.assertEqual(len(bottom['clusters']), 10)
+        self.assertEqual(bottom['clusters'][0]['size'], 6)
+        self.assertLessEqual(len(bottom['edges']), 5)
+        self.assertGreater(bottom['hidden']['clusters'], 0)
+        with self.assertRaises(ValueError):
+            self.clusters.overview(level=overview['levels'])
+
+    def test_expand(self):
+        overview = self.clusters.overview()
+        top = overview['clusters'][0]
+        expanded = self.clusters.expand(top['id'])
+        self.assertEqual(expanded['cluster']['id'], top['id'])
+        self.assertEqual(len(expanded['clusters']), top['children'])
+        self.assertEqual(sum(cluster['size'] for cluster in expanded['clusters']), top['size'])
+        self.assertTrue(all(cluster['level'] == top['level'] - 1 for cluster in expanded['clusters']))
+        for edge in expanded['external']:
+            self.assertNotEqual(edge['to'], top['id'])
+            self.assertTrue(edge['to'].startswith(f"{top['level']}-"))
+
+        # Down to the entities of a level 0 cluster: one clique
+        cluster = expanded['clusters'][0]
+        while cluster['level'] > 0:
+            cluster = self.clusters.expand(cluster['id'])['clusters'][0]
+        entities = self.clusters.expand(cluster['id'])
+        ids = {entity['id'] for entity in entities['entities']}
+        self.assertIn(ids, [set(clique) for clique in self.cliques])
+        self.assertEqual(len(entities['relationships']), 15)
+        self.assertEqual(entities['hidden'], {'entities': 0})
+        with self.assertRaises(KeyError):
+            self.clusters.expand('0-100000')
+        with self.assertRaises(KeyError):
+            self.clusters.expand('cluster')
+
+    def test_incremental_update(self):
+        before = self.clusters.overview()
+        clique = self.cliques[10]
+        new = self.db.add_entity({'name': 'new', 'type': 'Person'})
+        for entity_id in clique[:4]:
+            link(self.db, entity_id, new)
+        lonely = self.db.add_entity({'name': 'lonely', 'type': 'Person'})
+        self.version[0] = 2
+
+        after = self.clusters.overview()
+        stats = self.clusters.stats()
+        self.assertEqual((stats['builds'], stats['updates']), (1, 1))
+        self.assertEqual(after['build'], before['build'])
+        self.assertEqual(after['entities'], 482)
+        hierarchy = self.clusters.current()
+        position = {entity_id: index for index, entity_id in enumerate(hierarchy.graph.ids)}
+        # The new entity joins the cluster of its neighbours, the lonely one starts its own
+        self.assertEqual(hierarchy.labels[position[new]], hierarchy.labels[position[clique[0]]])
+        self.assertEqual(len(hierarchy.members(0, hierarchy.labels[position[lonely]])), 1)
+        self.assertEqual(sum(cluster['size'] for cluster in after['clusters']) + after['hidden']['entities'], 482)
+
+    def test_routes(self):
+        app = create_app()
+        ids = [add_entity({'name': name, 'type': 'Person'}) for name in ('Ada', 'Alan', 'Grace')]
+        add_relationship({'from_id': ids[0], 'to_id': ids[1], 'relationship': 'knows', 'snippet': ''})
+        client = app.test_client()
+        overview = client.get('/clusters').get_json()
+        self.assertEqual(overview['entities'], 3)
+        cluster_id = overview['clusters'][0]['id']
+        self.assertEqual(client.get(f'/clusters/{cluster_id}').status_code, 200)
+        self.assertEqual(client.get('/clusters/9-9').status_code, 404)
+        self.assertEqual(client.get('/clusters?level=7').status_code, 400)
+        self.assertEqual(client.get('/clusters?limit=many').status_code, 400)
+        self.assertEqual(client.get('/clusters?limit=-1').status_code, 400)
+        self.assertEqual(client.get(f'/clusters/{cluster_id}?max_edges=-1').status_code, 400)
+
+
+if __name__ == '__main__':
+    unittest.main()
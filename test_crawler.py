@@ -0,0 +1,99 @@
+import functools
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+os.environ.setdefault('OPENAI_API_KEY', 'test')
+
+from app import create_app
+from app.integrations.url_crawler import DEFAULT_PARAMS, MAX_PARAMS, Crawler, crawl_params
+
+SITE = {
+    'index.html': '<html><head><title>Home</title></head><body>Home <a href="a.html">A</a> '
+                  '<a href="/b.html#top">B</a> <a href="http://example.com/">External</a> '
+                  '<a href="mailto:someone@example.com">Mail</a></body></html>',
+    'a.html': '<html><head><title>A</title></head><body>Page A <a href="c.html">C</a> '
+              '<a href="index.html">Home</a></body></html>',
+    'b.html': '<html><head><title>B</title></head><body>Page B <a href="a.html">A</a> '
+              '<a href="missing.html">Missing</a></body></html>',
+    'c.html': '<html><head><title>C</title></head><body>Page C</body></html>',
+}
+
+
+class QuietHandler(SimpleHTTPRequestHandler):
+
+    def log_message(self, format, *args):
+        pass
+
+
+class CrawlerTestCase(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.mkdtemp()
+        for name, content in SITE.items():
+            with open(os.path.join(cls.directory, name), 'w') as fp:
+                fp.write(content)
+        handler = functools.partial(QuietHandler, directory=cls.directory)
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+        cls.thread = threading.Thread(target=cls.server.serve_forever, daemon=True)
+        cls.thread.start()
+        cls.base_url = f'http://127.0.0.1:{cls.server.server_address[1]}'
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        shutil.rmtree(cls.directory)
+
+    def crawl(self, **kwargs):
+        extracted = []
+        lock = threading.Lock()
+
+        def on_page(page):
+            with lock:
+                extracted.append(page['title'])
+            return 200
+
+        options = {'politeness_delay': 0, 'on_page': on_page}
+        options.update(kwargs)
+        report = Crawler([f'{self.base_url}/index.html'], **options).run()
+        return report, sorted(extracted)
+
+    def test_depth_limit(self):
+        report, extracted = self.crawl(max_depth=1)
+        self.assertEqual(extracted, ['A', 'B', 'Home'])
+        self.assertEqual(report['errors'], [])
+
+    def test_follows_links_and_reports_errors(self):
+        report, extracted = self.crawl(max_depth=3)
+        self.assertEqual(extracted, ['A', 'B', 'C', 'Home'])
+        self.assertEqual(len(report['errors']), 1)
+        self.assertIn('missing.html', report['errors'][0])
+
+    def test_page_budget(self):
+        report, extracted = self.crawl(max_depth=3, max_pages=2)
+        self.assertEqual(len(extracted), 2)
+
+    def test_allowed_domains(self):
+        report, extracted = self.crawl(max_depth=3, allowed_domains=['example.org'])
+        self.assertEqual(extracted, [])
+        self.assertEqual(report['pages'], [])
+
+    def test_request_options(self):
+        self.assertEqual(crawl_params({}), {**DEFAULT_PARAMS, 'allowed_domains': None})
+        self.assertEqual(crawl_params({'max_depth': '2', 'politeness_delay': 0})['max_depth'], 2)
+        client = create_app().test_client()
+        for options in ({'concurrency': 'many'}, {'concurrency': MAX_PARAMS['concurrency'] + 1},
+                        {'max_pages': 0}, {'max_depth': [1]}, {'politeness_delay': -1},
+                        {'politeness_delay': 'inf'}, {'allowed_domains': 'example.org'}):
+            response = client.post('/trigger-integration/url_crawler',
+                                   json={'urls': [f'{self.base_url}/index.html'], **options})
+            self.assertEqual(response.status_code, 400, options)
+
+
+if __name__ == '__main__':
+    unittest.main()
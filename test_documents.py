@@ -0,0 +1,43 @@
+import os
+import tempfile
+import unittest
+from app.documents import DocumentRegistry, document_id_for
+
+
+class DocumentRegistryTestCase(unittest.TestCase):
+
+    def test_document_id_ignores_whitespace_changes(self):
+        self.assertEqual(
+            document_id_for('John Doe  works at\nDoe Enterprises '),
+            document_id_for('John Doe works at Doe Enterprises'),
+        )
+        self.assertNotEqual(document_id_for('John'), document_id_for('Jane'))
+
+    def test_claim_short_circuits_known_documents(self):
+        registry = DocumentRegistry()
+        document_id = document_id_for('some text')
+        self.assertIsNone(registry.claim(document_id))
+        self.assertEqual(registry.claim(document_id)['status'], 'processing')
+
+        registry.complete(document_id, ['entity_1'], [{'from_id': 'entity_1', 'to_id': 'entity_2'}])
+        record = registry.claim(document_id)
+        self.assertEqual(record['status'], 'ingested')
+        self.assertEqual(record['entities'], ['entity_1'])
+
+    def test_release_allows_retry(self):
+        registry = DocumentRegistry()
+        document_id = document_id_for('failed text')
+        registry.claim(document_id)
+        registry.release(document_id)
+        self.assertIsNone(registry.claim(document_id))
+
+    def test_registry_is_persisted(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'documents.jsonl')
+            document_id = document_id_for('persisted text')
+            DocumentRegistry(path).complete(document_id, ['entity_1'], [])
+            self.assertEqual(DocumentRegistry(path).get(document_id)['entities'], ['entity_1'])
+
+
+if __name__ == '__main__':
+    unittest.main()
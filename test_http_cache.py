@@ -0,0 +1,77 @@
+import contextlib
+import gzip
+import io
+import json
+import os
+import unittest
+
+os.environ.setdefault('OPENAI_API_KEY', 'test')
+
+from app import create_app
+from app.http_cache import negotiate_encoding, response_cache
+from app.models import add_entity, add_relationship
+
+
+class HttpCacheTestCase(unittest.TestCase):
+
+    def setUp(self):
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.app = create_app()
+            self.client = self.app.test_client()
+            ids = [add_entity({'name': f'Entity {index}', 'type': 'Concept', 'description': 'x' * 50})
+                   for index in range(40)]
+            for from_id, to_id in zip(ids, ids[1:], strict=False):
+                add_relationship({'from_id': from_id, 'to_id': to_id, 'relationship': 'related_to'})
+
+    def get(self, path, **headers):
+        with contextlib.redirect_stdout(io.StringIO()):
+            return self.client.get(path, headers=headers)
+
+    def test_etag_and_not_modified(self):
+        response = self.get('/get-graph-data')
+        self.assertEqual(response.status_code, 200)
+        etag = response.headers['ETag']
+        self.assertTrue(etag.startswith('W/'))
+
+        self.assertEqual(self.get('/get-graph-data', **{'If-None-Match': etag}).status_code, 304)
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            add_entity({'name': 'New', 'type': 'Concept'})
+        changed = self.get('/get-graph-data', **{'If-None-Match': etag})
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed.headers['ETag'], etag)
+
+    def test_gzip_cached_per_version(self):
+        plain = self.get('/get-graph-data')
+        compressed = self.get('/get-graph-data', **{'Accept-Encoding': 'gzip'})
+        self.assertEqual(compressed.headers['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', compressed.headers['Vary'])
+        self.assertEqual(json.loads(gzip.decompress(compressed.data)), plain.get_json())
+
+        hits = response_cache.stats()['hits']
+        again = self.get('/get-graph-data', **{'Accept-Encoding': 'gzip'})
+        self.assertEqual(again.data, compressed.data)
+        self.assertEqual(response_cache.stats()['hits'], hits + 1)
+
+    def test_other_routes_compressed(self):
+        plain = self.get('/integration-load')
+        self.assertGreaterEqual(len(plain.data), 1024)
+        response = self.get('/integration-load', **{'Accept-Encoding': 'gzip'})
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertEqual(json.loads(gzip.decompress(response.data)), plain.get_json())
+        # Below COMPRESS_MIN_SIZE bodies are sent as they are
+        small = self.get('/cache-metrics', **{'Accept-Encoding': 'gzip'})
+        self.assertNotIn('Content-Encoding', small.headers)
+        not_found = self.get('/analytics/unknown', **{'Accept-Encoding': 'gzip'})
+        self.assertEqual(not_found.status_code, 404)
+
+    def test_negotiate_encoding(self):
+        self.assertEqual(negotiate_encoding('gzip, deflate'), 'gzip')
+        self.assertIsNone(negotiate_encoding('identity'))
+        self.assertIsNone(negotiate_encoding('gzip;q=0'))
+        self.assertIsNone(negotiate_encoding(None))
+        self.assertIn(negotiate_encoding('*'), ('br', 'gzip'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,45 @@
+import datetime
+import json
+import unittest
+from flask import Flask, jsonify
+from flask.json.provider import DefaultJSONProvider
+from app.integrations.integration_manager import integration_result
+from app.json_provider import FastJSONProvider
+
+
+class FastJSONProviderTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.app = Flask(__name__)
+        self.app.json = FastJSONProvider(self.app)
+        self.default = DefaultJSONProvider(self.app)
+
+    def test_matches_default_provider(self):
+        graph = {
+            'entities': {2: {'name': 'Acme', 'type': 'Organization'}, 1: {'name': 'Zoë', 'type': 'Person'}},
+            'relationships': [{'from_id': 1, 'to_id': 2, 'relationship': 'works_at'}],
+            'created': datetime.datetime(2024, 1, 2, 3, 4, 5),
+            'huge': 2 ** 70,
+        }
+        self.assertEqual(json.loads(self.app.json.dumps(graph)), json.loads(self.default.dumps(graph)))
+        self.assertEqual(self.app.json.loads(self.app.json.dumps(graph))['entities']['1']['name'], 'Zoë')
+        self.assertEqual(self.app.json.dumps({'b': 1, 'a': 2}), '{"a":2,"b":1}')
+
+    def test_response(self):
+        with self.app.app_context():
+            response = jsonify(id=1, name='Acme')
+        self.assertEqual(response.mimetype, 'application/json')
+        self.assertEqual(response.get_data(), b'{"id":1,"name":"Acme"}\n')
+
+    def test_integration_result(self):
+        with self.app.app_context():
+            self.assertEqual(integration_result((jsonify(success=True), 200)), ({'success': True}, 200))
+            self.assertEqual(integration_result(jsonify(success=True)), ({'success': True}, 200))
+        payload = {'success': True, 'entity_id': 3}
+        data, status_code = integration_result((payload, 201))
+        self.assertIs(data, payload)
+        self.assertEqual(status_code, 201)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+import os
+import unittest
+
+os.environ.setdefault('OPENAI_API_KEY', 'test')
+
+import numpy as np
+from scipy import sparse
+from app import create_app
+from app.analytics import GraphAnalytics
+from app.integrations.database.memory import InMemoryDatabase
+from app.layout import GraphLayout, coarsen, force_layout, multilevel_layout
+from app.models import add_entity, add_relationship
+
+
+def cliques(count, size):
+    # `count` cliques of `size` nodes, each joined to the next one by a single edge
+    edges = [(clique * size + a, clique * size + b) for clique in range(count)
+             for a in range(size) for b in range(a + 1, size)]
+    edges += [(clique * size, (clique + 1) * size) for clique in range(count - 1)]
+    rows, cols = zip(*edges, strict=True)
+    n = count * size
+    adjacency = sparse.csr_matrix((np.ones(len(rows)), (rows, cols)), shape=(n, n))
+    return (adjacency + adjacency.T).tocsr()
+
+
+def mean_distances(positions, size):
+    clique = np.arange(len(positions)) // size
+    distances = np.linalg.norm(positions[:, None] - positions[None, :], axis=2)
+    same = clique[:, None] == clique[None, :]
+    np.fill_diagonal(same, False)
+    return distances[same].mean(), distances[clique[:, None] != clique[None, :]].mean()
+
+
+class LayoutTestCase(unittest.TestCase):
+
+    def test_force_layout_separates_clusters(self):
+        inside, between = mean_distances(force_layout(cliques(3, 8)), 8)
+        self.assertLess(inside * 2, between)
+
+    def test_multilevel_layout(self):
+        adjacency = cliques(60, 10)
+        parent = coarsen(adjacency, np.random.default_rng(0))
+        self.assertLess(parent.max() + 1, adjacency.shape[0])
+        # Paired nodes are neighbours
+        for coarse in range(parent.max() + 1):
+            members = np.flatnonzero(parent == coarse)
+            self.assertLessEqual(len(members), 2)
+            if len(members) == 2:
+                self.assertTrue(adjacency[members[0], members[1]])
+
+        positions = multilevel_layout(adjacency)
+        self.assertEqual(positions.shape, (600, 2))
+        self.assertTrue(np.isfinite(positions).all())
+        inside, between = mean_distances(positions, 10)
+        self.assertLess(inside * 2, between)
+
+    def test_incremental_layout(self):
+        db = InMemoryDatabase()
+        version = [1]
+        layout = GraphLayout(GraphAnalytics(db.dump_graph, lambda: version[0]))
+        ids = [db.add_entity({'name': f'n{index}', 'type': 'Person'}) for index in range(40)]
+        for index in range(39):
+            db.add_relationship({'from_id': ids[index], 'to_id': ids[index + 1], 'relationship': 'knows',
+                                 'snippet': ''})
+        first = layout.layout()
+        self.assertIs(layout.layout(), first)
+        self.assertEqual(set(first), set(ids))
+
+        new = db.add_entity({'name': 'new', 'type': 'Person'})
+        db.add_relationship({'from_id': ids[0], 'to_id': new, 'relationship': 'knows', 'snippet': ''})
+        version[0] = 2
+        second = layout.layout()
+        self.assertEqual(layout.stats()['runs'], {'full': 1, 'incremental': 1})
+        self.assertIn(new, second)
+        # Entities already laid out barely move
+        moves = [np.hypot(second[i][0] - first[i][0], second[i][1] - first[i][1]) for i in ids]
+        self.assertLess(np.median(moves), 150)
+
+    def test_graph_data_route(self):
+        app = create_app()
+        ids = [add_entity({'name': name, 'type': 'Person'}) for name in ('Ada', 'Alan', 'Grace')]
+        add_relationship({'from_id': ids[0], 'to_id': ids[1], 'relationship': 'knows', 'snippet': ''})
+        client = app.test_client()
+        self.assertNotIn('positions', client.get('/get-graph-data').get_json())
+        positions = client.get('/get-graph-data?layout=1').get_json()['positions']
+        self.assertEqual(set(positions), {str(entity_id) for entity_id in ids})
+        self.assertTrue(all(len(position) == 2 for position in positions.values()))
+        self.assertEqual(client.get('/layout').get_json()['nodes'], 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
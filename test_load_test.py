@@ -0,0 +1,51 @@
+import contextlib
+import io
+import json
+import os
+import tempfile
+import unittest
+
+os.environ.setdefault('OPENAI_API_KEY', 'test')
+
+import requests
+from benchmarks.fake_openai import FakeOpenAIServer
+from benchmarks.load_test import main
+
+
+class FakeOpenAITestCase(unittest.TestCase):
+
+    def test_answers_knowledge_graph_calls(self):
+        with FakeOpenAIServer() as fake:
+            response = requests.post(fake.url + '/chat/completions', json={
+                'model': 'gpt-4-turbo',
+                'messages': [{'role': 'user', 'content': 'Ada Lovelace worked with Charles Babbage.'}],
+                'function_call': {'name': 'knowledge_graph'},
+            })
+        arguments = json.loads(response.json()['choices'][0]['message']['function_call']['arguments'])
+        self.assertEqual([node['name'] for node in arguments['nodes']], ['Ada', 'Lovelace', 'Charles', 'Babbage'])
+        self.assertEqual(len(arguments['relationships']), 3)
+        self.assertEqual(fake.stats, {'knowledge_graph': 1})
+
+
+class LoadTestTestCase(unittest.TestCase):
+
+    def test_runs_offline_and_reports_per_route(self):
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, 'load.json')
+            with contextlib.redirect_stdout(io.StringIO()):
+                status = main(['--concurrency', '2', '--requests', '12', '--model-latency', '0', '--model-jitter', '0',
+                               '--mix', 'natural_input=1', 'ai_search=1', 'graph=1', '--quiet-app',
+                               '--output', output])
+            with open(output) as fp:
+                report = json.load(fp)
+
+        self.assertEqual(status, 0)
+        self.assertEqual(report['overall']['requests'], 12)
+        self.assertEqual(report['overall']['error_rate'], 0.0)
+        for stats in report['routes'].values():
+            self.assertLessEqual(stats['p50_ms'], stats['p99_ms'])
+        self.assertIn('knowledge_graph', report['model_calls'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,61 @@
+import logging
+import unittest
+from flask import Flask, jsonify
+from app.logs import (
+    REQUEST_ID_HEADER,
+    RequestIdFilter,
+    SamplingFilter,
+    configure_logging,
+    request_id_var,
+    sampled,
+    truncated,
+)
+
+
+class LogsTestCase(unittest.TestCase):
+
+    def test_truncated(self):
+        self.assertEqual(str(truncated('short')), 'short')
+        self.assertEqual(str(truncated({'a': 1})), "{'a': 1}")
+        text = str(truncated('x' * 50, limit=10))
+        self.assertEqual(text, 'xxxxxxxxxx... (50 chars)')
+
+    def test_sampling(self):
+        sampling = SamplingFilter(every=10)
+        logger = logging.getLogger('app.test_sampling')
+        kept = []
+        for index in range(25):
+            record = logger.makeRecord(logger.name, logging.DEBUG, __file__, 0, 'Added %s', (index,), None,
+                                       extra=sampled('test'))
+            if sampling.filter(record):
+                kept.append(record.getMessage())
+        self.assertEqual(kept, ['Added 0', 'Added 10 [sampled, 1 of 10]', 'Added 20 [sampled, 1 of 10]'])
+        other = logger.makeRecord(logger.name, logging.DEBUG, __file__, 0, 'Other', (), None)
+        self.assertTrue(sampling.filter(other))
+
+    def test_request_id(self):
+        app = Flask(__name__)
+        configure_logging(app)
+        records = []
+
+        @app.route('/id')
+        def current_id():
+            record = logging.getLogger('app.test').makeRecord('app.test', logging.INFO, __file__, 0, 'x', (), None)
+            RequestIdFilter().filter(record)
+            records.append(record)
+            return jsonify(request_id=request_id_var.get())
+
+        client = app.test_client()
+        response = client.get('/id', headers={REQUEST_ID_HEADER: 'abc123'})
+        self.assertEqual(response.headers[REQUEST_ID_HEADER], 'abc123')
+        self.assertEqual(response.get_json()['request_id'], 'abc123')
+        self.assertEqual(records[0].request_id, 'abc123')
+
+        generated = client.get('/id')
+        self.assertEqual(len(generated.headers[REQUEST_ID_HEADER]), 32)
+        self.assertNotEqual(generated.headers[REQUEST_ID_HEADER], 'abc123')
+        self.assertEqual(request_id_var.get(), '-')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+import os
+import unittest
+
+os.environ.setdefault('OPENAI_API_KEY', 'test')
+
+from app import create_app
+from app.integrations.database.instrumented import InstrumentedDatabase
+from app.integrations.database.memory import InMemoryDatabase
+from app.metrics import (
+    Histogram,
+    MetricsRegistry,
+    db_operation_duration,
+    db_operation_errors,
+    http_requests,
+    instrument_integration,
+    integration_calls,
+    integration_errors,
+)
+from app.models import add_entity
+
+
+class MetricsTestCase(unittest.TestCase):
+
+    def test_histogram_text_format(self):
+        registry = MetricsRegistry()
+        histogram = registry.register(Histogram('test_seconds', 'Test.', ('route',), buckets=(0.1, 1)))
+        for value in (0.05, 0.5, 0.5, 3):
+            histogram.observe(value, '/a')
+        lines = registry.render().splitlines()
+        self.assertEqual(lines[:2], ['# HELP test_seconds Test.', '# TYPE test_seconds histogram'])
+        self.assertIn('test_seconds_bucket{route="/a",le="0.1"} 1', lines)
+        self.assertIn('test_seconds_bucket{route="/a",le="1"} 3', lines)
+        self.assertIn('test_seconds_bucket{route="/a",le="+Inf"} 4', lines)
+        self.assertIn('test_seconds_sum{route="/a"} 4.05', lines)
+        self.assertIn('test_seconds_count{route="/a"} 4', lines)
+
+    def test_failing_gauge_is_skipped(self):
+        registry = MetricsRegistry()
+        registry.gauge('broken', 'Broken.', lambda: 1 / 0)
+        registry.counter('working', 'Working.').inc()
+        text = registry.render()
+        self.assertIn('# broken unavailable', text)
+        self.assertIn('working 1', text)
+
+    def test_integration_errors(self):
+        def failing(_app, _data):
+            return {'error': 'boom'}, 500
+
+        def raising(_app, _data):
+            raise RuntimeError('boom')
+
+        errors = integration_errors.value('test_failing')
+        instrument_integration('test_failing', failing)(None, {})
+        with self.assertRaises(RuntimeError):
+            instrument_integration('test_failing', raising)(None, {})
+        self.assertEqual(integration_calls.value('test_failing'), 2)
+        self.assertEqual(integration_errors.value('test_failing'), errors + 2)
+
+    def test_database_timings(self):
+        db = InstrumentedDatabase(InMemoryDatabase())
+        count = db_operation_duration.count('get_entity')
+        entity_id = db.add_entity({'name': 'Acme', 'type': 'Organization'})
+        self.assertEqual(db.get_entity(entity_id)['name'], 'Acme')
+        self.assertEqual(db.get_entity(entity_id)['name'], 'Acme')
+        self.assertEqual(db_operation_duration.count('get_entity'), count + 2)
+        self.assertEqual(db.graph_counts(), {'entities': 1, 'relationships': 0})
+        self.assertTrue(hasattr(db, 'adjacency'))
+        self.assertFalse(hasattr(db, 'cache_stats'))
+
+        errors = db_operation_errors.value('load_graph')
+        with self.assertRaises(TypeError):
+            db.load_graph(None, None)
+        self.assertEqual(db_operation_errors.value('load_graph'), errors + 1)
+
+    def test_metrics_route(self):
+        app = create_app()
+        client = app.test_client()
+        add_entity({'name': 'Acme', 'type': 'Organization'})
+        requests = http_requests.value('GET', '/get-graph-data', '200')
+        client.get('/get-graph-data')
+        response = client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.content_type.startswith('text/plain; version=0.0.4'))
+        self.assertEqual(http_requests.value('GET', '/get-graph-data', '200'), requests + 1)
+        text = response.get_data(as_text=True)
+        self.assertIn('kgraph_graph_entities 1', text)
+        self.assertIn('kgraph_http_request_duration_seconds_count{method="GET",route="/get-graph-data"}', text)
+        self.assertIn('kgraph_db_operation_duration_seconds_count{operation="get_full_graph"}', text)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,180 @@
+import io
+import os
+import unittest
+
+os.environ.setdefault('OPENAI_API_KEY', 'test')
+
+from app.integrations.database.memory import InMemoryDatabase
+from app.integrations.database.neo4j_async import AsyncNeo4jIntegration
+from app.integrations.database.neo4jdb import Neo4jIntegration
+
+
+# These tests need a running Neo4j server, e.g.
+#   docker run -p 7687:7687 -e NEO4J_AUTH=neo4j/password neo4j:5
+#   NEO4J_PASSWORD=password python -m pytest test_neo4j.py
+@unittest.skipUnless(os.getenv('NEO4J_PASSWORD'), 'NEO4J_PASSWORD is not set, no Neo4j server to test against')
+class Neo4jIntegrationTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.db = Neo4jIntegration()
+        self.entity_ids = []
+
+    def tearDown(self):
+        with self.db.driver.session() as session:
+            session.run('MATCH (n:Entity) WHERE n.id IN $ids DETACH DELETE n', ids=self.entity_ids).consume()
+        self.db.close()
+
+    def test_add_entities_and_relationships(self):
+        self.entity_ids = self.db.add_entities([{'name': 'Batch Alice'}, {'name': 'Batch Bob'}])
+        self.assertEqual(len(self.entity_ids), 2)
+        self.assertEqual(self.db.get_entity(self.entity_ids[0])['name'], 'Batch Alice')
+
+        created = self.db.add_relationships([{
+            'from_id': self.entity_ids[0],
+            'to_id': self.entity_ids[1],
+            'relationship': 'knows',
+            'snippet': 'Batch Alice knows Batch Bob',
+        }])
+        self.assertEqual(created, 1)
+
+    def test_upsert_graph(self):
+        self.entity_ids = self.db.add_entities([{'name': 'Upsert Existing', 'source_documents': ['doc_a']}])
+        existing_id = self.entity_ids[0]
+
+        result = self.db.upsert_graph(
+            {1: {'name': 'Upsert New', 'source_documents': ['doc_b']}},
+            [
+                {'from_ref': 1, 'to_id': existing_id, 'relationship': 'knows', 'source_documents': ['doc_b']},
+                {'from_ref': 1, 'to_id': 'entity_missing', 'relationship': 'knows'},
+            ],
+            [{'id': existing_id, 'source_documents': ['doc_a', 'doc_b']}, {'id': 'entity_missing'}],
+        )
+        self.entity_ids.extend(result['entity_ids'].values())
+
+        self.assertEqual(result['updated'], [existing_id])
+        self.assertEqual(result['relationships'], 1)
+        self.assertEqual(self.db.get_entity(existing_id)['source_documents'], ['doc_a', 'doc_b'])
+        self.assertEqual(self.db.get_entity(result['entity_ids'][1])['name'], 'Upsert New')
+
+
+def plan_operators(plan):
+    operators = [plan['operatorType'].split('@')[0]]
+    for child in plan.get('children', []):
+        operators.extend(plan_operators(child))
+    return operators
+
+
+@unittest.skipUnless(os.getenv('NEO4J_PASSWORD'), 'NEO4J_PASSWORD is not set, no Neo4j server to test against')
+class Neo4jSchemaTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.db = Neo4jIntegration()
+        self.db.ensure_schema()
+        with self.db.driver.session() as session:
+            session.run('CALL db.awaitIndexes(120)').consume()
+
+    def tearDown(self):
+        self.db.close()
+
+    def explain(self, query, params=None):
+        with self.db.driver.session() as session:
+            return plan_operators(session.run('EXPLAIN ' + query, params or {}).consume().plan)
+
+    def test_schema_is_created(self):
+        with self.db.driver.session() as session:
+            constraints = [record['name'] for record in session.run('SHOW CONSTRAINTS')]
+            indexes = [record['name'] for record in session.run('SHOW INDEXES')]
+        self.assertIn('entity_id_unique', constraints)
+        self.assertIn('entity_type', indexes)
+        self.assertIn('entity_names', indexes)
+        self.assertIn('relationship_snippets', indexes)
+
+    def test_lookup_by_id_uses_unique_index(self):
+        self.assertIn('NodeUniqueIndexSeek', self.explain('MATCH (n:Entity {id: $id}) RETURN n', {'id': 'x'}))
+
+    def test_name_search_uses_fulltext_index(self):
+        query, params = self.db._search_entities_query({'name': 'Johnny Appleseed'})
+        operators = self.explain(query, params)
+        self.assertIn('ProcedureCall', operators)
+        self.assertNotIn('NodeByLabelScan', operators)
+
+    def test_type_search_uses_range_index(self):
+        query, params = self.db._search_entities_query({}, 'Person')
+        self.assertIn('NodeIndexSeek', self.explain(query, params))
+
+    def test_relationship_search_by_endpoint_uses_unique_index(self):
+        query, params = self.db._search_relationships_query({'from_id': 'x', 'relationship': 'knows'})
+        operators = self.explain(query, params)
+        self.assertIn('NodeUniqueIndexSeek', operators)
+        self.assertNotIn('NodeByLabelScan', operators)
+
+    def test_fulltext_search_matches_word_prefixes(self):
+        entity_ids = self.db.add_entities([{'name': 'Johnny Appleseed', 'type': 'Person'}])
+        try:
+            results = self.db.search_entities({'name': 'apple'})
+            self.assertIn(entity_ids[0], [result['id'] for result in results])
+            results = self.db.search_entities_with_type('Person', {'name': 'johnny'})
+            self.assertIn(entity_ids[0], [result['id'] for result in results])
+        finally:
+            self.db.delete_entity(entity_ids[0])
+
+
+@unittest.skipUnless(os.getenv('NEO4J_PASSWORD'), 'NEO4J_PASSWORD is not set, no Neo4j server to test against')
+class AsyncNeo4jIntegrationTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.db = AsyncNeo4jIntegration()
+        self.entity_ids = []
+
+    def tearDown(self):
+        for entity_id in self.entity_ids:
+            self.db.delete_entity(entity_id)
+        self.db.close()
+
+    def test_crud_and_full_graph(self):
+        self.entity_ids = [self.db.add_entity({'name': 'Async Alice'}), self.db.add_entity({'name': 'Async Bob'})]
+        self.db.add_relationship({
+            'from_id': self.entity_ids[0],
+            'to_id': self.entity_ids[1],
+            'relationship': 'knows',
+        })
+        self.assertTrue(self.db.update_entity(self.entity_ids[0], {'age': 30}))
+        self.assertEqual(self.db.get_entity(self.entity_ids[0])['age'], 30)
+        self.assertEqual([entity['name'] for entity in self.db.get_entities(self.entity_ids)], ['Async Alice', 'Async Bob'])
+
+        graph = self.db.get_full_graph()
+        self.assertIn(self.entity_ids[1], graph['entities'])
+        self.assertIn(
+            (self.entity_ids[0], self.entity_ids[1]),
+            [(rel['from_id'], rel['to_id']) for rel in graph['relationships']]
+        )
+
+    def test_upsert_graph(self):
+        result = self.db.upsert_graph(
+            {'a': {'name': 'Async Upsert A'}, 'b': {'name': 'Async Upsert B'}},
+            [{'from_ref': 'a', 'to_ref': 'b', 'relationship': 'knows'}],
+        )
+        self.entity_ids = list(result['entity_ids'].values())
+        self.assertEqual(result['relationships'], 1)
+        results = self.db.search_relationships({'from_id': result['entity_ids']['a']})
+        self.assertEqual([rel['relationship'] for rel in results], ['knows'])
+
+    def test_snapshot_round_trip(self):
+        source = InMemoryDatabase()
+        self.entity_ids = ['entity_snapshot_ann', 'entity_snapshot_bob']
+        source.load_graph([(self.entity_ids[0], 'Person', {'name': 'Snapshot Ann'}),
+                           (self.entity_ids[1], 'Person', {'name': 'Snapshot Bob'})],
+                          [(self.entity_ids[0], self.entity_ids[1], {'relationship': 'knows', 'snippet': ''})])
+        fp = io.BytesIO()
+        source.export_snapshot(fp)
+        fp.seek(0)
+
+        self.assertEqual(self.db.import_snapshot(fp), {'entities': 2, 'relationships': 1})
+        self.assertEqual(self.db.get_entity(self.entity_ids[0])['name'], 'Snapshot Ann')
+        nodes, edges = self.db.dump_graph()
+        self.assertTrue(set(self.entity_ids) <= {node[0] for node in nodes})
+        self.assertIn((self.entity_ids[0], self.entity_ids[1]), [(edge[0], edge[1]) for edge in edges])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+import os
+import tempfile
+import unittest
+from app.integrations.database.memory import InMemoryDatabase
+from app.integrations.database.paths import adjacency_from_edges, bidirectional_bfs, k_shortest_paths
+from app.integrations.database.sqlitedb import SQLiteIntegration
+
+os.environ.setdefault('OPENAI_API_KEY', 'test')
+
+from app.integrations.ai_search import describe_path
+
+
+def build(db):
+    # a - b - c - d with a shortcut a - e - d and a longer detour b - f - g - d
+    ids = {name: db.add_entity({'name': name.upper(), 'type': 'Concept'}) for name in 'abcdefg'}
+    for from_name, to_name, relationship in [
+        ('a', 'b', 'knows'), ('b', 'c', 'knows'), ('c', 'd', 'knows'),
+        ('a', 'e', 'works_at'), ('d', 'e', 'works_at'),
+        ('b', 'f', 'knows'), ('f', 'g', 'knows'), ('g', 'd', 'knows'),
+    ]:
+        db.add_relationship({'from_id': ids[from_name], 'to_id': ids[to_name], 'relationship': relationship,
+                             'snippet': f'{from_name} {relationship} {to_name}'})
+    return ids
+
+
+class PathAlgorithmsTestCase(unittest.TestCase):
+
+    def setUp(self):
+        edges = [(1, 2, {}), (2, 3, {}), (3, 4, {}), (1, 5, {}), (5, 4, {}), (4, 6, {})]
+        adjacency = adjacency_from_edges(edges)
+        self.expand = lambda ids: {entity_id: adjacency.get(entity_id, ()) for entity_id in ids}
+
+    def test_bidirectional_bfs(self):
+        nodes, relationships = bidirectional_bfs(self.expand, 1, 6)
+        self.assertEqual(nodes, [1, 5, 4, 6])
+        self.assertEqual(len(relationships), 3)
+        self.assertEqual(bidirectional_bfs(self.expand, 3, 3), ([3], []))
+        self.assertIsNone(bidirectional_bfs(self.expand, 1, 6, max_depth=2))
+        self.assertIsNone(bidirectional_bfs(self.expand, 1, 99))
+
+    def test_yen_paths_are_loopless_and_ordered(self):
+        paths = k_shortest_paths(self.expand, 1, 4, k=5)
+        self.assertEqual([nodes for nodes, _ in paths], [[1, 5, 4], [1, 2, 3, 4]])
+
+
+class DatabasePathsTestCase(unittest.TestCase):
+
+    def check_backend(self, db):
+        ids = build(db)
+        path = db.shortest_path(ids['a'], ids['d'])
+        self.assertEqual(path['length'], 2)
+        self.assertEqual([entity['name'] for entity in path['entities']], ['A', 'E', 'D'])
+
+        paths = db.k_shortest_paths(ids['a'], ids['d'], k=3)
+        self.assertEqual([path['length'] for path in paths], [2, 3, 4])
+
+        knows = db.shortest_path(ids['a'], ids['d'], relationship_types=['knows'])
+        self.assertEqual([entity['name'] for entity in knows['entities']], ['A', 'B', 'C', 'D'])
+        self.assertIsNone(db.shortest_path(ids['a'], ids['d'], max_depth=1))
+        self.assertIsNone(db.shortest_path(ids['a'], 'missing'))
+
+        db.delete_entity(ids['e'])
+        self.assertEqual(db.shortest_path(ids['a'], ids['d'])['length'], 3)
+        return path
+
+    def test_memory(self):
+        self.check_backend(InMemoryDatabase())
+
+    def test_sqlite(self):
+        with tempfile.TemporaryDirectory() as directory:
+            db = SQLiteIntegration(os.path.join(directory, 'paths.db'))
+            try:
+                self.check_backend(db)
+            finally:
+                db.close()
+
+    def test_describe_path(self):
+        db = InMemoryDatabase()
+        ids = build(db)
+        description = describe_path(db.shortest_path(ids['a'], ids['d']))
+        self.assertEqual(description, 'A -[works_at]-> E <-[works_at]- D (a works_at e; d works_at e)')
+
+
+if __name__ == '__main__':
+    unittest.main()
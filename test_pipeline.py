@@ -0,0 +1,130 @@
+import functools
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+os.environ.setdefault('OPENAI_API_KEY', 'test')
+
+import openai
+from app import create_app
+from app.integrations.ingestion_pipeline import chunk_text
+from app.integrations.url_array_processor import url_array_processor
+from app.pipeline import Pipeline, Stage, pipeline_metrics
+from benchmarks.fake_openai import FakeOpenAIServer
+
+
+class PipelineTestCase(unittest.TestCase):
+
+    def test_stages_fan_out_and_filter(self):
+        pipeline = Pipeline('test', [
+            Stage('split', lambda text: text.split(), workers=2, queue_size=2),
+            Stage('drop_short', lambda word: [word] if len(word) > 2 else [], workers=3, queue_size=2),
+            Stage('upper', lambda word: [word.upper()], workers=1, queue_size=1),
+        ])
+        results, errors = pipeline.run(['the quick brown fox', 'jumps over a lazy dog'] * 10)
+        self.assertEqual(errors, [])
+        self.assertEqual(sorted(set(results)), ['BROWN', 'DOG', 'FOX', 'JUMPS', 'LAZY', 'OVER', 'QUICK', 'THE'])
+        self.assertEqual(len(results), 80)
+
+        metrics = pipeline.metrics()
+        self.assertFalse(metrics['running'])
+        self.assertEqual(metrics['stages']['split']['processed'], 20)
+        self.assertEqual(metrics['stages']['split']['emitted'], 90)
+        self.assertEqual(metrics['stages']['drop_short']['emitted'], 80)
+        self.assertLessEqual(metrics['stages']['upper']['max_queue_depth'], 1)
+        self.assertIn(metrics, pipeline_metrics()['recent'])
+
+    def test_failures_are_isolated(self):
+        def check(value):
+            if value == 3:
+                raise ValueError('bad value')
+            return [value]
+
+        results, errors = Pipeline('test', [Stage('check', check, workers=2)]).run(range(6))
+        self.assertEqual(sorted(results), [0, 1, 2, 4, 5])
+        self.assertEqual(len(errors), 1)
+        self.assertEqual(errors[0]['stage'], 'check')
+
+    def test_stages_overlap(self):
+        active = set()
+        overlap = threading.Event()
+        lock = threading.Lock()
+
+        def slow(name):
+            def function(item):
+                with lock:
+                    active.add(name)
+                    if len(active) > 1:
+                        overlap.set()
+                time.sleep(0.01)
+                with lock:
+                    active.discard(name)
+                return [item]
+            return function
+
+        Pipeline('test', [Stage('first', slow('first')), Stage('second', slow('second'))]).run(range(10))
+        self.assertTrue(overlap.is_set())
+
+
+class ChunkTextTestCase(unittest.TestCase):
+
+    def test_chunks_on_sentence_boundaries(self):
+        text = ' '.join(f'Sentence number {i} is here.' for i in range(100))
+        chunks = chunk_text(text, size=200)
+        self.assertTrue(all(len(chunk) <= 200 for chunk in chunks))
+        self.assertTrue(all(chunk.endswith('.') for chunk in chunks))
+        self.assertEqual(' '.join(chunks), text)
+
+    def test_short_text_is_one_chunk(self):
+        self.assertEqual(chunk_text('short text'), ['short text'])
+
+
+class QuietHandler(SimpleHTTPRequestHandler):
+
+    def log_message(self, format, *args):
+        pass
+
+
+class UrlArrayProcessorTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        with open(os.path.join(self.directory, 'page.html'), 'w') as fp:
+            fp.write(f'<html><head><title>Ada</title></head><body>Ada Lovelace worked with Charles Babbage '
+                     f'in London ({time.time()}).</body></html>')
+        handler = functools.partial(QuietHandler, directory=self.directory)
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.fake = FakeOpenAIServer().start()
+        self.base_url = (openai.base_url, os.environ.get('OPENAI_BASE_URL'))
+        openai.base_url = self.fake.url + '/'
+        os.environ['OPENAI_BASE_URL'] = self.fake.url
+
+    def tearDown(self):
+        self.fake.stop()
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.directory)
+        openai.base_url = self.base_url[0]
+        if self.base_url[1] is None:
+            os.environ.pop('OPENAI_BASE_URL', None)
+        else:
+            os.environ['OPENAI_BASE_URL'] = self.base_url[1]
+
+    def test_ingests_valid_urls(self):
+        app = create_app()
+        page = f'http://127.0.0.1:{self.server.server_address[1]}/page.html'
+        response, status = url_array_processor(app, {'urls': [page, page, 'not a url']})
+        self.assertEqual(status, 200)
+        report = response.get_json()
+        self.assertEqual(report['errors'], ['Invalid URL: not a url'])
+        self.assertEqual([document['status'] for document in report['documents']], ['ingested'])
+        self.assertIn('knowledge_graph', self.fake.stats)
+
+
+if __name__ == '__main__':
+    unittest.main()
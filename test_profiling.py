@@ -0,0 +1,55 @@
+import json
+import os
+import tempfile
+import unittest
+
+os.environ.setdefault('OPENAI_API_KEY', 'test')
+
+from app import create_app, profiling
+from app.models import add_entity
+
+
+class ProfilingTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.settings = (profiling.PROFILE_TOKEN, profiling.PROFILE_DIR)
+        profiling.PROFILE_TOKEN = 'secret'
+        profiling.PROFILE_DIR = self.directory.name
+        self.app = create_app()
+        add_entity({'name': 'Acme', 'type': 'Organization'})
+        self.client = self.app.test_client()
+
+    def tearDown(self):
+        profiling.PROFILE_TOKEN, profiling.PROFILE_DIR = self.settings
+        self.directory.cleanup()
+
+    def test_not_profiled_without_token(self):
+        for headers in ({}, {'X-Profile': 'wrong'}):
+            response = self.client.get('/get-graph-data', headers=headers)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn('X-Profile-File', response.headers)
+        self.assertEqual(os.listdir(self.directory.name), [])
+
+    def test_deterministic(self):
+        response = self.client.get('/get-graph-data', headers={'X-Profile': 'secret'})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('entities', response.get_json())
+        path = response.headers['X-Profile-File']
+        self.assertTrue(path.endswith('-GET-get_graph_data.prof'))
+        self.assertTrue(os.path.exists(path))
+        self.assertTrue(os.path.exists(path[:-len('.prof')] + '.txt'))
+        summary = json.loads(response.headers['X-Profile-Summary'])
+        self.assertTrue(summary)
+        self.assertTrue(any('get_graph_data' in function for _, function in summary))
+        self.assertEqual(summary, sorted(summary, key=lambda entry: -entry[0]))
+
+    def test_sampling(self):
+        response = self.client.get('/get-graph-data?profile=secret&profile_mode=sampling')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.headers['X-Profile-File'].endswith('.folded'))
+        self.assertIsInstance(json.loads(response.headers['X-Profile-Summary']), list)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,158 @@
+import gc
+import os
+import random
+import threading
+import time
+import unittest
+
+os.environ.setdefault('OPENAI_API_KEY', 'test')
+
+from app import create_app
+from app.models import add_entity
+from app.signals import BusSignal, EventBus, entity_updated, event_bus
+
+
+class Subscriber:
+    def __init__(self, fail=0):
+        self.events = []
+        self.fail = fail
+
+    def receive(self, _sender, **extra):
+        if self.fail:
+            self.fail -= 1
+            raise RuntimeError('enrichment failed')
+        time.sleep(random.random() / 1000)
+        self.events.append(extra['entity_id'])
+
+
+class SignalsTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.bus = EventBus(workers=3, queue_size=4, max_retries=2, retry_delay=0, enabled=True)
+        self.signal = BusSignal('test-signal', bus=self.bus)
+
+    def test_send_returns_before_receivers(self):
+        release = threading.Event()
+        received = []
+
+        def slow(_sender, **extra):
+            release.wait(5)
+            received.append(extra['entity_id'])
+
+        self.signal.connect(slow)
+        self.signal.send(self, entity_id=1)
+        self.assertEqual(received, [])
+        self.assertEqual(self.bus.pending(), 1)
+        release.set()
+        self.assertTrue(self.bus.flush(5))
+        self.assertEqual(received, [1])
+        self.assertEqual(self.bus.stats()['delivered'], 1)
+
+    def test_order_per_subscriber(self):
+        subscribers = [Subscriber() for _ in range(4)]
+        for subscriber in subscribers:
+            self.signal.connect(subscriber.receive)
+        # More events than the queues hold, senders wait for room
+        for entity_id in range(50):
+            self.signal.send(self, entity_id=entity_id)
+        self.assertTrue(self.bus.flush(10))
+        for subscriber in subscribers:
+            self.assertEqual(subscriber.events, list(range(50)))
+        self.assertGreater(self.bus.stats()['blocked'], 0)
+
+    def test_retry_and_dead_letters(self):
+        flaky = Subscriber(fail=2)
+        broken = Subscriber(fail=1000)
+        healthy = Subscriber()
+        for subscriber in (flaky, broken, healthy):
+            self.signal.connect(subscriber.receive)
+        self.signal.send(self, entity_id=7)
+        self.assertTrue(self.bus.flush(5))
+        self.assertEqual(flaky.events, [7])
+        self.assertEqual(healthy.events, [7])
+        stats = self.bus.stats()
+        self.assertEqual((stats['delivered'], stats['retried'], stats['dead_lettered']), (2, 4, 1))
+        self.assertEqual(len(stats['dead_letters']), 1)
+        self.assertEqual(stats['dead_letters'][0]['attempts'], 3)
+        self.assertIn('enrichment failed', stats['dead_letters'][0]['error'])
+
+        broken.fail = 0
+        self.assertEqual(self.bus.redeliver(), 1)
+        self.assertTrue(self.bus.flush(5))
+        self.assertEqual(broken.events, [7])
+        self.assertEqual(self.bus.stats()['dead_letters'], [])
+
+    def test_retries_do_not_hold_the_workers(self):
+        bus = EventBus(workers=1, max_retries=1, retry_delay=1, enabled=True)
+        signal = BusSignal('test-signal', bus=bus)
+        failing = Subscriber(fail=1)
+        healthy = Subscriber()
+        signal.connect(failing.receive)
+        signal.connect(healthy.receive)
+        started = time.monotonic()
+        for entity_id in range(3):
+            signal.send(self, entity_id=entity_id)
+        while len(healthy.events) < 3 and time.monotonic() - started < 5:
+            time.sleep(0.01)
+        # Served while the failed delivery waits for its retry, which keeps the order of its subscriber
+        self.assertEqual(healthy.events, [0, 1, 2])
+        self.assertLess(time.monotonic() - started, 0.5)
+        self.assertEqual(failing.events, [])
+        self.assertTrue(bus.flush(5))
+        self.assertEqual(failing.events, [0, 1, 2])
+
+    def test_inline_and_sync_receivers(self):
+        inline = Subscriber()
+        self.signal.connect(inline.receive, inline=True)
+        self.signal.send(self, entity_id=1)
+        self.assertEqual(inline.events, [1])
+        self.assertEqual(self.bus.stats()['published'], 0)
+
+        # Forgotten once disconnected
+        self.signal.disconnect(inline.receive)
+        self.signal.connect(inline.receive)
+        self.signal.send(self, entity_id=3)
+        self.assertEqual(self.bus.stats()['published'], 1)
+        self.assertTrue(self.bus.flush(5))
+        self.assertEqual(inline.events, [1, 3])
+
+        self.bus.enabled = False
+        queued = Subscriber()
+        self.signal.connect(queued.receive)
+        self.signal.send(self, entity_id=2)
+        self.assertEqual(queued.events, [2])
+
+    def test_collected_inline_receivers_are_forgotten(self):
+        inline = Subscriber()
+        self.signal.connect(inline.receive, inline=True)
+        self.assertEqual(len(self.signal.inline), 1)
+        del inline
+        gc.collect()
+        self.assertEqual(len(self.signal.inline), 0)
+
+    def test_routes_dispatch_in_background(self):
+        app = create_app()
+        entity_id = add_entity({'name': 'Ada', 'type': 'Person'})
+        received = []
+
+        def enrich(_sender, **extra):
+            # Delivered within an app context of the app that sent it
+            from flask import current_app
+            received.append((current_app.name, extra['entity_id']))
+
+        entity_updated.connect(enrich, sender=app)
+        event_bus.enabled = True
+        try:
+            client = app.test_client()
+            response = client.put(f'/{entity_id}', json={'name': 'Ada Lovelace'})
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(event_bus.flush(5))
+            self.assertEqual(received, [(app.name, entity_id)])
+            self.assertEqual(client.get('/signal-metrics').get_json()['mode'], 'async')
+        finally:
+            event_bus.enabled = False
+            entity_updated.disconnect(enrich)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+import io
+import unittest
+from app.integrations.database.memory import InMemoryDatabase
+from app.integrations.database.snapshot import (
+    SnapshotError,
+    decode_snapshot,
+    encode_snapshot,
+)
+
+
+class SnapshotTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.nodes = [
+            (1, 'Person', {'name': 'John Doe', 'age': 42, 'score': 0.5, 'active': True}),
+            (2, 'Organization', {'name': 'Doe Enterprises', 'tags': ['a', 'b'], 'meta': {'founded': 1999}}),
+            (7, None, {'name': 'x' * 200, 'missing': None}),
+        ]
+        self.edges = [
+            (1, 2, {'relationship': 'works_at', 'snippet': 'John Doe works at Doe Enterprises'}),
+            (2, 99, {'relationship': 'owns'}),
+        ]
+
+    def test_round_trip(self):
+        for compression in ('none', 'zlib', 'lzma', 'bz2'):
+            data = encode_snapshot(self.nodes, self.edges, compression)
+            nodes, edges = decode_snapshot(data)
+            self.assertEqual(nodes, self.nodes)
+            self.assertEqual(edges, self.edges)
+
+    def test_string_ids(self):
+        nodes = [('entity_a', 'Person', {'name': 'A'}), ('entity_b', 'Person', {'name': 'B'})]
+        edges = [('entity_a', 'entity_b', {'relationship': 'knows'})]
+        self.assertEqual(decode_snapshot(encode_snapshot(nodes, edges)), (nodes, edges))
+
+    def test_rejects_invalid_data(self):
+        with self.assertRaises(SnapshotError):
+            decode_snapshot(b'not a snapshot')
+        with self.assertRaises(SnapshotError):
+            encode_snapshot([(1, None, {}), (1, None, {})], [])
+
+    def test_rejects_corrupt_payloads(self):
+        for compression in ('none', 'zlib', 'lzma', 'bz2'):
+            data = encode_snapshot(self.nodes, self.edges, compression)
+            header = data[:8]
+            for corrupt in (data[:len(data) // 2], header + b'\xff' * 40):
+                with self.assertRaises(SnapshotError, msg=compression):
+                    decode_snapshot(corrupt)
+
+    def test_memory_backend_export_import(self):
+        source = InMemoryDatabase()
+        source.load_graph(self.nodes, self.edges)
+        fp = io.BytesIO()
+        source.export_snapshot(fp, 'zlib')
+        fp.seek(0)
+
+        target = InMemoryDatabase()
+        counts = target.import_snapshot(fp)
+        self.assertEqual(counts, {'entities': 3, 'relationships': 2})
+        self.assertEqual(target.get_full_graph(), source.get_full_graph())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,121 @@
+import io
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from app.integrations.database.memory import InMemoryDatabase
+from app.integrations.database.sqlitedb import SQLiteIntegration
+
+
+def names(results):
+    return sorted(result['name'] for result in results)
+
+
+class SQLiteIntegrationTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.db = SQLiteIntegration(os.path.join(self.directory, 'test.db'))
+        self.john = self.db.add_entity({'name': 'John Doe', 'type': 'Person', 'age': 42})
+        self.acme = self.db.add_entity({'name': 'Doe Enterprises', 'type': 'Organization'})
+        self.al = self.db.add_entity({'name': 'Al', 'type': 'Person'})
+        self.db.add_relationship({
+            'from_id': self.john,
+            'to_id': self.acme,
+            'relationship': 'works_at',
+            'snippet': 'John Doe works at Doe Enterprises',
+            'source_documents': ['doc_a'],
+        })
+        self.db.add_relationship({'from_id': self.acme, 'to_id': self.al, 'relationship': 'employs'})
+
+    def tearDown(self):
+        self.db.close()
+        shutil.rmtree(self.directory)
+
+    def test_crud(self):
+        self.assertEqual(self.db.get_entity(self.john), {'id': self.john, 'name': 'John Doe', 'type': 'Person', 'age': 42})
+        self.assertTrue(self.db.update_entity(self.john, {'name': 'Johnny Doe'}))
+        self.assertEqual(self.db.get_entity(self.john)['name'], 'Johnny Doe')
+        self.assertFalse(self.db.update_entity('missing', {'name': 'x'}))
+
+        self.assertTrue(self.db.delete_entity(self.acme))
+        self.assertIsNone(self.db.get_entity(self.acme))
+        self.assertEqual(self.db.get_full_graph()['relationships'], [])
+        self.assertFalse(self.db.delete_entity(self.acme))
+
+    def test_search_entities(self):
+        self.assertEqual(names(self.db.search_entities({'name': 'doe'})), ['Doe Enterprises', 'John Doe'])
+        # Shorter than a trigram, served by the LIKE fallback
+        self.assertEqual(names(self.db.search_entities({'name': 'al'})), ['Al'])
+        self.assertEqual(names(self.db.search_entities({'age': 42})), ['John Doe'])
+        self.assertEqual(names(self.db.search_entities_with_type('Person', {'name': 'DOE'})), ['John Doe'])
+        self.assertEqual(names(self.db.search_text('enterprise')), ['Doe Enterprises'])
+
+        self.db.update_entity(self.al, {'name': 'Alice Liddell'})
+        self.assertEqual(names(self.db.search_entities({'name': 'lidd'})), ['Alice Liddell'])
+
+    def test_search_relationships(self):
+        results = self.db.search_relationships({'snippet': 'WORKS AT'})
+        self.assertEqual([(r['from_id'], r['to_id'], r['source_documents']) for r in results],
+                         [(self.john, self.acme, ['doc_a'])])
+        self.assertEqual(len(self.db.search_relationships({'from_id': self.acme})), 1)
+        self.assertEqual(len(self.db.search_relationships({'relationship': 'emp'})), 1)
+
+    def test_neighborhood(self):
+        self.assertEqual(set(self.db.get_neighborhood(self.john, 1)['entities']), {self.john, self.acme})
+        neighborhood = self.db.get_neighborhood(self.john, 2)
+        self.assertEqual(neighborhood['entities'][self.al]['depth'], 2)
+        self.assertEqual(len(neighborhood['relationships']), 2)
+        self.assertEqual(self.db.get_neighborhood('missing', 2), {'entities': {}, 'relationships': []})
+
+    def test_upsert_graph(self):
+        result = self.db.upsert_graph(
+            {'a': {'name': 'New Person'}},
+            [{'from_ref': 'a', 'to_id': self.john, 'relationship': 'knows'}],
+            [{'id': self.john, 'source_documents': ['doc_b']}],
+        )
+        self.assertEqual(result['updated'], [self.john])
+        self.assertEqual(result['relationships'], 1)
+        self.assertEqual(self.db.get_entity(self.john)['source_documents'], ['doc_b'])
+        self.assertEqual(self.db.search_relationships({'to_id': self.john})[0]['from_id'], result['entity_ids']['a'])
+
+    def test_data_survives_reopening(self):
+        self.db.close()
+        self.db = SQLiteIntegration(os.path.join(self.directory, 'test.db'))
+        self.assertEqual(len(self.db.get_all_entities()), 3)
+        self.assertEqual(self.db.search_entities({'name': 'enterprises'})[0]['id'], self.acme)
+
+    def test_connections_per_thread(self):
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(self.db.add_entity({'name': 'Threaded'})))
+                   for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(self.db.search_entities({'name': 'threaded'})), 4)
+
+    def test_connections_closed_with_their_thread(self):
+        for _ in range(50):
+            thread = threading.Thread(target=self.db.get_entity, args=(self.john,))
+            thread.start()
+            thread.join()
+        # Only the connection of the test thread is left
+        self.assertEqual(self.db.connections, [self.db.connection()])
+
+    def test_snapshot_from_memory_backend(self):
+        source = InMemoryDatabase()
+        source.load_graph([(1, 'Person', {'name': 'Ann'}), (2, 'Person', {'name': 'Bob'})],
+                          [(1, 2, {'relationship': 'knows', 'snippet': ''})])
+        fp = io.BytesIO()
+        source.export_snapshot(fp)
+        fp.seek(0)
+
+        self.assertEqual(self.db.import_snapshot(fp), {'entities': 2, 'relationships': 1})
+        self.assertEqual(self.db.get_entity(1)['name'], 'Ann')
+        self.assertEqual(set(self.db.get_neighborhood(1, 1)['entities']), {1, 2})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+import contextlib
+import io
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+os.environ.setdefault('OPENAI_API_KEY', 'test')
+
+from app import create_app
+from app.integrations import database
+from app import models
+from app.integrations.database import neo4jdb
+from app.integrations.database.memory import InMemoryDatabase
+from app.integrations.integration_manager import IntegrationManager
+from benchmarks.startup import main
+
+
+class LazyIntegrationsTestCase(unittest.TestCase):
+
+    def test_modules_register_on_first_lookup(self):
+        app = create_app()
+        manager = app.integration_manager
+        self.assertIn('ai_search', manager.pending_modules)
+        self.assertNotIn('ai_search', manager.integration_functions)
+
+        self.assertIsNotNone(manager.get_async_integration_function('ai_search'))
+        self.assertNotIn('ai_search', manager.pending_modules)
+        self.assertIn('ai_search', manager.integration_functions)
+        # Disabled and unknown integrations are still missing
+        self.assertIsNone(manager.get_integration_function('auto_add_person'))
+        self.assertIsNone(manager.get_integration_function('unknown'))
+
+    def test_register_lazy(self):
+        built = []
+
+        def factory():
+            built.append(True)
+            return lambda _app, _data: 'ok'
+
+        manager = IntegrationManager(None)
+        manager.register_lazy('backend', factory)
+        self.assertEqual(built, [])
+        self.assertEqual(manager.get_integration_function('backend')(None, {}), 'ok')
+        manager.get_integration_function('backend')
+        self.assertEqual(built, [True])
+
+    def test_database_backends(self):
+        self.assertIs(database.database_class('memory'), InMemoryDatabase)
+        self.assertIs(database.database_class('unknown'), InMemoryDatabase)
+        self.assertEqual(database.database_class('sqlite').__name__, 'SQLiteIntegration')
+        self.assertIs(database.InMemoryDatabase, InMemoryDatabase)
+        self.assertFalse(hasattr(database, 'MissingIntegration'))
+
+    def test_database_connects_on_first_call(self):
+        self.addCleanup(models.set_database_integration, models.current_db_integration)
+        driver = mock.MagicMock()
+        with mock.patch.object(database, 'db_type', 'neo4j'), \
+                mock.patch.dict(os.environ, {'NEO4J_PASSWORD': 'test', 'NEO4J_BOOTSTRAP_SCHEMA': 'false'}), \
+                mock.patch.object(neo4jdb.GraphDatabase, 'driver', return_value=driver) as connect:
+            create_app()
+            connect.assert_not_called()
+            driver.session.return_value.__enter__.return_value.run.return_value.single.return_value = None
+            self.assertIsNone(models.get_entity('entity_missing'))
+            models.get_entity('entity_missing')
+        connect.assert_called_once()
+        driver.verify_connectivity.assert_called_once_with()
+
+
+class StartupBenchmarkTestCase(unittest.TestCase):
+
+    def test_lazy_startup_skips_heavy_modules(self):
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, 'startup.json')
+            with contextlib.redirect_stdout(io.StringIO()):
+                self.assertEqual(main(['--runs', '1', '--modes', 'lazy', '--output', output]), 0)
+            with open(output) as fp:
+                result = json.load(fp)['results'][0]
+        self.assertEqual(result['modules'], [])
+        self.assertGreater(result['create_app_ms']['median'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
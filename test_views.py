@@ -0,0 +1,25 @@
+import os
+import unittest
+
+os.environ.setdefault('OPENAI_API_KEY', 'test')
+
+from app import create_app
+
+
+class EntityRoutesTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.client = create_app().test_client()
+
+    def test_create_and_update_entity(self):
+        response = self.client.post('/0', json={'name': 'Ada', 'type': 'Person'})
+        self.assertEqual(response.status_code, 201)
+        entity_id = response.get_json()['id']
+        self.assertEqual(self.client.get(f'/{entity_id}').get_json()['name'], 'Ada')
+
+        self.assertEqual(self.client.put(f'/{entity_id}', json={'name': 'Ada Lovelace'}).status_code, 200)
+        self.assertEqual(self.client.get(f'/{entity_id}').get_json()['name'], 'Ada Lovelace')
+
+
+if __name__ == '__main__':
+    unittest.main()